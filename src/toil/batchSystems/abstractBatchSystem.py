@@ -20,6 +20,8 @@ from abc import ABCMeta, abstractmethod
 from collections import namedtuple
 from contextlib import contextmanager
 
+from six.moves.queue import Empty
+
 from toil.lib.objects import abstractclassmethod
 from toil.lib.threading import LastProcessStandingArena
 from toil.batchSystems.registry import BATCH_SYSTEM_FACTORY_REGISTRY, DEFAULT_BATCH_SYSTEM
@@ -182,6 +184,30 @@ class AbstractBatchSystem(with_metaclass(ABCMeta, object)):
                  batch system does not support tracking wall time.
         """
         raise NotImplementedError()
+
+    def getUpdatedBatchJobs(self, maxWait):
+        """
+        Returns information about all the jobs that have updated their status
+        and are available within maxWait. Blocks until at least one update is
+        available or maxWait runs out, and then collects every other update
+        that is ready without waiting further. Each job will be returned
+        exactly once, by either this method or :meth:`getUpdatedBatchJob`.
+
+        The default implementation calls :meth:`getUpdatedBatchJob`
+        repeatedly. Implementations that can collect many updates at once
+        should override it.
+
+        :param float maxWait: the number of seconds to block, waiting for the first result
+
+        :rtype: list(UpdatedBatchJobInfo)
+        :return: The available updates, which may be an empty list.
+        """
+        updates = []
+        update = self.getUpdatedBatchJob(maxWait)
+        while update is not None:
+            updates.append(update)
+            update = self.getUpdatedBatchJob(0)
+        return updates
         
     def getSchedulingStatusMessage(self):
         """
@@ -371,6 +397,28 @@ class BatchSystemSupport(AbstractBatchSystem):
             workflowID=workflowID, jobID=jobID, batchSystem=batchSystem, batchJobIDfmt=batchJobIDfmt, fileDesc=fileDesc)
         return os.path.join(workDir, fileName)
 
+    @staticmethod
+    def _drainQueue(queue, maxWait):
+        """
+        Take everything from the given queue, blocking for up to maxWait
+        seconds for the first item and then taking whatever else is already
+        there without waiting further.
+
+        :param Queue queue: the queue to take items from
+        :param float maxWait: the number of seconds to block, waiting for the first item
+
+        :rtype: list
+        :return: The items taken, which may be an empty list.
+        """
+        items = []
+        try:
+            items.append(queue.get(timeout=maxWait))
+            while True:
+                items.append(queue.get_nowait())
+        except Empty:
+            pass
+        return items
+
     @staticmethod
     def workerCleanup(info):
         """
@@ -433,6 +481,11 @@ class BatchSystemLocalSupport(BatchSystemSupport):
         """To be called by getUpdatedBatchJob()"""
         return self.localBatch.getUpdatedBatchJob(maxWait)
 
+    def getUpdatedLocalJobs(self, maxWait):
+        # type: (float) -> List[UpdatedBatchJobInfo]
+        """To be called by getUpdatedBatchJobs()"""
+        return self.localBatch.getUpdatedBatchJobs(maxWait)
+
     def getNextJobID(self):  # type: () -> int
         """
         Must be used to get job IDs so that the local and batch jobs do not
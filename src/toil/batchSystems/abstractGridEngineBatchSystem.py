@@ -15,7 +15,9 @@
 from __future__ import absolute_import
 
 from builtins import str
+from collections import OrderedDict
 from datetime import datetime
+from pipes import quote
 import logging
 import time
 from threading import Thread, Lock
@@ -41,6 +43,15 @@ class AbstractGridEngineBatchSystem(BatchSystemCleanupSupport):
 
     class Worker(with_metaclass(ABCMeta, Thread)):
 
+        # Most jobs to submit as one array job. Schedulers commonly limit
+        # arrays to 1000 tasks by default.
+        maxArrayTasks = 1000
+
+        # Most bytes of commands to put in one array job, so that the
+        # submission command line stays under the length limit for a single
+        # argument.
+        maxArrayCommandBytes = 64 * 1024
+
         def __init__(self, newJobsQueue, updatedJobsQueue, killQueue,
                      killedJobsQueue, boss):
             """
@@ -102,6 +113,9 @@ class AbstractGridEngineBatchSystem(BatchSystemCleanupSupport):
             """
             Create a new job with the Toil job ID.
 
+            Waiting jobs that need the same resources are submitted together as
+            array jobs, if the batch system supports them.
+
             Implementation-specific; called by AbstractGridEngineWorker.run()
 
             :param string newJob: Toil job ID
@@ -111,29 +125,110 @@ class AbstractGridEngineBatchSystem(BatchSystemCleanupSupport):
             if newJob is not None:
                 self.waitingJobs.append(newJob)
             # Launch jobs as necessary:
+            toLaunch = []
             while len(self.waitingJobs) > 0 and \
-                    len(self.runningJobs) < int(self.boss.config.maxLocalJobs):
+                    len(self.runningJobs) + len(toLaunch) < int(self.boss.config.maxLocalJobs):
+                toLaunch.append(self.waitingJobs.pop(0))
+
+            # Group the jobs by the resources they need, keeping them in order
+            groups = OrderedDict()
+            for job in toLaunch:
+                groups.setdefault((job[1], job[2]), []).append(job)
+
+            for (cpu, memory), jobs in groups.items():
                 activity = True
-                jobID, cpu, memory, command, jobName = self.waitingJobs.pop(0)
-
-                # prepare job submission command
-                subLine = self.prepareSubmission(cpu, memory, jobID, command, jobName)
-                logger.debug("Running %r", subLine)
-                batchJobID = self.boss.with_retries(self.submitJob, subLine)
-                logger.debug("Submitted job %s", str(batchJobID))
-
-                # Store dict for mapping Toil job ID to batch job ID
-                # TODO: Note that this currently stores a tuple of (batch system
-                # ID, Task), but the second value is None by default and doesn't
-                # seem to be used
-                self.batchJobIDs[jobID] = (batchJobID, None)
-
-                # Add to queue of running jobs
-                with self.runningJobsLock:
-                    self.runningJobs.add(jobID)
+                while jobs:
+                    array = self._takeArray(jobs)
+                    if len(array) > 1:
+                        try:
+                            self._submitArray(cpu, memory, array)
+                            continue
+                        except NotImplementedError:
+                            pass
+                    for jobID, cpu, memory, command, jobName in array:
+                        self._submitSingle(jobID, cpu, memory, command, jobName)
 
             return activity
 
+        def _takeArray(self, jobs):
+            """
+            Remove and return as many jobs from the front of the given list as
+            fit in one array job: at most maxArrayTasks jobs, with commands
+            adding up to at most maxArrayCommandBytes.
+            """
+            size = 0
+            count = 0
+            while count < len(jobs) and count < self.maxArrayTasks:
+                size += len(jobs[count][3])
+                if count > 0 and size > self.maxArrayCommandBytes:
+                    break
+                count += 1
+            array = jobs[:count]
+            del jobs[:count]
+            return array
+
+        def _submitSingle(self, jobID, cpu, memory, command, jobName):
+            # prepare job submission command
+            subLine = self.prepareSubmission(cpu, memory, jobID, command, jobName)
+            logger.debug("Running %r", subLine)
+            batchJobID = self.boss.with_retries(self.submitJob, subLine)
+            logger.debug("Submitted job %s", str(batchJobID))
+
+            # Store dict for mapping Toil job ID to batch job ID, as a tuple of
+            # (batch system ID, array task), where the task is None for jobs
+            # not submitted as part of an array.
+            self.batchJobIDs[jobID] = (batchJobID, None)
+
+            # Add to queue of running jobs
+            with self.runningJobsLock:
+                self.runningJobs.add(jobID)
+
+        def _submitArray(self, cpu, memory, jobs):
+            jobIDs = [job[0] for job in jobs]
+            jobNames = set(job[4] for job in jobs)
+            jobName = jobNames.pop() if len(jobNames) == 1 else 'array'
+            subLine = self.prepareArraySubmission(cpu, memory, jobIDs, [job[3] for job in jobs], jobName)
+            logger.debug("Running %r", subLine)
+            batchJobID = self.boss.with_retries(self.submitJob, subLine)
+            logger.debug("Submitted array job %s for %d jobs", str(batchJobID), len(jobs))
+
+            # Array tasks are numbered from 1, in the order of the commands
+            with self.runningJobsLock:
+                for task, jobID in enumerate(jobIDs, 1):
+                    self.batchJobIDs[jobID] = (batchJobID, task)
+                    self.runningJobs.add(jobID)
+
+        def prepareArrayCommand(self, jobIDs, commands, batchSystem, taskIDVariable, batchJobIDfmt):
+            """
+            Put together a shell command for all the tasks of an array job,
+            which runs the command for the task whose index, counting from 1,
+            is in the given environment variable.
+
+            Each task sends its standard output and error to files named after
+            its own Toil job ID, like a job submitted on its own does, so that
+            the leader can find them if the job fails.
+
+            :param list jobIDs: Toil job IDs, one per task
+            :param list commands: the commands to run, one per task
+            :param string batchSystem: name of the batch system
+            :param string taskIDVariable: name of the environment variable the
+                   batch system puts the task index in
+            :param string batchJobIDfmt: a shell expression for the batch
+                   system's ID of the running task
+
+            :rtype: string
+            """
+            def taskPath(jobID, fileDesc):
+                # Format the path around a placeholder, and put the shell
+                # expression for the batch job ID in its place unquoted.
+                path = self.boss.formatStdOutErrPath(jobID, batchSystem, '\0', fileDesc)
+                return batchJobIDfmt.join(quote(part) for part in path.split('\0'))
+
+            return 'case ${} in {} esac'.format(taskIDVariable, ' '.join(
+                '{}) {{ {} ; }} >{} 2>{} ;;'.format(task, command,
+                                                   taskPath(jobID, 'std_output'), taskPath(jobID, 'std_error'))
+                for task, (jobID, command) in enumerate(zip(jobIDs, commands), 1)))
+
         def killJobs(self):
             """
             Kill any running jobs within worker
@@ -166,9 +261,8 @@ class AbstractGridEngineBatchSystem(BatchSystemCleanupSupport):
 
             # Wait to confirm the kill
             while killList:
-                for jobID in list(killList):
-                    batchJobID = self.getBatchSystemID(jobID)
-                    if self.boss.with_retries(self.getJobExitCode, batchJobID) is not None:
+                for jobID, status in zip(list(killList), self.getJobStatuses(killList)):
+                    if status is not None:
                         logger.debug('Adding jobID %s to killedJobsQueue', jobID)
                         self.killedJobsQueue.put(jobID)
                         killList.remove(jobID)
@@ -189,9 +283,8 @@ class AbstractGridEngineBatchSystem(BatchSystemCleanupSupport):
                 return self._checkOnJobsCache
 
             activity = False
-            for jobID in list(self.runningJobs):
-                batchJobID = self.getBatchSystemID(jobID)
-                status = self.boss.with_retries(self.getJobExitCode, batchJobID)
+            runningJobs = list(self.runningJobs)
+            for jobID, status in zip(runningJobs, self.getJobStatuses(runningJobs)):
                 if status is not None and isinstance(status, int):
                     activity = True
                     self.updatedJobsQueue.put(UpdatedBatchJobInfo(jobID=jobID, exitStatus=status, exitReason=None, wallTime=None))
@@ -204,18 +297,39 @@ class AbstractGridEngineBatchSystem(BatchSystemCleanupSupport):
             self._checkOnJobsTimestamp = datetime.now()
             return activity
 
+        def getJobStatuses(self, jobIDs):
+            """
+            Get the exit codes of the given jobs, asking the scheduler about
+            them all at once if the batch system supports it, and one at a
+            time otherwise.
+
+            :param list jobIDs: Toil job IDs of jobs that have been submitted
+            :return: for each job, its exit code, a BatchJobExitReason, or None
+                     if it is still running, in the same order as jobIDs.
+            :rtype: list
+            """
+            if not jobIDs:
+                return []
+            batchJobIDs = [self.getBatchSystemID(jobID) for jobID in jobIDs]
+            try:
+                return self.boss.with_retries(self.getJobExitCodes, batchJobIDs)
+            except NotImplementedError:
+                return [self.boss.with_retries(self.getJobExitCode, batchJobID)
+                        for batchJobID in batchJobIDs]
+
         def _runStep(self):
             """return True if more jobs, False is all done"""
             activity = False
-            newJob = None
-            if not self.newJobsQueue.empty():
+            # Take all the new jobs at once, so they can be submitted together
+            while not self.newJobsQueue.empty():
                 activity = True
                 newJob = self.newJobsQueue.get()
                 if newJob is None:
                     logger.debug('Received queue sentinel.')
                     return False
+                self.waitingJobs.append(newJob)
             activity |= self.killJobs()
-            activity |= self.createJobs(newJob)
+            activity |= self.createJobs(None)
             activity |= self.checkOnJobs()
             if not activity:
                 logger.debug('No activity, sleeping for %is', self.boss.sleepSeconds())
@@ -248,6 +362,27 @@ class AbstractGridEngineBatchSystem(BatchSystemCleanupSupport):
             """
             raise NotImplementedError()
 
+        def prepareArraySubmission(self, cpu, memory, jobIDs, commands, jobName):
+            """
+            Preparation in putting together a command-line string for
+            submitting several jobs with the same resource requirements to the
+            batch system as one array job (via submitJob().) Task N of the array
+            must run the Nth command, counting from 1; see
+            prepareArrayCommand().
+
+            Batch systems without array jobs need not implement this, and will
+            have each job submitted on its own instead.
+
+            :param: string cpu
+            :param: string memory
+            :param: list jobIDs: Toil job IDs, one per task
+            :param: list commands: the command line strings to be called, one per task
+            :param: string jobName: the name shared by the Toil jobs, or 'array'
+
+            :rtype: string
+            """
+            raise NotImplementedError()
+
         @abstractmethod
         def submitJob(self, subLine):
             """
@@ -295,6 +430,23 @@ class AbstractGridEngineBatchSystem(BatchSystemCleanupSupport):
             """
             raise NotImplementedError()
 
+        def getJobExitCodes(self, batchJobIDs):
+            """
+            Returns the exit codes of several jobs, the way getJobExitCode()
+            does for one, with as few calls to the scheduler as possible.
+            Implementation-specific; called by
+            AbstractGridEngineWorker.checkOnJobs() once per polling interval.
+
+            Batch systems that cannot query jobs in bulk need not implement
+            this, and will have getJobExitCode() called for each job instead.
+
+            :param list batchJobIDs: batch system job IDs, as strings
+
+            :rtype: list: for each batch job ID, in order, an exit code, a
+                    BatchJobExitReason, or None if the job is still running.
+            """
+            raise NotImplementedError()
+
     def __init__(self, config, maxCores, maxMemory, maxDisk):
         super(AbstractGridEngineBatchSystem, self).__init__(
             config, maxCores, maxMemory, maxDisk)
@@ -399,6 +551,20 @@ class AbstractGridEngineBatchSystem(BatchSystemCleanupSupport):
             self.currentJobs.remove(item.jobID)
             return item
 
+    def getUpdatedBatchJobs(self, maxWait):
+        updates = self.getUpdatedLocalJobs(0)
+        # Only wait if there isn't already a local job to report
+        waited = len(updates) == 0
+        items = self._drainQueue(self.updatedJobsQueue, maxWait if waited else 0)
+        for item in items:
+            logger.debug('UpdatedJobsQueue Item: %s', item)
+            self.currentJobs.remove(item.jobID)
+        updates.extend(items)
+        if waited:
+            # Pick up any local jobs that finished while we were waiting
+            updates.extend(self.getUpdatedLocalJobs(0))
+        return updates
+
     def shutdown(self):
         """
         Signals worker to shutdown (via sentinel) then cleanly joins the thread
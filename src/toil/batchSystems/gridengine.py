@@ -43,29 +43,37 @@ class GridEngineBatchSystem(AbstractGridEngineBatchSystem):
         def getRunningJobIDs(self):
             times = {}
             with self.runningJobsLock:
-                currentjobs = dict((str(self.batchJobIDs[x][0]), x) for x in self.runningJobs)
-            stdout = call_command(["qstat"])
+                currentjobs = dict((self.getBatchSystemID(x), x) for x in self.runningJobs)
 
-            for currline in stdout.split('\n'):
-                items = currline.strip().split()
-                if items:
-                    if items[0] in currentjobs and items[4] == 'r':
-                        jobstart = " ".join(items[5:7])
-                        jobstart = time.mktime(time.strptime(jobstart, "%m/%d/%Y %H:%M:%S"))
-                        times[currentjobs[items[0]]] = time.time() - jobstart
+            for sgeJobID, items in self._listQstatJobs():
+                if sgeJobID in currentjobs and items[4] == 'r':
+                    jobstart = " ".join(items[5:7])
+                    jobstart = time.mktime(time.strptime(jobstart, "%m/%d/%Y %H:%M:%S"))
+                    times[currentjobs[sgeJobID]] = time.time() - jobstart
 
             return times
 
         def killJob(self, jobID):
-            call_command(['qdel', self.getBatchSystemID(jobID)])
+            job, task = self.batchJobIDs[jobID]
+            if task is None:
+                call_command(['qdel', str(job)])
+            else:
+                call_command(['qdel', str(job), '-t', str(task)])
 
         def prepareSubmission(self, cpu, memory, jobID, command, jobName):
             return self.prepareQsub(cpu, memory, jobID) + [command]
 
+        def prepareArraySubmission(self, cpu, memory, jobIDs, commands, jobName):
+            jobID = '{}-{}'.format(jobIDs[0], jobIDs[-1])
+            return (self.prepareQsub(cpu, memory, jobID, batchJobIDfmt='$JOB_ID.$TASK_ID') +
+                    ['-t', '1-{}'.format(len(commands)),
+                     self.prepareArrayCommand(jobIDs, commands, 'gridengine', 'SGE_TASK_ID', '${JOB_ID}.${SGE_TASK_ID}')])
+
         def submitJob(self, subLine):
             stdout = call_command(subLine)
             output = stdout.split('\n')[0].strip()
-            result = int(output)
+            # Array jobs come back like 1234.1-10:1
+            result = int(output.split('.')[0])
             return result
 
         def getJobExitCode(self, sgeJobID):
@@ -90,6 +98,68 @@ class GridEngineBatchSystem(AbstractGridEngineBatchSystem):
                 if "Following jobs do not exist" not in ex.stderr:
                     raise
 
+            return self._getJobExitCodeFromQacct(job, task)
+
+        def getJobExitCodes(self, sgeJobIDs):
+            """
+            Get the exit codes of several jobs. One qstat call lists the jobs
+            that are still queued or running, and only the jobs that are not
+            are looked up with qacct.
+            """
+            queued = set(sgeJobID for sgeJobID, items in self._listQstatJobs())
+
+            exitCodes = []
+            for sgeJobID in sgeJobIDs:
+                job, task = (sgeJobID, None)
+                if '.' in sgeJobID:
+                    job, task = sgeJobID.split('.', 1)
+                if sgeJobID in queued:
+                    exitCodes.append(None)
+                else:
+                    exitCodes.append(self._getJobExitCodeFromQacct(job, task))
+            return exitCodes
+
+        """
+        Implementation-specific helper methods
+        """
+        def _listQstatJobs(self):
+            """
+            List the jobs that qstat reports as queued or running, as (job ID,
+            qstat columns) pairs. Array jobs are listed task by task, with IDs
+            like 1234.5, as returned by getBatchSystemID().
+            """
+            jobs = []
+            stdout = call_command(["qstat"])
+            for currline in stdout.split('\n'):
+                items = currline.strip().split()
+                if not items or not items[0].isdigit():
+                    # Skip the header
+                    continue
+                # Only running jobs have a queue column, like all.q@node1, and
+                # then array jobs have their tasks at the end.
+                taskColumn = 9 if len(items) > 7 and '@' in items[7] else 8
+                if len(items) > taskColumn:
+                    for task in self._expandTaskRange(items[taskColumn]):
+                        jobs.append(('{}.{}'.format(items[0], task), items))
+                else:
+                    jobs.append((items[0], items))
+            return jobs
+
+        def _expandTaskRange(self, tasks):
+            """
+            Get the task numbers in a qstat task list, like 4, 1-10:1 or 2,5,7.
+            """
+            numbers = []
+            for part in tasks.split(','):
+                if '-' in part:
+                    span, _, step = part.partition(':')
+                    first, last = span.split('-', 1)
+                    numbers.extend(range(int(first), int(last) + 1, int(step or 1)))
+                else:
+                    numbers.append(int(part))
+            return numbers
+
+        def _getJobExitCodeFromQacct(self, job, task):
             args = ["qacct", "-j", str(job)]
             if task is not None:
                 args.extend(["-t", str(task)])
@@ -102,10 +172,7 @@ class GridEngineBatchSystem(AbstractGridEngineBatchSystem):
                     return int(line.split()[1])
             return None
 
-        """
-        Implementation-specific helper methods
-        """
-        def prepareQsub(self, cpu, mem, jobID):
+        def prepareQsub(self, cpu, mem, jobID, batchJobIDfmt='$JOB_ID'):
             qsubline = ['qsub', '-V', '-b', 'y', '-terse', '-j', 'y', '-cwd',
                         '-N', 'toil_job_' + str(jobID)]
 
@@ -141,8 +208,8 @@ class GridEngineBatchSystem(AbstractGridEngineBatchSystem):
                 raise RuntimeError("must specify PE in TOIL_GRIDENGINE_PE environment variable when using multiple CPUs. "
                                    "Run qconf -spl and your local documentation for possible values")
 
-            stdoutfile = self.boss.formatStdOutErrPath(jobID, 'gridengine', '$JOB_ID', 'std_output')
-            stderrfile = self.boss.formatStdOutErrPath(jobID, 'gridengine', '$JOB_ID', 'std_error')
+            stdoutfile = self.boss.formatStdOutErrPath(jobID, 'gridengine', batchJobIDfmt, 'std_output')
+            stderrfile = self.boss.formatStdOutErrPath(jobID, 'gridengine', batchJobIDfmt, 'std_error')
             qsubline.extend(['-o', stdoutfile, '-e', stderrfile])
 
             return qsubline
@@ -166,16 +166,6 @@ class HTCondorBatchSystem(AbstractGridEngineBatchSystem):
         def getJobExitCode(self, batchJobID):
             logger.debug("Getting exit code for HTCondor job {0}".format(batchJobID))
 
-            status = {
-                1: 'Idle',
-                2: 'Running',
-                3: 'Removed',
-                4: 'Completed',
-                5: 'Held',
-                6: 'Transferring Output',
-                7: 'Suspended'
-            }
-
             requirements = '(ClusterId == {0})'.format(batchJobID)
             projection = ['JobStatus', 'ToilJobKilled', 'ExitCode',
                               'HoldReason', 'HoldReasonSubCode']
@@ -206,6 +196,49 @@ class HTCondorBatchSystem(AbstractGridEngineBatchSystem):
                 logger.warning(
                     "Multiple HTCondor ads returned using constraint: {0}".format(requirements))
 
+            return self._getJobExitCodeFromAd(schedd, batchJobID, ad)
+
+        def getJobExitCodes(self, batchJobIDs):
+            logger.debug("Getting exit codes for {0} HTCondor jobs".format(len(batchJobIDs)))
+
+            # Ask for all the jobs in one query
+            requirements = ' || '.join('(ClusterId == {0})'.format(batchJobID) for batchJobID in batchJobIDs)
+            projection = ['ClusterId', 'JobStatus', 'ToilJobKilled', 'ExitCode',
+                              'HoldReason', 'HoldReasonSubCode']
+
+            schedd = self.connectSchedd()
+            ads = {}
+            for ad in schedd.xquery(requirements = requirements, projection = projection):
+                batchJobID = str(ad['ClusterId'])
+                if batchJobID in ads:
+                    logger.warning(
+                        "Multiple HTCondor ads returned for ClusterId {0}".format(batchJobID))
+                ads[batchJobID] = ad
+
+            exitCodes = []
+            for batchJobID in batchJobIDs:
+                if str(batchJobID) not in ads:
+                    raise RuntimeError(
+                        "No HTCondor ads returned using constraint: (ClusterId == {0})".format(batchJobID))
+                exitCodes.append(self._getJobExitCodeFromAd(schedd, batchJobID, ads[str(batchJobID)]))
+            return exitCodes
+
+        def _getJobExitCodeFromAd(self, schedd, batchJobID, ad):
+            """
+            Get a job's exit code from its ClassAd, removing it from the Schedd
+            if it is done, or None if it is still running.
+            """
+
+            status = {
+                1: 'Idle',
+                2: 'Running',
+                3: 'Removed',
+                4: 'Completed',
+                5: 'Held',
+                6: 'Transferring Output',
+                7: 'Suspended'
+            }
+
             if ad['ToilJobKilled']:
                 logger.debug("HTCondor job {0} was killed by Toil".format(batchJobID))
 
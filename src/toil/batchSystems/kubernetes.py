@@ -24,6 +24,7 @@ Docker
 import base64
 import datetime
 import getpass
+import json
 import kubernetes
 import logging
 import os
@@ -33,15 +34,19 @@ import string
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import uuid
 import urllib3
 
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
 from kubernetes.client.rest import ApiException
+from kubernetes.watch.watch import iter_resp_lines
 
 from toil import applianceSelf
 from toil.batchSystems.abstractBatchSystem import (BatchSystemCleanupSupport,
-                                                   BatchJobExitReason,
                                                    EXIT_STATUS_UNAVAILABLE_VALUE,
                                                    UpdatedBatchJobInfo)
 from toil.common import Toil
@@ -91,7 +96,317 @@ def utc_now():
     return datetime.datetime.utcnow().replace(tzinfo=pytz.UTC)
 
 
+class KubernetesInformer(object):
+    """
+    Keeps an in-memory index of the Kubernetes jobs with a label, and of their
+    pods, up to date by watching for changes instead of listing them again.
+
+    Each kind of object gets a thread that lists all of them once, and then
+    watches for changes, resuming each new watch from the last resourceVersion
+    it saw. If Kubernetes has forgotten that version (410 Gone), the thread
+    lists everything again.
+    """
+
+    # For each kind of object we watch, the API it is in, the name of the
+    # method to list it, and the model to deserialize it as.
+    kinds = {'jobs': ('batch', 'list_namespaced_job', 'V1Job'),
+             'pods': ('core', 'list_namespaced_pod', 'V1Pod')}
+
+    # How long to ask each watch to last, in seconds. Each watch gets fresh
+    # credentials, so this needs to be well under their lifetime.
+    watchTimeout = 60
+
+    # How long to wait before trying again after an error, in seconds.
+    retryDelay = 5
+
+    # How long to wait for a kind of object to be listed, or for a job to be
+    # seen deleted, in seconds, before callers should ask Kubernetes directly.
+    waitTimeout = 60
+
+    def __init__(self, getApi, namespace, labelSelector):
+        """
+        :param getApi: function that takes 'batch' or 'core' and returns that
+               Kubernetes API object, with fresh credentials.
+        :param str namespace: namespace to watch objects in.
+        :param str labelSelector: Kubernetes label selector for the objects to
+               watch, like "toil_run=toil-1234".
+        """
+        self.getApi = getApi
+        self.namespace = namespace
+        self.labelSelector = labelSelector
+        # Maps job name to V1Job
+        self._jobs = {}
+        # Maps job name to the V1Pod running the job, from the pod's job-name
+        # label
+        self._pods = {}
+        # Names of jobs we have seen deleted. Names are never reused, so these
+        # must not come back from stale information.
+        self._deletedJobNames = set()
+        # Kinds that have been listed at least once
+        self._synced = set()
+        # Counts changes to the index, so waiters can tell if anything happened
+        self.version = 0
+        # Guards all of the above
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+
+    def start(self):
+        """
+        Start listing and watching in the background.
+        """
+        for kind in self.kinds:
+            thread = threading.Thread(target=self._run, args=(kind,), name='kubernetes-informer-' + kind)
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        """
+        Stop watching. Each thread finishes when its current watch ends.
+        """
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def waitForSync(self, kind):
+        """
+        Wait for the given kind of object to have been listed, for at most
+        waitTimeout seconds.
+
+        :param str kind: 'jobs' or 'pods'.
+        :return: True if the informer can be asked about that kind of object,
+                 or False if the caller should ask Kubernetes instead.
+        :rtype: bool
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: kind in self._synced or self._stop.is_set(),
+                                            self.waitTimeout):
+                logger.warning('Kubernetes %s have not been listed after %s seconds; asking directly',
+                               kind, self.waitTimeout)
+            return kind in self._synced
+
+    def jobs(self):
+        """
+        Get all the jobs. Only complete after :meth:`waitForSync` for 'jobs'
+        has returned True.
+
+        :rtype: list(kubernetes.client.V1Job)
+        """
+        with self._condition:
+            return list(self._jobs.values())
+
+    def pods(self):
+        """
+        Get all the pods of the jobs. Only complete after :meth:`waitForSync`
+        for 'pods' has returned True.
+
+        :rtype: list(kubernetes.client.V1Pod)
+        """
+        with self._condition:
+            return list(self._pods.values())
+
+    def getPod(self, jobName):
+        """
+        Get the pod for the job with the given name, or None if it has none.
+        Only reliable after :meth:`waitForSync` for 'pods' has returned True.
+
+        :rtype: kubernetes.client.V1Pod
+        """
+        with self._condition:
+            return self._pods.get(jobName)
+
+    def addJob(self, jobObject):
+        """
+        Index a job we just created, so we don't have to wait for the watch to
+        report it. Anything the watch already said about it wins.
+
+        :param kubernetes.client.V1Job jobObject: the job Kubernetes returned
+               when we created it.
+        """
+        with self._condition:
+            name = jobObject.metadata.name
+            if name not in self._jobs and name not in self._deletedJobNames:
+                self._jobs[name] = jobObject
+                self._changed()
+
+    def waitForChange(self, version, timeout):
+        """
+        Wait until the index has changed since it was at the given version, or
+        the timeout in seconds expires.
+
+        :return: the current version of the index.
+        :rtype: int
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != version or self._stop.is_set(), timeout)
+            return self.version
+
+    def waitForJobDeath(self, jobName):
+        """
+        Block until the job with the given name is gone, for at most
+        waitTimeout seconds.
+
+        :return: True if the job is gone, or False if the caller should ask
+                 Kubernetes instead, in case its deletion was missed.
+        :rtype: bool
+        """
+        with self._condition:
+            if self._condition.wait_for(lambda: jobName not in self._jobs or self._stop.is_set(),
+                                        self.waitTimeout):
+                return jobName not in self._jobs
+        logger.warning('Kubernetes job %s still exists after %s seconds; asking directly',
+                       jobName, self.waitTimeout)
+        return False
+
+    def _changed(self):
+        # Must be called with the condition held
+        self.version += 1
+        self._condition.notify_all()
+
+    def _run(self, kind):
+        """
+        List and then watch the given kind of object until stopped.
+        """
+        resourceVersion = None
+        while not self._stop.is_set():
+            try:
+                if resourceVersion is None:
+                    resourceVersion = self._list(kind)
+                resourceVersion = self._watch(kind, resourceVersion)
+                if resourceVersion is None:
+                    logger.debug('Kubernetes no longer has the %s versions we were watching from; listing again', kind)
+            except ApiException as e:
+                if e.status == 410:
+                    logger.debug('Kubernetes no longer has the %s versions we were watching from; listing again', kind)
+                    resourceVersion = None
+                else:
+                    logger.warning('Received error from Kubernetes while watching %s: %s', kind, e)
+                    self._stop.wait(self.retryDelay)
+            except Exception as e:
+                # Whatever happened, we have to keep the index up to date, or
+                # the batch system will wait forever.
+                if is_retryable_kubernetes_error(e):
+                    logger.warning('Received error from Kubernetes while watching %s: %s', kind, e)
+                else:
+                    logger.exception('Unexpected error while watching Kubernetes %s', kind)
+                self._stop.wait(self.retryDelay)
+
+    def _list(self, kind):
+        """
+        List all the objects of the given kind and replace the index of them.
+
+        :return: the resourceVersion to watch for changes from.
+        :rtype: str
+        """
+        apiKind, methodName, _ = self.kinds[kind]
+        index = {}
+        resourceVersion = None
+        token = None
+        while True:
+            # As in KubernetesBatchSystem._ourJobObject, only send a
+            # continuation token if we have one.
+            kwargs = {'label_selector': self.labelSelector}
+            if token is not None:
+                kwargs['_continue'] = token
+            results = getattr(self.getApi(apiKind), methodName)(self.namespace, **kwargs)
+            if resourceVersion is None:
+                # Changes after the first page will show up in the watch.
+                resourceVersion = results.metadata.resource_version
+            for item in results.items:
+                key = self._key(kind, item)
+                if key is not None:
+                    index[key] = item
+            token = getattr(results.metadata, '_continue', None)
+            if token is None:
+                break
+
+        with self._condition:
+            if kind == 'jobs':
+                self._jobs = index
+                # The list is the whole truth as of now, and the watch goes on
+                # from it, so we no longer need to remember what was deleted
+                # before.
+                self._deletedJobNames = set()
+            else:
+                self._pods = index
+            self._synced.add(kind)
+            self._changed()
+        return resourceVersion
+
+    def _watch(self, kind, resourceVersion):
+        """
+        Watch the given kind of object from the given resourceVersion, until
+        the watch times out, and apply the changes to the index.
+
+        :return: the resourceVersion to resume watching from, or None if
+                 Kubernetes no longer has the one we asked for.
+        :rtype: str
+        """
+        apiKind, methodName, model = self.kinds[kind]
+        api = self.getApi(apiKind)
+        # We parse the stream ourselves instead of with kubernetes.watch,
+        # which can't tell us about an expired resourceVersion.
+        response = getattr(api, methodName)(self.namespace, label_selector=self.labelSelector,
+                                            resource_version=resourceVersion, watch=True,
+                                            timeout_seconds=self.watchTimeout, _preload_content=False)
+        try:
+            for line in iter_resp_lines(response):
+                event = json.loads(line)
+                if event['type'] == 'ERROR':
+                    if event['object'].get('code') == 410:
+                        return None
+                    raise RuntimeError('Kubernetes watch failed: {}'.format(event['object'].get('message')))
+                item = api.api_client.deserialize(SimpleNamespace(data=json.dumps(event['object'])), model)
+                resourceVersion = item.metadata.resource_version
+                self._apply(kind, event['type'], item)
+                if self._stop.is_set():
+                    break
+        finally:
+            response.close()
+            response.release_conn()
+        return resourceVersion
+
+    def _key(self, kind, item):
+        """
+        Get the key to index an object of the given kind under: a job's name,
+        or the name of a pod's job. Returns None for pods without a job.
+        """
+        if kind == 'jobs':
+            return item.metadata.name
+        return (item.metadata.labels or {}).get('job-name')
+
+    def _apply(self, kind, eventType, item):
+        """
+        Apply a watch event to the index.
+        """
+        if eventType not in ('ADDED', 'MODIFIED', 'DELETED'):
+            # Bookmarks just move the resourceVersion along
+            return
+        key = self._key(kind, item)
+        if key is None:
+            return
+        with self._condition:
+            if kind == 'jobs':
+                if eventType == 'DELETED':
+                    self._jobs.pop(key, None)
+                    self._deletedJobNames.add(key)
+                elif key not in self._deletedJobNames:
+                    self._jobs[key] = item
+            else:
+                if eventType == 'DELETED':
+                    current = self._pods.get(key)
+                    if current is not None and current.metadata.name == item.metadata.name:
+                        del self._pods[key]
+                else:
+                    self._pods[key] = item
+            self._changed()
+
+
 class KubernetesBatchSystem(BatchSystemCleanupSupport):
+
+    # How many requests to Kubernetes to make at once when cleaning up after
+    # finished jobs and checking on running ones in the background
+    cleanupConcurrency = 16
+
     @classmethod
     def supportsAutoDeployment(cls):
         return True
@@ -162,13 +477,30 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
         # TODO: have some way to specify this (env var?)!
         self.awsSecretName = os.environ.get("TOIL_AWS_SECRET_NAME", None)
 
-        # Set this to True to enable the experimental wait-for-job-update code
-        # TODO: Make this an environment variable?
+        # Set this to True to keep track of our jobs by watching them, instead
+        # of listing them from Kubernetes every time we look for updates.
         self.enableWatching = os.environ.get("KUBE_WATCH_ENABLED", False)
 
         self.runID = 'toil-{}'.format(self.uniqueID)
 
         self.jobIds = set()
+
+        # If watching, this keeps an index of our jobs and their pods for us
+        self.informer = None
+        if self.enableWatching:
+            self.informer = KubernetesInformer(self._api, self.namespace, 'toil_run={}'.format(self.runID))
+            self.informer.start()
+
+        # Fetching the logs of failed pods, deleting finished jobs, and
+        # checking if pods are stuck out of memory all happen here, so that
+        # the leader hears about finished jobs without waiting on them.
+        self._cleanupPool = ThreadPoolExecutor(max_workers=self.cleanupConcurrency)
+        # Names of jobs we have reported as finished that may still exist
+        self._finishedJobNames = set()
+        # Maps pod name to a Future for whether the pod is stuck out of memory
+        self._oomChecks = {}
+        # Guards the above
+        self._cleanupLock = threading.Lock()
     
    
     def _api(self, kind, max_age_seconds = 5 * 60):
@@ -447,6 +779,10 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
             # Make the job
             launched = self._try_kubernetes(self._api('batch').create_namespaced_job, self.namespace, job)
 
+            if self.informer is not None:
+                # Don't wait for the watch to hear about it
+                self.informer.addJob(launched)
+
             logger.debug('Launched job: %s', jobName)
             
             return jobID
@@ -462,6 +798,16 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
         :param bool onlySucceeded: restrict results to succeeded jobs.
         :param int limit: max results to yield.
         """
+
+        if self.informer is not None and self.informer.waitForSync('jobs'):
+            # The informer already knows about all our jobs
+            for job in self.informer.jobs():
+                if job.metadata.name in self._finishedJobNames:
+                    # We already reported this one
+                    continue
+                if not onlySucceeded or (getattr(job.status, 'succeeded', 0) or 0) > 0:
+                    yield job
+            return
         
         # We need to page through the list from the cluster with a continuation
         # token. These expire after about 5 minutes. If we use an expired one,
@@ -491,11 +837,14 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
                 results = self._try_kubernetes(self._api('batch').list_namespaced_job, self.namespace, 
                                                 label_selector="toil_run={}".format(self.runID), **kwargs)
             for job in results.items:
+                if job.metadata.name in self._finishedJobNames:
+                    # We already reported this one
+                    continue
                 # This job belongs to us
                 yield job
 
             # Remember the continuation token, if any
-            token = getattr(results.metadata, 'continue', None)
+            token = getattr(results.metadata, '_continue', None)
 
             if token is None:
                 # There isn't one. We got everything.
@@ -508,6 +857,11 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
         cluster knows about.                                        
         """
 
+        if self.informer is not None and self.informer.waitForSync('pods'):
+            for pod in self.informer.pods():
+                yield pod
+            return
+
         token = None
 
         while True:
@@ -524,7 +878,7 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
             for pod in results.items:
                 yield pod
             # Remember the continuation token, if any
-            token = getattr(results.metadata, 'continue', None)
+            token = getattr(results.metadata, '_continue', None)
 
             if token is None:
                 # There isn't one. We got everything.
@@ -542,6 +896,16 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
         :return: The pod for the job, or None if no pod is found.
         :rtype: kubernetes.client.V1Pod
         """
+
+        if self.informer is not None and self.informer.waitForSync('pods'):
+            pod = self.informer.getPod(jobObject.metadata.name)
+            jobFinished = ((getattr(jobObject.status, 'succeeded', 0) or 0) > 0 or
+                           (getattr(jobObject.status, 'failed', 0) or 0) > 0)
+            if not jobFinished or getattr(getattr(pod, 'status', None), 'phase', None) in ('Succeeded', 'Failed'):
+                return pod
+            # Jobs and pods are watched separately, so the informer can hear
+            # that a job finished before it hears that its pod did. Ask
+            # Kubernetes.
         
         token = None
         
@@ -564,7 +928,7 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
                 return pod
                     
             # Remember the continuation token, if any
-            token = getattr(results.metadata, 'continue', None)
+            token = getattr(results.metadata, '_continue', None)
         
             if token is None:
                 # There isn't one. We got everything.
@@ -671,79 +1035,42 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
 
         entry = datetime.datetime.now()
 
-        result = self._getUpdatedBatchJobImmediately()
+        while True:
+            if self.informer is not None:
+                # Note how much the informer has seen before we look, so we
+                # can wait for it to see something new.
+                seenVersion = self.informer.version
+
+            result = self._getUpdatedBatchJobImmediately()
+
+            waited = (datetime.datetime.now() - entry).total_seconds()
+            if result is not None or waited >= maxWait:
+                # We found something or we ran out of time
+                return result
+
+            if self.informer is not None:
+                # Wait for our jobs or pods to change. Local jobs don't show
+                # up in the informer, so look again at least every second.
+                self.informer.waitForChange(seenVersion, min(maxWait - waited, 1.0))
+            else:
+                # Still nothing. Wait a second, or some fraction of our max wait time.
+                time.sleep(min(maxWait/2, 1.0))
 
-        if result is not None or maxWait == 0:
-            # We got something on the first try, or we only get one try
-            return result
+    def getUpdatedBatchJobs(self, maxWait):
 
-        # Otherwise we need to maybe wait.
-        if self.enableWatching:
-            for event in self._try_kubernetes_stream(self._api('batch').list_namespaced_job, self.namespace, 
-                                                        label_selector="toil_run={}".format(self.runID),
-                                                        timeout_seconds=maxWait):
-                # Grab the metadata data, ID, the list of conditions of the current job, and the total pods
-                jobObject = event['object']
-                jobID = int(jobObject.metadata.name[len(self.jobPrefix):])
-                jobObjectListConditions =jobObject.status.conditions
-                totalPods = jobObject.status.active + jobObject.status.finished + jobObject.status.failed
-                # Exit Reason defaults to 'Successfully Finsihed` unless said otherwise 
-                exitReason = BatchJobExitReason.FINISHED
-                exitCode = 0
-
-                # Check if there are any active pods
-                if jobObject.status.acitve > 0:
-                    logger.info("%s has %d pods running" % jobObject.metadata.name, jobObject.status.active)
-                    continue
-                elif jobObject.status.failed > 0 or jobObject.status.finished > 0:
-                    # No more active pods in the current job ; must be finished
-                    logger.info("%s RESULTS -> Succeeded: %d Failed:%d Active:%d" % jobObject.metadata.name, 
-                                                                jobObject.status.succeeded, jobObject.status.failed, jobObject.status.active)
-                    # Get termination information of job
-                    termination = jobObjectListConditions[0]
-                    # Log out succeess/failure given a reason
-                    logger.info("%s REASON: %s", termination.type, termination.reason)
-
-                    # Log out reason of failure and pod exit code 
-                    if jobObject.status.failed > 0:
-                        exitReason = BatchJobExitReason.FAILED
-                        pod = self._getPodForJob(jobObject)
-                        logger.debug("Failed job %s", str(jobObject))
-                        logger.warning("Failed Job Message: %s", termination.message)
-                        exitCode = pod.status.container_statuses[0].state.terminated.exit_code
-                    
-                    runtime = slow_down((termination.completion_time - termination.start_time).total_seconds())
-                    result = UpdatedBatchJobInfo(jobID=jobID, exitStatus=exitCode, wallTime=runtime, exitReason=exitReason)
-
-                    if (ExiReason == BatchJobExitReason.FAILED) or (jobObject.status.finished == totalPods):
-                        # Cleanup if job is all finished or there was a pod that failed
-                        self._try_kubernetes(self._api('batch').delete_namespaced_job, 
-                                            jobObject.metadata.name,
-                                            self.namespace,
-                                            propagation_policy='Foreground')
-                        self._waitForJobDeath(jobOjbect.metadata.name)
-                        return result
-                    continue
-                else:
-                    # Job is not running/updating ; no active, successful, or failed pods yet
-                    logger.debug("Job %s -> %s" % (jobObject.metadata.name, jobObjectListConditions[0].reason))
-                    # Pod could be pending; don't say it's lost.
-                    continue
-        else:
-            # Try polling instead
-            while result is None and (datetime.datetime.now() - entry).total_seconds() < maxWait:
-                # We still have nothing and we haven't hit the timeout.
-                
-                # Poll
-                result = self._getUpdatedBatchJobImmediately()
+        results = self._getUpdatedBatchJobsImmediately()
 
-                if result is None:
-                    # Still nothing. Wait a second, or some fraction of our max wait time.
-                    time.sleep(min(maxWait/2, 1.0))
+        if len(results) > 0 or maxWait == 0:
+            # We got something on the first try, or we only get one try
+            return results
 
-            # When we get here, either we found something or we ran out of time
-            return result
+        # Otherwise wait for something to finish, the same way we do for one job
+        result = self.getUpdatedBatchJob(maxWait)
+        if result is None:
+            return []
 
+        # And collect anything else that finished while we were waiting
+        return [result] + self._getUpdatedBatchJobsImmediately()
 
     def _getUpdatedBatchJobImmediately(self):
         """
@@ -791,52 +1118,179 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
 
         if jobObject is None:
             # If no jobs are failed, look for jobs with pods that are stuck for various reasons.
-            for j in self._ourJobObject():
-                pod = self._getPodForJob(j)
+            jobObject = self._findStuckJob()
+            if jobObject is not None:
+                chosenFor = 'stuck'
 
-                if pod is None:
-                    # Skip jobs with no pod
-                    continue
-                    
-                # Containers can get stuck in Waiting with reason ImagePullBackOff
+        if jobObject is None:
+            # Say we couldn't find anything
+            return None
 
-                # Get the statuses of the pod's containers
-                containerStatuses = pod.status.container_statuses
-                if containerStatuses is None or len(containerStatuses) == 0:
-                    # Pod exists but has no container statuses
-                    # This happens when the pod is just "Scheduled"
-                    # ("PodScheduled" status event) and isn't actually starting
-                    # to run yet.
-                    # Can't be stuck in ImagePullBackOff
-                    continue
+        # Otherwise we got something. Return it, and clean it up later.
+        return self._finishJob(jobObject, chosenFor)
 
-                waitingInfo = getattr(getattr(pod.status.container_statuses[0], 'state', None), 'waiting', None)
-                if waitingInfo is not None and waitingInfo.reason == 'ImagePullBackOff':
-                    # Assume it will never finish, even if the registry comes back or whatever.
-                    # We can get into this state when we send in a non-existent image.
-                    # See https://github.com/kubernetes/kubernetes/issues/58384
-                    jobObject = j
-                    chosenFor = 'stuck'
-                    logger.warning('Failing stuck job; did you try to run a non-existent Docker image?'
-                                   ' Check TOIL_APPLIANCE_SELF.')
-                    break
+    def _getUpdatedBatchJobsImmediately(self):
+        """
+        Return all the updated (completed, failed or stuck) batch jobs that
+        are currently available, which may be none.
 
-                # Pods can also get stuck nearly but not quite out of memory,
-                # if their memory limits are high and they try to exhaust them.
+        Collects finished jobs from a single listing of our jobs, and leaves
+        them to be cleaned up in the background.
 
-                if self._isPodStuckOOM(pod):
-                    # We found a job that probably should be OOM! Report it as stuck.
-                    # Polling function takes care of the logging.
-                    jobObject = j
-                    chosenFor = 'stuck'
-                    break
+        :rtype: list(UpdatedBatchJobInfo)
+        """
 
-        if jobObject is None:
-            # Say we couldn't find anything
-            return None
+        # See if local batch jobs have updated and are available immediately
+        results = self.getUpdatedLocalJobs(0)
+
+        # Pair up done or failed jobs with the reason we picked them
+        chosen = []
+        for j in self._ourJobObject():
+            if (getattr(j.status, 'succeeded', 0) or 0) > 0:
+                chosen.append((j, 'done'))
+            elif (getattr(j.status, 'failed', 0) or 0) > 0:
+                chosen.append((j, 'failed'))
+
+        if len(chosen) == 0 and len(results) == 0:
+            # Looking for stuck jobs needs a request per job, so only do it
+            # when nothing else is going on.
+            jobObject = self._findStuckJob()
+            if jobObject is not None:
+                chosen.append((jobObject, 'stuck'))
 
+        for jobObject, chosenFor in chosen:
+            results.append(self._finishJob(jobObject, chosenFor))
 
-        # Otherwise we got something.
+        return results
+
+    def _finishJob(self, jobObject, chosenFor):
+        """
+        Summarize a job that is done, failed or stuck for the leader, and leave
+        getting its log and deleting it to the cleanup pool. The job won't be
+        reported again.
+
+        :param kubernetes.client.V1Job jobObject: The job to finish.
+        :param str chosenFor: 'done', 'failed' or 'stuck'.
+
+        :rtype: UpdatedBatchJobInfo
+        """
+        pod = self._getPodForJob(jobObject)
+        result = self._summarizeJob(jobObject, chosenFor, pod)
+        jobName = jobObject.metadata.name
+        with self._cleanupLock:
+            self._finishedJobNames.add(jobName)
+        self._cleanupPool.submit(self._cleanUpJob, result.jobID, jobName, pod, chosenFor == 'failed')
+        return result
+
+    def _cleanUpJob(self, jobID, jobName, pod, failed):
+        """
+        Runs in the cleanup pool. Log the log of a failed job's pod, and then
+        delete the job and wait for it to be gone.
+
+        :param int jobID: The batch system ID of the job, for the log.
+        :param str jobName: The name of the job in Kubernetes.
+        :param kubernetes.client.V1Pod pod: The job's pod, or None.
+        :param bool failed: True if the job failed and its log is wanted.
+        """
+        if failed and pod is not None:
+            try:
+                # Warn the user with the failed pod's log
+                # TODO: cut this down somehow?
+                logger.warning('Log from failed pod for job %d: %s', jobID, self._getLogForPod(pod))
+            except Exception as e:
+                logger.warning('Could not get log from failed pod for job %d: %s', jobID, e)
+        try:
+            self._deleteFinishedJob(jobName)
+            self._waitForJobDeath(jobName)
+        except Exception:
+            # Leave it marked as finished so we never report it twice; our
+            # jobs all get deleted at shutdown anyway.
+            logger.exception('Could not clean up finished job %s', jobName)
+            return
+        with self._cleanupLock:
+            self._finishedJobNames.discard(jobName)
+            if pod is not None:
+                self._oomChecks.pop(pod.metadata.name, None)
+
+    def _findStuckJob(self):
+        """
+        Find a job of ours whose pod is stuck and will never finish.
+
+        :return: The stuck job, or None if no job is stuck.
+        :rtype: kubernetes.client.V1Job
+        """
+        for j in self._ourJobObject():
+            pod = self._getPodForJob(j)
+
+            if pod is None:
+                # Skip jobs with no pod
+                continue
+                
+            # Containers can get stuck in Waiting with reason ImagePullBackOff
+
+            # Get the statuses of the pod's containers
+            containerStatuses = pod.status.container_statuses
+            if containerStatuses is None or len(containerStatuses) == 0:
+                # Pod exists but has no container statuses
+                # This happens when the pod is just "Scheduled"
+                # ("PodScheduled" status event) and isn't actually starting
+                # to run yet.
+                # Can't be stuck in ImagePullBackOff
+                continue
+
+            waitingInfo = getattr(getattr(pod.status.container_statuses[0], 'state', None), 'waiting', None)
+            if waitingInfo is not None and waitingInfo.reason == 'ImagePullBackOff':
+                # Assume it will never finish, even if the registry comes back or whatever.
+                # We can get into this state when we send in a non-existent image.
+                # See https://github.com/kubernetes/kubernetes/issues/58384
+                logger.warning('Failing stuck job; did you try to run a non-existent Docker image?'
+                               ' Check TOIL_APPLIANCE_SELF.')
+                return j
+
+            # Pods can also get stuck nearly but not quite out of memory,
+            # if their memory limits are high and they try to exhaust them.
+
+            if self._checkPodStuckOOM(pod):
+                # We found a job that probably should be OOM! Report it as stuck.
+                # Polling function takes care of the logging.
+                return j
+
+        return None
+
+    def _checkPodStuckOOM(self, pod):
+        """
+        Return True if a check in the cleanup pool has found the given pod to
+        be stuck out of memory. Otherwise, start a new check if there isn't one
+        going, to find out for next time.
+
+        :param kubernetes.client.V1Pod pod: a running pod to check on.
+        :rtype: bool
+        """
+        name = pod.metadata.name
+        with self._cleanupLock:
+            check = self._oomChecks.get(name)
+            if check is not None and not check.done():
+                # Still waiting to find out
+                return False
+            if check is not None and check.exception() is None and check.result():
+                return True
+            if check is not None and check.exception() is not None:
+                logger.warning('Could not check if pod %s is out of memory: %s', name, check.exception())
+            self._oomChecks[name] = self._cleanupPool.submit(self._isPodStuckOOM, pod)
+            return False
+
+    def _summarizeJob(self, jobObject, chosenFor, pod):
+        """
+        Work out the exit code and runtime of a job that is done, failed or
+        stuck.
+
+        :param kubernetes.client.V1Job jobObject: The job to summarize.
+        :param str chosenFor: 'done', 'failed' or 'stuck'.
+        :param kubernetes.client.V1Pod pod: The job's pod, or None if it has
+               none.
+
+        :rtype: UpdatedBatchJobInfo
+        """
 
         # Work out what the job's ID was (whatever came after our name prefix)
         jobID = int(jobObject.metadata.name[len(self.jobPrefix):])
@@ -848,9 +1302,6 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
             # If somehow this is unset, say it was just now.
             jobSubmitTime = utc_now() 
 
-        # Grab the pod
-        pod = self._getPodForJob(jobObject)
-
         if pod is not None:
             if chosenFor == 'done' or chosenFor == 'failed':
                 # The job actually finished or failed
@@ -898,11 +1349,6 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
                         # successful.
                         runtime = slow_down((terminatedInfo.finished_at - 
                                              pod.status.start_time).total_seconds())
-
-                        if chosenFor == 'failed':
-                            # Warn the user with the failed pod's log
-                            # TODO: cut this down somehow?
-                            logger.warning('Log from failed pod: %s', self._getLogForPod(pod))
             
             else:
                 # The job has gotten stuck
@@ -921,36 +1367,41 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
             runtime = slow_down((utc_now() - jobSubmitTime).total_seconds())
         
         
+        return UpdatedBatchJobInfo(jobID=jobID, exitStatus=exitCode, wallTime=runtime, exitReason=None)
+
+    def _deleteFinishedJob(self, jobName):
+        """
+        Start deleting the finished job with the given name, and its pods.
+
+        That just kicks off the deletion process. Foreground doesn't actually
+        block. See
+        https://kubernetes.io/docs/concepts/workloads/controllers/garbage-collection/#foreground-cascading-deletion
+        We have to either wait until the deletion is done and we can't see the
+        job anymore, or ban the job from being "updated" again if we see it.
+        If we don't block on deletion, we can't use limit=1 on our query for
+        succeeded jobs. So callers need to poll for the job's non-existence
+        with :meth:`_waitForJobDeath`.
+        """
         try:
             # Delete the job and all dependents (pods), hoping to get a 404 if it's magically gone
-            self._try_kubernetes_expecting_gone(self._api('batch').delete_namespaced_job, jobObject.metadata.name,
+            self._try_kubernetes_expecting_gone(self._api('batch').delete_namespaced_job, jobName,
                                                 self.namespace,
                                                 propagation_policy='Foreground')
-                                                
-            # That just kicks off the deletion process. Foreground doesn't
-            # actually block. See
-            # https://kubernetes.io/docs/concepts/workloads/controllers/garbage-collection/#foreground-cascading-deletion
-            # We have to either wait until the deletion is done and we can't
-            # see the job anymore, or ban the job from being "updated" again if
-            # we see it. If we don't block on deletion, we can't use limit=1
-            # on our query for succeeded jobs. So we poll for the job's
-            # non-existence.
-            self._waitForJobDeath(jobObject.metadata.name)
-                    
         except ApiException as e:
             if e.status != 404:
                 # Something is wrong, other than the job already being deleted.
                 raise
             # Otherwise everything is fine and the job is gone. 
 
-        # Return the one finished job we found
-        return UpdatedBatchJobInfo(jobID=jobID, exitStatus=exitCode, wallTime=runtime, exitReason=None)
-
     def _waitForJobDeath(self, jobName):
         """
         Block until the job with the given name no longer exists.
         """
 
+        if self.informer is not None and self.informer.waitForJobDeath(jobName):
+            # The informer saw it go
+            return
+
         # We do some exponential backoff on the polling
         # TODO: use a wait instead of polling?
         backoffTime = 0.1
@@ -975,6 +1426,9 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
         
         # Shutdown local processes first
         self.shutdownLocal()
+
+        # Let cleanups that have started finish talking to Kubernetes
+        self._cleanupPool.shutdown(wait=True)
        
     
         # Kill all of our jobs and clean up pods that are associated with those jobs
@@ -1010,6 +1464,9 @@ class KubernetesBatchSystem(BatchSystemCleanupSupport):
                         # Anything other than a 404 is weird here.
                         logger.error("Exception when calling CoreV1Api->delete_namespaced_pod: %s" % e)
 
+        if self.informer is not None:
+            self.informer.stop()
+
 
     def _getIssuedNonLocalBatchJobIDs(self):
         """
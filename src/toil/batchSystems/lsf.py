@@ -24,7 +24,7 @@ from builtins import range
 from past.utils import old_div
 import logging
 import math
-from toil.lib.misc import call_command
+from toil.lib.misc import call_command, CalledProcessErrorStderr
 import os
 import json
 import re
@@ -54,18 +54,19 @@ class LSFBatchSystem(AbstractGridEngineBatchSystem):
         def getRunningJobIDs(self):
             times = {}
             with self.runningJobsLock:
-                currentjobs = dict((str(self.batchJobIDs[x][0]), x) for x in
+                currentjobs = dict((self.lsfJobID(self.getBatchSystemID(x)), x) for x in
                                    self.runningJobs)
 
             if check_lsf_json_output_supported:
-                stdout = call_command(["bjobs","-json","-o", "jobid stat start_time"])
+                stdout = call_command(["bjobs","-json","-o", "jobid jobindex stat start_time"])
 
                 bjobs_records = self.parseBjobs(stdout)
                 if bjobs_records:
                     for single_item in bjobs_records:
-                        if single_item['STAT'] == 'RUN' and single_item['JOBID'] in currentjobs:
+                        job = self.bjobsRecordJobID(single_item)
+                        if single_item['STAT'] == 'RUN' and job in currentjobs:
                             jobstart = parse(single_item['START_TIME'], default=datetime.now(tzlocal()))
-                            times[currentjobs[single_item['JOBID']]] = datetime.now(tzlocal()) \
+                            times[currentjobs[job]] = datetime.now(tzlocal()) \
                             - jobstart
             else:
                 times = self.fallbackRunningJobIDs(currentjobs)
@@ -83,11 +84,19 @@ class LSFBatchSystem(AbstractGridEngineBatchSystem):
             return times
 
         def killJob(self, jobID):
-            call_command(['bkill', self.getBatchSystemID(jobID)])
+            call_command(['bkill', self.lsfJobID(self.getBatchSystemID(jobID))])
 
         def prepareSubmission(self, cpu, memory, jobID, command, jobName):
             return self.prepareBsub(cpu, memory, jobID) + [command]
 
+        def prepareArraySubmission(self, cpu, memory, jobIDs, commands, jobName):
+            if not check_lsf_json_output_supported:
+                # Without the JSON output of bjobs we can't tell the tasks apart.
+                raise NotImplementedError()
+            jobID = '{}-{}'.format(jobIDs[0], jobIDs[-1])
+            return (self.prepareBsub(cpu, memory, jobID, arraySize=len(commands)) +
+                    [self.prepareArrayCommand(jobIDs, commands, 'lsf', 'LSB_JOBINDEX', '${LSB_JOBID}_${LSB_JOBINDEX}')])
+
         def submitJob(self, subLine):
             combinedEnv = self.boss.environment
             combinedEnv.update(os.environ)
@@ -118,61 +127,90 @@ class LSFBatchSystem(AbstractGridEngineBatchSystem):
 
             # first try bjobs to find out job state
             if check_lsf_json_output_supported:
-                args = ["bjobs", "-json", "-o",
-                        "user exit_code stat exit_reason pend_reason", str(job)]
-                logger.debug("Checking job exit code for job via bjobs: "
-                             "{}".format(job))
-                stdout = call_command(args)
-                bjobs_records = self.parseBjobs(stdout)
-                if bjobs_records:
-                    process_output = bjobs_records[0]
-                    if 'STAT' in process_output:
-                        process_status = process_output['STAT']
-                        if process_status == 'DONE':
-                            logger.debug(
-                                "bjobs detected job completed for job: {}".format(job))
-                            return 0
-                        if process_status == 'PEND':
-                            pending_info = ""
-                            if 'PEND_REASON' in process_output:
-                                if process_output['PEND_REASON']:
-                                    pending_info = "\n" + \
-                                        process_output['PEND_REASON']
-                            logger.debug(
-                                "bjobs detected job pending with: {}\nfor job: {}".format(pending_info, job))
-                            return None
-                        if process_status == 'EXIT':
-                            exit_code = 1
-                            exit_reason = ""
-                            if 'EXIT_CODE' in process_output:
-                                exit_code_str = process_output['EXIT_CODE']
-                                if exit_code_str:
-                                    exit_code = int(exit_code_str)
-                            if 'EXIT_REASON' in process_output:
-                                exit_reason = process_output['EXIT_REASON']
-                            exit_info = ""
-                            if exit_code:
-                                exit_info = "\nexit code: {}".format(exit_code)
-                            if exit_reason:
-                                exit_info += "\nexit reason: {}".format(exit_reason)
-                            logger.error(
-                                "bjobs detected job failed with: {}\nfor job: {}".format(exit_info, job))
-                            if "TERM_MEMLIMIT" in exit_reason:
-                                return BatchJobExitReason.MEMLIMIT
-                            return exit_code
-                        if process_status == 'RUN':
-                            logger.debug(
-                                "bjobs detected job started but not completed for job: {}".format(job))
-                            return None
-                        if process_status in {'PSUSP', 'USUSP', 'SSUSP'}:
-                            logger.debug(
-                                "bjobs detected job suspended for job: {}".format(job))
-                            return None
-
-                        return self.getJobExitCodeBACCT(job)
+                return self.getJobExitCodes([lsfJobID])[0]
             else:
                 return self.fallbackGetJobExitCode(job)
 
+        def getJobExitCodes(self, lsfJobIDs):
+            if not check_lsf_json_output_supported:
+                # Only the JSON output of bjobs is easy to split up by job.
+                raise NotImplementedError()
+
+            jobs = [self.lsfJobID(lsfJobID) for lsfJobID in lsfJobIDs]
+            submitted = [job for job in jobs if "NOT_SUBMITTED" not in job]
+            records = {}
+            if submitted:
+                args = ["bjobs", "-json", "-o",
+                        "jobid jobindex user exit_code stat exit_reason pend_reason"] + submitted
+                logger.debug("Checking job exit codes for %d jobs via bjobs", len(submitted))
+                try:
+                    stdout = call_command(args)
+                except CalledProcessErrorStderr as e:
+                    # bjobs fails if it has forgotten any of the jobs, but
+                    # still reports on the others.
+                    stdout = e.output or ''
+                for record in self.parseBjobs(stdout) or []:
+                    records[self.bjobsRecordJobID(record)] = record
+
+            exitCodes = []
+            for job in jobs:
+                if "NOT_SUBMITTED" in job:
+                    logger.error("bjobs detected job failed to submit")
+                    exitCodes.append(1)
+                else:
+                    exitCodes.append(self.getJobExitCodeFromBjobsRecord(job, records.get(job, {})))
+            return exitCodes
+
+        def getJobExitCodeFromBjobsRecord(self, job, process_output):
+            """
+            Work out a job's exit code from its record in bjobs json type
+            output, falling back to bacct if bjobs doesn't know it.
+            """
+            if 'STAT' in process_output:
+                process_status = process_output['STAT']
+                if process_status == 'DONE':
+                    logger.debug(
+                        "bjobs detected job completed for job: {}".format(job))
+                    return 0
+                if process_status == 'PEND':
+                    pending_info = ""
+                    if 'PEND_REASON' in process_output:
+                        if process_output['PEND_REASON']:
+                            pending_info = "\n" + \
+                                process_output['PEND_REASON']
+                    logger.debug(
+                        "bjobs detected job pending with: {}\nfor job: {}".format(pending_info, job))
+                    return None
+                if process_status == 'EXIT':
+                    exit_code = 1
+                    exit_reason = ""
+                    if 'EXIT_CODE' in process_output:
+                        exit_code_str = process_output['EXIT_CODE']
+                        if exit_code_str:
+                            exit_code = int(exit_code_str)
+                    if 'EXIT_REASON' in process_output:
+                        exit_reason = process_output['EXIT_REASON']
+                    exit_info = ""
+                    if exit_code:
+                        exit_info = "\nexit code: {}".format(exit_code)
+                    if exit_reason:
+                        exit_info += "\nexit reason: {}".format(exit_reason)
+                    logger.error(
+                        "bjobs detected job failed with: {}\nfor job: {}".format(exit_info, job))
+                    if "TERM_MEMLIMIT" in exit_reason:
+                        return BatchJobExitReason.MEMLIMIT
+                    return exit_code
+                if process_status == 'RUN':
+                    logger.debug(
+                        "bjobs detected job started but not completed for job: {}".format(job))
+                    return None
+                if process_status in {'PSUSP', 'USUSP', 'SSUSP'}:
+                    logger.debug(
+                        "bjobs detected job suspended for job: {}".format(job))
+                    return None
+
+            return self.getJobExitCodeBACCT(job)
+
         def getJobExitCodeBACCT(self,job):
             # if not found in bjobs, then try bacct (slower than bjobs)
             logger.debug("bjobs failed to detect job - trying bacct: "
@@ -237,7 +275,24 @@ class LSFBatchSystem(AbstractGridEngineBatchSystem):
         """
         Implementation-specific helper methods
         """
-        def prepareBsub(self, cpu, mem, jobID):
+        def lsfJobID(self, batchJobID):
+            """
+            Convert a batch system job ID from getBatchSystemID(), which has
+            any array task after a dot, into the form LSF uses, like 123[4].
+            """
+            job, _, task = str(batchJobID).partition('.')
+            return '{}[{}]'.format(job, task) if task else job
+
+        def bjobsRecordJobID(self, record):
+            """
+            Get the ID of the job or array task a bjobs json type record is
+            about, in the form lsfJobID() gives.
+            """
+            job = record.get('JOBID')
+            task = record.get('JOBINDEX')
+            return '{}[{}]'.format(job, task) if task and task != '0' else job
+
+        def prepareBsub(self, cpu, mem, jobID, arraySize=None):
             """
             Make a bsub commandline to execute.
 
@@ -245,6 +300,7 @@ class LSFBatchSystem(AbstractGridEngineBatchSystem):
               cpu: number of cores needed
               mem: number of bytes of memory needed
               jobID: ID number of the job
+              arraySize: number of tasks, if submitting an array job
             """
             if mem:
                 if per_core_reservation():
@@ -262,11 +318,15 @@ class LSFBatchSystem(AbstractGridEngineBatchSystem):
             else:
                 bsubMem = []
             bsubCpu = [] if cpu is None else ['-n', str(math.ceil(cpu))]
-            bsubline = ["bsub", "-cwd", ".", "-J", "toil_job_{}".format(jobID)]
+            if arraySize is None:
+                jobName, batchJobIDfmt = "toil_job_{}".format(jobID), '%J'
+            else:
+                jobName, batchJobIDfmt = "toil_job_{}[1-{}]".format(jobID, arraySize), '%J_%I'
+            bsubline = ["bsub", "-cwd", ".", "-J", jobName]
             bsubline.extend(bsubMem)
             bsubline.extend(bsubCpu)
-            stdoutfile = self.boss.formatStdOutErrPath(jobID, 'lsf', '%J', 'std_output')
-            stderrfile = self.boss.formatStdOutErrPath(jobID, 'lsf', '%J', 'std_error')
+            stdoutfile = self.boss.formatStdOutErrPath(jobID, 'lsf', batchJobIDfmt, 'std_output')
+            stderrfile = self.boss.formatStdOutErrPath(jobID, 'lsf', batchJobIDfmt, 'std_error')
             bsubline.extend(['-o', stdoutfile, '-e', stderrfile])
             lsfArgs = os.getenv('TOIL_LSF_ARGS')
             if lsfArgs:
@@ -272,6 +272,25 @@ class MesosBatchSystem(BatchSystemLocalSupport,
             else:
                 log.debug('Job %s ended naturally before it could be killed.', item.jobID)
 
+    def getUpdatedBatchJobs(self, maxWait):
+        updates = self.getUpdatedLocalJobs(0)
+        # Only wait if there isn't already a local job to report
+        waited = len(updates) == 0
+        items = self._drainQueue(self.updatedJobsQueue, maxWait if waited else 0)
+        for item in items:
+            try:
+                self.intendedKill.remove(item.jobID)
+            except KeyError:
+                log.debug('Job %s ended with status %i, took %s seconds.', item.jobID, item.exitStatus,
+                          '???' if item.wallTime is None else str(item.wallTime))
+                updates.append(item)
+            else:
+                log.debug('Job %s ended naturally before it could be killed.', item.jobID)
+        if waited:
+            # Pick up any local jobs that finished while we were waiting
+            updates.extend(self.getUpdatedLocalJobs(0))
+        return updates
+
     def nodeInUse(self, nodeIP):
         return nodeIP in self.hostToJobIDs
 
@@ -53,6 +53,19 @@ def _singleMachineOptions(addOptionFn, config):
                 help=("A scaling factor to change the value of all submitted "
                       "tasks's submitted cores. Used in singleMachine batch "
                       "system. default=%s" % 1))
+    addOptionFn("--singleMachinePriority", dest="singleMachinePriority", default=None,
+                choices=['bestFit', 'fifo', 'smallestFirst'],
+                help=("The order in which the singleMachine batch system starts jobs that "
+                      "are waiting for resources. The oldest waiting job always has resources "
+                      "reserved for it; other jobs are started around it if they fit. "
+                      "'bestFit' starts the job that fills the most of the free resources "
+                      "first, 'fifo' the oldest job, and 'smallestFirst' the smallest job. "
+                      "default=%s" % 'bestFit'))
+    addOptionFn("--singleMachineWarmWorkers", dest="singleMachineWarmWorkers",
+                action='store_true', default=None,
+                help=("Fork workers in the singleMachine batch system from a process that has "
+                      "already imported Toil, instead of starting each one from scratch. This "
+                      "cuts the overhead of running many short jobs. default=false"))
     if config.cwl:
         addOptionFn(
             "--noLinkImports", dest="linkImports", default=True,
@@ -161,6 +174,8 @@ def setDefaultOptions(config):
 
     # single machine
     config.scale = 1
+    config.singleMachinePriority = 'bestFit'
+    config.singleMachineWarmWorkers = False
     config.linkImports = False
     config.moveExports = False
 
@@ -280,6 +280,19 @@ class ParasolBatchSystem(BatchSystemSupport):
             else:
                 return item
 
+    def getUpdatedBatchJobs(self, maxWait):
+        items = self._drainQueue(self.updatedJobsQueue, maxWait)
+        updates = []
+        for item in items:
+            try:
+                self.runningJobs.remove(item.jobID)
+            except KeyError:
+                # We tried to kill this job, but it ended by itself instead, so skip it.
+                pass
+            else:
+                updates.append(item)
+        return updates
+
     def updatedJobWorker(self):
         """
         We use the parasol results to update the status of jobs, adding them
@@ -13,11 +13,14 @@
 # limitations under the License.
 
 from past.utils import old_div
+from collections import deque
 from contextlib import contextmanager
 import logging
 import os
 import time
 import math
+import selectors
+import shlex
 import subprocess
 import sys
 import traceback
@@ -27,6 +30,7 @@ from six.moves.queue import Empty, Queue
 
 import toil
 from toil.batchSystems.abstractBatchSystem import BatchSystemSupport, EXIT_STATUS_UNAVAILABLE_VALUE, UpdatedBatchJobInfo
+from toil.batchSystems.warmWorkers import WarmWorker, WarmWorkerPool
 from toil.lib.threading import cpu_count
 from toil import worker as toil_worker
 from toil.common import Toil
@@ -46,6 +50,16 @@ class SingleMachineBatchSystem(BatchSystemSupport):
     finished/stopped and need to be returned by getUpdatedBatchJob (the output
     queue).
 
+    The daddy thread sleeps until a job is added to the input queue or a child
+    exits. Jobs that don't fit wait until a child exits and gives back
+    resources. The oldest waiting job has the resources it needs reserved for
+    it, and younger jobs are backfilled around that reservation in the order
+    set by the priority policy.
+
+    With warm workers turned on, Toil workers are forked from a zygote process
+    that has already imported Toil, instead of being started from scratch,
+    and the daddy thread hears when they exit from the zygote.
+
     When the batch system is shut down, the daddy thread is stopped.
 
     If running in debug-worker mode, jobs are run immediately as they are sent
@@ -70,6 +84,20 @@ class SingleMachineBatchSystem(BatchSystemSupport):
     """
     physicalMemory = toil.physicalMemory()
 
+    priorityPolicies = ('bestFit', 'fifo', 'smallestFirst')
+    """
+    The orders in which waiting jobs can be backfilled. 'bestFit' starts the
+    job that fills the most of what is left first, 'fifo' starts the oldest
+    job first, and 'smallestFirst' starts the job that uses the least of what
+    is left first.
+    """
+
+    pollInterval = 0.01
+    """
+    How often, in seconds, to check on children that can't be waited on with
+    a pidfd (for example, on Mac).
+    """
+
     def __init__(self, config, maxCores, maxMemory, maxDisk):
         
         # Limit to the smaller of the user-imposed limit and what we actually
@@ -102,6 +130,10 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         # squeezing more tasks onto each core (scale < 1) or stretching tasks over more cores
         # (scale > 1).
         self.scale = config.scale
+
+        self.priority = config.singleMachinePriority
+        if self.priority not in self.priorityPolicies:
+            raise RuntimeError('Unknown single machine priority policy: %s' % self.priority)
         
         if config.badWorker > 0 and config.debugWorker:
             # We can't throw SIGUSR1 at the worker because it is also going to
@@ -135,7 +167,8 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         
         # These next two are only used outside debug-worker mode
 
-        # A dict mapping PIDs to Popen objects for running jobs.
+        # A dict mapping PIDs to Popen objects for running jobs, or WarmWorker
+        # objects for workers forked by the zygote.
         # Jobs that don't fork are executed one at a time in the main thread.
         self.children = {}
         """
@@ -153,6 +186,24 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         self.memory = ResourcePool(self.maxMemory, 'memory')
         # A pool representing the available space in bytes
         self.disk = ResourcePool(self.maxDisk, 'disk')
+
+        # The pools, and how much of each we have in total, in the order jobs'
+        # needs are given in.
+        self.pools = (self.coreFractions, self.memory, self.disk)
+        self.poolTotals = tuple(pool.value for pool in self.pools)
+
+        # Jobs from the input queue that have not been started yet, grouped by
+        # their (coreFractions, memory, disk) needs, oldest first in each
+        # group. Only used by the daddy thread, as are the reservation fields
+        # below.
+        self.waitingJobs = {}
+        """
+        :type: dict[tuple(int,int,int),collections.deque]
+        """
+        # The ID of the waiting job we are holding resources back for, and the
+        # IDs of the jobs we have started around it since.
+        self.reservedJob = None
+        self.backfilledJobs = set()
         
         # If we can't schedule something, we fill this in with a reason why
         self.schedulingStatusMessage = None
@@ -166,9 +217,29 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         # If it breaks it will fill this in
         self.daddyException = None
 
+        # The daddy thread sleeps on this selector until it is woken up through
+        # the wakeup pipe, or a child's pidfd (if we have one for it) becomes
+        # readable because the child exited.
+        self.selector = None
+        self.wakeupRead, self.wakeupWrite = None, None
+        # A dict mapping child PIDs to their pidfds
+        self.childPidfds = {}
+        # Set to False if we find we can't get pidfds
+        self.usePidfds = hasattr(os, 'pidfd_open')
+        # The pool that forks workers from a zygote, if we are using one
+        self.warmWorkers = None
+
         if self.debugWorker:
             log.debug('Started in worker debug mode.')
         else:
+            self.selector = selectors.DefaultSelector()
+            self.wakeupRead, self.wakeupWrite = os.pipe()
+            for fd in (self.wakeupRead, self.wakeupWrite):
+                os.set_blocking(fd, False)
+            self.selector.register(self.wakeupRead, selectors.EVENT_READ)
+            if config.singleMachineWarmWorkers:
+                self.warmWorkers = WarmWorkerPool()
+                self.selector.register(self.warmWorkers, selectors.EVENT_READ)
             self.daddyThread = Thread(target=self.daddy, daemon=True)
             self.daddyThread.start()
             log.debug('Started in normal mode.')
@@ -180,60 +251,55 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         Our job is to look at jobs from the input queue.
         
         If a job fits in the available resources, we allocate resources for it
-        and kick off a child process.
+        and kick off a child process. If not, it waits, and the oldest job that
+        is waiting gets the resources it needs reserved for it as they come
+        free.
 
         We also check on our children.
 
         When a child finishes, we reap it, release its resources, and put its
-        information in the output queue.
+        information in the output queue. Then we try to start the jobs
+        waiting for resources again.
+
+        When there is nothing to do, we sleep until there is a new job or a
+        child finishes, whichever comes first.
         """
 
         try:
             log.debug('Started daddy thread.')
 
+            # PIDs of children we were told have exited while we slept
+            exitedChildren = set()
+
             while not self.shuttingDown.is_set():
                 # Main loop
 
+                newJobs = False
                 while not self.shuttingDown.is_set():
-                    # Try to start as many jobs as we can try to start
+                    # Collect everything new
                     try:
                         # Grab something from the input queue if available.
                         args = self.inputQueue.get_nowait()
-                        jobCommand, jobID, jobCores, jobMemory, jobDisk, environment = args
-
-                        coreFractions = int(old_div(jobCores, self.minCores))
-                        
-                        # Try to start the child
-                        result = self._startChild(jobCommand, jobID,
-                            coreFractions, jobMemory, jobDisk, environment)
-
-                        if result is None:
-                            # We did not get the resources to run this job.
-                            # Requeue last, so we can look at the next job.
-                            # TODO: Have some kind of condition the job can wait on,
-                            # but without threads (queues for jobs needing
-                            # cores/memory/disk individually)?
-                            self.inputQueue.put(args)
-                            break
-
-                        # Otherwise it's a PID if it succeeded, or False if it couldn't
-                        # start. But we don't care either way here.
-
                     except Empty:
                         # Nothing to run. Stop looking in the queue.
                         break
+                    self._addWaitingJob(args)
+                    newJobs = True
 
                 # Now check on our children.
-                for done_pid in self._pollForDoneChildrenIn(self.children):
+                doneChildren = self._pollForDoneChildrenIn(self.children) | exitedChildren
+                for done_pid in doneChildren:
                     # A child has actually finished.
                     # Clean up after it.
                     self._handleChild(done_pid)
 
-                # Then loop again: start and collect more jobs.
-                # TODO: It would be good to be able to wait on a new job or a finished child, whichever comes first.
-                # For now we just sleep and loop.
-                time.sleep(0.01)
-                    
+                if newJobs or doneChildren:
+                    # There are new jobs, or resources were freed, so some
+                    # waiting jobs may fit now.
+                    self._scheduleWaitingJobs()
+
+                # Then sleep until there is something more to do.
+                exitedChildren = self._waitForWork()
 
             # When we get here, we are shutting down.
             
@@ -243,6 +309,11 @@ class SingleMachineBatchSystem(BatchSystemSupport):
             for popen in self.children.values():
                 # Reap all the children
                 popen.wait()
+            for pidfd in self.childPidfds.values():
+                os.close(pidfd)
+            self.childPidfds = {}
+            if self.warmWorkers is not None:
+                self.warmWorkers.close()
             
             # Then exit the thread.
             return
@@ -252,6 +323,173 @@ class SingleMachineBatchSystem(BatchSystemSupport):
             self.daddyException = e
             raise
 
+    def _addWaitingJob(self, args):
+        """
+        Add the job with the given input queue entry to the jobs waiting to be
+        started.
+        """
+        jobCommand, jobID, jobCores, jobMemory, jobDisk, environment = args
+        needs = (int(old_div(jobCores, self.minCores)), jobMemory, jobDisk)
+        self.waitingJobs.setdefault(needs, deque()).append(args)
+
+    def _scheduleWaitingJobs(self):
+        """
+        Start as many of the waiting jobs as we can.
+
+        The oldest waiting jobs are started for as long as they fit. The first
+        one that does not fit gets a reservation: the jobs started after it
+        ("backfilled") may only use resources it will not need once
+        everything that was running before has finished. That way small jobs
+        can use what is left over, but cannot keep a big job waiting forever.
+
+        Backfilled jobs are picked according to the priority policy, looking
+        at what is free and not reserved.
+        """
+        free = [pool.value for pool in self.pools]
+
+        while self.waitingJobs:
+            needs, queue = min(self.waitingJobs.items(), key=lambda item: item[1][0][1])
+            if not self._fits(needs, free):
+                break
+            self._startWaitingJob(needs, free)
+        else:
+            # Everything is running
+            self.reservedJob = None
+            return
+
+        reservedID = queue[0][1]
+        if reservedID != self.reservedJob:
+            # The job we were reserving for has started; hold resources for
+            # the next one.
+            self.reservedJob = reservedID
+            self.backfilledJobs = set()
+            for pool, amount, available in zip(self.pools, needs, free):
+                if amount > available:
+                    self._setSchedulingStatusMessage('Not enough %s to run job %s; reserving it for the job'
+                                                     % (pool.resourceType, reservedID))
+                    break
+        self.backfilledJobs.intersection_update(self.runningJobs)
+
+        # Work out how much we can backfill with.
+        budget = [total - amount for total, amount in zip(self.poolTotals, needs)]
+        for jobID in self.backfilledJobs:
+            for i, amount in enumerate(self.runningJobs[jobID].resources):
+                budget[i] -= amount
+        budget = [min(available, spare) for available, spare in zip(free, budget)]
+
+        candidates = [needs for needs in self.waitingJobs if self._fits(needs, budget)]
+        while candidates:
+            needs = min(candidates, key=lambda needs: self._priorityKey(needs, budget))
+            jobID = self._startWaitingJob(needs, budget)
+            self.backfilledJobs.add(jobID)
+            candidates = [needs for needs in candidates
+                          if needs in self.waitingJobs and self._fits(needs, budget)]
+
+    @staticmethod
+    def _fits(needs, available):
+        """
+        :return: True if each of the given needs is no more than the matching
+                 available amount.
+        :rtype: bool
+        """
+        return all(amount <= limit for amount, limit in zip(needs, available))
+
+    def _priorityKey(self, needs, available):
+        """
+        :return: A key that sorts the waiting jobs with the given needs that
+                 should be backfilled first into the given available resources
+                 first.
+        """
+        oldestID = self.waitingJobs[needs][0][1]
+        if self.priority == 'fifo':
+            return oldestID
+        # How much of the tightest resource the job would take. Nothing may be
+        # left of any resource, if the job needs none of it either.
+        share = max((old_div(amount, float(limit)) for amount, limit in zip(needs, available) if limit > 0),
+                    default=0)
+        if self.priority == 'bestFit':
+            return -share, oldestID
+        else:
+            assert self.priority == 'smallestFirst'
+            return share, oldestID
+
+    def _startWaitingJob(self, needs, available):
+        """
+        Start the oldest waiting job with the given needs, which must fit in
+        the resources we have. Takes what it uses out of the given available
+        amounts.
+
+        :return: The ID of the job.
+        :rtype: int
+        """
+        queue = self.waitingJobs[needs]
+        jobCommand, jobID, jobCores, jobMemory, jobDisk, environment = queue.popleft()
+        if not queue:
+            del self.waitingJobs[needs]
+        if jobID == self.reservedJob:
+            self.reservedJob = None
+
+        # It's a PID if it succeeded, or False if it couldn't start. But we
+        # don't care either way here.
+        if self._startChild(jobCommand, jobID, needs[0], jobMemory, jobDisk, environment) is None:
+            raise RuntimeError('Could not start job %s, but it fits in the available resources' % jobID)
+        for i, amount in enumerate(needs):
+            available[i] -= amount
+        return jobID
+
+    def _waitForWork(self):
+        """
+        Block until there might be something for the daddy thread to do: a new
+        job, a child exiting, or shutdown.
+
+        :return: PIDs of children that we know have exited.
+        :rtype: set(int)
+        """
+        warmWorkers = 0
+        if self.warmWorkers is not None:
+            warmWorkers = len(self.warmWorkers.workers)
+        if self.warmWorkers is not None and self.warmWorkers.hasExited():
+            # The zygote already told us about some
+            timeout = 0
+        elif len(self.childPidfds) + warmWorkers == len(self.children):
+            # We will hear about every child exiting
+            timeout = None
+        else:
+            # We have to go and look for some of them
+            timeout = self.pollInterval
+        exited = set()
+        for key, _ in self.selector.select(timeout):
+            if key.fd == self.wakeupRead:
+                # Consume all the wakeups sent so far
+                try:
+                    while os.read(self.wakeupRead, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            elif key.fileobj is self.warmWorkers:
+                # Handled below
+                pass
+            else:
+                # A child's pidfd. It is readable once the child exits.
+                exited.add(key.data)
+        if self.warmWorkers is not None:
+            exited |= self.warmWorkers.takeExited()
+            if not self.warmWorkers.alive:
+                # It broke, and new workers will be started from scratch.
+                self.selector.unregister(self.warmWorkers)
+                self.warmWorkers = None
+        return exited
+
+    def _wakeDaddy(self):
+        """
+        Wake up the daddy thread if it is waiting for work.
+        """
+        try:
+            os.write(self.wakeupWrite, b'\0')
+        except BlockingIOError:
+            # The pipe is full of wakeups already
+            pass
+
     def _checkOnDaddy(self):
         if self.daddyException is not None:
             # The daddy thread broke and we cannot do our job
@@ -360,6 +598,24 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         
         self.schedulingStatusMessage = message
 
+    def _warmWorkerArgv(self, jobCommand):
+        """
+        :return: The command line for a warm worker to run the given command
+                 with, or None if the command should be run by the shell.
+        :rtype: list(str) or None
+        """
+        if self.warmWorkers is None:
+            return None
+        try:
+            argv = shlex.split(jobCommand)
+        except ValueError:
+            # Not a worker command line, and maybe the shell can make sense
+            # of it anyway.
+            return None
+        if argv and os.path.basename(argv[0]) == '_toil_worker':
+            return argv
+        return None
+
     def _startChild(self, jobCommand, jobID, coreFractions, jobMemory, jobDisk, environment):
         """
         Start a child process for the given job.
@@ -390,9 +646,14 @@ class SingleMachineBatchSystem(BatchSystemSupport):
 
                     try:
                         # Launch the job
-                        popen = subprocess.Popen(jobCommand,
-                                                 shell=True,
-                                                 env=dict(os.environ, **environment))
+                        argv = self._warmWorkerArgv(jobCommand)
+                        if argv is not None:
+                            # Fork it from the zygote
+                            popen = self.warmWorkers.start(argv, dict(os.environ, **environment))
+                        else:
+                            popen = subprocess.Popen(jobCommand,
+                                                     shell=True,
+                                                     env=dict(os.environ, **environment))
                     except Exception:
                         # If the job can't start, make sure we release resources now
                         self.coreFractions.release(coreFractions)
@@ -404,16 +665,21 @@ class SingleMachineBatchSystem(BatchSystemSupport):
                         # Report as failed.
                         self.outputQueue.put(UpdatedBatchJobInfo(jobID=jobID, exitStatus=EXIT_STATUS_UNAVAILABLE_VALUE, wallTime=0, exitReason=None))
 
-                        # Free resources
-                        self.coreFractions.release(coreFractions)
-                        self.memory.release(jobMemory)
-                        self.disk.release(jobDisk)
-
                         # Complain it broke.
                         return False
                     else:
                         # If the job did start, record it
                         self.children[popen.pid] = popen
+                        if self.usePidfds and not isinstance(popen, WarmWorker):
+                            # Make sure we get woken up when it exits
+                            try:
+                                pidfd = os.pidfd_open(popen.pid)
+                            except OSError as e:
+                                log.warning('Cannot get pidfds (%s); polling for finished jobs instead', e)
+                                self.usePidfds = False
+                            else:
+                                self.childPidfds[popen.pid] = pidfd
+                                self.selector.register(pidfd, selectors.EVENT_READ, popen.pid)
                         # Make sure we can look it up by PID later
                         self.childToJob[popen.pid] = jobID
                         # Record that the job is running, and the resources it is using
@@ -464,6 +730,10 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         self.runningJobs.pop(jobID)
         self.childToJob.pop(pid)
         self.children.pop(pid)
+        pidfd = self.childPidfds.pop(pid, None)
+        if pidfd is not None:
+            self.selector.unregister(pidfd)
+            os.close(pidfd)
         
         # See how the child did, and reap it.
         statusCode = popen.wait()
@@ -513,6 +783,7 @@ class SingleMachineBatchSystem(BatchSystemSupport):
             # Queue the job for later
             self.inputQueue.put((jobDesc.command, jobID, cores, jobDesc.memory,
                                 jobDesc.disk, self.environment.copy()))
+            self._wakeDaddy()
             
 
         return jobID
@@ -560,8 +831,12 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         if self.daddyThread is not None:
             # Tell the daddy thread to stop.
             self.shuttingDown.set()
+            self._wakeDaddy()
             # Wait for it to stop.
             self.daddyThread.join()
+            self.selector.close()
+            os.close(self.wakeupRead)
+            os.close(self.wakeupWrite)
 
         BatchSystemSupport.workerCleanup(self.workerCleanupInfo)
 
@@ -578,9 +853,25 @@ class SingleMachineBatchSystem(BatchSystemSupport):
         log.debug("Ran jobID: %s with exit value: %i", item.jobID, item.exitStatus)
         return item
 
+    def getUpdatedBatchJobs(self, maxWait):
+        """
+        Returns all the no-longer-running jobs in the output queue, waiting up
+        to maxWait for the first one.
+        """
+
+        self._checkOnDaddy()
+
+        items = self._drainQueue(self.outputQueue, maxWait)
+        for item in items:
+            self.jobs.pop(item.jobID)
+            log.debug("Ran jobID: %s with exit value: %i", item.jobID, item.exitStatus)
+        return items
+
     @classmethod
     def setOptions(cls, setOption):
         setOption("scale", default=1)
+        setOption("singleMachinePriority", default='bestFit')
+        setOption("singleMachineWarmWorkers", default=False)
 
 
 class Info(object):
@@ -30,7 +30,7 @@ class SlurmBatchSystem(AbstractGridEngineBatchSystem):
             # Should return a dictionary of Job IDs and number of seconds
             times = {}
             with self.runningJobsLock:
-                currentjobs = dict((str(self.batchJobIDs[x][0]), x) for x in self.runningJobs)
+                currentjobs = dict((self.slurmJobID(self.getBatchSystemID(x)), x) for x in self.runningJobs)
             # currentjobs is a dictionary that maps a slurm job id (string) to our own internal job id
             # squeue arguments:
             # -h for no header
@@ -49,11 +49,18 @@ class SlurmBatchSystem(AbstractGridEngineBatchSystem):
             return times
 
         def killJob(self, jobID):
-            call_command(['scancel', self.getBatchSystemID(jobID)])
+            call_command(['scancel', self.slurmJobID(self.getBatchSystemID(jobID))])
 
         def prepareSubmission(self, cpu, memory, jobID, command, jobName):
             return self.prepareSbatch(cpu, memory, jobID, jobName) + ['--wrap={}'.format(command)]
 
+        def prepareArraySubmission(self, cpu, memory, jobIDs, commands, jobName):
+            jobID = '{}-{}'.format(jobIDs[0], jobIDs[-1])
+            return (self.prepareSbatch(cpu, memory, jobID, jobName, batchJobIDfmt='%A_%a') +
+                    ['--array=1-{}'.format(len(commands)),
+                     '--wrap={}'.format(self.prepareArrayCommand(jobIDs, commands, 'slurm', 'SLURM_ARRAY_TASK_ID',
+                                                                   '${SLURM_ARRAY_JOB_ID}_${SLURM_ARRAY_TASK_ID}'))])
+
         def submitJob(self, subLine):
             try:
                 output = call_command(subLine)
@@ -66,57 +73,76 @@ class SlurmBatchSystem(AbstractGridEngineBatchSystem):
                 raise e
 
         def getJobExitCode(self, slurmJobID):
-            logger.debug("Getting exit code for slurm job %d", int(slurmJobID))
+            logger.debug("Getting exit code for slurm job %s", slurmJobID)
+            return self.getJobExitCodes([slurmJobID])[0]
+
+        def getJobExitCodes(self, slurmJobIDs):
+            logger.debug("Getting exit codes for %d slurm jobs", len(slurmJobIDs))
 
             try:
-                state, rc = self._getJobDetailsFromSacct(slurmJobID)
+                details = self._getJobDetailsFromSacct(slurmJobIDs)
             except CalledProcessErrorStderr:
                 # no accounting system or some other error
-                state, rc = self._getJobDetailsFromScontrol(slurmJobID)
+                details = {slurmJobID: self._getJobDetailsFromScontrol(slurmJobID) for slurmJobID in slurmJobIDs}
 
-            logger.debug("s job state is %s", state)
-            # If Job is in a running state, return None to indicate we don't have an update
-            if state in ('PENDING', 'RUNNING', 'CONFIGURING', 'COMPLETING', 'RESIZING', 'SUSPENDED'):
-                return None
+            exitCodes = []
+            for slurmJobID in slurmJobIDs:
+                state, rc = details.get(self.slurmJobID(slurmJobID), (None, None))
+                logger.debug("s job %s state is %s", slurmJobID, state)
+                # If Job is in a running state, return None to indicate we don't have an update
+                if state in ('PENDING', 'RUNNING', 'CONFIGURING', 'COMPLETING', 'RESIZING', 'SUSPENDED'):
+                    rc = None
+                exitCodes.append(rc)
+            return exitCodes
 
-            return rc
+        def _getJobDetailsFromSacct(self, slurmJobIDs):
+            """
+            Get the states and exit codes of the given jobs from one sacct call.
 
-        def _getJobDetailsFromSacct(self, slurmJobID):
+            :return: (state, exit code) tuples by job ID. Jobs sacct doesn't
+                     know about yet are left out.
+            :rtype: dict
+            """
             # SLURM job exit codes are obtained by running sacct.
             args = ['sacct',
                     '-n', # no header
-                    '-j', str(slurmJobID), # job
-                    '--format', 'State,ExitCode', # specify output columns
+                    '-j', ','.join(self.slurmJobID(slurmJobID) for slurmJobID in slurmJobIDs), # jobs
+                    '--format', 'JobID,State,ExitCode', # specify output columns
                     '-P', # separate columns with pipes
                     '-S', '1970-01-01'] # override start time limit
 
             stdout = call_command(args)
+            details = {}
             for line in stdout.split('\n'):
                 logger.debug("%s output %s", args[0], line)
                 values = line.strip().split('|')
-                if len(values) < 2:
+                if len(values) < 3:
                     continue
-                state, exitcode = values
-                logger.debug("sacct job state is %s", state)
-                # If Job is in a running state, return None to indicate we don't have an update
+                jobID, state, exitcode = values
+                if jobID in details or '.' in jobID:
+                    # Job steps (like 123.batch) follow the job itself. Array
+                    # tasks show up as 123_4, or as 123_[4-10] while pending.
+                    continue
+                logger.debug("sacct job %s state is %s", jobID, state)
                 status, signal = [int(n) for n in exitcode.split(':')]
                 if signal > 0:
                     # A non-zero signal may indicate e.g. an out-of-memory killed job
                     status = 128 + signal
                 logger.debug("sacct exit code is %s, returning status %d", exitcode, status)
-                return state, status
-            logger.debug("Did not find exit code for job in sacct output")
-            return None, None
+                details[jobID] = (state, status)
+            if len(details) < len(slurmJobIDs):
+                logger.debug("Did not find exit code for some jobs in sacct output")
+            return details
 
         def _getJobDetailsFromScontrol(self, slurmJobID):
             args = ['scontrol',
                     'show',
                     'job',
-                    str(slurmJobID)]
+                    self.slurmJobID(slurmJobID)]
 
             stdout = call_command(args)
             job = dict()
-            for line in stdout:
+            for line in stdout.split('\n'):
                 logger.debug("%s output %s", args[0], line)
                 values = line.strip().split()
 
@@ -154,7 +180,14 @@ class SlurmBatchSystem(AbstractGridEngineBatchSystem):
         Implementation-specific helper methods
         """
 
-        def prepareSbatch(self, cpu, mem, jobID, jobName):
+        def slurmJobID(self, batchJobID):
+            """
+            Convert a batch system job ID from getBatchSystemID(), which has
+            any array task after a dot, into the form Slurm uses, like 123_4.
+            """
+            return str(batchJobID).replace('.', '_', 1)
+
+        def prepareSbatch(self, cpu, mem, jobID, jobName, batchJobIDfmt='%j'):
             #  Returns the sbatch command line before the script to run
             sbatch_line = ['sbatch', '-J', 'toil_job_{}_{}'.format(jobID, jobName)]
 
@@ -173,8 +206,8 @@ class SlurmBatchSystem(AbstractGridEngineBatchSystem):
             if cpu is not None:
                 sbatch_line.append(f'--cpus-per-task={math.ceil(cpu)}')
 
-            stdoutfile = self.boss.formatStdOutErrPath(jobID, 'slurm', '%j', 'std_output')
-            stderrfile = self.boss.formatStdOutErrPath(jobID, 'slurm', '%j', 'std_error')
+            stdoutfile = self.boss.formatStdOutErrPath(jobID, 'slurm', batchJobIDfmt, 'std_output')
+            stderrfile = self.boss.formatStdOutErrPath(jobID, 'slurm', batchJobIDfmt, 'std_error')
             sbatch_line.extend(['-o', stdoutfile, '-e', stderrfile])
 
             # "Native extensions" for SLURM (see DRMAA or SAGA)
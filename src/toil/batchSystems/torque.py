@@ -130,7 +130,45 @@ class TorqueBatchSystem(AbstractGridEngineBatchSystem):
                 args = ["qstat", "-f", str(torqueJobID).split('.')[0]]
 
             stdout = call_command(args)
+            return self._getJobExitCodeFromQstat(torqueJobID, stdout.split('\n'))
+
+        def getJobExitCodes(self, torqueJobIDs):
+            jobs = [str(torqueJobID).split('.')[0] for torqueJobID in torqueJobIDs]
+            if self._version == "pro":
+                args = ["qstat", "-x", "-f"] + jobs
+            elif self._version == "oss":
+                args = ["qstat", "-f"] + jobs
+
+            try:
+                stdout, stderr = call_command(args), ''
+            except CalledProcessErrorStderr as e:
+                # qstat fails if any of the jobs is unknown, but still reports
+                # on the others.
+                stdout, stderr = e.output or '', e.stderr or ''
+
+            # Split the output up by job; each job's attributes follow a
+            # "Job Id: 1234.server" line.
+            jobLines = {job: [] for job in jobs}
+            lines = None
             for line in stdout.split('\n'):
+                if line.strip().startswith('Job Id:'):
+                    lines = jobLines.get(line.split(':', 1)[1].strip().split('.')[0])
+                elif lines is not None:
+                    lines.append(line)
+            for line in stderr.split('\n'):
+                # Like "qstat: Unknown Job Id 1234.server"
+                if 'unknown job id' in line.lower():
+                    jobLines.get(line.split()[-1].split('.')[0], []).append(line)
+
+            return [self._getJobExitCodeFromQstat(torqueJobID, jobLines[job])
+                    for torqueJobID, job in zip(torqueJobIDs, jobs)]
+
+        def _getJobExitCodeFromQstat(self, torqueJobID, lines):
+            """
+            Get a job's exit code from its lines of qstat -f output, or None if
+            it is still running.
+            """
+            for line in lines:
                 line = line.strip()
                 # Case differences due to PBSPro vs OSS Torque qstat outputs
                 if line.startswith("failed") or line.startswith("FAILED") and int(line.split()[1]) == 1:
@@ -0,0 +1,362 @@
+# Copyright (C) 2015-2020 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Warm workers for the single machine batch system.
+
+Starting a worker from scratch means starting a Python interpreter and
+importing Toil, which can take longer than a short job does. Instead, a
+long-lived "zygote" process does that once, and then forks a copy of itself
+to run each worker. The forked worker is still its own process, so a job
+that crashes or is killed takes nothing else down with it.
+
+The batch system talks to the zygote over a Unix socket, with one JSON
+message per line. It sends::
+
+    {"run": <request ID>, "argv": [...], "env": {...}}
+    {"kill": <request ID>}
+
+and the zygote answers::
+
+    {"started": <request ID>, "pid": <PID>}
+    {"failed": <request ID>, "error": <message>}
+    {"exited": <request ID>, "status": <exit code, or -signal>}
+"""
+
+import importlib
+import json
+import logging
+import os
+import random
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from threading import Lock
+
+from toil.batchSystems.abstractBatchSystem import EXIT_STATUS_UNAVAILABLE_VALUE
+
+log = logging.getLogger(__name__)
+
+
+class WarmWorkerPool(object):
+    """
+    Runs workers by asking a zygote process to fork them.
+
+    Only the thread that starts workers may wait on them; any thread may
+    kill them.
+    """
+
+    def __init__(self):
+        ours, theirs = socket.socketpair()
+        self.process = subprocess.Popen([sys.executable, '-m', 'toil.batchSystems.warmWorkers',
+                                         str(theirs.fileno())],
+                                        pass_fds=(theirs.fileno(),))
+        theirs.close()
+        self.socket = ours
+        # Guards writes to the socket
+        self._writeLock = Lock()
+        # Bytes received but not yet handled
+        self._buffer = b''
+        self._nextRequest = 0
+        # Maps request ID to WarmWorker for workers that have not exited
+        self.workers = {}
+        # PIDs of workers we have heard have exited, that nobody has asked
+        # about yet
+        self._exited = set()
+        # Set to False if the zygote goes away
+        self.alive = True
+        log.debug('Started warm worker zygote %d', self.process.pid)
+
+    def fileno(self):
+        """
+        Get the socket to the zygote, which is readable when there is news
+        about workers.
+        """
+        return self.socket.fileno()
+
+    def start(self, argv, env):
+        """
+        Start a worker with the given command line and environment.
+
+        :param list(str) argv: the _toil_worker command line
+        :param dict(str,str) env: the whole environment for the worker
+        :rtype: WarmWorker
+        :raise OSError: if the worker could not be started
+        """
+        requestID = self._nextRequest
+        self._nextRequest += 1
+        worker = WarmWorker(self, requestID)
+        self.workers[requestID] = worker
+        self._send(dict(run=requestID, argv=argv, env=env))
+        while worker.pid is None and worker.returncode is None:
+            self._receive(block=True)
+        if worker.pid is None:
+            raise OSError('Warm worker zygote could not start %s: %s' % (argv, worker.error))
+        return worker
+
+    def takeExited(self):
+        """
+        :return: The PIDs of workers that have exited since this was last
+                 called.
+        :rtype: set(int)
+        """
+        if self.alive:
+            self._receive(block=False)
+        exited = self._exited
+        self._exited = set()
+        return exited
+
+    def hasExited(self):
+        """
+        :return: True if any worker has exited that takeExited() has not
+                 returned yet.
+        :rtype: bool
+        """
+        return bool(self._exited)
+
+    def close(self):
+        """
+        Stop the zygote, killing any workers still running.
+        """
+        self.socket.close()
+        self.process.wait()
+        self.alive = False
+
+    def _send(self, message):
+        with self._writeLock:
+            try:
+                self.socket.sendall(json.dumps(message).encode('utf-8') + b'\n')
+            except OSError:
+                # We will hear about the zygote being gone when we read
+                pass
+
+    def _receive(self, block):
+        """
+        Handle whatever the zygote has sent, waiting for something if block
+        is set.
+        """
+        try:
+            data = self.socket.recv(65536, 0 if block else socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return
+        if not data:
+            self._lost()
+            return
+        self._buffer += data
+        lines = self._buffer.split(b'\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            message = json.loads(line.decode('utf-8'))
+            if 'started' in message:
+                self.workers[message['started']].pid = message['pid']
+            elif 'failed' in message:
+                worker = self.workers.pop(message['failed'])
+                worker.error = message['error']
+                worker.returncode = EXIT_STATUS_UNAVAILABLE_VALUE
+            else:
+                worker = self.workers.pop(message['exited'])
+                worker.returncode = message['status']
+                self._exited.add(worker.pid)
+
+    def _lost(self):
+        """
+        Deal with the zygote having gone away. Its workers went with it, so
+        they all count as failed.
+        """
+        log.error('Warm worker zygote exited with code %s; starting workers from scratch instead',
+                  self.process.wait())
+        self.alive = False
+        for worker in self.workers.values():
+            worker.returncode = EXIT_STATUS_UNAVAILABLE_VALUE
+            if worker.pid is not None:
+                self._exited.add(worker.pid)
+        self.workers = {}
+
+
+class WarmWorker(object):
+    """
+    A worker forked by the zygote, that can be treated like the Popen object
+    for a worker that was started normally.
+    """
+
+    def __init__(self, pool, requestID):
+        self.pool = pool
+        self.requestID = requestID
+        self.pid = None
+        self.returncode = None
+        # Why the zygote couldn't start the worker, if it couldn't
+        self.error = None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self):
+        while self.returncode is None:
+            self.pool._receive(block=True)
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is None:
+            self.pool._send(dict(kill=self.requestID))
+
+
+class Zygote(object):
+    """
+    The zygote process, which forks workers when asked over its socket and
+    reports back when they exit.
+    """
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.selector = selectors.DefaultSelector()
+        # SIGCHLD wakes us up through this pipe
+        self.wakeupRead, self.wakeupWrite = os.pipe()
+        # Maps worker PID to request ID
+        self.workers = {}
+        self._buffer = b''
+
+    def serve(self):
+        """
+        Run workers until the batch system hangs up.
+        """
+        for fd in (self.wakeupRead, self.wakeupWrite):
+            os.set_blocking(fd, False)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        signal.set_wakeup_fd(self.wakeupWrite)
+        self.selector.register(self.wakeupRead, selectors.EVENT_READ)
+        self.selector.register(self.socket, selectors.EVENT_READ)
+
+        while True:
+            for key, _ in self.selector.select():
+                if key.fd == self.wakeupRead:
+                    try:
+                        while os.read(self.wakeupRead, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    self._reap()
+                else:
+                    data = self.socket.recv(65536)
+                    if not data:
+                        # The batch system is gone, so nobody wants the
+                        # workers.
+                        for pid in self.workers:
+                            os.kill(pid, signal.SIGKILL)
+                        return
+                    self._buffer += data
+                    lines = self._buffer.split(b'\n')
+                    self._buffer = lines.pop()
+                    for line in lines:
+                        self._handle(json.loads(line.decode('utf-8')))
+
+    def _handle(self, message):
+        if 'run' in message:
+            try:
+                pid = os.fork()
+            except OSError as e:
+                self._send(dict(failed=message['run'], error=str(e)))
+                return
+            if pid == 0:
+                self._runWorker(message['argv'], message['env'])
+            self.workers[pid] = message['run']
+            self._send(dict(started=message['run'], pid=pid))
+        else:
+            for pid, requestID in self.workers.items():
+                if requestID == message['kill']:
+                    # We haven't reaped it, so the PID can't have been reused
+                    os.kill(pid, signal.SIGKILL)
+
+    def _reap(self):
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            if os.WIFSIGNALED(status):
+                # Report it the way Popen does
+                code = -os.WTERMSIG(status)
+            else:
+                code = os.WEXITSTATUS(status)
+            self._send(dict(exited=self.workers.pop(pid), status=code))
+
+    def _send(self, message):
+        self.socket.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+    def _runWorker(self, argv, env):
+        """
+        Become a worker, in a freshly forked child. Never returns.
+        """
+        status = 1
+        try:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            self.selector.close()
+            self.socket.close()
+            os.close(self.wakeupRead)
+            os.close(self.wakeupWrite)
+            # Don't make the same random choices as every other worker
+            random.seed()
+            os.environ.clear()
+            os.environ.update(env)
+            # Forget what the zygote worked out from its own environment when
+            # it imported things, so this worker goes by the job's, as one
+            # started fresh would.
+            tempfile.tempdir = None
+            time.tzset()
+            # Python only reads PYTHONPATH when it starts up
+            sys.path[1:1] = [path for path in env.get('PYTHONPATH', '').split(os.pathsep)
+                             if path and path not in sys.path]
+            sys.argv = argv
+            from toil.worker import main as workerMain
+            workerMain(argv)
+            status = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                status = e.code or 0
+            else:
+                sys.stderr.write('%s\n' % e.code)
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    sock = socket.socket(fileno=int(argv[1]))
+
+    # Import everything workers always need, so the workers we fork have it
+    # already.
+    for module in ('toil.worker',
+                   'toil.fileStores.cachingFileStore',
+                   'toil.fileStores.nonCachingFileStore',
+                   'toil.jobStores.fileJobStore'):
+        importlib.import_module(module)
+
+    try:
+        Zygote(sock).serve()
+    except KeyboardInterrupt:
+        # The workers got the interrupt too
+        pass
+
+
+if __name__ == '__main__':
+    main()
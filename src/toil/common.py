@@ -110,8 +110,13 @@ class Config:
 
         # Misc
         self.disableCaching = False
+        self.cacheEvictionPolicy = 'lru'
+        self.uploadThreads = 4
         self.disableChaining = False
+        self.maxChainFanOut = 1
         self.disableJobStoreChecksumVerification = False
+        self.awsPartSize = 50 << 20
+        self.awsTransferConcurrency = 4
         self.maxLogFileSize = 64000
         self.writeLogs = None
         self.writeLogsGzip = None
@@ -270,8 +275,13 @@ class Config:
         # Misc
         setOption("maxLocalJobs", int)
         setOption("disableCaching")
+        setOption("cacheEvictionPolicy")
+        setOption("uploadThreads", int, iC(1))
         setOption("disableChaining")
+        setOption("maxChainFanOut", int, iC(1))
         setOption("disableJobStoreChecksumVerification")
+        setOption("awsPartSize", h2b, iC(5 << 20))
+        setOption("awsTransferConcurrency", int, iC(1))
         setOption("maxLogFileSize", h2b, iC(1))
         setOption("writeLogs")
         setOption("writeLogsGzip")
@@ -567,14 +577,35 @@ def _addOptions(addGroupFn, config):
                 type='bool', nargs='?', const=True, default=False,
                 help='Disables caching in the file store. This flag must be set to use '
                      'a batch system that does not support cleanup, such as Parasol.')
+    addOptionFn('--cacheEvictionPolicy', dest='cacheEvictionPolicy', default=None,
+                choices=['lru', 'lfu', 'greedyDual'],
+                help="The order in which to evict files from the caching file store when "
+                     "space is needed. 'lru' evicts the least recently read file first, "
+                     "'lfu' evicts the file with the fewest cache hits first, and "
+                     "'greedyDual' favours keeping small and recently read files. "
+                     "default=%s" % config.cacheEvictionPolicy)
+    addOptionFn('--uploadThreads', dest='uploadThreads', default=None,
+                help="The number of files the caching file store uploads to the job store at once. "
+                     "Files are uploaded in the background as soon as they are written. "
+                     "default=%s" % config.uploadThreads)
     addOptionFn('--disableChaining', dest='disableChaining', action='store_true', default=False,
                 help="Disables chaining of jobs (chaining uses one job's resource allocation "
                 "for its successor job if possible).")
+    addOptionFn('--maxChainFanOut', dest='maxChainFanOut', default=None,
+                help="The most successors a job can have at once for a worker to run them itself, "
+                     "one after the other, instead of handing them back to the leader to run in "
+                     "parallel. default=%s" % config.maxChainFanOut)
     addOptionFn("--disableJobStoreChecksumVerification", dest="disableJobStoreChecksumVerification",
                 default=False, action="store_true",
                 help=("Disables checksum verification for files transferred to/from the job store. "
                       "Checksum verification is a safety check to ensure the data is not corrupted "
                       "during transfer. Currently only supported for non-streaming AWS files."))
+    addOptionFn("--awsPartSize", dest="awsPartSize", default=None, metavar='BYTESIZE',
+                help=("The size of each part when transferring large files to and from an AWS job "
+                      "store. Must be at least 5 MiB. default=%s" % bytes2human(config.awsPartSize, symbols='iec')))
+    addOptionFn("--awsTransferConcurrency", dest="awsTransferConcurrency", default=None,
+                help=("The number of parts of a large file to transfer to or from an AWS job store "
+                      "at once. default=%s" % config.awsTransferConcurrency))
     addOptionFn("--maxLogFileSize", dest="maxLogFileSize", default=None,
                 help=("The maximum size of a job log file to keep (in bytes), log files "
                       "larger than this will be truncated to the last X bytes. Setting "
@@ -802,6 +833,8 @@ class Toil(object):
                 raise
             else:
                 logger.exception('The following error was raised during clean up:')
+        finally:
+            self._jobStore.shutdown()
         self._inContextManager = False
         self._inRestart = False
         return False  # let exceptions through
@@ -1051,12 +1084,22 @@ class Toil(object):
             pickle.dump(dict(os.environ), fileHandle, pickle.HIGHEST_PROTOCOL)
         logger.debug("Written the environment for the jobs to the environment file")
 
+    # How often, in seconds, to report progress when downloading all the jobs
+    _jobCacheReportInterval = 10
+
     def _cacheAllJobs(self):
         """
         Downloads all jobs in the current job store into self.jobCache.
         """
         logger.debug('Caching all jobs in job store')
-        self._jobCache = {jobDesc.jobStoreID: jobDesc for jobDesc in self._jobStore.jobs()}
+        self._jobCache = {}
+        lastReport = time.time()
+        for jobDesc in self._jobStore.jobs():
+            self._jobCache[jobDesc.jobStoreID] = jobDesc
+            if time.time() - lastReport >= self._jobCacheReportInterval:
+                # Loading can take a while on a big job store, so say how it is going.
+                logger.info('Downloaded %d jobs so far...', len(self._jobCache))
+                lastReport = time.time()
         logger.debug('{} jobs downloaded.'.format(len(self._jobCache)))
 
     def _cacheJob(self, job):
@@ -1443,5 +1486,8 @@ def getFileSystemSize(dirPath):
     return freeSpace, diskSize
 
 def safeUnpickleFromStream(stream):
-    string = stream.read()
-    return pickle.loads(string)
+    """
+    Unpickle an object from the given binary stream, as the data arrives,
+    without reading it all into memory first.
+    """
+    return pickle.load(stream)
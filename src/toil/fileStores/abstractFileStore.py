@@ -13,14 +13,16 @@
 # limitations under the License.
 from abc import abstractmethod, ABCMeta
 from contextlib import contextmanager
-from threading import Semaphore, Event
+from threading import Semaphore, Event, Lock, Thread
 from future.utils import with_metaclass
 import dill
 import logging
 import os
 import tempfile
+import time
 from typing import Union
 
+from toil.lib.expando import Expando
 from toil.lib.objects import abstractclassmethod
 from toil.lib.misc import WriteWatchingStream
 from toil.common import cacheDirName
@@ -58,6 +60,11 @@ class AbstractFileStore(with_metaclass(ABCMeta, object)):
     _pendingFileWrites = set()
     _terminateEvent = Event()  # Used to signify crashes in threads
 
+    # Upper bounds in seconds, and names, of the buckets of the transfer time
+    # histograms in ioStats
+    _transferTimeBuckets = ((0.01, '<10ms'), (0.1, '<100ms'), (1, '<1s'), (10, '<10s'),
+                            (100, '<100s'), (float('inf'), '>=100s'))
+
     def __init__(self, jobStore, jobDesc, localTempDir, waitForPreviousCommit):
         """
         Create a new file store object.
@@ -97,6 +104,20 @@ class AbstractFileStore(with_metaclass(ABCMeta, object)):
         # Holds records of file ID, or file ID and local path, for reporting
         # the accessed files of failed jobs.
         self._accessLog = []
+        # File I/O counters for the current job, reported in the job's stats:
+        # reads served from and missing the node's cache, files evicted from
+        # the cache, bytes moved from and to the job store, histograms of how
+        # long those transfers took, and seconds spent blocked waiting for the
+        # job's commit. Uploads can still be happening in the commit thread
+        # when the job's stats are collected, so the stats hold on to this
+        # object and it keeps counting until the worker writes them out.
+        self.ioStats = Expando(cache_hits=0, cache_misses=0, cache_evictions=0,
+                               bytes_read=0, bytes_written=0,
+                               download_times={name: 0 for _, name in self._transferTimeBuckets},
+                               upload_times={name: 0 for _, name in self._transferTimeBuckets},
+                               commit_wait=0.0)
+        # Transfers can be counted from several threads at once
+        self._ioStatsLock = Lock()
 
     @staticmethod
     def createFileStore(jobStore, jobDesc, localTempDir, waitForPreviousCommit, caching):
@@ -106,6 +127,44 @@ class AbstractFileStore(with_metaclass(ABCMeta, object)):
         fileStoreCls = CachingFileStore if caching else NonCachingFileStore
         return fileStoreCls(jobStore, jobDesc, localTempDir, waitForPreviousCommit)
 
+    @staticmethod
+    def startJobDescriptionCommit(jobStore, jobDesc, waitForPreviousCommit):
+        """
+        Save a JobDescription to the job store in the background, once the
+        previous job's commit is done, without setting up a whole file store.
+
+        Used by the worker when chaining, where the next job has to be saved
+        under the ID of the job it is taking over but has no files of its own
+        to commit yet. The JobDescription must not be modified until the
+        commit is done.
+
+        :param toil.jobStores.abstractJobStore.AbstractJobStore jobStore: the job store
+               to save to.
+        :param toil.job.JobDescription jobDesc: the JobDescription to save.
+        :param waitForPreviousCommit: the waitForCommit method of the previous job's file
+               store, or the function this returned for the previous job.
+
+        :return: A function that blocks until the commit is done, to use like
+                 :meth:`waitForCommit`.
+        :rtype: callable
+        """
+        def commit():
+            waitForPreviousCommit()
+            try:
+                jobStore.update(jobDesc)
+            except:
+                AbstractFileStore._terminateEvent.set()
+                raise
+
+        commitThread = Thread(target=commit)
+        commitThread.start()
+
+        def waitForCommit():
+            commitThread.join()
+            return True
+
+        return waitForCommit
+
     @staticmethod
     def shutdownFileStore(workflowDir, workflowID):
         """
@@ -236,6 +295,7 @@ class AbstractFileStore(with_metaclass(ABCMeta, object)):
                   2) the toil.fileStores.FileID of the resulting file in the job store.
         """
         
+        startTime = time.time()
         with self.jobStore.writeFileStream(self.jobDesc.jobStoreID, cleanup, basename) as (backingStream, fileStoreID):
             
             # We have a string version of the file ID, and the backing stream.
@@ -256,6 +316,26 @@ class AbstractFileStore(with_metaclass(ABCMeta, object)):
             wrappedStream.onWrite(handle)
             
             yield wrappedStream, fileID
+        self._recordTransfer(True, fileID.size, startTime)
+
+    def _recordTransfer(self, upload, numBytes, startTime):
+        """
+        Count a file transfer between this node and the job store, which
+        started at the given time and has just finished, in ioStats.
+
+        :param bool upload: True for a write to the job store, and False for a
+               read from it.
+        :param int numBytes: Size of the file transferred.
+        :param float startTime: Time the transfer started, from time.time().
+        """
+        seconds = time.time() - startTime
+        with self._ioStatsLock:
+            self.ioStats['bytes_written' if upload else 'bytes_read'] += numBytes
+            histogram = self.ioStats.upload_times if upload else self.ioStats.download_times
+            for bound, name in self._transferTimeBuckets:
+                if seconds < bound:
+                    histogram[name] += 1
+                    break
 
     def _dumpAccessLogs(self):
         """
@@ -323,6 +403,9 @@ class AbstractFileStore(with_metaclass(ABCMeta, object)):
         file handle does not need to and should not be closed explicitly.
 
         Implementations must call :meth:`logAccess` to report the download.
+        Reads from the job store are counted in ioStats as being the size of
+        the file, if fileStoreID is a FileID, since the stream may not be read
+        to the end.
 
         :return: a context manager yielding a file handle which can be read from.
         """
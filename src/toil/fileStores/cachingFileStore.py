@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from concurrent.futures import ThreadPoolExecutor, wait
 from contextlib import contextmanager
 import errno
 import hashlib
@@ -28,7 +29,7 @@ import uuid
 from toil.common import cacheDirName, getDirSizeRecursively, getFileSystemSize
 from toil.lib.bioio import makePublicDir
 from toil.lib.humanize import bytes2human
-from toil.lib.misc import robust_rmtree, atomic_copy, atomic_copyobj
+from toil.lib.misc import robust_rmtree, atomic_copy, atomic_copyobj, open_mapped
 from toil.lib.retry import retry, ErrorCondition
 from toil.lib.threading import get_process_name, process_name_exists
 from toil.fileStores.abstractFileStore import AbstractFileStore
@@ -109,7 +110,9 @@ class CachingFileStore(AbstractFileStore):
     files contains one entry for each file in the cache. Each entry knows the
     path to its data on disk. It also knows its global file ID, its state, and
     its owning worker PID. If the owning worker dies, another worker will pick
-    it up. It also knows its size.
+    it up. It also knows its size, and, for choosing what to evict, when it was
+    last read, how many times it was read from the cache, and its GreedyDual
+    priority.
 
     File states are:
 
@@ -166,10 +169,36 @@ class CachingFileStore(AbstractFileStore):
     references until the null-worker jobs are gone.
 
     properties contains key, value pairs for tracking total space available,
-    and whether caching is free for this run.
+    whether caching is free for this run, and the GreedyDual inflation value
+    (the priority of the last file evicted).
+
+    When space is needed, unreferenced cached files are evicted in the order
+    set by the --cacheEvictionPolicy option:
+
+    - "lru": least recently read first.
+
+    - "lfu": fewest cache hits first, least recently read first among ties.
+
+    - "greedyDual": lowest priority first. A file's priority is set to the
+      inflation value plus the reciprocal of its size whenever it is read, so
+      large files and files not read since other files were evicted go first.
 
     """
 
+    # ORDER BY clauses, over the files table, for each eviction policy
+    evictionOrders = {'lru': 'files.last_access',
+                      'lfu': 'files.hits, files.last_access',
+                      'greedyDual': 'files.priority, files.last_access'}
+
+    # Statement for adding a file record, stamped as just read and with a
+    # fresh GreedyDual priority. Format with "OR IGNORE " if the record may
+    # already exist. Takes the ID, path, size, state, owner, access time, and
+    # then the size again.
+    _insertFileSQL = """
+        INSERT {}INTO files (id, path, size, state, owner, last_access, priority)
+        VALUES (?, ?, ?, ?, ?, ?, (SELECT value FROM properties WHERE name = 'evictionInflation') + 1.0 / MAX(?, 1))
+    """
+
     def __init__(self, jobStore, jobDesc, localTempDir, waitForPreviousCommit):
         super(CachingFileStore, self).__init__(jobStore, jobDesc, localTempDir, waitForPreviousCommit)
 
@@ -231,7 +260,11 @@ class CachingFileStore(AbstractFileStore):
 
         # Initialize the space accounting properties
         freeSpace, _ = getFileSystemSize(self.localCacheDir)
-        self._write([('INSERT OR IGNORE INTO properties VALUES (?, ?)', ('maxSpace', freeSpace))])
+        self._write([('INSERT OR IGNORE INTO properties VALUES (?, ?)', ('maxSpace', freeSpace)),
+                     ('INSERT OR IGNORE INTO properties VALUES (?, ?)', ('evictionInflation', 0.0))])
+
+        # Work out what order to evict files in
+        self.evictionOrder = self.evictionOrders[self.jobStore.config.cacheEvictionPolicy]
 
         # Space used by caching and by jobs is accounted with queries
 
@@ -245,6 +278,15 @@ class CachingFileStore(AbstractFileStore):
         # time.
         self.commitThread = None
 
+        # Files are uploaded to the job store by a pool of threads, starting
+        # as soon as they are written into the cache. Each upload thread talks
+        # to the database over its own connection, kept here. The futures for
+        # uploads we have started are kept by file ID until we wait on them.
+        self.uploadPool = ThreadPoolExecutor(max_workers=self.jobStore.config.uploadThreads)
+        self.uploadConnections = threading.local()
+        self.uploadFutures = {}
+        self.uploadFuturesLock = threading.Lock()
+
     
     @staticmethod
     @retry(infinite_retries=True,
@@ -342,7 +384,10 @@ class CachingFileStore(AbstractFileStore):
                 path TEXT UNIQUE NOT NULL,
                 size INT NOT NULL,
                 state TEXT NOT NULL,
-                owner TEXT
+                owner TEXT,
+                last_access REAL NOT NULL DEFAULT 0,
+                hits INT NOT NULL DEFAULT 0,
+                priority REAL NOT NULL DEFAULT 0
             )
         """, """
             CREATE TABLE IF NOT EXISTS refs (
@@ -715,12 +760,12 @@ class CachingFileStore(AbstractFileStore):
 
     def _executePendingUploads(self, con, cur):
         """
-        Uploads all files in uploadable state that we own.
+        Uploads all files in uploadable state that we own, and waits for all
+        the uploads we have started to finish.
 
         Returns the number of files that were uploaded.
 
-        Needs access to self to get at the job store for uploading files, but
-        still needs to take con and cur so it can run in a thread with the
+        Still needs to take con and cur so it can run in a thread with the
         thread's database connection.
 
         :param sqlite3.Connection con: Connection to the cache database.
@@ -730,49 +775,82 @@ class CachingFileStore(AbstractFileStore):
         # Work out who we are
         me = get_process_name(self.workDir)
 
-        # Record how many files we upload
-        uploadedCount = 0
-        while True:
-            # Try and find a file we might want to upload
-            fileID = None
-            filePath = None
-            for row in cur.execute('SELECT id, path FROM files WHERE state = ? AND owner = ? LIMIT 1', ('uploadable', me)):
-                fileID = row[0]
-                filePath = row[1]
-
-            if fileID is None:
-                # Nothing else exists to upload
-                break
+        # Start uploading anything that isn't already going
+        for fileID, filePath in cur.execute('SELECT id, path FROM files WHERE state = ? AND owner = ?',
+                                            ('uploadable', me)).fetchall():
+            self._startUpload(fileID, filePath)
 
-            # We need to set it to uploading in a way that we can detect that *we* won the update race instead of anyone else.
-            rowCount = self._staticWrite(con, cur, [('UPDATE files SET state = ? WHERE id = ? AND state = ?', ('uploading', fileID, 'uploadable'))])
-            if rowCount != 1:
-                # We didn't manage to update it. Someone else (a running job if
-                # we are a committing thread, or visa versa) must have grabbed
-                # it.
-                logger.debug('Lost race to upload %s', fileID)
-                # Try again to see if there is something else to grab.
-                continue
+        with self.uploadFuturesLock:
+            futures = list(self.uploadFutures.values())
+            self.uploadFutures = {}
+        wait(futures)
 
-            # Upload the file
-            logger.debug('Actually executing upload for file %s', fileID)
-            try:
-                self.jobStore.updateFile(fileID, filePath)
-            except:
-                # We need to set the state back to 'uploadable' in case of any failures to ensure
-                # we can retry properly.
-                self._staticWrite(con, cur, [('UPDATE files SET state = ? WHERE id = ? AND state = ?', ('uploadable', fileID, 'uploading'))])
-                raise
+        # Count the files that actually got uploaded, and complain about any
+        # that failed.
+        return sum(future.result() for future in futures)
 
-            # Count it for the total uploaded files value we need to return
-            uploadedCount += 1
+    def _startUpload(self, fileID, filePath):
+        """
+        Start uploading the given cached file to the job store in the upload
+        pool, if we aren't already.
+        """
+        with self.uploadFuturesLock:
+            if fileID not in self.uploadFutures:
+                self.uploadFutures[fileID] = self.uploadPool.submit(self._uploadFile, fileID, filePath)
 
-            # Remember that we uploaded it in the database
-            self._staticWrite(con, cur, [('UPDATE files SET state = ?, owner = NULL WHERE id = ?', ('cached', fileID))])
+    def _waitForUpload(self, fileID):
+        """
+        Make sure the upload of the given file we may have started is not
+        running, cancelling it if it has not started yet.
 
-        return uploadedCount
+        :return: The upload's future, or None if we weren't uploading the
+                 file.
+        :rtype: concurrent.futures.Future or None
+        """
+        with self.uploadFuturesLock:
+            future = self.uploadFutures.pop(fileID, None)
+        if future is not None and not future.cancel():
+            wait([future])
+        return future
 
+    def _uploadFile(self, fileID, filePath):
+        """
+        Upload the given file, if it is in uploadable state, and mark it as
+        cached. Runs in the upload pool.
 
+        :return: True if we uploaded the file, or False if someone else (a
+                 running job if we are uploading for a committing job, or visa
+                 versa) got to it first.
+        :rtype: bool
+        """
+        try:
+            con, cur = self.uploadConnections.con, self.uploadConnections.cur
+        except AttributeError:
+            # SQLite objects are tied to a thread, so we need our own.
+            con = self.uploadConnections.con = sqlite3.connect(self.dbPath, timeout=SQLITE_TIMEOUT_SECS)
+            cur = self.uploadConnections.cur = con.cursor()
+
+        # We need to set it to uploading in a way that we can detect that *we* won the update race instead of anyone else.
+        rowCount = self._staticWrite(con, cur, [('UPDATE files SET state = ? WHERE id = ? AND state = ?', ('uploading', fileID, 'uploadable'))])
+        if rowCount != 1:
+            logger.debug('Lost race to upload %s', fileID)
+            return False
+
+        # Upload the file
+        logger.debug('Actually executing upload for file %s', fileID)
+        try:
+            startTime = time.time()
+            self.jobStore.updateFile(fileID, filePath)
+            self._recordTransfer(True, os.path.getsize(filePath), startTime)
+        except:
+            # We need to set the state back to 'uploadable' in case of any failures to ensure
+            # we can retry properly.
+            self._staticWrite(con, cur, [('UPDATE files SET state = ? WHERE id = ? AND state = ?', ('uploadable', fileID, 'uploading'))])
+            raise
+
+        # Remember that we uploaded it in the database
+        self._staticWrite(con, cur, [('UPDATE files SET state = ?, owner = NULL WHERE id = ?', ('cached', fileID))])
+        return True
 
     def _allocateSpaceForJob(self, newJobReqs):
         """
@@ -889,12 +967,14 @@ class CachingFileStore(AbstractFileStore):
         # evictions before starting more, or we might evict everything as
         # soon as we hit the cache limit.
 
-        # Find something that has no non-mutable references and is not already being deleted.
+        # Find something that has no non-mutable references and is not
+        # already being deleted, picking the one our eviction policy likes
+        # least.
         self.cur.execute("""
-            SELECT files.id FROM files WHERE files.state = 'cached' AND NOT EXISTS (
+            SELECT files.id, files.priority FROM files WHERE files.state = 'cached' AND NOT EXISTS (
                 SELECT NULL FROM refs WHERE refs.file_id = files.id AND refs.state != 'mutable'
-            ) LIMIT 1
-        """)
+            ) ORDER BY {} LIMIT 1
+        """.format(self.evictionOrder))
         row = self.cur.fetchone()
         if row is None:
             # Nothing can be evicted by us.
@@ -904,21 +984,26 @@ class CachingFileStore(AbstractFileStore):
             return False
 
         # Otherwise we found an eviction candidate.
-        fileID = row[0]
+        fileID, priority = row
 
         # Work out who we are
         me = get_process_name(self.workDir)
 
         # Try and grab it for deletion, subject to the condition that nothing has started reading it
-        self._write([("""
+        if self._write([("""
             UPDATE files SET owner = ?, state = ? WHERE id = ? AND state = ?
             AND owner IS NULL AND NOT EXISTS (
                 SELECT NULL FROM refs WHERE refs.file_id = files.id AND refs.state != 'mutable'
             )
             """,
-            (me, 'deleting', fileID, 'cached'))])
+            (me, 'deleting', fileID, 'cached'))]) > 0:
+
+            logger.debug('Evicting file %s', fileID)
+            self.ioStats.cache_evictions += 1
 
-        logger.debug('Evicting file %s', fileID)
+            # Files read from now on have to beat the file we just evicted.
+            self._write([('UPDATE properties SET value = MAX(value, ?) WHERE name = ?',
+                          (priority, 'evictionInflation'))])
 
         # Whether we actually got it or not, try deleting everything we have to delete
         if self._executePendingDeletions(self.workDir, self.con, self.cur) > 0:
@@ -1047,7 +1132,7 @@ class CachingFileStore(AbstractFileStore):
 
         # Create a file in uploadable state and a reference, in the same transaction.
         # Say the reference is an immutable reference
-        self._write([('INSERT INTO files VALUES (?, ?, ?, ?, ?)', (fileID, cachePath, fileSize, 'uploadable', me)),
+        self._write([(self._insertFileSQL.format(''), (fileID, cachePath, fileSize, 'uploadable', me, time.time(), fileSize)),
             ('INSERT INTO refs VALUES (?, ?, ?, ?)', (absLocalFileName, fileID, creatorID, 'immutable'))])
 
         if absLocalFileName.startswith(self.localTempDir) and not os.path.islink(absLocalFileName):
@@ -1061,10 +1146,12 @@ class CachingFileStore(AbstractFileStore):
 
                 linkedToCache = True
 
-                logger.debug('Hardlinked file %s into cache at %s; deferring write to job store', localFileName, cachePath)
+                logger.debug('Hardlinked file %s into cache at %s; uploading to job store in the background', localFileName, cachePath)
                 assert not os.path.islink(cachePath), "Symlink %s has invaded cache!" % cachePath
 
-                # Don't do the upload now. Let it be deferred until later (when the job is committing).
+                # Upload from the cache while the job carries on. The job
+                # commit waits for the upload to finish.
+                self._startUpload(fileID, cachePath)
             except OSError:
                 # We couldn't make the link for some reason
                 linkedToCache = False
@@ -1090,7 +1177,9 @@ class CachingFileStore(AbstractFileStore):
 
             # Save the file to the job store right now
             logger.debug('Actually executing upload immediately for file %s', fileID)
+            startTime = time.time()
             self.jobStore.updateFile(fileID, absLocalFileName)
+            self._recordTransfer(True, fileSize, startTime)
 
         # Ship out the completed FileID object with its real size.
         return FileID.forPath(fileID, absLocalFileName)
@@ -1194,6 +1283,7 @@ class CachingFileStore(AbstractFileStore):
                 time.sleep(self.forceDownloadDelay)
 
             # Just read directly
+            startTime = time.time()
             if mutable or self.forceNonFreeCaching:
                 # Always copy
                 with self.jobStore.readFileStream(fileStoreID) as inStream:
@@ -1201,6 +1291,7 @@ class CachingFileStore(AbstractFileStore):
             else:
                 # Link or maybe copy
                 self.jobStore.readFile(fileStoreID, localFilePath, symlink=symlink)
+            self._recordTransfer(False, os.path.getsize(localFilePath), startTime)
 
         # Now we got the file, somehow.
         return localFilePath
@@ -1219,6 +1310,7 @@ class CachingFileStore(AbstractFileStore):
             # Wait around to simulate a big file for testing
             time.sleep(self.forceDownloadDelay)
 
+        startTime = time.time()
         if self.forceNonFreeCaching:
             # Always copy
             with self.jobStore.readFileStream(fileStoreID) as inStream:
@@ -1226,6 +1318,7 @@ class CachingFileStore(AbstractFileStore):
         else:
             # Link or maybe copy
             self.jobStore.readFile(fileStoreID, cachedPath, symlink=False)
+        self._recordTransfer(False, os.path.getsize(cachedPath), startTime)
 
     def _readGlobalFileMutablyWithCache(self, fileStoreID, localFilePath, readerID):
         """
@@ -1248,8 +1341,9 @@ class CachingFileStore(AbstractFileStore):
         while True:
             # Try and create a downloading entry if no entry exists
             logger.debug('Trying to make file record for id %s', fileStoreID)
-            self._write([('INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?)',
-                (fileStoreID, cachedPath, self.getGlobalFileSize(fileStoreID), 'downloading', me))])
+            fileSize = self.getGlobalFileSize(fileStoreID)
+            self._write([(self._insertFileSQL.format('OR IGNORE '),
+                (fileStoreID, cachedPath, fileSize, 'downloading', me, time.time(), fileSize))])
 
             # See if we won the race
             self.cur.execute('SELECT COUNT(*) FROM files WHERE id = ? AND state = ? AND owner = ?', (fileStoreID, 'downloading', me))
@@ -1262,6 +1356,7 @@ class CachingFileStore(AbstractFileStore):
 
                 # Do the download into the cache.
                 self._downloadToCache(fileStoreID, cachedPath)
+                self._recordCacheAccess(fileStoreID, hit=False)
 
                 # Now, we may have to immediately give away this file, because
                 # we don't have space for two copies.
@@ -1300,6 +1395,7 @@ class CachingFileStore(AbstractFileStore):
                     for row in self.cur.execute('SELECT path FROM files WHERE id = ?', (fileStoreID,)):
                         cachedPath = row[0]
 
+                    self._recordCacheAccess(fileStoreID, hit=True)
 
                     while self.getCacheAvailable() < 0:
                         # Since we now have a copying reference, see if we have used too much space.
@@ -1364,6 +1460,27 @@ class CachingFileStore(AbstractFileStore):
             # Wait for other people's downloads to progress before re-polling.
             time.sleep(self.contentionBackoff)
 
+    def _recordCacheAccess(self, fileStoreID, hit):
+        """
+        Note that the current job read the given file through the cache.
+
+        Updates the file's record for the eviction policies, and the job's
+        cache hit and miss counts.
+
+        :param toil.fileStores.FileID or str fileStoreID: job store id for the file
+        :param bool hit: True if the file was already in the cache, and False
+               if we had to download it.
+        """
+
+        self.ioStats['cache_hits' if hit else 'cache_misses'] += 1
+
+        self._write([("""
+            UPDATE files SET last_access = ?, hits = hits + ?,
+            priority = (SELECT value FROM properties WHERE name = ?) + 1.0 / MAX(size, 1)
+            WHERE id = ?
+            """,
+            (time.time(), int(hit), 'evictionInflation', fileStoreID))])
+
     def _fulfillCopyingReference(self, fileStoreID, cachedPath, localFilePath):
         """
         For use when you own a file in 'downloading' state, and have a
@@ -1507,8 +1624,9 @@ class CachingFileStore(AbstractFileStore):
             # Make sure to create a reference at the same time if it succeeds, to bill it against our job's space.
             # Don't create the mutable reference yet because we might not necessarily be able to clear that space.
             logger.debug('Trying to make file downloading file record and reference for id %s', fileStoreID)
-            self._write([('INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?)',
-                (fileStoreID, cachedPath, self.getGlobalFileSize(fileStoreID), 'downloading', me)),
+            fileSize = self.getGlobalFileSize(fileStoreID)
+            self._write([(self._insertFileSQL.format('OR IGNORE '),
+                (fileStoreID, cachedPath, fileSize, 'downloading', me, time.time(), fileSize)),
                 ('INSERT INTO refs SELECT ?, id, ?, ? FROM files WHERE id = ? AND state = ? AND owner = ?',
                 (localFilePath, readerID, 'immutable', fileStoreID, 'downloading', me))])
 
@@ -1523,6 +1641,7 @@ class CachingFileStore(AbstractFileStore):
 
                 # Do the download into the cache.
                 self._downloadToCache(fileStoreID, cachedPath)
+                self._recordCacheAccess(fileStoreID, hit=False)
 
                 # Try and make the link before we let the file go to cached state.
                 # If we fail we may end up having to give away the file we just downloaded.
@@ -1570,6 +1689,7 @@ class CachingFileStore(AbstractFileStore):
 
                     if self._createLinkFromCache(cachedPath, localFilePath, symlink):
                         # We managed to make the link
+                        self._recordCacheAccess(fileStoreID, hit=True)
                         return localFilePath
                     else:
                         # We can't make the link. We need a copy instead.
@@ -1599,16 +1719,37 @@ class CachingFileStore(AbstractFileStore):
                     # Wait for other people's downloads to progress.
                     time.sleep(self.contentionBackoff)
 
+    @contextmanager
     def readGlobalFileStream(self, fileStoreID):
         if str(fileStoreID) in self.filesToDelete:
             # File has already been deleted
             raise FileNotFoundError('Attempted to read deleted file: {}'.format(fileStoreID))
         
         self.logAccess(fileStoreID)
-        
-        # TODO: can we fulfil this from the cache if the file is in the cache?
-        # I think we can because if a job is keeping the file data on disk due to having it open, it must be paying for it itself.
-        return self.jobStore.readFileStream(fileStoreID)
+
+        # If the file is in the cache, read it from there. If a job is keeping
+        # the file data on disk due to having it open, it must be paying for it
+        # itself, and the mapping stays valid if the file is evicted.
+        cachedPath = None
+        for row in self.cur.execute('SELECT path FROM files WHERE id = ? AND (state = ? OR state = ? OR state = ?)',
+            (fileStoreID, 'cached', 'uploadable', 'uploading')):
+            cachedPath = row[0]
+        if cachedPath is not None:
+            try:
+                f = open_mapped(cachedPath)
+            except FileNotFoundError:
+                # It was evicted since we looked.
+                pass
+            else:
+                self._recordCacheAccess(fileStoreID, hit=True)
+                with f:
+                    yield f
+                return
+
+        startTime = time.time()
+        with self.jobStore.readFileStream(fileStoreID) as f:
+            yield f
+        self._recordTransfer(False, getattr(fileStoreID, 'size', 0), startTime)
 
     def deleteLocalFile(self, fileStoreID):
         # What job are we operating as?
@@ -1673,6 +1814,9 @@ class CachingFileStore(AbstractFileStore):
         # Work out who we are
         me = get_process_name(self.workDir)
 
+        # Don't delete the file out from under its upload
+        self._waitForUpload(fileStoreID)
+
         # Make sure nobody else has references to it
         for row in self.cur.execute('SELECT job_id FROM refs WHERE file_id = ? AND state != ?', (fileStoreID, 'mutable')):
             raise RuntimeError('Deleted file ID %s which is still in use by job %s' % (fileStoreID, row[0]))
@@ -1699,7 +1843,8 @@ class CachingFileStore(AbstractFileStore):
         # uploading it because we aren't supposed to have the ID from them
         # until they are done.
 
-        # For safety and simplicity, we just execute all pending uploads now.
+        # For safety and simplicity, we just execute all pending uploads now,
+        # and wait for any that are already going.
         self._executePendingUploads(self.con, self.cur)
 
         # Then we let the job store export. TODO: let the export come from the
@@ -1707,7 +1852,8 @@ class CachingFileStore(AbstractFileStore):
         self.jobStore.exportFile(jobStoreFileID, dstUrl)
 
     def waitForCommit(self):
-        # We need to block on the upload thread.
+        # We need to block on the commit thread, which waits on the uploads
+        # that are still going.
 
         # We may be called even if startCommit is not called. In that
         # case, a new instance of this class should have been created by the
@@ -1719,7 +1865,9 @@ class CachingFileStore(AbstractFileStore):
         # work.
 
         if self.commitThread is not None and self.commitThread is not threading.current_thread():
+            startTime = time.time()
             self.commitThread.join()
+            self.ioStats.commit_wait += time.time() - startTime
 
         return True
 
@@ -1750,7 +1898,7 @@ class CachingFileStore(AbstractFileStore):
 
             logger.debug('Committing file uploads asynchronously')
 
-            # Finish all uploads
+            # Finish all uploads, most of which should already be going
             self._executePendingUploads(con, cur)
             # Finish all deletions out of the cache (not from the job store)
             self._executePendingDeletions(self.workDir, con, cur)
@@ -1857,6 +2005,8 @@ class CachingFileStore(AbstractFileStore):
         """
 
         self.waitForCommit()
+        # Let the upload threads go away once they are done.
+        self.uploadPool.shutdown(wait=False)
 
     @classmethod
     def _removeDeadJobs(cls, workDir, con):
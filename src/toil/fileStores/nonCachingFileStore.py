@@ -27,6 +27,7 @@ import fcntl
 import logging
 import os
 import sys
+import time
 import uuid
 
 from toil.lib.misc import robust_rmtree
@@ -89,7 +90,9 @@ class NonCachingFileStore(AbstractFileStore):
     def writeGlobalFile(self, localFileName, cleanup=False):
         absLocalFileName = self._resolveAbsoluteLocalPath(localFileName)
         creatorID = self.jobDesc.jobStoreID
+        startTime = time.time()
         fileStoreID = self.jobStore.writeFile(absLocalFileName, creatorID, cleanup)
+        self._recordTransfer(True, os.path.getsize(absLocalFileName), startTime)
         if absLocalFileName.startswith(self.localTempDir):
             # Only files in the appropriate directory should become local files
             # we can delete with deleteLocalFile
@@ -104,16 +107,20 @@ class NonCachingFileStore(AbstractFileStore):
         else:
             localFilePath = self.getLocalTempFileName()
 
+        startTime = time.time()
         self.jobStore.readFile(fileStoreID, localFilePath, symlink=symlink)
+        self._recordTransfer(False, os.path.getsize(localFilePath), startTime)
         self.localFileMap[fileStoreID].append(localFilePath)
         self.logAccess(fileStoreID, localFilePath)
         return localFilePath
 
     @contextmanager
     def readGlobalFileStream(self, fileStoreID):
+        startTime = time.time()
         with self.jobStore.readFileStream(fileStoreID) as f:
             self.logAccess(fileStoreID)
             yield f
+        self._recordTransfer(False, getattr(fileStoreID, 'size', 0), startTime)
 
     def exportFile(self, jobStoreFileID, dstUrl):
         self.jobStore.exportFile(jobStoreFileID, dstUrl)
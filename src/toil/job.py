@@ -22,16 +22,15 @@ from builtins import str
 import collections
 import copy
 import enum
+import functools
 import importlib
 import inspect
 import itertools
 import logging
 import os
-import shutil
 import sys
 import time
 import dill
-import tempfile
 
 try:
     import cPickle as pickle
@@ -52,11 +51,11 @@ from toil.lib.humanize import human2bytes
 
 from toil.common import Toil, addOptions, safeUnpickleFromStream, Config
 from toil.deferred import DeferredFunction
-from toil.fileStores import FileID
 from toil.lib.bioio import (setLoggingFromOptions,
                             getTotalCpuTimeAndMemoryUsage,
                             getTotalCpuTime)
 from toil.resource import ModuleDescriptor
+from toil.serviceSignals import ServiceSignalClient
 from future.utils import with_metaclass
 
 logger = logging.getLogger( __name__ )
@@ -124,6 +123,11 @@ class Requirer:
     cores, memory, disk, and preemptability as properties.
     """
     
+    # The leader can hold a great many of these, so they keep their attributes
+    # in slots instead of a __dict__. Subclasses that don't declare __slots__,
+    # like user services, still get a __dict__.
+    __slots__ = ('_config', '_requirementOverrides')
+    
     def __init__(self, requirements):
         """
         Parse and save the given requirements.
@@ -163,32 +167,49 @@ class Requirer:
         
     def __getstate__(self):
         """
-        Return the dict to use as the instance's __dict__ when pickling.
+        Return the dict of attribute values to save when pickling or copying,
+        for :meth:`__setstate__` to restore.
         """
         
+        # Attributes live in our slots, or in a __dict__ for subclasses (like
+        # user services) that don't declare slots, and for attributes other
+        # code adds to JobDescriptions.
+        state = {name: getattr(self, name) for name in self._slotNames() if hasattr(self, name)}
+        state.update(getattr(self, '__dict__', {}))
         # We want to exclude the config from pickling.
-        state = self.__dict__.copy()
         state['_config'] = None
         return state
+        
+    def __setstate__(self, state):
+        """
+        Restore the attribute values saved by :meth:`__getstate__`.
+        """
+        for name, value in state.items():
+            if name.startswith('__'):
+                # Older versions could leave copying overrides on the
+                # instance, and so in its pickle. We don't need them.
+                continue
+            object.__setattr__(self, name, value)
+            
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def _slotNames(cls):
+        """
+        Get the names of all the slots of the class and its base classes.
+        
+        :rtype: tuple(str)
+        """
+        return tuple(name for klass in cls.__mro__ for name in klass.__dict__.get('__slots__', ())
+                     if name != '__dict__')
    
     def __copy__(self):
         """
         Return a semantically-shallow copy of the object, for :meth:`copy.copy`.
         """
         
-        # See https://stackoverflow.com/a/40484215 for how to do an override
-        # that uses the base implementation
-        
-        # Hide this override
-        implementation = self.__copy__
-        self.__copy__ = None
-        
         # Do the copy which omits the config via __getstate__ override
-        clone = copy.copy(self)
-        
-        # Put back the override on us and the copy
-        self.__copy__ = implementation
-        clone.__copy__ = implementation
+        clone = self.__class__.__new__(self.__class__)
+        clone.__setstate__(self.__getstate__())
         
         if self._config is not None:
             # Share a config reference
@@ -201,19 +222,10 @@ class Requirer:
         Return a semantically-deep copy of the object, for :meth:`copy.deepcopy`.
         """
         
-        # See https://stackoverflow.com/a/40484215 for how to do an override
-        # that uses the base implementation
-        
-        # Hide this override
-        implementation = self.__deepcopy__
-        self.__deepcopy__ = None
-        
         # Do the deepcopy which omits the config via __getstate__ override
-        clone = copy.deepcopy(self, memo)
-        
-        # Put back the override on us and the copy
-        self.__deepcopy__ = implementation
-        clone.__deepcopy__ = implementation
+        clone = self.__class__.__new__(self.__class__)
+        memo[id(self)] = clone
+        clone.__setstate__(copy.deepcopy(self.__getstate__(), memo))
         
         if self._config is not None:
             # Share a config reference
@@ -369,6 +381,74 @@ class Requirer:
     def preemptable(self, val):
          self._requirementOverrides['preemptable'] = self._parseResource('preemptable', val)
 
+class _NewIDSet(set):
+    """
+    An empty set of job IDs, handed out for a JobDescription that is sharing
+    the empty frozenset in one of its ID set slots. Once something is added to
+    it, it takes the frozenset's place in the slot, so code that adds to the
+    set it got from the JobDescription still changes the JobDescription.
+    """
+    __slots__ = ('_owner', '_slot')
+
+    def __init__(self, owner, slot):
+        super().__init__()
+        self._owner = owner
+        self._slot = slot
+
+    def __reduce__(self):
+        # Copies and pickles are just sets.
+        return set, (list(self),)
+
+    def _attach(self):
+        """
+        Put this set in its JobDescription's slot, if it isn't there yet.
+        """
+        if self._owner is None or not self:
+            return
+        current = getattr(self._owner, self._slot)
+        if current is self._owner._noIDs:
+            setattr(self._owner, self._slot, self)
+        else:
+            # Something else added to the slot first; add to what it put there.
+            current.update(self)
+        self._owner = None
+
+    def add(self, element):
+        super().add(element)
+        self._attach()
+
+    def update(self, *others):
+        super().update(*others)
+        self._attach()
+
+    def symmetric_difference_update(self, other):
+        super().symmetric_difference_update(other)
+        self._attach()
+
+    def __ior__(self, other):
+        super().__ior__(other)
+        self._attach()
+        return self
+
+    def __ixor__(self, other):
+        super().__ixor__(other)
+        self._attach()
+        return self
+
+def _idSetProperty(slot, doc):
+    """
+    Make a property for a set of job IDs kept in the given slot, which holds
+    the shared empty frozenset while the set is empty.
+    """
+    def getter(self):
+        value = getattr(self, slot)
+        return _NewIDSet(self, slot) if value is self._noIDs else value
+
+    def setter(self, value):
+        setattr(self, slot, value)
+
+    return property(getter, setter, doc=doc)
+
 class JobDescription(Requirer):
     """
     Stores all the information that the Toil Leader ever needs to know about a
@@ -384,6 +464,25 @@ class JobDescription(Requirer):
     their specific parameters.
     """
     
+    # chainedJobs is only set by the worker, on jobs it chained, and by
+    # CheckpointJobDescription. The __dict__ is only made for code (like
+    # Cactus) that hangs its own attributes on a JobDescription, so it keeps
+    # working.
+    __slots__ = ('jobName', 'unitName', 'displayName', 'jobStoreID', 'command', '_remainingTryCount',
+                 'filesToDelete', 'jobsToDelete', 'predecessorNumber', '_predecessorsFinished', '_childIDs',
+                 '_followOnIDs', 'serviceTree', 'logJobStoreFileID', 'chainedJobs', '__dict__')
+    
+    # Most jobs have no children, no follow-ons, or no finished predecessors
+    # being tracked, so they share this instead of each having an empty set.
+    # It is swapped for a set when an ID is added, including when one is added
+    # to the set the property gave out.
+    _noIDs = frozenset()
+    _idSetSlots = {'_predecessorsFinished': 'predecessorsFinished', '_childIDs': 'childIDs',
+                   '_followOnIDs': 'followOnIDs'}
+    predecessorsFinished = _idSetProperty('_predecessorsFinished', 'The IDs of predecessor jobs that have finished.')
+    childIDs = _idSetProperty('_childIDs', 'The IDs of all child jobs of the described job.')
+    followOnIDs = _idSetProperty('_followOnIDs', 'The IDs of all follow-on jobs of the described job.')
+    
     def __init__(self, requirements, jobName, unitName='', displayName='', command=None):
         """
         Create a new JobDescription.
@@ -409,11 +508,9 @@ class JobDescription(Requirer):
         super().__init__(requirements)
         
         # Save names, making sure they are strings and not e.g. bytes.
-        def makeString(x):
-            return x if not isinstance(x, bytes) else x.decode('utf-8', errors='replace')
-        self.jobName = makeString(jobName)
-        self.unitName = makeString(unitName)
-        self.displayName = makeString(displayName)
+        self.jobName = self._intern(jobName)
+        self.unitName = self._intern(unitName)
+        self.displayName = self._intern(displayName)
     
         # Set properties that are not fully filled in on creation.
         
@@ -460,7 +557,8 @@ class JobDescription(Requirer):
         # after the job is scheduled, so we don't ahve to worry about
         # conflicting updates from workers.
         # TODO: Move into ToilState itself so leader stops mutating us so much?
-        self.predecessorsFinished = set()
+        # Must be added to with addFinishedPredecessor.
+        self.predecessorsFinished = self._noIDs
         
         # Note that we don't hold IDs of our predecessors. Predecessors know
         # about us, and not the other way around. Otherwise we wouldn't be able
@@ -469,11 +567,11 @@ class JobDescription(Requirer):
        
         # The IDs of all child jobs of the described job.
         # Children which are done must be removed with filterSuccessors.
-        self.childIDs = set()
+        self.childIDs = self._noIDs
         
         # The IDs of all follow-on jobs of the described job.
         # Follow-ons which are done must be removed with filterSuccessors.
-        self.followOnIDs = set()
+        self.followOnIDs = self._noIDs
         
         # Dict from ServiceHostJob ID to list of child ServiceHostJobs that start after it.
         # All services must have an entry, if only to an empty list.
@@ -482,6 +580,46 @@ class JobDescription(Requirer):
         # A jobStoreFileID of the log file for a job. This will be None unless the job failed and
         # the logging has been captured to be reported on the leader.
         self.logJobStoreFileID = None 
+        
+    def __getstate__(self):
+        """
+        Return the dict of attribute values to save, with the ID sets under
+        their public names.
+        """
+        state = super().__getstate__()
+        for slot, name in self._idSetSlots.items():
+            if slot in state:
+                state[name] = state.pop(slot)
+        return state
+        
+    def __setstate__(self, state):
+        """
+        Restore the attribute values saved by :meth:`__getstate__`, sharing
+        strings with other jobs where we can.
+        """
+        super().__setstate__(state)
+        
+        # Unpickled strings are all separate objects. Names are often the same
+        # for many jobs, and a job's ID is also held by all its predecessors
+        # and by the leader, so keep one copy of each.
+        self.jobName = self._intern(self.jobName)
+        self.unitName = self._intern(self.unitName)
+        self.displayName = self._intern(self.displayName)
+        self.jobStoreID = self._intern(self.jobStoreID)
+        self.childIDs = {self._intern(x) for x in self.childIDs} or self._noIDs
+        self.followOnIDs = {self._intern(x) for x in self.followOnIDs} or self._noIDs
+        self.predecessorsFinished = {self._intern(x) for x in self.predecessorsFinished} or self._noIDs
+        
+    @staticmethod
+    def _intern(x):
+        """
+        Get the single shared copy of the given string, decoding it first if
+        it is bytes. Anything else, like a TemporaryID or None, is returned
+        as-is.
+        """
+        if isinstance(x, bytes):
+            x = x.decode('utf-8', errors='replace')
+        return sys.intern(x) if isinstance(x, str) else x
     
     def serviceHostIDsInBatches(self):
         """
@@ -595,8 +733,8 @@ class JobDescription(Requirer):
        Treats all other successors as complete and forgets them.
        """
        
-       self.childIDs = {x for x in self.childIDs if predicate(x)}
-       self.followOnIDs = {x for x in self.followOnIDs if predicate(x)}
+       self.childIDs = {x for x in self.childIDs if predicate(x)} or self._noIDs
+       self.followOnIDs = {x for x in self.followOnIDs if predicate(x)} or self._noIDs
        
     def filterServiceHosts(self, predicate):
         """
@@ -618,8 +756,8 @@ class JobDescription(Requirer):
         """
         Remove all references to child, follow-on, and service jobs associated with the described job.
         """
-        self.childIDs = set()
-        self.followOnIDs = set()
+        self.childIDs = self._noIDs
+        self.followOnIDs = self._noIDs
         self.serviceTree = {}
         
     
@@ -651,6 +789,9 @@ class JobDescription(Requirer):
         Make the job with the given ID a child of the described job.
         """
         
+        if not self.childIDs:
+            # Stop sharing the empty set
+            self.childIDs = set()
         self.childIDs.add(childID)
         
     def addFollowOn(self, followOnID):
@@ -658,6 +799,9 @@ class JobDescription(Requirer):
         Make the job with the given ID a follow-on of the described job.
         """
         
+        if not self.followOnIDs:
+            # Stop sharing the empty set
+            self.followOnIDs = set()
         self.followOnIDs.add(followOnID)
         
     def addServiceHostJob(self, serviceID, parentServiceID=None):
@@ -705,17 +849,51 @@ class JobDescription(Requirer):
         :param dict(TemporaryID, str) renames: Rename operations to apply.
         """
         
-        self.childIDs = {renames.get(old, old) for old in self.childIDs}
-        self.followOnIDs = {renames.get(old, old) for old in self.followOnIDs}
+        self.childIDs = {renames.get(old, old) for old in self.childIDs} or self._noIDs
+        self.followOnIDs = {renames.get(old, old) for old in self.followOnIDs} or self._noIDs
         self.serviceTree = {renames.get(parent, parent): [renames.get(child, child) for child in children]
                             for parent, children in self.serviceTree.items()}
         
+    def snapshot(self):
+        """
+        Return a copy of this JobDescription that later changes to this one
+        won't show up in, such as for saving to the job store in the
+        background while this one keeps being used.
+        
+        Cheaper than :func:`copy.deepcopy`: everything but the collections
+        that hold IDs, file lists and requirements is immutable, so only those
+        collections are copied.
+        
+        :rtype: toil.job.JobDescription
+        """
+        state = self.__getstate__()
+        for name, value in state.items():
+            if isinstance(value, (list, set)):
+                state[name] = type(value)(value)
+            elif isinstance(value, dict):
+                # The service tree holds lists of IDs
+                state[name] = {k: list(v) if isinstance(v, list) else v for k, v in value.items()}
+        clone = self.__class__.__new__(self.__class__)
+        clone.__setstate__(state)
+        if self._config is not None:
+            clone.assignConfig(self._config)
+        return clone
+        
     def addPredecessor(self):
         """
         Notify the JobDescription that a predecessor has been added to its Job.
         """
         self.predecessorNumber += 1
         
+    def addFinishedPredecessor(self, predecessorID):
+        """
+        Record that the predecessor job with the given ID has finished.
+        """
+        if not self.predecessorsFinished:
+            # Stop sharing the empty set
+            self.predecessorsFinished = set()
+        self.predecessorsFinished.add(predecessorID)
+        
     def onRegistration(self, jobStore):
         """
         Called by the Job saving logic when this JobDescription meets the JobStore and has its ID assigned.
@@ -833,7 +1011,7 @@ class JobDescription(Requirer):
     # a time, keyed by jobStoreID.
 
     def __repr__(self):
-        return '%s( **%r )' % (self.__class__.__name__, self.__dict__)
+        return '%s( **%r )' % (self.__class__.__name__, self.__getstate__())
         
         
 class ServiceJobDescription(JobDescription):
@@ -841,6 +1019,8 @@ class ServiceJobDescription(JobDescription):
     A description of a job that hosts a service.
     """
     
+    __slots__ = ('terminateJobStoreID', 'startJobStoreID', 'errorJobStoreID')
+    
     def __init__(self, *args, **kwargs):
         """
         Create a ServiceJobDescription to describe a ServiceHostJob.
@@ -878,6 +1058,8 @@ class CheckpointJobDescription(JobDescription):
     A description of a job that is a checkpoint.
     """
     
+    __slots__ = ('checkpoint', 'checkpointFilesToDelete')
+    
     def __init__(self, *args, **kwargs):
         """
         Create a CheckpointJobDescription to describe a checkpoint job.
@@ -947,10 +1129,44 @@ class CheckpointJobDescription(JobDescription):
                 jobStore.update(self)
         return successorsDeleted
 
+class _CappedCopyWriter:
+    """
+    Write-only stream that passes everything written on to another stream,
+    and keeps a copy of it in a BytesIO, until the copy would grow past a
+    limit. Then the copy is dropped and is None.
+    """
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.copy = BytesIO()
+
+    def write(self, data):
+        self.stream.write(data)
+        if self.copy is not None:
+            if self.copy.tell() + memoryview(data).nbytes > self.limit:
+                self.copy = None
+            else:
+                self.copy.write(data)
+        return len(data)
+
 class Job:
     """
     Class represents a unit of work in toil.
     """
+
+    # Bodies of jobs saved by this process, by the ID of the file each was
+    # saved in, oldest first. See _keepSavedBody().
+    _savedBodies = collections.OrderedDict()
+    _savedBodiesSize = 0
+    # Largest pickled job body to keep in memory after saving it, and the
+    # most bytes of them to keep in all.
+    maxSavedBodySize = 64 * 1024
+    maxSavedBodiesSize = 16 * 1024 * 1024
+    # Largest pickled promised value to store in the file shared by the
+    # promises it fulfills, rather than in a file of its own.
+    maxInlinePromiseSize = 4 * 1024
+
     def __init__(self, memory=None, cores=None, disk=None, preemptable=None,
                        unitName='', checkpoint=False, displayName='',
                        descriptionClass=None):
@@ -1019,13 +1235,17 @@ class Job:
         # defining the class self is an instance of, which may be a subclass of Job that may be
         # defined in a different module.
         self.userModule = ModuleDescriptor.forModule(self.__module__).globalize()
-        # Maps index paths into composite return values to lists of IDs of files containing
-        # promised values for those return value items. An index path is a tuple of indices that
-        # traverses a nested data structure of lists, dicts, tuples or any other type supporting
-        # the __getitem__() protocol.. The special key `()` (the empty tuple) represents the
-        # entire return value.
-        self._rvs = collections.defaultdict(list)
+        # Maps the IDs of files that will hold promised values to the ID of the job owning each
+        # file, and the set of index paths into our return value that the file needs values for.
+        # An index path is a tuple of indices that traverses a nested data structure of lists,
+        # dicts, tuples or any other type supporting the __getitem__() protocol.. The special key
+        # `()` (the empty tuple) represents the entire return value.
+        self._rvs = {}
         self._promiseJobStore = None
+        # The job to own promise files made while promises can register, and
+        # the files they are being registered in so far, by owner.
+        self._promiseOwnerID = None
+        self._promiseFileIDs = {}
         self._fileStore = None
         self._defer = None
         self._tempDir = None
@@ -1455,14 +1675,20 @@ class Job:
             # We haven't had a job store set to put our return value into, so
             # we must not have been hit yet in job topological order.
             raise JobPromiseConstraintError(self) 
-        # TODO: can we guarantee self.jobStoreID is populated and so pass that here?
-        with self._promiseJobStore.writeFileStream() as (fileHandle, jobStoreFileID):
-            promise = UnfulfilledPromiseSentinel(str(self.description), False)
-            pickle.dump(promise, fileHandle, pickle.HIGHEST_PROTOCOL)
-        self._rvs[path].append(jobStoreFileID)
+        ownerID = self._promiseOwnerID
+        if ownerID not in self._promiseFileIDs:
+            # All the promises with the same owner registered until registration is disabled
+            # share one file, which is cleaned up with the owner.
+            with self._promiseJobStore.writeFileStream(ownerID, cleanup=ownerID is not None) as (fileHandle, jobStoreFileID):
+                promise = UnfulfilledPromiseSentinel(str(self.description), False)
+                pickle.dump(promise, fileHandle, pickle.HIGHEST_PROTOCOL)
+            self._promiseFileIDs[ownerID] = jobStoreFileID
+            self._rvs[jobStoreFileID] = (ownerID, set())
+        jobStoreFileID = self._promiseFileIDs[ownerID]
+        self._rvs[jobStoreFileID][1].add(path)
         return self._promiseJobStore.config.jobStore, jobStoreFileID
 
-    def prepareForPromiseRegistration(self, jobStore):
+    def prepareForPromiseRegistration(self, jobStore, ownerID=None):
         """
         Ensure that a promise by this job (the promissor) can register with the promissor when
         another job referring to the promise (the promissee) is being serialized. The promissee
@@ -1470,9 +1696,15 @@ class Job:
         is being pickled, so will the promises it refers to. Pickling a promise triggers it to be
         registered with the promissor.
 
-        :return:
+        :param toil.jobStores.abstractJobStore.AbstractJobStore jobStore: The job store to keep
+               promised values in.
+        :param str ownerID: The ID of a job that will not be deleted until every promissee that
+               can register now has run. Files holding promised values are cleaned up with it.
+               If None, they are never cleaned up.
         """
         self._promiseJobStore = jobStore
+        self._promiseOwnerID = ownerID
+        self._promiseFileIDs = {}
         
     def _disablePromiseRegistration(self):
         """
@@ -1482,6 +1714,8 @@ class Job:
         """
         
         self._promiseJobStore = None
+        self._promiseOwnerID = None
+        self._promiseFileIDs = {}
 
     ####################################################
     #Cycle/connectivity checking
@@ -1887,30 +2121,60 @@ class Job:
     def _fulfillPromises(self, returnValues, jobStore):
         """
         Sets the values for promises using the return values from this job's run() function.
+
+        Each promise file gets a dict from index path to the pickled value. A value too big to
+        inline goes in a file of its own, with the same owner, and the dict holds its ID instead.
         """
-        for path, promiseFileStoreIDs in iteritems(self._rvs):
-            if not path:
-                # Note that its possible for returnValues to be a promise, not an actual return
-                # value. This is the case if the job returns a promise from another job. In
-                # either case, we just pass it on.
-                promisedValue = returnValues
-            else:
-                # If there is an path ...
-                if isinstance(returnValues, Promise):
-                    # ... and the value itself is a Promise, we need to created a new, narrower
-                    # promise and pass it on.
-                    promisedValue = Promise(returnValues.job, path)
+        # Pickled value for each owner and path, so each is only pickled once
+        pickledValues = {}
+        savingOwnerID = self._promiseOwnerID
+        for promiseFileStoreID, (ownerID, paths) in iteritems(self._rvs):
+            # File may be gone if the job is a service being re-run and the accessing job is
+            # already complete.
+            if not jobStore.fileExists(promiseFileStoreID):
+                continue
+            # The value may hold promises by jobs we are saving, which register as they are
+            # pickled. Whoever reads this file can read those, so they need the same owner.
+            for job in self._registry.values():
+                job._promiseOwnerID = ownerID
+            inlineValues = {}
+            valueFileIDs = {}
+            for path in paths:
+                if (ownerID, path) not in pickledValues:
+                    pickledValues[ownerID, path] = pickle.dumps(self._selectPromisedValue(returnValues, path),
+                                                                pickle.HIGHEST_PROTOCOL)
+                pickledValue = pickledValues[ownerID, path]
+                if len(pickledValue) > self.maxInlinePromiseSize:
+                    with jobStore.writeFileStream(ownerID, cleanup=ownerID is not None) as (fileHandle, valueFileID):
+                        fileHandle.write(pickledValue)
+                    valueFileIDs[path] = valueFileID
                 else:
-                    # Otherwise, we just select the desired component of the return value.
-                    promisedValue = returnValues
-                    for index in path:
-                        promisedValue = promisedValue[index]
-            for promiseFileStoreID in promiseFileStoreIDs:
-                # File may be gone if the job is a service being re-run and the accessing job is
-                # already complete.
-                if jobStore.fileExists(promiseFileStoreID):
-                    with jobStore.updateFileStream(promiseFileStoreID) as fileHandle:
-                        pickle.dump(promisedValue, fileHandle, pickle.HIGHEST_PROTOCOL)
+                    inlineValues[path] = pickledValue
+            with jobStore.updateFileStream(promiseFileStoreID) as fileHandle:
+                pickle.dump((inlineValues, valueFileIDs), fileHandle, pickle.HIGHEST_PROTOCOL)
+        for job in self._registry.values():
+            job._promiseOwnerID = savingOwnerID
+
+    @staticmethod
+    def _selectPromisedValue(returnValues, path):
+        """
+        Get the part of a job's return value that a promise with the given index path is for.
+        """
+        if not path:
+            # Note that its possible for returnValues to be a promise, not an actual return
+            # value. This is the case if the job returns a promise from another job. In
+            # either case, we just pass it on.
+            return returnValues
+        # If there is an path ...
+        if isinstance(returnValues, Promise):
+            # ... and the value itself is a Promise, we need to created a new, narrower
+            # promise and pass it on.
+            return Promise(returnValues.job, path)
+        # Otherwise, we just select the desired component of the return value.
+        promisedValue = returnValues
+        for index in path:
+            promisedValue = promisedValue[index]
+        return promisedValue
 
     # Functions associated with Job.checkJobGraphAcyclic to establish that the job graph does not
     # contain any cycles of dependencies:
@@ -2071,9 +2335,11 @@ class Job:
                 self._registry = {description.jobStoreID: self}
                 self._directPredecessors = set()
             
-                # Save the body of the job
+                # Save the body of the job, pickling it straight into the job
+                # store and only keeping a copy if it is small.
                 with jobStore.writeFileStream(description.jobStoreID, cleanup=True) as (fileHandle, fileStoreID):
-                    pickle.dump(self, fileHandle, pickle.HIGHEST_PROTOCOL)
+                    body = _CappedCopyWriter(fileHandle, self.maxSavedBodySize)
+                    pickle.dump(self, body, pickle.HIGHEST_PROTOCOL)
             finally:
                 # Restore important fields (before handling errors)
                 self._directPredecessors = directPredecessors 
@@ -2086,6 +2352,11 @@ class Job:
                 e = JobPromiseConstraintError(e.promisingJob, self)
             raise e
             
+        # A worker that made the job may well be the one to run it next, when
+        # chaining.
+        if body.copy is not None:
+            self._keepSavedBody(fileStoreID, body.copy.getvalue())
+
         # Find the user script.
         # Note that getUserScript() may have been overridden. This is intended. If we used
         # self.userModule directly, we'd be getting a reference to job.py if the job was
@@ -2138,9 +2409,11 @@ class Job:
                 # about the renames.
                 job._renameReferences(fakeToReal)
 
-        # Make sure the whole component is ready for promise registration
+        # Make sure the whole component is ready for promise registration.
+        # Everything that can be a promissee now is under us, so we can own
+        # the promise files.
         for job in allJobs:
-            job.prepareForPromiseRegistration(jobStore)
+            job.prepareForPromiseRegistration(jobStore, self.jobStoreID)
         
         # Get an ordering on the non-service jobs which we use for pickling the
         # jobs in the correct order to ensure the promises are properly
@@ -2238,44 +2511,47 @@ class Job:
         userModule = cls._loadUserModule(userModule)
         pickleFile = commandTokens[1]
 
-        # Get a directory to download the job in
-        directory = tempfile.mkdtemp()
-        # Initialize a blank filename so the finally below can't fail due to a
-        # missing variable
-        filename = ''
+        body = cls._savedBodies.pop(pickleFile, None)
+        if body is not None:
+            # We saved this job ourselves, so we don't need to read it back.
+            cls._savedBodiesSize -= len(body)
+            logger.debug('Loading job body %s from memory.', pickleFile)
+            stream = BytesIO(body)
+        elif pickleFile == "firstJob":
+            stream = jobStore.readSharedFileStream(pickleFile)
+        else:
+            stream = jobStore.readFileStream(pickleFile)
 
-        try:
-            # Get a filename to download the job to.
-            # Don't use mkstemp because we would need to delete and replace the
-            # file.
-            # Don't use a NamedTemporaryFile context manager because its
-            # context manager exit will crash if we deleted it.
-            filename = os.path.join(directory, 'job')
-                
-            # Download the job
-            if pickleFile == "firstJob":
-                jobStore.readSharedFile(pickleFile, filename)
-            else:
-                jobStore.readFile(pickleFile, filename)
+        # Unpickle straight from the stream
+        with stream as fileHandle:
+            job = cls._unpickle(userModule, fileHandle, requireInstanceOf=Job)
+        # Fill in the current description
+        job._description = jobDescription
 
-            # Open and unpickle
-            with open(filename, 'rb') as fileHandle:
-                job = cls._unpickle(userModule, fileHandle, requireInstanceOf=Job)
-                # Fill in the current description
-                job._description = jobDescription
-                
-                # Set up the registry again, so children and follow-ons can be added on the worker
-                job._registry = {job.jobStoreID: job}
-                
-                return job
+        # Set up the registry again, so children and follow-ons can be added on the worker
+        job._registry = {job.jobStoreID: job}
 
-                # TODO: We ought to just unpickle straight from a streaming read
-        finally:
-            # Clean up the file
-            if os.path.exists(filename):
-                os.unlink(filename)
-            # Clean up the directory we put it in
-            shutil.rmtree(directory)
+        return job
+
+    @classmethod
+    def _keepSavedBody(cls, fileStoreID, body):
+        """
+        Remember the body of a job that has just been saved, if it is small,
+        for :meth:`loadJob` to use instead of reading it back from the job
+        store. Bodies are never changed once saved, so they can't go stale.
+
+        :param str fileStoreID: The ID of the file the body was saved in.
+        :param bytes body: The pickled job.
+        """
+        if len(body) > cls.maxSavedBodySize:
+            return
+        cls._savedBodies[fileStoreID] = body
+        cls._savedBodiesSize += len(body)
+        while cls._savedBodiesSize > cls.maxSavedBodiesSize:
+            # Forget the oldest, which have probably been sent off to run
+            # somewhere else.
+            _, forgotten = cls._savedBodies.popitem(last=False)
+            cls._savedBodiesSize -= len(forgotten)
 
     def _run(self, jobGraph=None, fileStore=None, **kwargs):
         """
@@ -2317,18 +2593,9 @@ class Job:
 
         yield
 
-        # If the job is not a checkpoint job, add the promise files to delete
-        # to the list of jobStoreFileIDs to delete
-        # TODO: why is Promise holding a global list here???
-        if not self.checkpoint:
-            for jobStoreFileID in Promise.filesToDelete:
-                # Make sure to wrap the job store ID in a FileID object so the file store will accept it
-                # TODO: talk directly to the job sotre here instead.
-                fileStore.deleteGlobalFile(FileID(jobStoreFileID, 0))
-        else:
-            # Else copy them to the job description to delete later
-            self.description.checkpointFilesToDelete = list(Promise.filesToDelete)
-        Promise.filesToDelete.clear()
+        # Promise files are cleaned up with their owners, so we are done with
+        # the ones we read.
+        Promise.forgetPromiseFiles()
         # Now indicate the asynchronous update of the job can happen
         fileStore.startCommit(jobState=True)
         # Change dir back to cwd dir, if changed by job (this is a safety issue)
@@ -2342,7 +2609,9 @@ class Job:
                     time=str(time.time() - startTime),
                     clock=str(totalCpuTime - startClock),
                     class_name=self._jobName(),
-                    memory=str(totalMemoryUsage)
+                    memory=str(totalMemoryUsage),
+                    # Still counts the job's commit until the worker reports
+                    file_io=fileStore.ioStats
                 )
             )
 
@@ -2653,13 +2922,13 @@ class EncapsulatedJob(Job):
         assert self.encapsulatedJob is not None
         return self.encapsulatedJob.rv(*path)
 
-    def prepareForPromiseRegistration(self, jobStore):
+    def prepareForPromiseRegistration(self, jobStore, ownerID=None):
         # This one will be called after execution when re-serializing the
         # (unchanged) graph of jobs rooted here.
-        super().prepareForPromiseRegistration(jobStore)
+        super().prepareForPromiseRegistration(jobStore, ownerID)
         if self.encapsulatedJob is not None:
             # Running where the job was created.
-            self.encapsulatedJob.prepareForPromiseRegistration(jobStore)
+            self.encapsulatedJob.prepareForPromiseRegistration(jobStore, ownerID)
         
     def _disablePromiseRegistration(self):
         assert self.encapsulatedJob is not None
@@ -2685,6 +2954,12 @@ class ServiceHostJob(Job):
     """
     Job that runs a service. Used internally by Toil. Users should subclass Service instead of using this.
     """
+
+    # A signal channel with nothing on it looks the same whether the leader
+    # has nothing to say or has gone away without closing it, so while using
+    # one we still look at the job store's flags every this many polls.
+    pollsPerJobStoreCheck = 10
+
     def __init__(self, service):
         """
         This constructor should not be called by a user.
@@ -2789,27 +3064,51 @@ class ServiceHostJob(Job):
                 fileStore.jobStore.deleteFile(self.description.startJobStoreID)
             assert not fileStore.jobStore.fileExists(self.description.startJobStoreID)
 
+            # If the leader is listening, tell it directly as well, and have it
+            # tell us when to stop, so neither of us has to poll the job store.
+            signals = ServiceSignalClient.fromEnvironment(self.description.jobStoreID)
+            if signals is not None and not signals.reportStarted():
+                signals = None
+
             #Now block until we are told to stop, which is indicated by the removal
             #of a file
             assert self.description.terminateJobStoreID != None
-            while True:
-                # Check for the terminate signal
-                if not fileStore.jobStore.fileExists(self.description.terminateJobStoreID):
-                    logger.debug("Detected that the terminate jobStoreID has been removed so exiting")
-                    if not fileStore.jobStore.fileExists(self.description.errorJobStoreID):
-                        raise RuntimeError("Detected the error jobStoreID has been removed so exiting with an error")
-                    break
-
-                # Check the service's status and exit if failed or complete
-                try:
-                    if not service.check():
-                        logger.debug("The service has finished okay, exiting")
+            polls = 0
+            try:
+                while True:
+                    polls += 1
+                    if signals is not None and not signals.broken:
+                        # Wait for the terminate signal
+                        stop = signals.waitForStop(fileStore.jobStore.config.servicePollingInterval)
+                        if stop == 'error':
+                            raise RuntimeError("Detected the error signal from the leader so exiting with an error")
+                        elif stop is not None:
+                            logger.debug("Detected the terminate signal from the leader so exiting")
+                            break
+                        checkJobStore = signals.broken or polls % self.pollsPerJobStoreCheck == 0
+                    else:
+                        checkJobStore = True
+                    # Check for the terminate signal
+                    if checkJobStore and not fileStore.jobStore.fileExists(self.description.terminateJobStoreID):
+                        logger.debug("Detected that the terminate jobStoreID has been removed so exiting")
+                        if not fileStore.jobStore.fileExists(self.description.errorJobStoreID):
+                            raise RuntimeError("Detected the error jobStoreID has been removed so exiting with an error")
                         break
-                except RuntimeError:
-                    logger.debug("Detected termination of the service")
-                    raise
 
-                time.sleep(fileStore.jobStore.config.servicePollingInterval) #Avoid excessive polling
+                    # Check the service's status and exit if failed or complete
+                    try:
+                        if not service.check():
+                            logger.debug("The service has finished okay, exiting")
+                            break
+                    except RuntimeError:
+                        logger.debug("Detected termination of the service")
+                        raise
+
+                    if signals is None or signals.broken:
+                        time.sleep(fileStore.jobStore.config.servicePollingInterval) #Avoid excessive polling
+            finally:
+                if signals is not None:
+                    signals.close()
 
             logger.debug("Service is done")
         finally:
@@ -2840,10 +3139,14 @@ class Promise():
     :type: toil.jobStores.abstractJobStore.AbstractJobStore
     """
 
-    filesToDelete = set()
+    _promiseFiles = {}
     """
-    A set of IDs of files containing promised values when we know we won't need them anymore
+    Caches the contents of the promise files read since :meth:`forgetPromiseFiles` was last
+    called, by file ID, so that the promises sharing a file only read it once
+
+    :type: dict(str,(dict,dict))
     """
+
     def __init__(self, job, path):
         """
         :param Job job: the job whose return value this promise references
@@ -2857,8 +3160,8 @@ class Promise():
         Called during pickling when a promise (an instance of this class) is about to be be
         pickled. Returns the Promise class and construction arguments that will be evaluated
         during unpickling, namely the job store coordinates of a file that will hold the promised
-        return value. By the time the promise is about to be unpickled, that file should be
-        populated.
+        return value, and the path to it in that file. By the time the promise is about to be
+        unpickled, that file should be populated.
         """
         # The allocation of the file in the job store is intentionally lazy, we only allocate an
         # empty file in the job store if the promise is actually being pickled. This is done so
@@ -2866,11 +3169,10 @@ class Promise():
         jobStoreLocator, jobStoreFileID = self.job.registerPromise(self.path)
         # Returning a class object here causes the pickling machinery to attempt to instantiate
         # the class. We will catch that with __new__ and return an the actual return value instead.
-        return self.__class__, (jobStoreLocator, jobStoreFileID)
+        return self.__class__, (jobStoreLocator, jobStoreFileID, self.path)
 
     @staticmethod
     def __new__(cls, *args):
-        assert len(args) == 2
         if isinstance(args[0], Job):
             # Regular instantiation when promise is created, before it is being pickled
             return super().__new__(cls)
@@ -2879,17 +3181,30 @@ class Promise():
             return cls._resolve(*args)
 
     @classmethod
-    def _resolve(cls, jobStoreLocator, jobStoreFileID):
+    def _resolve(cls, jobStoreLocator, jobStoreFileID, path):
         # Initialize the cached job store if it was never initialized in the current process or
         # if it belongs to a different workflow that was run earlier in the current process.
         if cls._jobstore is None or cls._jobstore.config.jobStore != jobStoreLocator:
             cls._jobstore = Toil.resumeJobStore(jobStoreLocator)
-        cls.filesToDelete.add(jobStoreFileID)
-        with cls._jobstore.readFileStream(jobStoreFileID) as fileHandle:
-            # If this doesn't work then the file containing the promise may not exist or be
-            # corrupted
-            value = safeUnpickleFromStream(fileHandle)
-            return value
+            cls.forgetPromiseFiles()
+        if jobStoreFileID not in cls._promiseFiles:
+            with cls._jobstore.readFileStream(jobStoreFileID) as fileHandle:
+                # If this doesn't work then the file containing the promise may not exist or be
+                # corrupted
+                cls._promiseFiles[jobStoreFileID] = safeUnpickleFromStream(fileHandle)
+        inlineValues, valueFileIDs = cls._promiseFiles[jobStoreFileID]
+        if path in inlineValues:
+            return pickle.loads(inlineValues[path])
+        with cls._jobstore.readFileStream(valueFileIDs[path]) as fileHandle:
+            return safeUnpickleFromStream(fileHandle)
+
+    @classmethod
+    def forgetPromiseFiles(cls):
+        """
+        Drop the cached contents of promise files. Called when a job is done, since the values
+        in them are only needed while the jobs that use them are being loaded.
+        """
+        cls._promiseFiles = {}
 
 
 class PromisedRequirement():
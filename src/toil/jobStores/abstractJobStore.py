@@ -15,7 +15,9 @@ import shutil
 import re
 import pickle
 import logging
+import threading
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager, closing
 from datetime import timedelta
 from uuid import uuid4
@@ -476,36 +478,64 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
         if jobCache is None:
             logger.warning("Cleaning jobStore recursively. This may be slow.")
 
+        # Jobs we have loaded or checked on ourselves, when they aren't in the
+        # jobCache. Every description of a job we use comes from one place, so
+        # changes to it are never lost.
+        loadedJobs = {}
+        knownExistence = {}
+
         # Functions to get and check the existence of jobs, using the jobCache
         # if present
         def getJobDescription(jobId):
-            if jobCache is not None:
-                try:
-                    return jobCache[jobId]
-                except KeyError:
-                    return self.load(jobId)
-            else:
-                return self.load(jobId)
+            if jobCache is not None and jobId in jobCache:
+                return jobCache[jobId]
+            if jobId not in loadedJobs:
+                loadedJobs[jobId] = self.load(jobId)
+            return loadedJobs[jobId]
 
         def haveJob(jobId):
             assert len(jobId) > 1, "Job ID {} too short; is a string being used as a list?".format(jobId)
-            if jobCache is not None:
-                if jobId in jobCache:
-                    return True
-                else:
-                    return self.exists(jobId)
-            else:
-                return self.exists(jobId)
-                
-        def deleteJob(jobId):
-            if jobCache is not None:
-                if jobId in jobCache:
-                    del jobCache[jobId]
-            self.delete(jobId)
-            
+            if jobCache is not None and jobId in jobCache:
+                return True
+            if jobId in loadedJobs:
+                return True
+            if jobId not in knownExistence:
+                knownExistence[jobId] = self.exists(jobId)
+            return knownExistence[jobId]
+
+        def prefetchJobs(jobIds):
+            # Load all the given jobs we don't have yet in one go. The ones
+            # that don't come back don't exist.
+            jobIds = [jobId for jobId in jobIds if not ((jobCache is not None and jobId in jobCache) or
+                                                        jobId in loadedJobs or jobId in knownExistence)]
+            loaded = self.loadMany(jobIds)
+            loadedJobs.update(loaded)
+            for jobId in jobIds:
+                knownExistence[jobId] = jobId in loaded
+
+        def checkJobsExist(jobIds):
+            # Check on the existence of all the given jobs we aren't sure about
+            # in one go.
+            jobIds = [jobId for jobId in jobIds if not ((jobCache is not None and jobId in jobCache) or
+                                                        jobId in loadedJobs or jobId in knownExistence)]
+            knownExistence.update(self.existsMany(jobIds))
+
+        def deleteJobs(jobIds):
+            for jobId in jobIds:
+                if jobCache is not None:
+                    jobCache.pop(jobId, None)
+                loadedJobs.pop(jobId, None)
+                knownExistence[jobId] = False
+            self.deleteMany(jobIds)
+
+        # Jobs that need to be written back, by ID. They are written together
+        # at the end.
+        jobsToUpdate = {}
+
         def updateJobDescription(jobDescription):
-            jobCache[jobDescription.jobStoreID] = jobDescription
-            self.update(jobDescription)
+            if jobCache is not None:
+                jobCache[jobDescription.jobStoreID] = jobDescription
+            jobsToUpdate[jobDescription.jobStoreID] = jobDescription
 
         def getJobDescriptions():
             if jobCache is not None:
@@ -521,6 +551,10 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
             if jobDescription.jobStoreID in reachableFromRoot:
                 return
             reachableFromRoot.add(jobDescription.jobStoreID)
+            # Load all the successors together before traversing them
+            prefetchJobs([successorJobStoreID for jobs in jobDescription.stack for successorJobStoreID in jobs
+                          if successorJobStoreID not in reachableFromRoot])
+            checkJobsExist(jobDescription.services)
             # Traverse jobs in stack
             for jobs in jobDescription.stack:
                 for successorJobStoreID in jobs:
@@ -546,8 +580,8 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
                 logger.warning("Deleting file '%s'. It is marked for deletion but has not yet been "
                             "removed.", fileID)
                 self.deleteFile(fileID)
-            # Delete the job from us and the cache
-            deleteJob(jobDescription.jobStoreID)
+        # Delete the jobs from us and the cache
+        deleteJobs([jobDescription.jobStoreID for jobDescription in jobsToDelete])
 
         jobDescriptionsReachableFromRoot = {id: getJobDescription(id) for id in reachableFromRoot}
 
@@ -569,6 +603,18 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
                 updateJobDescription(jobDescription)
         for jobID in jobsDeletedByCheckpoints:
             del jobDescriptionsReachableFromRoot[jobID]
+            if jobCache is not None:
+                jobCache.pop(jobID, None)
+            loadedJobs.pop(jobID, None)
+            jobsToUpdate.pop(jobID, None)
+            knownExistence[jobID] = False
+
+        # Find out which successors and services still exist all at once,
+        # rather than one at a time as we go.
+        checkJobsExist([successorJobStoreID for jobDescription in jobDescriptionsReachableFromRoot.values()
+                        for jobs in jobDescription.stack for successorJobStoreID in jobs] +
+                       [serviceJobStoreID for jobDescription in jobDescriptionsReachableFromRoot.values()
+                        for serviceJobStoreID in jobDescription.services])
 
         # Clean up jobs that are in reachable from the root
         for jobDescription in jobDescriptionsReachableFromRoot.values():
@@ -670,15 +716,20 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
                 logger.critical("Repairing job: %s" % jobDescription.jobStoreID)
                 updateJobDescription(jobDescription)
 
-        # Remove any crufty stats/logging files from the previous run
-        logger.debug("Discarding old statistics and logs...")
-        # We have to manually discard the stream to avoid getting
-        # stuck on a blocking write from the job store.
-        def discardStream(stream):
-            """Read the stream 4K at a time until EOF, discarding all input."""
-            while len(stream.read(4096)) != 0:
-                pass
-        self.readStatsAndLogging(discardStream)
+        # Write back all the repaired jobs together
+        self.updateMany(list(jobsToUpdate.values()))
+
+        # Remove any crufty stats/logging files from the previous run. If we
+        # are keeping stats, the leader adds them to its summary instead.
+        if not self.config.stats:
+            logger.debug("Discarding old statistics and logs...")
+            # We have to manually discard the stream to avoid getting
+            # stuck on a blocking write from the job store.
+            def discardStream(stream):
+                """Read the stream 4K at a time until EOF, discarding all input."""
+                while len(stream.read(4096)) != 0:
+                    pass
+            self.readStatsAndLogging(discardStream)
 
         logger.debug("Job store is clean")
         # TODO: reloading of the rootJob may be redundant here
@@ -806,6 +857,126 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
         """
         raise NotImplementedError()
 
+    def existsMany(self, jobStoreIDs):
+        """
+        Indicates, for each of the given jobStoreIDs, whether a description of
+        the job exists in the job store.
+
+        The default implementation calls :meth:`exists` for each job. Job
+        stores that can check on many jobs in fewer requests should override
+        it.
+
+        :param list(str) jobStoreIDs: the IDs of the jobs to check for
+
+        :rtype: dict(str, bool)
+        """
+        return {jobStoreID: self.exists(jobStoreID) for jobStoreID in jobStoreIDs}
+
+    def loadMany(self, jobStoreIDs):
+        """
+        Loads the descriptions of all the given jobs that exist, as
+        :meth:`load` would. Jobs that do not exist are left out of the result,
+        instead of raising :class:`NoSuchJobException`.
+
+        The default implementation calls :meth:`exists` and :meth:`load` for
+        each job. Job stores that can load many jobs in fewer requests should
+        override it.
+
+        :param list(str) jobStoreIDs: the IDs of the jobs to load
+
+        :return: The loaded JobDescriptions, by job store ID.
+        :rtype: dict(str, toil.job.JobDescription)
+        """
+        jobs = {}
+        for jobStoreID in jobStoreIDs:
+            job = self._loadIfExists(jobStoreID)
+            if job is not None:
+                jobs[jobStoreID] = job
+        return jobs
+
+    def updateMany(self, jobDescriptions):
+        """
+        Persists changes to the state of all the given JobDescriptions, as
+        :meth:`update` would. Each update is atomic, but the batch as a whole
+        is not.
+
+        The default implementation calls :meth:`update` for each job. Job
+        stores that can write many jobs in fewer requests should override it.
+
+        :param list(toil.job.JobDescription) jobDescriptions: the jobs to write to this job store
+        """
+        for jobDescription in jobDescriptions:
+            self.update(jobDescription)
+
+    def deleteMany(self, jobStoreIDs):
+        """
+        Removes all the given JobDescriptions from the store, as :meth:`delete`
+        would. Deleting jobs that do not exist succeeds silently.
+
+        The default implementation calls :meth:`delete` for each job. Job
+        stores that can delete many jobs in fewer requests should override it.
+
+        :param list(str) jobStoreIDs: the IDs of the jobs to delete from this job store
+        """
+        for jobStoreID in jobStoreIDs:
+            self.delete(jobStoreID)
+
+    def _loadIfExists(self, jobStoreID):
+        """
+        Load the job with the given ID, or return None if it does not exist.
+
+        :rtype: toil.job.JobDescription
+        """
+        if not self.exists(jobStoreID):
+            return None
+        try:
+            return self.load(jobStoreID)
+        except NoSuchJobException:
+            # The job went away between the two calls, or we got a stale
+            # read saying it was there.
+            logger.warning('Job %s was reported to exist but could not be loaded', jobStoreID)
+            return None
+
+    # How many requests the *Many methods may have in flight at once, for job
+    # stores that implement them by running single requests concurrently.
+    maxConcurrentRequests = 16
+
+    # The threads those requests run on, made the first time they are needed
+    # and kept until shutdown() so that the leader's frequent small batches
+    # don't each start and stop their own.
+    _requestPool = None
+    _requestPoolLock = threading.Lock()
+
+    def _mapConcurrently(self, function, items):
+        """
+        Call the given function on each of the given items, on up to
+        maxConcurrentRequests threads, and return the results in order.
+
+        Any exception raised by a call is raised again here.
+
+        :rtype: list
+        """
+        items = list(items)
+        if len(items) <= 1:
+            # Not worth using any threads
+            return [function(item) for item in items]
+        if self._requestPool is None:
+            with self._requestPoolLock:
+                if self._requestPool is None:
+                    self._requestPool = ThreadPoolExecutor(max_workers=self.maxConcurrentRequests)
+        return list(self._requestPool.map(function, items))
+
+    def shutdown(self):
+        """
+        Stop the threads this instance uses to run requests concurrently, once
+        they have finished what they are running. The job store can still be
+        used afterwards, and will start them again if needed.
+        """
+        with self._requestPoolLock:
+            pool, self._requestPool = self._requestPool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
     def jobs(self):
         """
         Best effort attempt to return iterator on JobDescriptions for all jobs
@@ -1071,7 +1242,8 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
         raise NotImplementedError()
 
     @abstractmethod
-    def readStatsAndLogging(self, callback, readAll=False):
+    def readStatsAndLogging(self, callback, readAll=False, markRead=True, alreadyRead=(),
+                            beforeMarkingRead=None):
         """
         Reads stats/logging strings accumulated by the writeStatsAndLogging() method. For each
         stats/logging string this method calls the given callback function with an open,
@@ -1081,11 +1253,26 @@ class AbstractJobStore(with_metaclass(ABCMeta, object)):
         existing stats/logging strings, including the ones from a previous invocation of this
         method.
 
+        Unread stats/logging strings are marked as read in batches, each with an ID that is a
+        string. The IDs of a batch are passed to beforeMarkingRead before any of it is marked,
+        so that a caller can record that it has dealt with the batch. A caller that went away
+        before the batch was marked can pass those IDs back in as alreadyRead, and the batches
+        are then marked as read without being passed to the callback again.
+
         :param Callable callback: a function to be applied to each of the stats file handles found
 
         :param bool readAll: a boolean indicating whether to read the already processed stats files
                in addition to the unread stats files
 
+        :param bool markRead: if False, leave the unread stats/logging strings unread, so they
+               are processed again by the next invocation of this method
+
+        :param Container alreadyRead: IDs of batches of unread stats/logging strings to mark as
+               read without processing them
+
+        :param Callable beforeMarkingRead: a function to be called with the list of IDs of the
+               batches about to be marked as read, before any of them are
+
         :raise ConcurrentFileModificationException: if the file was modified concurrently during
                an invocation of this method
 
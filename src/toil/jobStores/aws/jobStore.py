@@ -22,20 +22,15 @@ from builtins import range
 from contextlib import contextmanager, closing
 import logging
 
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle
-
 import re
 import time
 import uuid
 import base64
 import hashlib
-import itertools
 import reprlib
 import urllib.parse
 import urllib.request, urllib.parse, urllib.error
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
 from toil.lib.memoize import strict_bool
@@ -67,8 +62,8 @@ from toil.jobStores.aws.utils import (SDBHelper,
                                       retryable_s3_errors,
                                       bucket_location_to_region,
                                       region_to_bucket_location, copyKeyMultipart,
-                                      uploadFromPath, chunkedFileUpload, fileSizeAndTime)
-from toil.jobStores.utils import WritablePipe, ReadablePipe, ReadableTransformingPipe
+                                      uploadFromPath, uploadParts, chunkedFileUpload, fileSizeAndTime)
+from toil.jobStores.utils import WritablePipe, ReadablePipe, ReadableTransformingPipe, JobDescriptionCodec
 import toil.lib.encryption as encryption
 from toil.lib.ec2nodes import EC2Regions
 
@@ -91,7 +86,7 @@ class AWSJobStore(AbstractJobStore):
     """
     A job store that uses Amazon's S3 for file storage and SimpleDB for storing job info and
     enforcing strong consistency on the S3 file storage. There will be SDB domains for jobs and
-    files and a versioned S3 bucket for file contents. Job objects are pickled, compressed,
+    files and a versioned S3 bucket for file contents. Job objects are serialized, compressed,
     partitioned into chunks of 1024 bytes and each chunk is stored as a an attribute of the SDB
     item representing the job. UUIDs are used to identify jobs and files.
     """
@@ -109,13 +104,15 @@ class AWSJobStore(AbstractJobStore):
     maxNameLen = 10
     nameSeparator = '--'
 
-    def __init__(self, locator, partSize=50 << 20):
+    def __init__(self, locator, partSize=None, transferConcurrency=None):
         """
         Create a new job store in AWS or load an existing one from there.
 
         :param int partSize: The size of each individual part used for multipart operations like
                upload and copy, must be >= 5 MiB but large enough to not exceed 10k parts for the
-               whole file
+               whole file. Defaults to the awsPartSize of the job store's config.
+        :param int transferConcurrency: The number of parts of a file to upload or download at
+               once. Defaults to the awsTransferConcurrency of the job store's config.
         """
         super(AWSJobStore, self).__init__()
         region, namePrefix = locator.split(':')
@@ -138,7 +135,8 @@ class AWSJobStore(AbstractJobStore):
         self.locator = locator
         self.region = region
         self.namePrefix = namePrefix
-        self.partSize = partSize
+        self._partSize = partSize
+        self._transferConcurrency = transferConcurrency
         self.jobsDomain = None
         self.filesDomain = None
         self.filesBucket = None
@@ -163,6 +161,26 @@ class AWSJobStore(AbstractJobStore):
     def sseKeyPath(self):
         return self.config.sseKey
 
+    @property
+    def partSize(self):
+        if self._partSize is None:
+            return 50 << 20 if self.config is None else self.config.awsPartSize
+        return self._partSize
+
+    @partSize.setter
+    def partSize(self, partSize):
+        self._partSize = partSize
+
+    @property
+    def transferConcurrency(self):
+        if self._transferConcurrency is None:
+            return 4 if self.config is None else self.config.awsTransferConcurrency
+        return self._transferConcurrency
+
+    @transferConcurrency.setter
+    def transferConcurrency(self, transferConcurrency):
+        self._transferConcurrency = transferConcurrency
+
     def resume(self):
         if not self._registered:
             raise NoSuchJobStoreException(self.locator)
@@ -272,13 +290,13 @@ class AWSJobStore(AbstractJobStore):
         else:
             binary, _ = SDBHelper.attributesToBinary(item)
             assert binary is not None
-        job = pickle.loads(binary)
+        job = JobDescriptionCodec.decode(binary)
         if job is not None:
             job.assignConfig(self.config)
         return job
 
     def _awsJobToItem(self, job):
-        binary = pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL)
+        binary = JobDescriptionCodec.encode(job)
         if len(binary) > SDBHelper.maxBinarySize(extraReservedChunks=1):
             # Store as an overlarge job in S3
             with self.writeFileStream() as (writable, fileID):
@@ -296,14 +314,7 @@ class AWSJobStore(AbstractJobStore):
     def batch(self):
         self._batchedUpdates = []
         yield
-        batches = [self._batchedUpdates[i:i + self.jobsPerBatchInsert] for i in
-                   range(0, len(self._batchedUpdates), self.jobsPerBatchInsert)]
-
-        for batch in batches:
-            items = {compat_bytes(jobDescription.jobStoreID): self._awsJobToItem(jobDescription) for jobDescription in batch}
-            for attempt in retry_sdb():
-                with attempt:
-                    assert self.jobsDomain.batch_put_attributes(items)
+        self.updateMany(self._batchedUpdates)
         self._batchedUpdates = None
 
     def assignID(self, jobDescription):
@@ -327,6 +338,77 @@ class AWSJobStore(AbstractJobStore):
                     attribute_name=[SDBHelper.presenceIndicator()],
                     consistent_read=True))
 
+    # SimpleDB allows at most this many values in the list for an "in" comparison
+    itemsPerSelect = 20
+
+    def _selectItems(self, domain, attributes, attribute, values):
+        """
+        Get the items in the given domain for which the given attribute has
+        one of the given values, in as few select requests as possible.
+
+        :param boto.sdb.domain.Domain domain: the domain to search
+        :param str attributes: the attributes to select, e.g. '*'
+        :param str attribute: the attribute to match, e.g. 'itemName()'
+        :param list(str) values: the values to match
+
+        :rtype: list(boto.sdb.item.Item)
+        """
+        values = list(values)
+        n = self.itemsPerSelect
+        results = []
+        for i in range(0, len(values), n):
+            query = "select %s from `%s` where %s in (%s)" % (
+                attributes, domain.name, attribute,
+                ', '.join("'%s'" % value for value in values[i:i + n]))
+            for attempt in retry_sdb():
+                with attempt:
+                    found = list(domain.select(consistent_read=True, query=query))
+            results.extend(found)
+        return results
+
+    def existsMany(self, jobStoreIDs):
+        jobStoreIDs = list(jobStoreIDs)
+        found = {item.name for item in self._selectItems(self.jobsDomain, 'itemName()', 'itemName()',
+                                                         jobStoreIDs)}
+        return {jobStoreID: jobStoreID in found for jobStoreID in jobStoreIDs}
+
+    def loadMany(self, jobStoreIDs):
+        jobs = {}
+        for item in self._selectItems(self.jobsDomain, '*', 'itemName()', jobStoreIDs):
+            job = self._awsJobFromItem(item)
+            if job is not None:
+                jobs[item.name] = job
+        log.debug("Loaded %d job(s)", len(jobs))
+        return jobs
+
+    def updateMany(self, jobDescriptions):
+        jobDescriptions = list(jobDescriptions)
+        n = self.jobsPerBatchInsert
+        for i in range(0, len(jobDescriptions), n):
+            items = {compat_bytes(jobDescription.jobStoreID): self._awsJobToItem(jobDescription)
+                     for jobDescription in jobDescriptions[i:i + n]}
+            log.debug("Updating %d job(s)", len(items))
+            for attempt in retry_sdb():
+                with attempt:
+                    assert self.jobsDomain.batch_put_attributes(items)
+
+    def deleteMany(self, jobStoreIDs):
+        jobStoreIDs = list(jobStoreIDs)
+        log.debug("Deleting %d job(s)", len(jobStoreIDs))
+        # Jobs that don't exist won't come back, so deleting them is a no-op.
+        items = self._selectItems(self.jobsDomain, 'overlargeID', 'itemName()', jobStoreIDs)
+        for item in items:
+            if item.get("overlargeID"):
+                log.debug("Deleting job %s from filestore", item.name)
+                self.deleteFile(item["overlargeID"])
+        n = self.itemsPerBatchDelete
+        for i in range(0, len(items), n):
+            itemsDict = {item.name: None for item in items[i:i + n]}
+            for attempt in retry_sdb():
+                with attempt:
+                    self.jobsDomain.batch_delete_attributes(itemsDict)
+        self._deleteFileItems(self._selectItems(self.filesDomain, 'version', 'ownerID', jobStoreIDs))
+
     def jobs(self):
         result = None
         for attempt in retry_sdb():
@@ -386,6 +468,16 @@ class AWSJobStore(AbstractJobStore):
         assert items is not None
         if items:
             log.debug("Deleting %d file(s) associated with job %s", len(items), jobStoreID)
+        self._deleteFileItems(items)
+
+    def _deleteFileItems(self, items):
+        """
+        Delete the files described by the given items from the files domain,
+        and their contents from the files bucket.
+
+        :param list(boto.sdb.item.Item) items: items holding at least the file's version
+        """
+        if items:
             n = self.itemsPerBatchDelete
             batches = [items[i:i + n] for i in range(0, len(items), n)]
             for batch in batches:
@@ -624,13 +716,19 @@ class AWSJobStore(AbstractJobStore):
             writeable.write(statsAndLoggingString)
         info.save()
 
-    def readStatsAndLogging(self, callback, readAll=False):
+    def readStatsAndLogging(self, callback, readAll=False, markRead=True, alreadyRead=(),
+                            beforeMarkingRead=None):
         itemsProcessed = 0
 
-        for info in self._readStatsAndLogging(callback, self.statsFileOwnerID):
-            info._ownerID = self.readStatsFileOwnerID
-            info.save()
-            itemsProcessed += 1
+        # Each stats file is a batch, with its file ID as its ID
+        unread = list(self._readStatsAndLogging(callback, self.statsFileOwnerID, alreadyRead))
+        itemsProcessed += sum(1 for info in unread if info.fileID not in alreadyRead)
+        if markRead and unread:
+            if beforeMarkingRead is not None:
+                beforeMarkingRead([info.fileID for info in unread])
+            for info in unread:
+                info._ownerID = self.readStatsFileOwnerID
+                info.save()
 
         if readAll:
             for _ in self._readStatsAndLogging(callback, self.readStatsFileOwnerID):
@@ -638,7 +736,7 @@ class AWSJobStore(AbstractJobStore):
 
         return itemsProcessed
 
-    def _readStatsAndLogging(self, callback, ownerId):
+    def _readStatsAndLogging(self, callback, ownerId, skip=()):
         items = None
         for attempt in retry_sdb():
             with attempt:
@@ -649,8 +747,9 @@ class AWSJobStore(AbstractJobStore):
         assert items is not None
         for item in items:
             info = self.FileInfo.fromItem(item)
-            with info.downloadStream() as readable:
-                callback(readable)
+            if info.fileID not in skip:
+                with info.downloadStream() as readable:
+                    callback(readable)
             yield info
 
     def getPublicUrl(self, jobStoreFileID):
@@ -850,7 +949,7 @@ class AWSJobStore(AbstractJobStore):
         """
 
         def __init__(self, fileID, ownerID, encrypted,
-                     version=None, content=None, numContentChunks=0,  checksum=None):
+                     version=None, content=None, numContentChunks=0,  checksum=None, partChecksums=None):
             """
             :type fileID: str
             :param fileID: the file's ID
@@ -876,6 +975,12 @@ class AWSJobStore(AbstractJobStore):
             :param checksum: the checksum of the file, if available. Formatted
             as <algorithm>$<lowercase hex hash>.
 
+            :type partChecksums: str|None
+            :param partChecksums: short checksums of each part of a file that
+            was uploaded in several parts, if available. Formatted as
+            <part size>$<hex hash of part 1><hex hash of part 2>..., with
+            partChecksumLength hex digits per part.
+
             inlined content. Note that an inlined empty string still occupies one chunk.
             """
             super(AWSJobStore.FileInfo, self).__init__()
@@ -886,6 +991,7 @@ class AWSJobStore(AbstractJobStore):
             self._previousVersion = version
             self._content = content
             self._checksum = checksum
+            self._partChecksums = partChecksums
             self._numContentChunks = numContentChunks
 
         @property
@@ -924,6 +1030,14 @@ class AWSJobStore(AbstractJobStore):
         def checksum(self, checksum):
             self._checksum = checksum
 
+        @property
+        def partChecksums(self):
+            return self._partChecksums
+
+        @partChecksums.setter
+        def partChecksums(self, partChecksums):
+            self._partChecksums = partChecksums
+
         @content.setter
         def content(self, content):
             assert content is None or isinstance(content, bytes)
@@ -1005,6 +1119,7 @@ class AWSJobStore(AbstractJobStore):
             else:
                 version = strOrNone(item['version'])
                 checksum = strOrNone(item.get('checksum'))
+                partChecksums = strOrNone(item.get('partChecksums'))
                 encrypted = strict_bool(encrypted)
                 content, numContentChunks = cls.attributesToBinary(item)
                 if encrypted:
@@ -1014,7 +1129,8 @@ class AWSJobStore(AbstractJobStore):
                     if content is not None:
                         content = encryption.decrypt(content, sseKeyPath)
                 self = cls(fileID=item.name, ownerID=ownerID, encrypted=encrypted, version=version,
-                           content=content, numContentChunks=numContentChunks, checksum=checksum)
+                           content=content, numContentChunks=numContentChunks, checksum=checksum,
+                           partChecksums=partChecksums)
                 return self
 
         def toItem(self):
@@ -1039,12 +1155,13 @@ class AWSJobStore(AbstractJobStore):
             attributes.update(dict(ownerID=self.ownerID,
                                    encrypted=self.encrypted,
                                    version=self.version or '',
-                                   checksum=self.checksum or ''))
+                                   checksum=self.checksum or '',
+                                   partChecksums=self.partChecksums or ''))
             return attributes, numChunks
 
         @classmethod
         def _reservedAttributes(cls):
-            return 3 + super(AWSJobStore.FileInfo, cls)._reservedAttributes()
+            return 5 + super(AWSJobStore.FileInfo, cls)._reservedAttributes()
 
         @staticmethod
         def maxInlinedSize():
@@ -1088,12 +1205,19 @@ class AWSJobStore(AbstractJobStore):
                     self.content = f.read()
                 # Clear out any old checksum in case of overwrite
                 self.checksum = ''
+                self.partChecksums = None
             else:
                 headers = self._s3EncryptionHeaders()
-                self.checksum = self._get_file_checksum(localFilePath) if calculateChecksum else None
-                self.version = uploadFromPath(localFilePath, partSize=self.outer.partSize,
+                partSize = self.outer.partSize
+                if calculateChecksum:
+                    self.checksum, self.partChecksums = self._get_file_checksums(localFilePath, partSize)
+                else:
+                    # Still record the part size of a file that goes up in parts
+                    self.checksum = None
+                    self.partChecksums = self._encode_part_checksums(partSize, [''] * -(-file_size // partSize))
+                self.version = uploadFromPath(localFilePath, partSize=partSize,
                                               bucket=self.outer.filesBucket, fileID=compat_bytes(self.fileID),
-                                              headers=headers)
+                                              headers=headers, concurrency=self.outer.transferConcurrency)
 
         def _start_checksum(self, to_match=None, algorithm='sha1'):
             """
@@ -1159,6 +1283,73 @@ class AWSJobStore(AbstractJobStore):
                     contents = f.read(1024 * 1024)
                 return self._finish_checksum(hasher)
 
+        partChecksumLength = 8
+        """
+        How many hex digits of each part's SHA1 hash to keep. They only have
+        to catch transfer errors, and have to fit in one SDB attribute.
+        """
+
+        def _get_file_checksums(self, localFilePath, partSize):
+            """
+            Checksum a file, and each part of it of the given size, in one pass.
+
+            :return: the file's checksum, and its part checksums as stored in
+                     partChecksums (or None if it has only one part or too
+                     many to store).
+            :rtype: (str, str|None)
+            """
+            with open(localFilePath, 'rb') as f:
+                hasher = self._start_checksum()
+                partHashes = []
+                while True:
+                    partHasher = hashlib.sha1()
+                    remaining = partSize
+                    while remaining > 0:
+                        contents = f.read(min(remaining, 1024 * 1024))
+                        if contents == b'':
+                            break
+                        self._update_checksum(hasher, contents)
+                        partHasher.update(contents)
+                        remaining -= len(contents)
+                    if remaining == partSize:
+                        # Nothing was left for this part
+                        break
+                    partHashes.append(partHasher.hexdigest())
+                    if remaining > 0:
+                        # That was the last part
+                        break
+                return self._finish_checksum(hasher), self._encode_part_checksums(partSize, partHashes)
+
+        def _encode_part_checksums(self, partSize, partHashes):
+            """
+            Format the given full hex hashes of a file's parts for partChecksums.
+
+            :return: the part checksums, or None if there aren't at least two
+                     parts. If they don't fit in an SDB attribute, just the
+                     part size, so downloads still know the file is in parts.
+            :rtype: str|None
+            """
+            if len(partHashes) < 2:
+                return None
+            encoded = '%d$%s' % (partSize, ''.join(h[:self.partChecksumLength] for h in partHashes))
+            if len(encoded) > self.maxValueSize:
+                return '%d$' % partSize
+            return encoded
+
+        def _decode_part_checksums(self):
+            """
+            :return: the part size the file was uploaded with and the short
+                     checksum of each part, or None and None if the file was
+                     not uploaded in parts that we know of. The list of
+                     checksums is empty if they didn't fit.
+            :rtype: (int|None, list[str]|None)
+            """
+            if not self.partChecksums:
+                return None, None
+            partSize, hashes = self.partChecksums.split('$')
+            n = self.partChecksumLength
+            return int(partSize), [hashes[i:i + n] for i in range(0, len(hashes), n)]
+
         @contextmanager
         def uploadStream(self, multipart=True, allowInlining=True):
             """
@@ -1185,11 +1376,26 @@ class AWSJobStore(AbstractJobStore):
                         info.content = buf
                         # There will be no checksum
                         info.checksum = ''
+                        info.partChecksums = None
                     else:
-                        # We will compute a checksum
+                        # We will compute a checksum, of the whole file and of
+                        # each part
                         hasher = info._start_checksum()
-                        info._update_checksum(hasher, buf)
-                    
+                        partHashes = []
+                        partSize = store.partSize
+
+                        def parts(buf):
+                            while True:
+                                info._update_checksum(hasher, buf)
+                                partHashes.append(hashlib.sha1(buf).hexdigest())
+                                yield buf
+                                # Get the next block of data we want to put
+                                buf = readable.read(partSize)
+                                assert isinstance(buf, bytes)
+                                if len(buf) == 0:
+                                    # Don't allow any part other than the very first to be empty.
+                                    break
+
                         headers = info._s3EncryptionHeaders()
                         for attempt in retry_s3():
                             with attempt:
@@ -1198,22 +1404,7 @@ class AWSJobStore(AbstractJobStore):
                                     key_name=compat_bytes(info.fileID),
                                     headers=headers)
                         try:
-                            for part_num in itertools.count():
-                                for attempt in retry_s3():
-                                    with attempt:
-                                        log.debug('Uploading part %d of %d bytes', part_num + 1, len(buf))
-                                        upload.upload_part_from_file(fp=BytesIO(buf),
-                                                                     # part numbers are 1-based
-                                                                     part_num=part_num + 1,
-                                                                     headers=headers)
-                                
-                                # Get the next block of data we want to put
-                                buf = readable.read(info.outer.partSize)
-                                assert isinstance(buf, bytes)
-                                if len(buf) == 0:
-                                    # Don't allow any part other than the very first to be empty.
-                                    break
-                                info._update_checksum(hasher, buf)
+                            uploadParts(upload, parts(buf), headers, store.transferConcurrency)
                         except:
                             with panic(log=log):
                                 for attempt in retry_s3():
@@ -1225,8 +1416,9 @@ class AWSJobStore(AbstractJobStore):
                                 log.warning('Versioning does not appear to be enabled yet. Deferring multipart upload completion...')
                                 time.sleep(1)
                                 
-                            # Save the checksum
+                            # Save the checksums
                             info.checksum = info._finish_checksum(hasher)
+                            info.partChecksums = info._encode_part_checksums(partSize, partHashes)
 
                             for attempt in retry_s3():
                                 with attempt:
@@ -1253,6 +1445,8 @@ class AWSJobStore(AbstractJobStore):
                     buf = readable.read()
                     assert isinstance(buf, bytes)
                     dataLength = len(buf)
+                    # There is only one part, so no part checksums
+                    info.partChecksums = None
                     if allowInlining and dataLength <= info.maxInlinedSize():
                         log.debug('Inlining content of %d bytes', len(buf))
                         info.content = buf
@@ -1321,6 +1515,8 @@ class AWSJobStore(AbstractJobStore):
             :param srcKey: The key that will be copied from
             """
             assert srcKey.size is not None
+            # We don't know the part checksums of what we copy
+            self.partChecksums = None
             if srcKey.size <= self.maxInlinedSize():
                 self.content = srcKey.get_contents_as_string()
             else:
@@ -1368,14 +1564,39 @@ class AWSJobStore(AbstractJobStore):
                         f.write(self.content)
             elif self.version:
                 headers = self._s3EncryptionHeaders()
-                key = self.outer.filesBucket.get_key(compat_bytes(self.fileID), validate=False)
+                store = self.outer
+                partSize, partChecksums = self._decode_part_checksums()
+                size = None
+                if partSize is not None:
+                    # It was uploaded in parts, so it is big enough to be worth
+                    # finding out exactly how big, to fetch the parts side by
+                    # side.
+                    for attempt in retry_s3():
+                        with attempt:
+                            size = store.filesBucket.get_key(compat_bytes(self.fileID), headers=headers,
+                                                             version_id=self.version).size
                 for attempt in retry_s3(predicate=lambda e: retryable_s3_errors(e) or isinstance(e, ChecksumError)):
                     with attempt:
                         with AtomicFileCreate(localFilePath) as tmpPath:
-                            key.get_contents_to_filename(tmpPath,
-                                                         version_id=self.version,
-                                                         headers=headers)
-                                                         
+                            if size is None or size <= partSize:
+                                key = store.filesBucket.get_key(compat_bytes(self.fileID), validate=False)
+                                key.get_contents_to_filename(tmpPath,
+                                                             version_id=self.version,
+                                                             headers=headers)
+                            else:
+                                # Fetch the parts side by side, straight into
+                                # their places in the file.
+                                with open(tmpPath, 'wb') as f:
+                                    f.truncate(size)
+                                starts = range(0, size, partSize)
+                                if not verifyChecksum or partChecksums is None or len(partChecksums) != len(starts):
+                                    partChecksums = [None] * len(starts)
+                                with ThreadPoolExecutor(max_workers=store.transferConcurrency) as executor:
+                                    for _ in executor.map(lambda args: self._download_part(tmpPath, *args),
+                                                          ((start, min(start + partSize, size), checksum)
+                                                           for start, checksum in zip(starts, partChecksums))):
+                                        pass
+
                         if verifyChecksum and self.checksum:
                             try:
                                 # This automatically compares the result and matches the algorithm.
@@ -1384,10 +1605,41 @@ class AWSJobStore(AbstractJobStore):
                                 # Annotate checksum mismatches with file name
                                 raise ChecksumError('Checksums do not match for file %s.' % localFilePath) from e
                                 # The error will get caught and result in a retry of the download until we run out of retries.
-                                # TODO: handle obviously truncated downloads by resuming instead.
             else:
                 assert False
 
+        def _download_part(self, localFilePath, start, end, checksum=None):
+            """
+            Download the given range of this file's current version into the
+            same range of the given local file, which must already be big
+            enough.
+
+            A part that arrives short or, if given its short checksum, corrupt,
+            is fetched again on its own.
+            """
+            headers = dict(self._s3EncryptionHeaders(), Range='bytes=%d-%d' % (start, end - 1))
+            for attempt in retry_s3(predicate=lambda e: retryable_s3_errors(e) or isinstance(e, ChecksumError)):
+                with attempt:
+                    # Keys hold the state of their responses, so each part needs its own.
+                    key = self.outer.filesBucket.get_key(compat_bytes(self.fileID), validate=False)
+                    with open(localFilePath, 'r+b') as f:
+                        f.seek(start)
+                        key.get_contents_to_file(f, headers=headers, version_id=self.version)
+                        if f.tell() != end:
+                            raise ChecksumError('Got %d bytes instead of %d for part at %d of file %s.' %
+                                                (f.tell() - start, end - start, start, localFilePath))
+                        if checksum is not None:
+                            f.seek(start)
+                            partHasher = hashlib.sha1()
+                            remaining = end - start
+                            while remaining > 0:
+                                contents = f.read(min(remaining, 1024 * 1024))
+                                partHasher.update(contents)
+                                remaining -= len(contents)
+                            if partHasher.hexdigest()[:len(checksum)] != checksum:
+                                raise ChecksumError('Checksum mismatch for part at %d of file %s.' %
+                                                    (start, localFilePath))
+
         @contextmanager
         def downloadStream(self, verifyChecksum=True):
             info = self
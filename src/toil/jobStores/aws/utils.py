@@ -18,8 +18,10 @@ import os
 import socket
 import logging
 import types
-import itertools
 import errno
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 
 from ssl import SSLError
 from six import iteritems
@@ -186,7 +188,7 @@ def fileSizeAndTime(localFilePath):
     return file_stat.st_size, file_stat.st_mtime
 
 
-def uploadFromPath(localFilePath, partSize, bucket, fileID, headers):
+def uploadFromPath(localFilePath, partSize, bucket, fileID, headers, concurrency=1):
     """
     Uploads a file to s3, using multipart uploading if applicable
 
@@ -195,6 +197,7 @@ def uploadFromPath(localFilePath, partSize, bucket, fileID, headers):
     :param boto.s3.Bucket bucket: the s3 bucket to upload to
     :param str fileID: the name of the file to upload to
     :param headers: http headers to use when uploading - generally used for encryption purposes
+    :param int concurrency: the maximum number of parts to upload at once
     :return: version of the newly uploaded file
     """
     file_size, file_time = fileSizeAndTime(localFilePath)
@@ -207,7 +210,7 @@ def uploadFromPath(localFilePath, partSize, bucket, fileID, headers):
         version = key.version_id
     else:
         with open(localFilePath, 'rb') as f:
-            version = chunkedFileUpload(f, bucket, fileID, file_size, headers, partSize)
+            version = chunkedFileUpload(f, bucket, fileID, file_size, headers, partSize, concurrency)
     for attempt in retry_s3():
         with attempt:
             key = bucket.get_key(compat_bytes(fileID),
@@ -219,26 +222,25 @@ def uploadFromPath(localFilePath, partSize, bucket, fileID, headers):
     return version
 
 
-def chunkedFileUpload(readable, bucket, fileID, file_size, headers=None, partSize=50 << 20):
-    for attempt in retry_s3():
-        with attempt:
-            upload = bucket.initiate_multipart_upload(
-                key_name=compat_bytes(fileID),
-                headers=headers)
-    try:
+def chunkedFileUpload(readable, bucket, fileID, file_size, headers=None, partSize=50 << 20, concurrency=1):
+    def parts():
         start = 0
-        part_num = itertools.count()
         while start < file_size:
             end = min(start + partSize, file_size)
             assert readable.tell() == start
-            for attempt in retry_s3():
-                with attempt:
-                    upload.upload_part_from_file(fp=readable,
-                                                 part_num=next(part_num) + 1,
-                                                 size=end - start,
-                                                 headers=headers)
+            buf = readable.read(end - start)
+            assert len(buf) == end - start
+            yield buf
             start = end
         assert readable.tell() == file_size == start
+
+    for attempt in retry_s3():
+        with attempt:
+            upload = bucket.initiate_multipart_upload(
+                key_name=compat_bytes(fileID),
+                headers=headers)
+    try:
+        uploadParts(upload, parts(), headers, concurrency)
     except:
         with panic(log=log):
             for attempt in retry_s3():
@@ -251,6 +253,40 @@ def chunkedFileUpload(readable, bucket, fileID, file_size, headers=None, partSiz
     return version
 
 
+def uploadParts(upload, parts, headers=None, concurrency=1):
+    """
+    Uploads the parts of a multipart upload, several at a time.
+
+    Parts are read from the given iterable only as fast as they can be
+    uploaded, so at most concurrency + 1 of them are held in memory.
+
+    :param boto.s3.multipart.MultiPartUpload upload: the upload to add the parts to
+    :param parts: iterable of the content of each part, as bytes, in order
+    :param headers: http headers to use when uploading - generally used for encryption purposes
+    :param int concurrency: the maximum number of parts to upload at once
+    :return: the number of parts uploaded
+    :rtype: int
+    """
+    def uploadPart(partNum, buf):
+        for attempt in retry_s3():
+            with attempt:
+                log.debug('Uploading part %d of %d bytes', partNum, len(buf))
+                upload.upload_part_from_file(fp=BytesIO(buf), part_num=partNum, headers=headers)
+
+    numParts = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        uploading = deque()
+        # part numbers are 1-based
+        for numParts, buf in enumerate(parts, 1):
+            uploading.append(executor.submit(uploadPart, numParts, buf))
+            while len(uploading) > concurrency:
+                # Don't read ahead any further than we can upload
+                uploading.popleft().result()
+        for future in uploading:
+            future.result()
+    return numParts
+
+
 def copyKeyMultipart(srcBucketName, srcKeyName, srcKeyVersion, dstBucketName, dstKeyName, sseAlgorithm=None, sseKey=None,
                      copySourceSseAlgorithm=None, copySourceSseKey=None):
     """
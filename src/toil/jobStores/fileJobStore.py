@@ -17,31 +17,34 @@ from __future__ import absolute_import
 from builtins import range
 
 # standard library
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+import fcntl
+import io
 import logging
 import random
 import shutil
+import socket
 import os
 import re
 import tempfile
+import threading
 import stat
 import errno
 import time
 import uuid
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle
-
 # toil dependencies
 from toil.fileStores import FileID
 from toil.lib.bioio import absSymPath
-from toil.lib.misc import robust_rmtree, AtomicFileCreate, atomic_copy, atomic_copyobj
+from toil.lib.misc import (robust_rmtree, AtomicFileCreate, atomic_copy, atomic_copyobj,
+                           copy_file_obj, open_mapped)
 from toil.jobStores.abstractJobStore import (AbstractJobStore,
                                              NoSuchJobException,
                                              NoSuchFileException,
                                              JobStoreExistsException,
                                              NoSuchJobStoreException)
+from toil.jobStores.utils import JobDescriptionCodec
 from toil.job import JobDescription, TemporaryID
 
 logger = logging.getLogger( __name__ )
@@ -69,6 +72,15 @@ class FileJobStore(AbstractJobStore):
     # 10Mb RAM chunks when reading/writing files
     BUFFER_SIZE = 10485760 # 10Mb
 
+    # First byte of a stats segment file that workers may still append to,
+    # and of one the leader has taken away from them.
+    STATS_SEGMENT_ACTIVE = b'A'
+    STATS_SEGMENT_SEALED = b'S'
+
+    # fcntl locks only keep out other processes, so threads in one process
+    # appending stats take turns on this.
+    _statsLock = threading.Lock()
+
     def __init__(self, path, fanOut=1000):
         """
         :param str path: Path to directory holding the job store
@@ -157,8 +169,7 @@ class FileJobStore(AbstractJobStore):
     def batch(self):
         self._batchedUpdates = []
         yield
-        for jobDescription in self._batchedUpdates:
-            self.update(jobDescription)
+        self.updateMany(self._batchedUpdates)
         self._batchedUpdates = None
 
     def _waitForExists(self, jobStoreID, maxTries=35, sleepTime=1):
@@ -218,7 +229,7 @@ class FileJobStore(AbstractJobStore):
         # Load a valid version of the job
         jobFile = self._getJobFileName(jobStoreID)
         with open(jobFile, 'rb') as fileHandle:
-            job = pickle.load(fileHandle)
+            job = JobDescriptionCodec.decode(fileHandle.read())
         
         # Pass along the current config, which is the JobStore's responsibility.
         job.assignConfig(self.config)
@@ -240,7 +251,7 @@ class FileJobStore(AbstractJobStore):
         # Atomicity guarantees use the fact the underlying file systems "move"
         # function is atomic.
         with open(self._getJobFileName(job.jobStoreID) + ".new", 'wb') as f:
-            pickle.dump(job, f)
+            f.write(JobDescriptionCodec.encode(job))
         # This should be atomic for the file system
         os.rename(self._getJobFileName(job.jobStoreID) + ".new", self._getJobFileName(job.jobStoreID))
 
@@ -254,22 +265,82 @@ class FileJobStore(AbstractJobStore):
             # Remove the job's directory itself.
             robust_rmtree(self._getJobDirFromId(jobStoreID))
 
+    def existsMany(self, jobStoreIDs):
+        jobStoreIDs = list(jobStoreIDs)
+        return dict(zip(jobStoreIDs, self._mapConcurrently(self.exists, jobStoreIDs)))
+
+    def loadMany(self, jobStoreIDs):
+        # Each job is its own file, so the best we can do is to overlap the
+        # file system round trips.
+        jobStoreIDs = list(jobStoreIDs)
+        return {jobStoreID: job for jobStoreID, job in zip(jobStoreIDs,
+                                                           self._mapConcurrently(self._loadIfExists, jobStoreIDs))
+                if job is not None}
+
+    def updateMany(self, jobDescriptions):
+        self._mapConcurrently(self.update, jobDescriptions)
+
+    def deleteMany(self, jobStoreIDs):
+        self._mapConcurrently(self.delete, jobStoreIDs)
+
+    # How many jobs jobs() loads in each batch
+    jobsPerLoadBatch = 100
+
     def jobs(self):
-        # Walk through list of temporary directories searching for jobs.
-        # Jobs are files that start with 'job'.
-        # Note that this also catches jobWhatever.new which exists if an update
-        # is in progress.
-        for tempDir in self._jobDirectories():
-            for i in os.listdir(tempDir):
-                if i.startswith(self.JOB_DIR_PREFIX):
-                    # This is a job instance directory
-                    jobId = self._getJobIdFromDir(os.path.join(tempDir, i))
-                    try:
-                        if self.exists(jobId):
-                            yield self.load(jobId)
-                    except NoSuchJobException:
-                        # An orphaned job may leave an empty or incomplete job file which we can safely ignore
-                        pass
+        # Walk through list of temporary directories searching for jobs, and
+        # load the jobs we find in batches. On a shared file system both are
+        # dominated by round trips to the server, so we scan directories and
+        # load batches concurrently, and hand back each batch of jobs as soon
+        # as it is loaded.
+        n = self.jobsPerLoadBatch
+        with ThreadPoolExecutor(max_workers=self.maxConcurrentRequests) as scanner, \
+                ThreadPoolExecutor(max_workers=self.maxConcurrentRequests) as loader:
+            loading = deque()
+            for jobIds in scanner.map(self._listJobDirectory, self._jobDirectories()):
+                for i in range(0, len(jobIds), n):
+                    loading.append(loader.submit(self._loadJobBatch, jobIds[i:i + n]))
+                # Hand back what is ready, and don't let too many loaded
+                # batches pile up in memory.
+                while loading and (loading[0].done() or len(loading) > 2 * self.maxConcurrentRequests):
+                    for job in loading.popleft().result():
+                        yield job
+            while loading:
+                for job in loading.popleft().result():
+                    yield job
+
+    def _listJobDirectory(self, tempDir):
+        """
+        Get the IDs of the jobs directly in the given directory of job
+        directories.
+
+        :param str tempDir: A directory from :meth:`_jobDirectories`.
+
+        :rtype: list(str)
+        """
+        try:
+            children = os.listdir(tempDir)
+        except OSError:
+            # Don't care if it is gone
+            return []
+        # Jobs are directories that start with JOB_DIR_PREFIX.
+        return [self._getJobIdFromDir(os.path.join(tempDir, i)) for i in children
+                if i.startswith(self.JOB_DIR_PREFIX)]
+
+    def _loadJobBatch(self, jobIds):
+        """
+        Load the jobs with the given IDs that exist.
+
+        :rtype: list(toil.job.JobDescription)
+        """
+        jobs = []
+        for jobId in jobIds:
+            try:
+                if self.exists(jobId):
+                    jobs.append(self.load(jobId))
+            except NoSuchJobException:
+                # An orphaned job may leave an empty or incomplete job file which we can safely ignore
+                pass
+        return jobs
 
     ##########################################
     # Functions that deal with temporary files associated with jobs
@@ -343,7 +414,7 @@ class FileJobStore(AbstractJobStore):
         
         # we use a ~10Mb buffer to improve speed
         with open(cls._extractPathFromUrl(url), 'rb') as readable:
-            shutil.copyfileobj(readable, writable, length=cls.BUFFER_SIZE)
+            copy_file_obj(readable, writable, length=cls.BUFFER_SIZE)
             # Return the number of bytes we read when we reached EOF.
             return readable.tell()
         
@@ -547,13 +618,16 @@ class FileJobStore(AbstractJobStore):
         # File objects are context managers (CM) so we could simply return what open returns.
         # However, it is better to wrap it in another CM so as to prevent users from accessing
         # the file object directly, without a with statement.
-        with open(self._getFilePathFromId(jobStoreFileID), 'wb') as f:
-            yield f
+        # The new contents replace the file atomically, so that readers with
+        # the file mapped into memory never see it truncated under them.
+        with AtomicFileCreate(self._getFilePathFromId(jobStoreFileID)) as tmpPath:
+            with open(tmpPath, 'wb') as f:
+                yield f
 
     @contextmanager
     def readFileStream(self, jobStoreFileID):
         self._checkJobStoreFileID(jobStoreFileID)
-        with open(self._getFilePathFromId(jobStoreFileID), 'rb') as f:
+        with open_mapped(self._getFilePathFromId(jobStoreFileID)) as f:
             yield f
 
     ##########################################
@@ -585,30 +659,76 @@ class FileJobStore(AbstractJobStore):
                 raise
 
     def writeStatsAndLogging(self, statsAndLoggingString):
-        # Temporary files are placed in the stats directory tree
-        tempStatsFileName = "stats" + str(uuid.uuid4().hex) + ".new"
-        tempStatsFile = os.path.join(self._getArbitraryStatsDir(), tempStatsFileName)
-        writeFormat = 'w' if isinstance(statsAndLoggingString, str) else 'wb'
-        with open(tempStatsFile, writeFormat) as f:
-            f.write(statsAndLoggingString)
-        os.rename(tempStatsFile, tempStatsFile[:-4])  # This operation is atomic
-
-    def readStatsAndLogging(self, callback, readAll=False):
-        numberOfFilesProcessed = 0
-        for tempDir in self._statsDirectories():
-            for tempFile in os.listdir(tempDir):
-                if tempFile.startswith('stats'):
-                    absTempFile = os.path.join(tempDir, tempFile)
-                    if os.path.isfile(absTempFile):
-                        if readAll or not tempFile.endswith('.new'):
-                            with open(absTempFile, 'rb') as fH:
-                                callback(fH)
-                            numberOfFilesProcessed += 1
-                            newName = tempFile.rsplit('.', 1)[0] + '.new'
-                            newAbsTempFile = os.path.join(tempDir, newName)
-                            # Mark this item as read
-                            os.rename(absTempFile, newAbsTempFile)
-        return numberOfFilesProcessed
+        # Every process on a node appends to the same segment file, so the
+        # leader has one file per node to collect instead of one per message.
+        if isinstance(statsAndLoggingString, str):
+            statsAndLoggingString = statsAndLoggingString.encode('utf-8')
+        record = b'%d\n' % len(statsAndLoggingString) + statsAndLoggingString
+        with self._statsLock:
+            while True:
+                fd = os.open(self._getStatsSegmentPath(), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o666)
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX)
+                    state = os.pread(fd, 1, 0)
+                    if state == self.STATS_SEGMENT_SEALED:
+                        # The leader took this segment after we opened it.
+                        # Start or join the next one.
+                        continue
+                    data = record if state else self.STATS_SEGMENT_ACTIVE + record
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(fd, view):]
+                    return
+                finally:
+                    # Closing the file releases our lock on it
+                    os.close(fd)
+
+    def readStatsAndLogging(self, callback, readAll=False, markRead=True, alreadyRead=(),
+                            beforeMarkingRead=None):
+        numberOfRecordsProcessed = 0
+        # Take each node's segment away from the workers appending to it. We
+        # don't have to wait for them, and they will start a new one.
+        for name in os.listdir(self.statsDir):
+            if name.endswith('.active'):
+                path = os.path.join(self.statsDir, name)
+                try:
+                    if os.path.getsize(path) == 0:
+                        continue
+                    os.rename(path, '%s.%s.reading' % (path[:-len('.active')], uuid.uuid4().hex))
+                except FileNotFoundError:
+                    # Someone else took it
+                    pass
+        # Segments being read may also have been left by a leader that went
+        # away in the middle. Each segment is a batch, with its name as its ID.
+        segments = []
+        for name in sorted(os.listdir(self.statsDir)):
+            path = os.path.join(self.statsDir, name)
+            if name.endswith('.reading'):
+                segment = name[:-len('.reading')]
+                if segment in alreadyRead:
+                    segments.append(segment)
+                    continue
+                try:
+                    self._sealStatsSegment(path)
+                    numberOfRecordsProcessed += self._readStatsSegment(path, callback)
+                except FileNotFoundError:
+                    if markRead:
+                        raise
+                    # The leader marked it as read while we were looking, and
+                    # any summary we were given predates that.
+                    numberOfRecordsProcessed += self._readStatsSegment(
+                        os.path.join(self.statsDir, segment + '.read'), callback)
+                    continue
+                segments.append(segment)
+            elif readAll and name.endswith('.read'):
+                numberOfRecordsProcessed += self._readStatsSegment(path, callback)
+        if markRead and segments:
+            if beforeMarkingRead is not None:
+                beforeMarkingRead(segments)
+            for segment in segments:
+                path = os.path.join(self.statsDir, segment)
+                os.rename(path + '.reading', path + '.read')
+        return numberOfRecordsProcessed
 
     ##########################################
     # Private methods
@@ -749,17 +869,58 @@ class FileJobStore(AbstractJobStore):
             # Just go in the root
             return self._getDynamicSprayDir(os.path.join(self.jobsDir, self.JOB_NAME_DIR_PREFIX + jobNameSlug))
 
-    def _getArbitraryStatsDir(self):
+    def _getStatsSegmentPath(self):
         """
-        Gets a temporary directory in a multi-level hierarchy in self.statsDir.
-        The directory is not unique and may already have other stats files in it.
+        Get the path to the stats segment file that processes on this node
+        append to.
 
-        :rtype : string, path to temporary directory in which to place files/directories.
+        :rtype : string
+        """
+        node = re.sub('[^A-Za-z0-9_.-]', '_', socket.gethostname())
+        return os.path.join(self.statsDir, 'stats-%s.active' % node)
 
+    def _sealStatsSegment(self, path):
+        """
+        Mark a stats segment file that has been taken away from the workers as
+        sealed, after any appends to it that are in progress. Nothing will be
+        appended to it afterwards.
 
+        :param str path: path to the segment file
         """
+        fd = os.open(path, os.O_RDWR)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            if os.pread(fd, 1, 0) != self.STATS_SEGMENT_SEALED:
+                os.pwrite(fd, self.STATS_SEGMENT_SEALED, 0)
+        finally:
+            os.close(fd)
 
-        return self._getDynamicSprayDir(self.statsDir)
+    def _readStatsSegment(self, path, callback):
+        """
+        Call the callback with a readable file handle for each stats/logging
+        string in a sealed segment file, holding only one in memory at a time.
+
+        :param str path: path to the segment file
+        :param Callable callback: function to call with each file handle
+
+        :rtype : int, the number of stats/logging strings read
+        """
+        count = 0
+        with open(path, 'rb') as f:
+            # Skip the state byte
+            f.read(1)
+            while True:
+                header = f.readline()
+                if not header:
+                    break
+                size = int(header)
+                data = f.read(size)
+                if len(data) != size:
+                    logger.warning('Stats file %s ends in the middle of a message.', path)
+                    break
+                callback(io.BytesIO(data))
+                count += 1
+        return count
 
     def _getArbitraryFilesDir(self):
         """
@@ -883,15 +1044,6 @@ class FileJobStore(AbstractJobStore):
                     yield inner
 
 
-    def _statsDirectories(self):
-        """
-        :rtype : an iterator to the temporary directories containing stats
-                 files. They may also contain directories containing more
-                 stats files.
-        """
-
-        return self._walkDynamicSprayDir(self.statsDir)
-
     def _getUniqueFilePath(self, fileName, jobStoreID=None, cleanup=False):
         """
         Create unique file name within a jobStore directory or tmp directory.
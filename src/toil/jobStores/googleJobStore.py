@@ -17,7 +17,6 @@ import uuid
 import logging
 import time
 import os
-from toil import pickle
 from toil.lib.misc import AtomicFileCreate
 from toil.lib.retry import old_retry
 from toil.lib.compatibility import compat_bytes
@@ -31,7 +30,7 @@ from six.moves import StringIO
 from toil.jobStores.abstractJobStore import (AbstractJobStore, NoSuchJobException,
                                              NoSuchFileException, NoSuchJobStoreException,
                                              JobStoreExistsException)
-from toil.jobStores.utils import WritablePipe, ReadablePipe
+from toil.jobStores.utils import WritablePipe, ReadablePipe, JobDescriptionCodec
 from toil.job import JobDescription
 log = logging.getLogger(__name__)
 
@@ -177,7 +176,7 @@ class GoogleJobStore(AbstractJobStore):
 
     def create(self, jobDescription):
         # TODO: we don't implement batching, but we probably should.
-        self._writeString(jobDescription.jobStoreID, pickle.dumps(jobDescription, protocol=pickle.HIGHEST_PROTOCOL))
+        self._writeString(jobDescription.jobStoreID, JobDescriptionCodec.encode(jobDescription))
         return jobDescription
 
     @googleRetry
@@ -199,7 +198,7 @@ class GoogleJobStore(AbstractJobStore):
             jobString = self._readContents(jobStoreID)
         except NoSuchFileException:
             raise NoSuchJobException(jobStoreID)
-        job = pickle.loads(jobString) 
+        job = JobDescriptionCodec.decode(jobString)
         # It is our responsibility to make sure that the JobDescription is
         # connected to the current config on this machine, for filling in
         # defaults. The leader and worker should never see config-less
@@ -208,7 +207,7 @@ class GoogleJobStore(AbstractJobStore):
         return job
 
     def update(self, job):
-        self._writeString(job.jobStoreID, pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL), update=True)
+        self._writeString(job.jobStoreID, JobDescriptionCodec.encode(job), update=True)
 
     @googleRetry
     def delete(self, jobStoreID):
@@ -218,6 +217,28 @@ class GoogleJobStore(AbstractJobStore):
         for blob in self.bucket.list_blobs(prefix=compat_bytes(jobStoreID)):
             self._delete(blob.name)
 
+    def existsMany(self, jobStoreIDs):
+        jobStoreIDs = list(jobStoreIDs)
+        return dict(zip(jobStoreIDs, self._mapConcurrently(self.exists, jobStoreIDs)))
+
+    def loadMany(self, jobStoreIDs):
+        def tryLoad(jobStoreID):
+            # Each job is its own blob, and fetching a missing blob is how we
+            # find out it doesn't exist, so don't check first.
+            try:
+                return self.load(jobStoreID)
+            except NoSuchJobException:
+                return None
+        jobStoreIDs = list(jobStoreIDs)
+        return {jobStoreID: job for jobStoreID, job in zip(jobStoreIDs, self._mapConcurrently(tryLoad, jobStoreIDs))
+                if job is not None}
+
+    def updateMany(self, jobDescriptions):
+        self._mapConcurrently(self.update, jobDescriptions)
+
+    def deleteMany(self, jobStoreIDs):
+        self._mapConcurrently(self.delete, jobStoreIDs)
+
     def getEnv(self):
         """
         Return a dict of environment variables to send out to the workers
@@ -365,32 +386,43 @@ class GoogleJobStore(AbstractJobStore):
             f.write(statsAndLoggingString)
 
     @googleRetry
-    def readStatsAndLogging(self, callback, readAll=False):
+    def readStatsAndLogging(self, callback, readAll=False, markRead=True, alreadyRead=(),
+                            beforeMarkingRead=None):
         prefix = self.readStatsBaseID if readAll else self.statsBaseID
         filesRead = 0
         lastTry = False
 
         while True:
             filesReadThisLoop = 0
+            # Each stats file is a batch, with its blob name as its ID
+            unread = []
             # prefix seems broken
             for blob in self.bucket.list_blobs(prefix=compat_bytes(prefix)):
+                if not readAll and blob.name in alreadyRead:
+                    unread.append(blob)
+                    continue
                 try:
                     with self.readSharedFileStream(blob.name) as readable:
                         log.debug("Reading stats file: %s", blob.name)
                         callback(readable)
                         filesReadThisLoop += 1
                     if not readAll:
-                        # rename this file by copying it and deleting the old version to avoid
-                        # rereading it
-                        newID = self.readStatsBaseID + blob.name[len(self.statsBaseID):]
-                        # NOTE: just copies then deletes old.
-                        self.bucket.rename_blob(blob, compat_bytes(newID))
+                        unread.append(blob)
                 except NoSuchFileException:
                     log.debug("Stats file not found: %s", blob.name)
-            if readAll:
+            if markRead and unread:
+                if beforeMarkingRead is not None:
+                    beforeMarkingRead([blob.name for blob in unread])
+                for blob in unread:
+                    # rename this file by copying it and deleting the old version to avoid
+                    # rereading it
+                    newID = self.readStatsBaseID + blob.name[len(self.statsBaseID):]
+                    # NOTE: just copies then deletes old.
+                    self.bucket.rename_blob(blob, compat_bytes(newID))
+            if readAll or not markRead:
                 # The readAll parameter is only by the toil stats util after the completion of the
                 # pipeline. Assume that this means the bucket is in a consistent state when readAll
-                # is passed.
+                # is passed. Files we leave unread would just be listed again.
                 return filesReadThisLoop
             if filesReadThisLoop == 0:
                 # Listing is unfortunately eventually consistent so we can't be 100% sure there
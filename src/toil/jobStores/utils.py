@@ -6,7 +6,9 @@ import errno
 from abc import ABCMeta
 from abc import abstractmethod
 
+from toil import pickle
 from toil.lib.threading import ExceptionalThread
+from toil.job import JobDescription, ServiceJobDescription, CheckpointJobDescription
 from future.utils import with_metaclass
 
 log = logging.getLogger(__name__)
@@ -294,3 +296,101 @@ class ReadableTransformingPipe(ReadablePipe):
     
     
 
+
+
+class JobDescriptionCodec(object):
+    """
+    Compact, versioned serialization for JobDescriptions, for job stores to use
+    instead of pickling them.
+
+    A record starts with a magic number, a format version and a byte saying
+    which JobDescription class it holds. After that comes a flat tuple
+    alternating between attribute names and attribute values, with the
+    attribute names every JobDescription has replaced by small numbers. The
+    config is never stored. Descriptions of classes the format doesn't know
+    are pickled whole.
+
+    The tuple itself is pickled, so this is still pickle underneath. The
+    header and numbered names keep the JobDescription class and its attribute
+    layout out of the pickle, but the values are pickled as they are. Values
+    that are instances of other classes, such as FileIDs or anything other
+    code has set on a JobDescription, are stored by reference to their class
+    and need that class to load, just as a plain pickle would.
+
+    Records written as plain pickles by earlier versions of Toil can still be
+    read.
+
+    >>> desc = JobDescription(requirements={'memory': 100, 'cores': 1}, jobName='hello', command='echo')
+    >>> desc.jobStoreID = 'job1'
+    >>> desc.addChild('job2')
+    >>> copy = JobDescriptionCodec.decode(JobDescriptionCodec.encode(desc))
+    >>> type(copy).__name__, copy.jobStoreID, copy.command, copy.childIDs, copy.requirements
+    ('JobDescription', 'job1', 'echo', {'job2'}, {'memory': 100, 'cores': 1})
+    >>> JobDescriptionCodec.decode(pickle.dumps(desc)).jobName
+    'hello'
+    """
+
+    magic = b'TJD'
+    version = 1
+
+    # The JobDescription classes we know how to store, by the number we store
+    # for them. Only ever append to this.
+    classes = (JobDescription, ServiceJobDescription, CheckpointJobDescription)
+
+    # The attribute names we store as numbers, by number minus one. Only ever
+    # append to this.
+    attributeNames = ('_requirementOverrides', 'jobName', 'unitName', 'displayName', 'jobStoreID',
+                      'command', '_remainingTryCount', 'filesToDelete', 'jobsToDelete',
+                      'predecessorNumber', 'predecessorsFinished', 'childIDs', 'followOnIDs',
+                      'serviceTree', 'logJobStoreFileID', 'terminateJobStoreID', 'startJobStoreID',
+                      'errorJobStoreID', 'checkpoint', 'checkpointFilesToDelete', 'chainedJobs')
+    attributeNumbers = {name: i + 1 for i, name in enumerate(attributeNames)}
+
+    @classmethod
+    def encode(cls, jobDescription):
+        """
+        Serialize the given JobDescription.
+
+        :param toil.job.JobDescription jobDescription: the JobDescription to serialize
+
+        :rtype: bytes
+        """
+        if type(jobDescription) not in cls.classes:
+            # Something we don't know the layout of; just pickle it.
+            return pickle.dumps(jobDescription, protocol=pickle.HIGHEST_PROTOCOL)
+        header = cls.magic + bytes((cls.version, cls.classes.index(type(jobDescription))))
+        flat = []
+        for name, value in jobDescription.__getstate__().items():
+            if name == '_config':
+                continue
+            flat.append(cls.attributeNumbers.get(name, name))
+            flat.append(value)
+        return header + pickle.dumps(tuple(flat), protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Deserialize a JobDescription serialized with :meth:`encode`, or
+        pickled. No config is assigned to it.
+
+        :param bytes data: the serialized JobDescription
+
+        :rtype: toil.job.JobDescription
+        """
+        if not data.startswith(cls.magic):
+            # This is a pickle, from an older Toil or of a class we don't know.
+            return pickle.loads(data)
+        headerSize = len(cls.magic) + 2
+        version, classNumber = data[len(cls.magic):headerSize]
+        if version > cls.version:
+            raise RuntimeError('JobDescription was stored in format version %d, but this version of '
+                               'Toil only understands up to version %d' % (version, cls.version))
+        jobClass = cls.classes[classNumber]
+        flat = pickle.loads(data[headerSize:])
+        state = {'_config': None}
+        for i in range(0, len(flat), 2):
+            name = flat[i]
+            state[cls.attributeNames[name - 1] if type(name) is int else name] = flat[i + 1]
+        jobDescription = jobClass.__new__(jobClass)
+        jobDescription.__setstate__(state)
+        return jobDescription
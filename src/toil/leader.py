@@ -38,8 +38,7 @@ try:
 except ImportError:
     # CWL extra not installed
     CWL_INTERNAL_JOBS = ()
-from toil.batchSystems.abstractBatchSystem import BatchJobExitReason
-from toil.jobStores.abstractJobStore import NoSuchJobException
+from toil.batchSystems.abstractBatchSystem import BatchJobExitReason, UpdatedBatchJobInfo
 from toil.batchSystems import DeadlockException
 from toil.lib.throttle import LocalThrottle
 from toil.provisioners.clusterScaler import ScalerThread
@@ -167,7 +166,7 @@ class Leader(object):
             self.clusterScaler = ScalerThread(self.provisioner, self, self.config)
 
         # A service manager thread to start and terminate services
-        self.serviceManager = ServiceManager(jobStore, self.toilState)
+        self.serviceManager = ServiceManager(jobStore, self.toilState, batchSystem)
 
         # A thread to manage the aggregation of statistics and logging from the run
         self.statsAndLogging = StatsAndLogging(self.jobStore, self.config)
@@ -187,6 +186,13 @@ class Leader(object):
         self.deadlockThrottler = LocalThrottle(self.config.deadlockCheckInterval)
         
         self.statusThrottler = LocalThrottle(self.config.statusWait)
+
+        # How long the main loop may block on the batch system when there is
+        # nothing else to do. Completed jobs cut the wait short.
+        self.batchSystemIdleWait = 2
+        # How long it may block while services are starting, since their
+        # transitions don't come through the batch system.
+        self.serviceTransitionWait = 0.1
         
         # For fancy console UI, we use an Enlighten counter that displays running / queued jobs
         # This gets filled in in run() and updated periodically.
@@ -340,7 +346,7 @@ class Leader(object):
         successor = self.toilState.jobsToBeScheduledWithMultiplePredecessors[successor.jobStoreID]
 
         # Add the predecessor as a finished predecessor to the successor
-        successor.predecessorsFinished.add(predecessor.jobStoreID)
+        successor.addFinishedPredecessor(predecessor.jobStoreID)
 
         # If the successor is in the set of successors of failed jobs
         if successor.jobStoreID in self.toilState.failedSuccessors:
@@ -393,18 +399,29 @@ class Leader(object):
         assert predecessor.jobStoreID not in self.toilState.successorCounts, 'Attempted to schedule successors of the same job twice!'
         self.toilState.successorCounts[predecessor.jobStoreID] = len(predecessor.stack[-1])
 
+        # Load all the successors at once
+        successorIDs = list(predecessor.stack[-1])
+        loaded = self.jobStore.loadMany(successorIDs)
+
         # For each successor schedule if all predecessors have been completed
         successors = []
-        for successorID in predecessor.stack[-1]:
-            try:
-                successor = self.jobStore.load(successorID)
-            except NoSuchJobException:
+        for successorID in successorIDs:
+            successor = loaded.get(successorID)
+            if successor is None:
                 # Job already done and gone
                 logger.warning("Job %s is a successor of %s but is already done and gone.", successorID, predecessor.jobStoreID)
                 # Don't try and run it
                 continue
             if self._makeJobSuccessorReadyToRun(successor, predecessor):
-                successors.append(successor)
+                if successor.logJobStoreFileID is not None:
+                    # A worker ran this successor itself, after the job it
+                    # was issued for, and it failed there. The worker has
+                    # already charged it a try, so just decide whether to run
+                    # it again, as for any job that failed.
+                    self._reportJobLogFile(successor)
+                    self.toilState.updatedJobs[successor.jobStoreID] = (successor, 1)
+                else:
+                    successors.append(successor)
         self.issueJobs(successors)
 
     def _processFailedSuccessors(self, predecessor):
@@ -563,18 +580,25 @@ class Leader(object):
                 # Mark the service job updated so we don't stop here.
                 self.toilState.updatedJobs[jobDesc.jobStoreID] = (jobDesc, 1)
     
-    def _gatherUpdatedJobs(self, updatedJobTuple):
-        """Gather any new, updated JobDescriptions from the batch system"""
-        jobID, exitStatus, exitReason, wallTime = (
-            updatedJobTuple.jobID, updatedJobTuple.exitStatus, updatedJobTuple.exitReason,
-            updatedJobTuple.wallTime)
-        # easy, track different state
-        try:
-            updatedJob = self.jobBatchSystemIDToIssuedJob[jobID]
-        except KeyError:
-            logger.warning("A result seems to already have been processed "
-                        "for job %s", jobID)
-        else:
+    def _gatherUpdatedJobs(self, updatedJobTuples):
+        """
+        Gather any new, updated JobDescriptions from the batch system, and
+        process them together.
+
+        :param list(toil.batchSystems.abstractBatchSystem.UpdatedBatchJobInfo) updatedJobTuples:
+               The updates from the batch system.
+        """
+        finishedJobTuples = []
+        finishedJobIDs = set()
+        for updatedJobTuple in updatedJobTuples:
+            jobID, exitStatus, exitReason = (
+                updatedJobTuple.jobID, updatedJobTuple.exitStatus, updatedJobTuple.exitReason)
+            # easy, track different state
+            updatedJob = self.jobBatchSystemIDToIssuedJob.get(jobID)
+            if updatedJob is None or jobID in finishedJobIDs:
+                logger.warning("A result seems to already have been processed "
+                            "for job %s", jobID)
+                continue
             if exitStatus == 0 and exitReason == None:
                 cur_logger = (logger.debug if str(updatedJob.jobName).startswith(CWL_INTERNAL_JOBS)
                               else logger.info)
@@ -584,7 +608,30 @@ class Leader(object):
                                exitStatus, updatedJob)
             if self.toilMetrics:
                 self.toilMetrics.logCompletedJob(updatedJob)
-            self.processFinishedJob(jobID, exitStatus, wallTime=wallTime, exitReason=exitReason)
+            finishedJobTuples.append(updatedJobTuple)
+            finishedJobIDs.add(jobID)
+        self.processFinishedJobs(finishedJobTuples)
+
+    def _getBatchSystemWait(self):
+        """
+        Work out how long the main loop can block waiting on the batch system.
+
+        Completions wake us up as soon as the batch system has them, but ready
+        jobs and service transitions arrive elsewhere, so we must not sleep
+        through them.
+
+        :return: Time in seconds to wait for the batch system.
+        :rtype: float
+        """
+        if self.toilState.updatedJobs or self.serviceManager.hasPendingTransitions():
+            # There is already work to do; just collect what is ready.
+            return 0
+        if self.serviceManager.jobsIssuedToServiceManager > 0:
+            # Services are starting. We can't block on the service manager and
+            # the batch system together, so look in on the service manager often.
+            return self.serviceTransitionWait
+        # Nothing can happen except through the batch system.
+        return self.batchSystemIdleWait
 
     def _processLostJobs(self):
         """Process jobs that have gone awry"""
@@ -622,10 +669,11 @@ class Leader(object):
             self._processJobsWithRunningServices()
             self._processJobsWithFailedServices()
 
-            # check in with the batch system
-            updatedJobTuple = self.batchSystem.getUpdatedBatchJob(maxWait=2)
-            if updatedJobTuple is not None:
-                self._gatherUpdatedJobs(updatedJobTuple)
+            # check in with the batch system, collecting every update it has
+            # for us instead of just one
+            updatedJobTuples = self.batchSystem.getUpdatedBatchJobs(maxWait=self._getBatchSystemWait())
+            if updatedJobTuples:
+                self._gatherUpdatedJobs(updatedJobTuples)
             else:
                 # If nothing is happening, see if any jobs have wandered off
                 self._processLostJobs()
@@ -878,13 +926,11 @@ class Leader(object):
         if len(jobsToKill) > 0:
             # Kill the jobs with the batch system. They will now no longer come in as updated.
             self.batchSystem.killBatchJobs(jobsToKill)
-            for jobBatchSystemID in jobsToKill:
-                # Reissue immediately, noting that we killed the job
-                willRerun = self.processFinishedJob(jobBatchSystemID, 1, exitReason=BatchJobExitReason.KILLED)
-                
-                if willRerun:
-                    # Compose a list of all the jobs that will run again
-                    jobsRerunning.append(jobBatchSystemID)
+            # Reissue immediately, noting that we killed the jobs
+            jobsRerunning = self.processFinishedJobs([UpdatedBatchJobInfo(jobID=jobBatchSystemID, exitStatus=1,
+                                                                          exitReason=BatchJobExitReason.KILLED,
+                                                                          wallTime=None)
+                                                      for jobBatchSystemID in jobsToKill])
         
         return jobsRerunning
                     
@@ -962,38 +1008,69 @@ class Leader(object):
         Return True if the job is going to run again, and False if the job is
         fully done or completely failed.
         """
-        issuedJob = self.removeJob(batchSystemID)
+        return len(self.processFinishedJobs([UpdatedBatchJobInfo(jobID=batchSystemID, exitStatus=resultStatus,
+                                                                 exitReason=exitReason, wallTime=wallTime)])) > 0
+
+    def processFinishedJobs(self, updatedJobTuples):
+        """
+        Function reads the processed JobDescription files for a batch of
+        finished jobs, reloading them from the job store together, and updates
+        their state.
+
+        :param list(toil.batchSystems.abstractBatchSystem.UpdatedBatchJobInfo) updatedJobTuples:
+               The finished jobs, which must all be currently issued.
+
+        :return: The batch system IDs of the jobs that are going to run again.
+        :rtype: list(int)
+        """
+        issuedJobs = [self.removeJob(updatedJobTuple.jobID) for updatedJobTuple in updatedJobTuples]
+        replacementJobs = self._reloadJobs([issuedJob.jobStoreID for issuedJob in issuedJobs])
+        jobsRerunning = []
+        for updatedJobTuple, issuedJob in zip(updatedJobTuples, issuedJobs):
+            if self._processFinishedJob(updatedJobTuple.jobID, issuedJob,
+                                        replacementJobs.get(issuedJob.jobStoreID),
+                                        updatedJobTuple.exitStatus, wallTime=updatedJobTuple.wallTime,
+                                        exitReason=updatedJobTuple.exitReason):
+                jobsRerunning.append(updatedJobTuple.jobID)
+        return jobsRerunning
+
+    def _reloadJobs(self, jobStoreIDs):
+        """
+        Reload the given jobs as modified by their workers.
+
+        :param list(str) jobStoreIDs: IDs of jobs that have just finished.
+
+        :return: The reloaded JobDescriptions of the jobs that continue to
+                 exist, by job store ID. Jobs that are done and gone are left out.
+        :rtype: dict(str, toil.job.JobDescription)
+        """
+        # Jobs the job store can't find are done and gone. This includes
+        # ghost jobs from stale SDB reads on AWS, which used to need special
+        # handling when existence and loading were checked separately. See
+        # https://github.com/BD2KGenomics/toil/issues/1091
+        return self.jobStore.loadMany(jobStoreIDs)
+
+    def _processFinishedJob(self, batchSystemID, issuedJob, replacementJob, resultStatus, wallTime=None,
+                            exitReason=None):
+        """
+        Update the state of a finished job that has been removed from the
+        issued jobs, given its reloaded JobDescription.
+
+        :param int batchSystemID: The batch system ID the job ran under.
+        :param toil.job.JobDescription issuedJob: The job as it was issued.
+        :param toil.job.JobDescription replacementJob: The job as modified by
+               the worker, or None if the job is done and gone.
+
+        Return True if the job is going to run again, and False if the job is
+        fully done or completely failed.
+        """
         jobStoreID = issuedJob.jobStoreID
         if wallTime is not None and self.clusterScaler is not None:
             self.clusterScaler.addCompletedJob(issuedJob, wallTime)
-        if self.jobStore.exists(jobStoreID):
+        if replacementJob is not None:
             logger.debug("Job %s continues to exist (i.e. has more to do)", issuedJob)
-            try:
-                # Reload the job as modified by the worker
-                replacementJob = self.jobStore.load(jobStoreID)
-            except NoSuchJobException:
-                # Avoid importing AWSJobStore as the corresponding extra might be missing
-                if self.jobStore.__class__.__name__ == 'AWSJobStore':
-                    # We have a ghost job - the job has been deleted but a stale read from
-                    # SDB gave us a false positive when we checked for its existence.
-                    # Process the job from here as any other job removed from the job store.
-                    # This is a temporary work around until https://github.com/BD2KGenomics/toil/issues/1091
-                    # is completed
-                    logger.warning('Got a stale read from SDB for job %s', issuedJob)
-                    self.processRemovedJob(issuedJob, resultStatus)
-                    return
-                else:
-                    raise
             if replacementJob.logJobStoreFileID is not None:
-                with replacementJob.getLogFileHandle(self.jobStore) as logFileStream:
-                    # more memory efficient than read().striplines() while leaving off the
-                    # trailing \n left when using readlines()
-                    # http://stackoverflow.com/a/15233739
-                    StatsAndLogging.logWithFormatting(jobStoreID, logFileStream, method=logger.warning,
-                                                      message='The job seems to have left a log file, indicating failure: %s' % replacementJob)
-                if self.config.writeLogs or self.config.writeLogsGzip:
-                    with replacementJob.getLogFileHandle(self.jobStore) as logFileStream:
-                        StatsAndLogging.writeLogFiles(replacementJob.chainedJobs, logFileStream, self.config, failed=True)
+                self._reportJobLogFile(replacementJob)
             if resultStatus != 0:
                 # If the batch system returned a non-zero exit code then the worker
                 # is assumed not to have captured the failure of the job, so we
@@ -1057,6 +1134,23 @@ class Leader(object):
             # Being done, it won't run again.
             return False
             
+    def _reportJobLogFile(self, jobDesc):
+        """
+        Log the log file a worker left for a failed job, and write it out if
+        the user asked for job logs.
+
+        :param toil.job.JobDescription jobDesc: The job, with its logJobStoreFileID set.
+        """
+        with jobDesc.getLogFileHandle(self.jobStore) as logFileStream:
+            # more memory efficient than read().striplines() while leaving off the
+            # trailing \n left when using readlines()
+            # http://stackoverflow.com/a/15233739
+            StatsAndLogging.logWithFormatting(jobDesc.jobStoreID, logFileStream, method=logger.warning,
+                                              message='The job seems to have left a log file, indicating failure: %s' % jobDesc)
+        if self.config.writeLogs or self.config.writeLogsGzip:
+            with jobDesc.getLogFileHandle(self.jobStore) as logFileStream:
+                StatsAndLogging.writeLogFiles(jobDesc.chainedJobs, logFileStream, self.config, failed=True)
+
     def getSuccessors(self, jobDesc, alreadySeenSuccessors, jobStore):
         """
         Gets successors of the given job by walking the job graph recursively.
@@ -1065,6 +1159,7 @@ class Leader(object):
         """
         successors = set()
         def successorRecursion(jobDesc):
+            newSuccessorIDs = []
             # For lists of successors
             for successorList in jobDesc.stack:
 
@@ -1077,12 +1172,12 @@ class Leader(object):
                         # Add to set of successors
                         successors.add(successorID)
                         alreadySeenSuccessors.add(successorID)
+                        newSuccessorIDs.append(successorID)
 
-                        # Recurse if job exists
-                        # (job may not exist if already completed)
-                        if jobStore.exists(successorID):
-                            loaded = jobStore.load(successorID)
-                            successorRecursion(loaded)
+            # Recurse into the jobs that exist, loading them together
+            # (a job may not exist if already completed)
+            for loaded in jobStore.loadMany(newSuccessorIDs).values():
+                successorRecursion(loaded)
 
         successorRecursion(jobDesc)  # Recurse from passed job
 
@@ -1134,7 +1229,7 @@ class Leader(object):
             # lets it continue, now that we have issued kill orders for them,
             # to start dependent services, which all need to actually fail
             # before we can finish up with the services' predecessor job.
-            self.jobStore.deleteFile(jobDesc.startJobStoreID)
+            self.serviceManager.markServiceStarted(jobDesc)
         else:
             # Is a non-service job
             assert jobDesc.jobStoreID not in self.toilState.servicesIssued
@@ -1203,8 +1298,13 @@ class Leader(object):
                 self.toilState.servicesIssued.pop(predecessorJob.jobStoreID) # The job has no running services
                 
                 logger.debug('Job %s is no longer waiting on services', predecessorJob)
-                
-                if predecessorJob.jobStoreID not in self.toilState.updatedJobs:
+
+                if predecessorJob.jobStoreID in self.toilState.successorCounts:
+                    # The services stopped by themselves while the job's
+                    # successors are still running. The last successor to
+                    # finish will update the job.
+                    logger.debug('Job %s is still waiting on its successors', predecessorJob)
+                elif predecessorJob.jobStoreID not in self.toilState.updatedJobs:
                     # Now we know the job is done we can add it to the list of
                     # updated job files
                     self.toilState.updatedJobs[predecessorJob.jobStoreID] = (predecessorJob, 0)
@@ -1,3 +1,6 @@
+import errno
+import io
+import mmap
 import random
 from math import sqrt
 import logging
@@ -219,16 +222,236 @@ def AtomicFileCreate(final_path, keep=False):
                 pass
         raise
 
+# The Linux ioctl that makes a file share all of another file's data blocks,
+# on filesystems with copy-on-write extents (btrfs, XFS, OCFS2, ...)
+FICLONE = 0x40049409
+
+# Errors from a kernel copy primitive that mean it cannot be used for this pair
+# of files, rather than that the copy itself went wrong.
+_unsupportedCopyErrors = frozenset((errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                                    errno.ENOTSUP, errno.EBADF, errno.ETXTBSY, errno.EPERM))
+
+def _kernel_copy(copy, src_fd, dest_fd):
+    """
+    Copy from src_fd to dest_fd at their current offsets until EOF, using the
+    given kernel copy call, which takes (src_fd, dest_fd, count) and returns
+    the number of bytes it moved.
+
+    :return: The number of bytes copied, or None if the call is not supported
+             for these files and nothing was copied.
+    :rtype: int or None
+    """
+    copied = 0
+    while True:
+        try:
+            sent = copy(src_fd, dest_fd, 1 << 30)
+        except OSError as e:
+            if copied == 0 and e.errno in _unsupportedCopyErrors:
+                return None
+            raise
+        if sent == 0:
+            return copied
+        copied += sent
+
+def _copy_file_range(src_fd, dest_fd, count):
+    return os.copy_file_range(src_fd, dest_fd, count)
+
+def _sendfile(src_fd, dest_fd, count):
+    return os.sendfile(dest_fd, src_fd, None, count)
+
+def copy_file_obj(src_fh, dest_fh, length=16384):
+    """
+    Copy the rest of a binary file object into another, from their current
+    positions, and leave both positioned after the copied data.
+
+    When both are plain files, the data is moved by the kernel instead of
+    through Python: the destination is made a reflink of the source where the
+    filesystem supports it, and otherwise copy_file_range(2) or sendfile(2)
+    are used. Anything else, such as pipes on the reading side or wrappers
+    like GzipFile whose data differs from that of their file descriptor, is
+    copied through Python in chunks of the given length.
+
+    :return: The number of bytes copied.
+    :rtype: int
+    """
+    src_fd, dest_fd = _plain_fileno(src_fh), _plain_fileno(dest_fh)
+    start = None
+    if src_fd is not None and dest_fd is not None:
+        try:
+            # Flush anything the destination has buffered, so its descriptor's
+            # offset is where our data has to go.
+            dest_fh.flush()
+            start = src_fh.tell()
+        except (OSError, ValueError):
+            # The source is a pipe that may be holding buffered data we can't
+            # see from its descriptor.
+            start = None
+
+    if start is not None:
+        os.lseek(src_fd, start, os.SEEK_SET)
+        copied = None
+        if start == 0 and sys.platform.startswith('linux'):
+            copied = _reflink(src_fd, dest_fd)
+        if copied is None and hasattr(os, 'copy_file_range'):
+            copied = _kernel_copy(_copy_file_range, src_fd, dest_fd)
+        if copied is None and hasattr(os, 'sendfile'):
+            copied = _kernel_copy(_sendfile, src_fd, dest_fd)
+        # Bring the file objects back in line with their descriptors.
+        src_fh.seek(start if copied is None else start + copied)
+        if copied is not None:
+            if dest_fh.seekable():
+                dest_fh.seek(os.lseek(dest_fd, 0, os.SEEK_CUR))
+            return copied
+
+    copied = 0
+    while True:
+        buf = src_fh.read(length)
+        if not buf:
+            return copied
+        dest_fh.write(buf)
+        copied += len(buf)
+
+def _plain_fileno(fh):
+    """
+    Get the file descriptor of a file object that reads or writes exactly the
+    data of its file: an io.FileIO, one wrapped in a plain buffer, or a
+    MappedFile.
+
+    :return: The file descriptor, or None for any other file object.
+    :rtype: int or None
+    """
+    if isinstance(fh, MappedFile):
+        fh = fh.fileHandle
+    if isinstance(fh, (io.BufferedReader, io.BufferedWriter, io.BufferedRandom)):
+        fh = fh.raw
+    if isinstance(fh, io.FileIO):
+        return fh.fileno()
+    return None
+
+def _reflink(src_fd, dest_fd):
+    """
+    Make the file open at dest_fd, which must be empty and at offset 0, share
+    all the data of the file open at src_fd, and seek both to the end.
+
+    :return: The number of bytes shared, or None if a reflink is not possible.
+    :rtype: int or None
+    """
+    try:
+        import fcntl
+        if os.fstat(dest_fd).st_size != 0 or os.lseek(dest_fd, 0, os.SEEK_CUR) != 0:
+            return None
+        fcntl.ioctl(dest_fd, FICLONE, src_fd)
+    except (ImportError, OSError):
+        return None
+    size = os.lseek(src_fd, 0, os.SEEK_END)
+    os.lseek(dest_fd, size, os.SEEK_SET)
+    return size
+
 def atomic_copy(src_path, dest_path):
     """Copy a file using posix atomic creations semantics."""
     with AtomicFileCreate(dest_path) as dest_path_tmp:
-        shutil.copyfile(src_path, dest_path_tmp)
+        with open(src_path, 'rb') as src_fh, open(dest_path_tmp, 'wb') as dest_fh:
+            copy_file_obj(src_fh, dest_fh)
 
 def atomic_copyobj(src_fh, dest_path, length=16384):
     """Copy an open file using posix atomic creations semantics."""
     with AtomicFileCreate(dest_path) as dest_path_tmp:
         with open(dest_path_tmp, 'wb') as dest_path_fh:
-            shutil.copyfileobj(src_fh, dest_path_fh, length=length)
+            copy_file_obj(src_fh, dest_path_fh, length=length)
+
+class MappedFile(io.BufferedIOBase):
+    """
+    A read-only binary file handle that serves reads out of a memory mapping
+    of the file, so data goes from the page cache to the reader without
+    passing through a read buffer.
+
+    The file must not be truncated while it is open. Use :func:`open_mapped`
+    to get one, since empty files and some filesystems can't be mapped.
+
+    It has no file descriptor of its own to give out, since reading from the
+    file's descriptor would not move its position.
+    """
+
+    def __init__(self, fileHandle):
+        super(MappedFile, self).__init__()
+        self.fileHandle = fileHandle
+        self.map = mmap.mmap(fileHandle.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        raise io.UnsupportedOperation('fileno')
+
+    def tell(self):
+        self._checkClosed()
+        return self.map.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._checkClosed()
+        if whence == os.SEEK_CUR:
+            offset += self.map.tell()
+        elif whence == os.SEEK_END:
+            offset += len(self.map)
+        # Seeking past the end is allowed for files, but not for mmaps.
+        self.map.seek(max(0, min(offset, len(self.map))))
+        return self.map.tell()
+
+    def read(self, size=-1):
+        self._checkClosed()
+        return self.map.read(-1 if size is None else size)
+
+    read1 = read
+
+    def readinto(self, buffer):
+        self._checkClosed()
+        start = self.map.tell()
+        count = min(len(buffer), len(self.map) - start)
+        with memoryview(buffer) as view, memoryview(self.map) as data:
+            view.cast('B')[:count] = data[start:start + count]
+        self.map.seek(start + count)
+        return count
+
+    readinto1 = readinto
+
+    def readline(self, size=-1):
+        self._checkClosed()
+        line = self.map.readline()
+        if size is not None and 0 <= size < len(line):
+            # Give back what the caller didn't ask for.
+            self.map.seek(self.map.tell() - (len(line) - size))
+            line = line[:size]
+        return line
+
+    def close(self):
+        if not self.closed:
+            self.map.close()
+            self.fileHandle.close()
+        super(MappedFile, self).close()
+
+def open_mapped(path):
+    """
+    Open a file for binary reading, using a :class:`MappedFile` when the file
+    can be memory-mapped, and a normal file object otherwise.
+
+    Files opened through a symbolic link or with other hard links are not
+    mapped. Whoever else can reach them could truncate them while they are
+    open, and reading a mapping past the new end kills the process with
+    SIGBUS.
+    """
+    fileHandle = open(path, 'rb')
+    try:
+        if os.path.islink(path) or os.fstat(fileHandle.fileno()).st_nlink != 1:
+            return fileHandle
+        return MappedFile(fileHandle)
+    except (ValueError, OSError):
+        # Empty files and special files can't be mapped.
+        return fileHandle
 
 class WriteWatchingStream(object):
     """
@@ -23,7 +23,8 @@ from threading import Thread, Event
 from queue import Empty, Queue
 
 from toil.job import ServiceJobDescription
-from toil.lib.throttle import throttle, LocalThrottle
+from toil.lib.throttle import LocalThrottle
+from toil.serviceSignals import ServiceSignalServer
 
 
 logger = logging.getLogger( __name__ )
@@ -32,12 +33,36 @@ class ServiceManager( object ):
     """
     Manages the scheduling of services.
     """
-    def __init__(self, jobStore, toilState):
+
+    # How often to check the job store for services that have started, in
+    # seconds, when services can tell us directly, and when they can't.
+    signalledPollInterval = 10
+    pollInterval = 1
+
+    def __init__(self, jobStore, toilState, batchSystem=None):
+        """
+        :param batchSystem: if given, services the batch system runs are told
+               how to signal the service manager directly, and only need
+               checking on in the job store as a fallback.
+        """
         logger.debug("Initializing service manager")
         self.jobStore = jobStore
         
         self.toilState = toilState
 
+        self.batchSystem = batchSystem
+
+        # Set whenever the service starter thread has something new to look at
+        self._wakeup = Event()
+
+        # The jobStoreIDs of services known to have started, from their own
+        # signals or from markServiceStarted()
+        self._startedServiceIDs = set()
+
+        self._signals = None
+        if batchSystem is not None:
+            self._signals = ServiceSignalServer(self._serviceStarted)
+
         self.jobDescriptionsWithServicesBeingStarted = set()
 
         self._terminate = Event() # This is used to terminate the thread associated
@@ -69,7 +94,8 @@ class ServiceManager( object ):
                                             self._jobDescriptionsWithServicesThatHaveStarted,
                                             self._jobDescriptionsWithServicesThatHaveFailedToStart,
                                             self.serviceJobDescriptionsToStart, self._terminate,
-                                            self.jobStore),
+                                            self.jobStore, self._wakeup, self._startedServiceIDs,
+                                            self.signalledPollInterval if self._signals else self.pollInterval),
                                       daemon=True)
                                       
                         
@@ -78,6 +104,8 @@ class ServiceManager( object ):
         """
         Start the service scheduling thread.
         """
+        if self._signals is not None:
+            self._signals.start(self.batchSystem)
         self._serviceStarter.start()
 
     def scheduleServices(self, jobDesc):
@@ -96,6 +124,7 @@ class ServiceManager( object ):
 
         # Asynchronously schedule the services
         self._jobDescriptionsWithServicesToStart.put(jobDesc)
+        self._wakeup.set()
 
     def getJobDescriptionWhoseServicesAreRunning(self, maxWait):
         """
@@ -145,6 +174,18 @@ class ServiceManager( object ):
         except Empty:
             return None
 
+    def hasPendingTransitions(self):
+        """
+        Returns true if the service manager has jobs waiting to be collected
+        by the leader, either service jobs to issue or jobs whose services
+        have started or failed to start.
+
+        :rtype: boolean
+        """
+        return not (self.serviceJobDescriptionsToStart.empty() and
+                    self._jobDescriptionsWithServicesThatHaveStarted.empty() and
+                    self._jobDescriptionsWithServicesThatHaveFailedToStart.empty())
+
     def killServices(self, services, error=False):
         """
         :param dict services: Maps service jobStoreIDs to the communication flags for the service
@@ -154,6 +195,27 @@ class ServiceManager( object ):
             if error:
                 self.jobStore.deleteFile(serviceJob.errorJobStoreID)
             self.jobStore.deleteFile(serviceJob.terminateJobStoreID)
+            if self._signals is not None:
+                # Now the flags are down, tell the service right away
+                self._signals.stop(serviceJobStoreID, error=error)
+
+    def markServiceStarted(self, serviceJobDesc):
+        """
+        Remove the start flag of a service on its behalf, for when it has
+        failed, so that nothing waits for it to start forever.
+
+        :param toil.job.ServiceJobDescription serviceJobDesc: the service
+        """
+        self.jobStore.deleteFile(serviceJobDesc.startJobStoreID)
+        self._serviceStarted(serviceJobDesc.jobStoreID)
+
+    def _serviceStarted(self, serviceJobStoreID):
+        """
+        Note that the service with the given jobStoreID has removed its start
+        flag.
+        """
+        self._startedServiceIDs.add(serviceJobStoreID)
+        self._wakeup.set()
             
     def isActive(self, service):
         """
@@ -189,10 +251,13 @@ class ServiceManager( object ):
         logger.debug('Waiting for service manager thread to finish ...')
         startTime = time.time()
         self._terminate.set()
+        self._wakeup.set()
         self._serviceStarter.join()
         # Kill any services still running to avoid deadlock
         for services in list(self.toilState.servicesIssued.values()):
             self.killServices(services, error=True)
+        if self._signals is not None:
+            self._signals.shutdown()
         logger.debug('... finished shutting down the service manager. Took %s seconds', time.time() - startTime)
 
     @staticmethod
@@ -200,9 +265,13 @@ class ServiceManager( object ):
                        jobDescriptionsWithServicesThatHaveStarted,
                        jobDescriptionsWithServicesThatHaveFailedToStart,
                        serviceJobsToStart,
-                       terminate, jobStore):
+                       terminate, jobStore, wakeup, startedServiceIDs, pollInterval):
         """
         Thread used to schedule services.
+
+        Sleeps until woken up by a new job with services, or by a service that
+        has started. Services that can't tell us they started are found by
+        checking the job store every pollInterval seconds.
         """
         
         # Keep the user informed, but not too informed, as services start up
@@ -214,74 +283,99 @@ class ServiceManager( object ):
         servicesRemainingToStartForJob = {}
         serviceToParentJobDescription = {}
         jobDescriptionsWithFailedServices = set()
+        nextPoll = 0
         while True:
-            with throttle(1.0):
-                if terminate.is_set():
-                    logger.debug('Received signal to quit starting services.')
-                    break
+            if terminate.is_set():
+                logger.debug('Received signal to quit starting services.')
+                break
+            while True:
                 try:
                     jobDesc = jobDescriptionsWithServicesToStart.get_nowait()
-                    if len(list(jobDesc.serviceHostIDsInBatches())) > 1:
-                        # Have to fall back to the old blocking behavior to
-                        # ensure entire service "groups" are issued as a whole.
-                        blockUntilServiceGroupIsStarted(jobDesc,
-                                                        jobDescriptionsWithServicesThatHaveStarted,
-                                                        jobDescriptionsWithServicesThatHaveFailedToStart,
-                                                        serviceJobsToStart, terminate, jobStore)
-                        continue
-                    # Found a new job that needs to schedule its services.
-                    for onlyBatch in jobDesc.serviceHostIDsInBatches():
-                        # There should be just one batch so we can do it here.
-                        servicesRemainingToStartForJob[jobDesc] = len(onlyBatch)
-                        for serviceJobID in onlyBatch:
-                            # Load up the service object.
-                            # TODO: cache?
-                            serviceJobDesc = jobStore.load(serviceJobID)
-                            # Remember the parent job
-                            serviceToParentJobDescription[serviceJobDesc] = jobDesc
-                            # We should now start to monitor this service to see if
-                            # it has started yet.
-                            servicesThatAreStarting.add(serviceJobDesc)
-                            # Send the service JobDescription off to be started
-                            logger.debug('Service manager is starting service job: %s, start ID: %s', serviceJobDesc, serviceJobDesc.startJobStoreID)
-                            serviceJobsToStart.put(serviceJobDesc)
                 except Empty:
                     # No new jobs that need services scheduled.
-                    pass
-                    
-                pendingServiceCount = len(servicesThatAreStarting)
-                if pendingServiceCount > 0 and logLimiter.throttle(False):
-                    logger.debug('%d services are starting...', pendingServiceCount)
-
-                for serviceJobDesc in list(servicesThatAreStarting):
-                    if not jobStore.fileExists(serviceJobDesc.startJobStoreID):
-                        # Service has started (or failed)
-                        logger.debug('Service %s has removed %s and is therefore started', serviceJobDesc, serviceJobDesc.startJobStoreID)
-                        servicesThatAreStarting.remove(serviceJobDesc)
-                        parentJob = serviceToParentJobDescription[serviceJobDesc]
-                        servicesRemainingToStartForJob[parentJob] -= 1
-                        assert servicesRemainingToStartForJob[parentJob] >= 0
-                        del serviceToParentJobDescription[serviceJobDesc]
-                        if not jobStore.fileExists(serviceJobDesc.errorJobStoreID):
-                            logger.error('Service %s has immediately failed before it could be used', serviceJobDesc)
-                            # It probably hasn't fileld in the promise that the job that uses the service needs.
-                            jobDescriptionsWithFailedServices.add(parentJob)
-
-                # Find if any JobDescriptions have had *all* their services started.
-                jobDescriptionsToRemove = set()
-                for jobDesc, remainingServices in servicesRemainingToStartForJob.items():
-                    if remainingServices == 0:
-                        if jobDesc in jobDescriptionsWithFailedServices:
-                            logger.error('Job %s has had all its services try to start, but at least one failed', jobDesc)
-                            jobDescriptionsWithServicesThatHaveFailedToStart.put(jobDesc)
-                        else:
-                            logger.debug('Job %s has all its services started', jobDesc)
-                            jobDescriptionsWithServicesThatHaveStarted.put(jobDesc)
-                        jobDescriptionsToRemove.add(jobDesc)
-                for jobDesc in jobDescriptionsToRemove:
-                    del servicesRemainingToStartForJob[jobDesc]
-
-def blockUntilServiceGroupIsStarted(jobDesc, jobDescriptionsWithServicesThatHaveStarted, jobDescriptionsWithServicesThatHaveFailedToStart, serviceJobsToStart, terminate, jobStore):
+                    break
+                if len(list(jobDesc.serviceHostIDsInBatches())) > 1:
+                    # Have to fall back to the old blocking behavior to
+                    # ensure entire service "groups" are issued as a whole.
+                    blockUntilServiceGroupIsStarted(jobDesc,
+                                                    jobDescriptionsWithServicesThatHaveStarted,
+                                                    jobDescriptionsWithServicesThatHaveFailedToStart,
+                                                    serviceJobsToStart, terminate, jobStore,
+                                                    wakeup, startedServiceIDs, pollInterval)
+                    continue
+                # Found a new job that needs to schedule its services.
+                for onlyBatch in jobDesc.serviceHostIDsInBatches():
+                    # There should be just one batch so we can do it here.
+                    servicesRemainingToStartForJob[jobDesc] = len(onlyBatch)
+                    for serviceJobID in onlyBatch:
+                        # Load up the service object.
+                        # TODO: cache?
+                        serviceJobDesc = jobStore.load(serviceJobID)
+                        # Remember the parent job
+                        serviceToParentJobDescription[serviceJobDesc] = jobDesc
+                        # We should now start to monitor this service to see if
+                        # it has started yet.
+                        servicesThatAreStarting.add(serviceJobDesc)
+                        # Send the service JobDescription off to be started
+                        logger.debug('Service manager is starting service job: %s, start ID: %s', serviceJobDesc, serviceJobDesc.startJobStoreID)
+                        serviceJobsToStart.put(serviceJobDesc)
+                
+            pendingServiceCount = len(servicesThatAreStarting)
+            if pendingServiceCount > 0 and logLimiter.throttle(False):
+                logger.debug('%d services are starting...', pendingServiceCount)
+
+            # Only go to the job store for services that haven't told us
+            # they started once in a while.
+            poll = time.time() >= nextPoll
+            if poll:
+                nextPoll = time.time() + pollInterval
+
+            for serviceJobDesc in list(servicesThatAreStarting):
+                if _hasStarted(serviceJobDesc, startedServiceIDs, jobStore, poll):
+                    # Service has started (or failed)
+                    logger.debug('Service %s has removed %s and is therefore started', serviceJobDesc, serviceJobDesc.startJobStoreID)
+                    servicesThatAreStarting.remove(serviceJobDesc)
+                    parentJob = serviceToParentJobDescription[serviceJobDesc]
+                    servicesRemainingToStartForJob[parentJob] -= 1
+                    assert servicesRemainingToStartForJob[parentJob] >= 0
+                    del serviceToParentJobDescription[serviceJobDesc]
+                    if not jobStore.fileExists(serviceJobDesc.errorJobStoreID):
+                        logger.error('Service %s has immediately failed before it could be used', serviceJobDesc)
+                        # It probably hasn't fileld in the promise that the job that uses the service needs.
+                        jobDescriptionsWithFailedServices.add(parentJob)
+
+            # Find if any JobDescriptions have had *all* their services started.
+            jobDescriptionsToRemove = set()
+            for jobDesc, remainingServices in servicesRemainingToStartForJob.items():
+                if remainingServices == 0:
+                    if jobDesc in jobDescriptionsWithFailedServices:
+                        logger.error('Job %s has had all its services try to start, but at least one failed', jobDesc)
+                        jobDescriptionsWithServicesThatHaveFailedToStart.put(jobDesc)
+                    else:
+                        logger.debug('Job %s has all its services started', jobDesc)
+                        jobDescriptionsWithServicesThatHaveStarted.put(jobDesc)
+                    jobDescriptionsToRemove.add(jobDesc)
+            for jobDesc in jobDescriptionsToRemove:
+                del servicesRemainingToStartForJob[jobDesc]
+
+            # Sleep until there's something new, or it's time to poll again
+            # for any services still starting. A group of services we blocked
+            # on above may have already used up the wakeup for terminating.
+            if not terminate.is_set():
+                wakeup.wait(max(0, nextPoll - time.time()) if servicesThatAreStarting else None)
+                wakeup.clear()
+
+def _hasStarted(serviceJobDesc, startedServiceIDs, jobStore, poll):
+    """
+    Return True if the given service is known to have removed its start flag,
+    checking the job store for it if poll is set.
+    """
+    if serviceJobDesc.jobStoreID in startedServiceIDs or (poll and not jobStore.fileExists(serviceJobDesc.startJobStoreID)):
+        startedServiceIDs.discard(serviceJobDesc.jobStoreID)
+        return True
+    return False
+
+def blockUntilServiceGroupIsStarted(jobDesc, jobDescriptionsWithServicesThatHaveStarted, jobDescriptionsWithServicesThatHaveFailedToStart, serviceJobsToStart, terminate, jobStore, wakeup, startedServiceIDs, pollInterval):
     
     # Keep the user informed, but not too informed, as services start up
     logLimiter = LocalThrottle(60)
@@ -304,9 +398,16 @@ def blockUntilServiceGroupIsStarted(jobDesc, jobDescriptionsWithServicesThatHave
 
         # Wait until all the services of the batch are running
         for serviceJobDesc in waitOn:
-            while jobStore.fileExists(serviceJobDesc.startJobStoreID):
-                # Sleep to avoid thrashing
-                time.sleep(1.0)
+            nextPoll = 0
+            while True:
+                poll = time.time() >= nextPoll
+                if poll:
+                    nextPoll = time.time() + pollInterval
+                if _hasStarted(serviceJobDesc, startedServiceIDs, jobStore, poll):
+                    break
+                # Sleep until the service signals us or it is time to poll
+                wakeup.wait(max(0, nextPoll - time.time()))
+                wakeup.clear()
                 
                 if logLimiter.throttle(False):
                     logger.info('Service %s is starting...', serviceJobDesc)
@@ -0,0 +1,243 @@
+# Copyright (C) 2015-2020 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Implements a TCP-based channel for the leader and service host jobs to tell each
+other when a service has started and when it should stop.
+
+The flag files in the job store stay the durable record of each service's
+state, and are always changed before a signal is sent. Signals just let the
+other side find out right away, instead of having to poll the job store for
+it. Either side falls back to polling if the channel isn't available. A
+service host job also looks at the flags now and then while it waits for a
+signal, since a leader that died or was cut off can leave the channel open
+with nothing ever coming down it.
+"""
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from six.moves import socketserver as SocketServer
+
+from toil.batchSystems.options import getPublicIP
+
+logger = logging.getLogger(__name__)
+
+# The names of all environment variables used to find the leader are prefixed
+# with this string
+envPrefix = 'TOIL_SERVICE_SIGNALS_'
+
+
+class ServiceSignalHandler(SocketServer.StreamRequestHandler):
+    """
+    Handle a connection from a service host job.
+
+    Each connection carries a single request line of the form
+    "<token> <verb> <service jobStoreID>". For the "started" verb the leader
+    answers "ok" once it has noted that the service started. For the "watch"
+    verb the leader answers "terminate" or "error" once the service has been
+    told to stop, keeping the connection open until then.
+    """
+
+    def handle(self):
+        try:
+            token, verb, serviceJobStoreID = self.rfile.readline().decode('utf-8').split()
+        except ValueError:
+            logger.warning("Malformed service signal from %s", self.client_address[0])
+            return
+        if token != self.server.signals.token:
+            logger.warning("Service signal with the wrong token from %s", self.client_address[0])
+            return
+
+        if verb == 'started':
+            self.server.signals.onStarted(serviceJobStoreID)
+            self.wfile.write(b'ok\n')
+        elif verb == 'watch':
+            stop = self.server.signals.waitForStop(serviceJobStoreID)
+            if stop is not None:
+                self.wfile.write(stop.encode('utf-8') + b'\n')
+        else:
+            logger.warning("Unknown service signal %s from %s", verb, self.client_address[0])
+
+
+class ServiceSignalServer(object):
+    """
+    The leader's end of the channel, which hears from service host jobs when
+    their services start, and tells them when to stop.
+    """
+
+    def __init__(self, onStarted):
+        """
+        :param onStarted: function to call with the jobStoreID of each service
+               that reports it has started. Called from server threads.
+        """
+        self.onStarted = onStarted
+        # Services can only signal us if they know this
+        self.token = uuid.uuid4().hex
+        # Maps the jobStoreID of each service that has been told to stop to
+        # 'terminate' or 'error'
+        self.stopped = {}
+        self.closing = False
+        self.condition = threading.Condition()
+        self.server = None
+        self.serverThread = None
+
+    def start(self, batchSystem):
+        """
+        Start serving, and tell jobs the batch system runs from now on where to
+        find us.
+        """
+        self.server = SocketServer.ThreadingTCPServer(server_address=('0.0.0.0', 0),
+                                                      RequestHandlerClass=ServiceSignalHandler)
+        self.server.daemon_threads = True
+        self.server.signals = self
+
+        self.serverThread = threading.Thread(target=self.server.serve_forever)
+        self.serverThread.daemon = True
+        self.serverThread.start()
+
+        def _setEnv(name, value):
+            name = envPrefix + name
+            os.environ[name] = value
+            batchSystem.setEnv(name)
+
+        _setEnv('ADDRESS', '%s:%i' % (getPublicIP(), self.server.server_address[1]))
+        _setEnv('TOKEN', self.token)
+
+    def stop(self, serviceJobStoreID, error=False):
+        """
+        Tell a service to stop, now if it is watching, or as soon as it starts
+        watching otherwise.
+        """
+        with self.condition:
+            self.stopped[serviceJobStoreID] = 'error' if error else 'terminate'
+            self.condition.notify_all()
+
+    def waitForStop(self, serviceJobStoreID):
+        """
+        Block until the given service has been told to stop, and return
+        'terminate' or 'error', or None if the server is shutting down.
+        """
+        with self.condition:
+            while serviceJobStoreID not in self.stopped and not self.closing:
+                self.condition.wait()
+            return self.stopped.get(serviceJobStoreID)
+
+    def shutdown(self):
+        """
+        Stop serving, dropping the connections of any services still watching
+        so that they fall back to the job store.
+        """
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.serverThread is not None:
+            self.serverThread.join()
+            self.serverThread = None
+        for k in list(os.environ.keys()):
+            if k.startswith(envPrefix):
+                os.environ.pop(k)
+
+
+class ServiceSignalClient(object):
+    """
+    A service host job's end of the channel.
+    """
+
+    @classmethod
+    def fromEnvironment(cls, serviceJobStoreID):
+        """
+        Get a client for the given service, or None if the leader isn't
+        listening for service signals.
+        """
+        try:
+            host, port = os.environ[envPrefix + 'ADDRESS'].split(':')
+            token = os.environ[envPrefix + 'TOKEN']
+        except KeyError:
+            return None
+        return cls((host, int(port)), token, serviceJobStoreID)
+
+    def __init__(self, address, token, serviceJobStoreID):
+        self.address = address
+        self.token = token
+        self.serviceJobStoreID = serviceJobStoreID
+        # The connection we are watching for a stop signal on, if any
+        self.watcher = None
+        # Set when the channel fails, after which we leave it alone
+        self.broken = False
+
+    def _request(self, verb, timeout):
+        connection = socket.create_connection(self.address, timeout=timeout)
+        connection.sendall('{} {} {}\n'.format(self.token, verb, self.serviceJobStoreID).encode('utf-8'))
+        return connection
+
+    def reportStarted(self, timeout=10):
+        """
+        Tell the leader that the service has started.
+
+        :return: True if the leader heard us, and False if it has to find out
+                 from the job store.
+        :rtype: bool
+        """
+        try:
+            with self._request('started', timeout) as connection:
+                return connection.makefile('rb').readline().strip() == b'ok'
+        except OSError as e:
+            logger.warning("Could not tell the leader that the service started: %s", e)
+            return False
+
+    def waitForStop(self, timeout):
+        """
+        Wait up to the given number of seconds for the leader to tell the
+        service to stop.
+
+        :return: 'terminate' or 'error' if the service should stop, or None if
+                 it has not been told to within the timeout. If the channel is
+                 broken, returns None and sets the broken attribute, and the
+                 job store must be checked instead.
+        :rtype: str or None
+        """
+        if self.broken:
+            return None
+        try:
+            if self.watcher is None:
+                self.watcher = self._request('watch', timeout)
+            self.watcher.settimeout(timeout)
+            reply = self.watcher.recv(64)
+        except socket.timeout:
+            return None
+        except OSError as e:
+            logger.warning("Lost contact with the leader, falling back to the job store: %s", e)
+            self.close()
+            self.broken = True
+            return None
+        if not reply:
+            logger.warning("Leader closed the service signal channel, falling back to the job store")
+            self.close()
+            self.broken = True
+            return None
+        # The reply is short enough to come in one piece
+        self.close()
+        return reply.decode('utf-8').strip()
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
@@ -16,24 +16,315 @@ from __future__ import absolute_import
 
 from builtins import str
 from builtins import object
+from collections import Counter
 import gzip
 import json
 import logging
+import math
 import os
 import time
 from threading import Thread, Event
 
+from toil.jobStores.abstractJobStore import NoSuchFileException
 from toil.lib.expando import Expando
 from toil.lib.bioio import getTotalCpuTime
 
 logger = logging.getLogger( __name__ )
 
+# Counters in the file_io stats of each job, as kept by the file store
+FILE_IO_COUNTERS = ["cache_hits", "cache_misses", "cache_evictions",
+                    "bytes_read", "bytes_written", "commit_wait"]
+
+
+def parseStats(fileHandle):
+    """
+    Parse a stats file from a worker, as given to readStatsAndLogging callbacks.
+    """
+    statsStr = fileHandle.read()
+    if not isinstance(statsStr, str):
+        statsStr = statsStr.decode()
+    return json.loads(statsStr, object_hook=Expando)
+
+
+class QuantileSketch(object):
+    """
+    Keeps approximate quantiles of a stream of numbers in bounded space. Each
+    number is counted in a bucket whose bounds grow geometrically, so any
+    quantile reported is within relativeAccuracy of a number that was added.
+    """
+
+    relativeAccuracy = 0.01
+
+    # Numbers closer to 0 than this are all counted as 0
+    zeroThreshold = 1e-9
+
+    def __init__(self):
+        self.gamma = (1 + self.relativeAccuracy) / (1 - self.relativeAccuracy)
+        self.count = 0
+        self.zeros = 0
+        # Map bucket index to count, for positive numbers and for the
+        # magnitudes of negative ones
+        self.positive = Counter()
+        self.negative = Counter()
+
+    def add(self, value):
+        self.count += 1
+        if abs(value) < self.zeroThreshold:
+            self.zeros += 1
+        else:
+            buckets = self.positive if value > 0 else self.negative
+            buckets[int(math.ceil(math.log(abs(value), self.gamma)))] += 1
+
+    def _value(self, index):
+        # The point in the bucket that is within relativeAccuracy of all of it
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Get the number that would be at index int(q * count) if all the
+        numbers added were sorted, or 0 if none were.
+
+        :param float q: fraction of the way through the numbers, from 0 to 1
+        :rtype: float
+        """
+        rank = min(int(q * self.count), self.count - 1)
+        if rank < 0:
+            return 0.0
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._value(index)
+        raise RuntimeError("Quantile sketch lost count of its numbers")
+
+    def toDict(self):
+        return dict(count=self.count, zeros=self.zeros,
+                    positive=self.positive, negative=self.negative)
+
+    @classmethod
+    def fromDict(cls, data):
+        sketch = cls()
+        sketch.count = data['count']
+        sketch.zeros = data['zeros']
+        # JSON makes the bucket indexes strings
+        sketch.positive = Counter({int(k): v for k, v in data['positive'].items()})
+        sketch.negative = Counter({int(k): v for k, v in data['negative'].items()})
+        return sketch
+
+
+class ItemSummary(object):
+    """
+    Running summary of the time, clock, wait and memory used by a kind of item
+    (workers, jobs, or jobs of one type), and the file I/O they did, that does
+    not keep the items.
+    """
+
+    categories = ["time", "clock", "wait", "memory"]
+
+    def __init__(self):
+        self.count = 0
+        self.stats = {category: dict(total=0.0, min=float('inf'), max=float('-inf'),
+                                     sketch=QuantileSketch())
+                      for category in self.categories}
+        self.fileIO = {counter: 0.0 for counter in FILE_IO_COUNTERS}
+        # Transfer time histograms are summed bucket by bucket.
+        self.histograms = {"download_times": Counter(), "upload_times": Counter()}
+
+    @staticmethod
+    def _nonnegative(value, name):
+        value = float(value)
+        if value < 0:
+            raise RuntimeError("Negative value %s reported for %s" % (value, name))
+        return value
+
+    def add(self, item):
+        """
+        Add an item from a stats file.
+
+        :param dict item: stats for one worker or job
+        """
+        # If something lacks an entry, assume it used none of that thing.
+        # This avoids crashing when jobs e.g. aren't done.
+        values = {category: self._nonnegative(item.get(category, 0), category)
+                  for category in ("time", "clock", "memory")}
+        values["wait"] = values["time"] - values["clock"]
+        self.count += 1
+        for category, value in values.items():
+            stat = self.stats[category]
+            stat["total"] += value
+            stat["min"] = min(stat["min"], value)
+            stat["max"] = max(stat["max"], value)
+            stat["sketch"].add(value)
+
+        fileIO = item.get("file_io", {})
+        for counter in FILE_IO_COUNTERS:
+            self.fileIO[counter] += self._nonnegative(fileIO.get(counter, 0), counter)
+        for histogram, counts in self.histograms.items():
+            for bucket, count in fileIO.get(histogram, {}).items():
+                counts[bucket] += count
+
+    def report(self, name):
+        """
+        Get the summary in the form toil stats reports it.
+
+        :param str name: what to call the kind of item
+        :rtype: Expando
+        """
+        report = Expando(total_number=float(self.count), name=name)
+        for category, stat in self.stats.items():
+            if self.count == 0:
+                # Say nothing used nothing
+                report.update({"%s_%s" % (field, category): 0.0
+                               for field in ("total", "median", "average", "min", "max")})
+                continue
+            # The sketch is only approximate, so keep its answer in bounds
+            median = min(max(stat["sketch"].quantile(0.5), stat["min"]), stat["max"])
+            report.update({"total_" + category: stat["total"],
+                           "median_" + category: median,
+                           "average_" + category: stat["total"] / self.count,
+                           "min_" + category: stat["min"],
+                           "max_" + category: stat["max"]})
+        report.update({"total_" + counter: total for counter, total in self.fileIO.items()})
+        report.update({histogram: Expando(counts) for histogram, counts in self.histograms.items()})
+        return report
+
+    def toDict(self):
+        return dict(count=self.count,
+                    stats={category: dict(stat, sketch=stat["sketch"].toDict())
+                           for category, stat in self.stats.items()},
+                    file_io=self.fileIO, histograms=self.histograms)
+
+    @classmethod
+    def fromDict(cls, data):
+        summary = cls()
+        summary.count = data["count"]
+        summary.stats = {category: dict(stat, sketch=QuantileSketch.fromDict(stat["sketch"]))
+                         for category, stat in data["stats"].items()}
+        summary.fileIO = data["file_io"]
+        summary.histograms = {histogram: Counter(counts)
+                              for histogram, counts in data["histograms"].items()}
+        return summary
+
+
+class StatsSummary(object):
+    """
+    Running summary of the stats files from a workflow, taking space
+    proportional to the number of job types rather than the number of jobs.
+
+    The leader keeps one as it reads the stats files in, and saves it in the
+    job store for toil stats after each batch of them, before the job store
+    marks them as read.
+    """
+
+    # The shared file in the job store where the leader saves its summary
+    sharedFileName = 'stats_summary.json'
+
+    def __init__(self):
+        self.totalTime = 0.0
+        self.totalClock = 0.0
+        self.worker = ItemSummary()
+        self.jobs = ItemSummary()
+        self.jobTypes = {}
+        # Map number of jobs run by a worker to how many workers ran that many
+        self.jobsPerWorker = Counter()
+        # The job store's IDs for the last batch of stats added, which may not
+        # have been marked as read yet, and must not be added again
+        self.batchIDs = set()
+
+    def add(self, stats):
+        """
+        Add the contents of a stats file.
+
+        :param Expando stats: the parsed stats file
+        """
+        # The leader writes its time out as a string when it finishes
+        self.totalTime += float(stats.get('total_time', 0))
+        self.totalClock += float(stats.get('total_clock', 0))
+        if stats.get('workers'):
+            self.worker.add(stats.workers)
+            jobs = stats.get('jobs') or []
+            self.jobsPerWorker[len(jobs)] += 1
+            for job in jobs:
+                self.jobs.add(job)
+                if job.class_name not in self.jobTypes:
+                    self.jobTypes[job.class_name] = ItemSummary()
+                self.jobTypes[job.class_name].add(job)
+
+    def save(self, jobStore):
+        """
+        Save the summary to the given job store, replacing any saved before.
+        """
+        data = dict(total_time=self.totalTime, total_clock=self.totalClock,
+                    worker=self.worker.toDict(), jobs=self.jobs.toDict(),
+                    job_types={name: jobType.toDict() for name, jobType in self.jobTypes.items()},
+                    jobs_per_worker=self.jobsPerWorker, batch_ids=sorted(self.batchIDs))
+        with jobStore.writeSharedFileStream(self.sharedFileName, isProtected=False) as f:
+            f.write(json.dumps(data).encode('utf-8'))
+
+    @classmethod
+    def load(cls, jobStore):
+        """
+        Load the summary saved in the given job store.
+
+        :return: the summary, or None if none has been saved
+        :rtype: StatsSummary
+        """
+        try:
+            with jobStore.readSharedFileStream(cls.sharedFileName) as f:
+                data = json.loads(f.read().decode('utf-8'))
+        except NoSuchFileException:
+            return None
+        summary = cls()
+        summary.totalTime = data['total_time']
+        summary.totalClock = data['total_clock']
+        summary.worker = ItemSummary.fromDict(data['worker'])
+        summary.jobs = ItemSummary.fromDict(data['jobs'])
+        summary.jobTypes = {name: ItemSummary.fromDict(jobType)
+                            for name, jobType in data['job_types'].items()}
+        summary.jobsPerWorker = Counter({int(k): v for k, v in data['jobs_per_worker'].items()})
+        summary.batchIDs = set(data.get('batch_ids', ()))
+        return summary
+
+    def read(self, jobStore, callback=None):
+        """
+        Add the unread stats in the given job store, apart from any that have
+        been added already, and mark them as read. The summary is saved before
+        they are, so that each is added exactly once even if we go away.
+
+        :param Callable callback: a function to call with each parsed stats file
+               after it is added
+
+        :return: the number of stats files added
+        :rtype: int
+        """
+        def add(fileHandle):
+            stats = parseStats(fileHandle)
+            self.add(stats)
+            if callback is not None:
+                callback(stats)
+
+        def save(batchIDs):
+            self.batchIDs = set(batchIDs)
+            self.save(jobStore)
+
+        return jobStore.readStatsAndLogging(add, alreadyRead=self.batchIDs, beforeMarkingRead=save)
+
 
 class StatsAndLogging( object ):
     """
     Class manages a thread that aggregates statistics and logging information on a toil run.
     """
 
+    # Below this many stats files, the aggregator waits before reading more
+    statsBatchSize = 100
+
     def __init__(self, jobStore, config):
         self._stop = Event()
         self._worker = Thread(target=self.statsAndLoggingAggregator,
@@ -155,11 +446,12 @@ class StatsAndLogging( object ):
         startTime = time.time()
         startClock = getTotalCpuTime()
 
-        def callback(fileHandle):
-            statsStr = fileHandle.read()
-            if not isinstance(statsStr, str):
-                statsStr = statsStr.decode()
-            stats = json.loads(statsStr, object_hook=Expando)
+        # Pick up the summary from any earlier attempts at the workflow
+        summary = None
+        if config.stats:
+            summary = StatsSummary.load(jobStore) or StatsSummary()
+
+        def callback(stats):
             try:
                 logs = stats.workers.logsToMaster
             except AttributeError:
@@ -182,18 +474,29 @@ class StatsAndLogging( object ):
                                       message='Received Toil worker log. Disable debug level logging to hide this output')
                 cls.writeLogFiles(jobNames, messages, config=config)
 
+        def read():
+            if summary is None:
+                return jobStore.readStatsAndLogging(lambda fileHandle: callback(parseStats(fileHandle)))
+            # The summary is saved once per batch, so wait between batches
+            # rather than saving it for every file as they trickle in.
+            count = summary.read(jobStore, callback)
+            return 0 if count < cls.statsBatchSize else count
+
         while True:
             # This is a indirect way of getting a message to the thread to exit
             if stop.is_set():
-                jobStore.readStatsAndLogging(callback)
+                read()
                 break
-            if jobStore.readStatsAndLogging(callback) == 0:
+            if read() == 0:
                 time.sleep(0.5)  # Avoid cycling too fast
 
         # Finish the stats file
         text = json.dumps(dict(total_time=str(time.time() - startTime),
                                total_clock=str(getTotalCpuTime() - startClock)), ensure_ascii=True)
         jobStore.writeStatsAndLogging(text)
+        if summary is not None:
+            # Count our own time, without leaving it to be counted again
+            read()
 
     def check(self):
         """
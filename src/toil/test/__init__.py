@@ -342,6 +342,19 @@ def needs_kubernetes(test_item):
     return test_item
 
 
+def needs_kubernetes_installed(test_item):
+    """
+    Use as a decorator before test classes or methods to run only if the
+    Kubernetes module is installed, whether or not there is a cluster.
+    """
+    test_item = _mark_test('kubernetes', test_item)
+    try:
+        import kubernetes
+    except ImportError:
+        return unittest.skip("Install Toil with the 'kubernetes' extra to include this test.")(test_item)
+    return test_item
+
+
 def needs_mesos(test_item):
     """Use as a decorator before test classes or methods to run only if Mesos is installed."""
     test_item = _mark_test('mesos', test_item)
@@ -20,18 +20,22 @@ from builtins import range
 from builtins import object
 from past.utils import old_div
 from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
 from fractions import Fraction
 from inspect import getsource
+import collections
 import logging
 import os
 import fcntl
 import itertools
+import argparse
 import tempfile
 from textwrap import dedent
 import time
 import sys
 import subprocess
 from unittest import skipIf
+from unittest.mock import patch
 
 from toil.common import Config
 # Don't import any batch systems here that depend on extras
@@ -44,11 +48,13 @@ from toil.batchSystems.singleMachine import SingleMachineBatchSystem
 from toil.batchSystems.abstractBatchSystem import (InsufficientSystemResources,
                                                    BatchSystemSupport)
 from toil.job import Job, JobDescription
+from toil.leader import FailedJobsException
 from toil.lib.threading import cpu_count
 from toil.test import (ToilTest,
                        needs_aws_s3,
                        needs_lsf,
                        needs_kubernetes,
+                       needs_kubernetes_installed,
                        needs_fetchable_appliance,
                        needs_mesos,
                        needs_parasol,
@@ -243,7 +249,26 @@ class hidden(object):
             jobUpdateInfo = self.batchSystem.getUpdatedBatchJob(maxWait=1000)
             self.assertEqual(jobUpdateInfo.exitStatus, 23)
             self.assertEqual(jobUpdateInfo.jobID, job5)
-        
+
+        def testGetUpdatedBatchJobs(self):
+            jobIDs = set()
+            for i in range(3):
+                jobDesc = self._mockJobDescription(command='true', jobName='test%d' % i, unitName=None,
+                                                   jobStoreID=str(i), requirements=defaultRequirements)
+                jobIDs.add(self.batchSystem.issueBatchJob(jobDesc))
+
+            # Every job should come back exactly once, however the batch
+            # system decides to group them.
+            updatedIDs = set()
+            deadline = time.time() + 1000
+            while updatedIDs != jobIDs and time.time() < deadline:
+                for jobUpdateInfo in self.batchSystem.getUpdatedBatchJobs(maxWait=10):
+                    self.assertEqual(jobUpdateInfo.exitStatus, 0)
+                    self.assertNotIn(jobUpdateInfo.jobID, updatedIDs)
+                    updatedIDs.add(jobUpdateInfo.jobID)
+            self.assertEqual(updatedIDs, jobIDs)
+            self.assertEqual(self.batchSystem.getUpdatedBatchJobs(0), [])
+
         def testCheckResourceRequest(self):
             if isinstance(self.batchSystem, BatchSystemSupport):
                 checkResourceRequest = self.batchSystem.checkResourceRequest
@@ -381,6 +406,244 @@ class KubernetesBatchSystemTest(hidden.AbstractBatchSystemTest):
         return KubernetesBatchSystem(config=self.config,
                                      maxCores=numCores, maxMemory=1e9, maxDisk=2001)
 
+
+@needs_kubernetes_installed
+@travis_test
+class KubernetesInformerTest(ToilTest):
+    """
+    Tests that the Kubernetes batch system can keep track of its jobs by
+    watching them, against a fake Kubernetes API server.
+    """
+
+    # Matches the paths for listing or watching jobs and pods
+    listPath = r'^/(api/v1|apis/batch/v1)/namespaces/[^/]+/(jobs|pods)$'
+
+    def setUp(self):
+        super(KubernetesInformerTest, self).setUp()
+        from toil.test.batchSystems.fakeKubernetes import FakeKubernetes
+        self.fake = FakeKubernetes()
+
+    def tearDown(self):
+        self.fake.shutdown()
+        super(KubernetesInformerTest, self).tearDown()
+
+    def _createInformer(self):
+        import kubernetes
+        from toil.batchSystems.kubernetes import KubernetesInformer
+        configuration = kubernetes.client.Configuration()
+        configuration.host = self.fake.url()
+        client = kubernetes.client.ApiClient(configuration)
+        apis = {'batch': kubernetes.client.BatchV1Api(client), 'core': kubernetes.client.CoreV1Api(client)}
+        informer = KubernetesInformer(apis.get, self.fake.namespace, 'toil_run=ours')
+        # Make watches end often, to make sure we resume them properly
+        informer.watchTimeout = 1
+        informer.start()
+        return informer
+
+    def _waitFor(self, condition, timeout=10):
+        start = time.time()
+        while not condition():
+            self.assertLess(time.time() - start, timeout)
+            time.sleep(0.1)
+
+    def _addJob(self, name, run='ours'):
+        self.fake.put('jobs', {'apiVersion': 'batch/v1', 'kind': 'Job',
+                               'metadata': {'name': name, 'labels': {'toil_run': run}}, 'status': {}})
+
+    def testInformer(self):
+        self._addJob('a')
+        self._addJob('b')
+        self._addJob('c', run='theirs')
+        informer = self._createInformer()
+        try:
+            self.assertTrue(informer.waitForSync('jobs'))
+            self.assertEqual({'a', 'b'}, {job.metadata.name for job in informer.jobs()})
+
+            self.fake.runJob('a')
+            self._waitFor(lambda: informer.getPod('a') is not None)
+            self.assertEqual('Running', informer.getPod('a').status.phase)
+            self.fake.finishJob('a', exitCode=3)
+            self._waitFor(lambda: informer.getPod('a').status.phase == 'Failed')
+            self.assertEqual(3, informer.getPod('a').status.container_statuses[0].state.terminated.exit_code)
+
+            self.fake.delete('jobs', 'a')
+            self.assertTrue(informer.waitForJobDeath('a'))
+            # Pods are watched separately, so the pod can go a bit later
+            self._waitFor(lambda: informer.getPod('a') is None)
+
+            # Outlast a few watches, which should pick up where they left off
+            time.sleep(3)
+            self._addJob('d')
+            self._waitFor(lambda: {job.metadata.name for job in informer.jobs()} == {'b', 'd'})
+            self.assertEqual(2, len(self.fake.requests('GET', self.listPath, watch=False)))
+            self.assertGreater(len(self.fake.requests('GET', self.listPath, watch=True)), 2)
+        finally:
+            informer.stop()
+
+    def testRelist(self):
+        self._addJob('a')
+        self._addJob('b')
+        informer = self._createInformer()
+        try:
+            self.assertTrue(informer.waitForSync('jobs'))
+            self.assertEqual(2, len(informer.jobs()))
+            # The watches have to start over, from versions the server no
+            # longer has, and only a new list can tell the informer that a job
+            # went away in the meantime.
+            self.fake.forgetHistory()
+            self.fake.delete('jobs', 'a')
+            self.fake.forgetHistory()
+            self._waitFor(lambda: {job.metadata.name for job in informer.jobs()} == {'b'})
+            self.assertGreater(len(self.fake.requests('GET', '/jobs$', watch=False)), 1)
+        finally:
+            informer.stop()
+
+    def testDeletedJobNamesForgottenOnRelist(self):
+        self._addJob('a')
+        self._addJob('b')
+        informer = self._createInformer()
+        try:
+            self.assertTrue(informer.waitForSync('jobs'))
+            self.fake.delete('jobs', 'a')
+            self.assertTrue(informer.waitForJobDeath('a'))
+            self.assertEqual({'a'}, informer._deletedJobNames)
+            lists = len(self.fake.requests('GET', '/jobs$', watch=False))
+            self.fake.forgetHistory()
+            self._waitFor(lambda: len(self.fake.requests('GET', '/jobs$', watch=False)) > lists)
+            self._waitFor(lambda: not informer._deletedJobNames)
+            self.assertEqual({'b'}, {job.metadata.name for job in informer.jobs()})
+        finally:
+            informer.stop()
+
+    def testInformerTimesOut(self):
+        from toil.batchSystems.kubernetes import KubernetesInformer
+        # Never started, so it never lists anything or sees anything go
+        informer = KubernetesInformer(None, self.fake.namespace, 'toil_run=ours')
+        informer.waitTimeout = 0.1
+        self.assertFalse(informer.waitForSync('jobs'))
+        self.assertFalse(informer.waitForSync('pods'))
+        informer._jobs['a'] = None
+        self.assertFalse(informer.waitForJobDeath('a'))
+        self.assertTrue(informer.waitForJobDeath('b'))
+
+    def testBatchSystemWithoutInformer(self):
+        """
+        The batch system asks Kubernetes itself when the informer can't list
+        anything.
+        """
+        from toil.batchSystems.kubernetes import KubernetesInformer
+        with patch.object(KubernetesInformer, 'start'), patch.object(KubernetesInformer, 'waitTimeout', 0.1):
+            with self._batchSystem() as batchSystem:
+                jobID, = self._issueJobs(batchSystem, 1)
+                name = batchSystem.jobPrefix + str(jobID)
+                self.fake.runJob(name)
+                self.fake.finishJob(name, exitCode=1)
+                updates = []
+                start = time.time()
+                while not updates:
+                    self.assertLess(time.time() - start, 30)
+                    updates = batchSystem.getUpdatedBatchJobs(maxWait=1)
+                self.assertEqual([(jobID, 1)], [(update.jobID, update.exitStatus) for update in updates])
+                # And it can tell when the job has been cleaned up
+                self._waitFor(lambda: name not in self.fake.objects['jobs'])
+
+    @contextmanager
+    def _batchSystem(self, watch=True):
+        """
+        Make a Kubernetes batch system that talks to the fake API server, and
+        shut it down afterwards.
+        """
+        import kubernetes
+        from toil.batchSystems.kubernetes import KubernetesBatchSystem, KubernetesInformer
+
+        kubeConfig = os.path.join(self._createTempDir(), 'config')
+        self.fake.writeKubeConfig(kubeConfig)
+        config = Config()
+        config.workflowID = 'kubernetes-informer-test'
+        with patch.object(kubernetes.config.kube_config, 'KUBE_CONFIG_DEFAULT_LOCATION', kubeConfig), \
+                patch('toil.batchSystems.kubernetes.applianceSelf', return_value='fake'), \
+                patch.dict(os.environ), \
+                patch.object(KubernetesInformer, 'watchTimeout', 1):
+            if watch:
+                os.environ['KUBE_WATCH_ENABLED'] = 'True'
+            else:
+                os.environ.pop('KUBE_WATCH_ENABLED', None)
+            batchSystem = KubernetesBatchSystem(config=config, maxCores=numCores, maxMemory=1e9, maxDisk=2001)
+            try:
+                yield batchSystem
+            finally:
+                batchSystem.shutdown()
+
+    def _issueJobs(self, batchSystem, count):
+        return [batchSystem.issueBatchJob(JobDescription(command='true', jobName='test%d' % i,
+                                                         unitName=None, requirements=defaultRequirements))
+                for i in range(count)]
+
+    def testBatchSystem(self):
+        with self._batchSystem() as batchSystem:
+            jobIDs = self._issueJobs(batchSystem, 3)
+            self.assertEqual(set(jobIDs), set(batchSystem.getIssuedBatchJobIDs()))
+
+            names = [batchSystem.jobPrefix + str(jobID) for jobID in jobIDs]
+            for name in names:
+                self.fake.runJob(name)
+            self._waitFor(lambda: len(batchSystem.getRunningBatchJobIDs()) == 3)
+            self.fake.finishJob(names[0], exitCode=0)
+            self.fake.finishJob(names[1], exitCode=1)
+
+            updates = {}
+            start = time.time()
+            while len(updates) < 2:
+                self.assertLess(time.time() - start, 30)
+                for update in batchSystem.getUpdatedBatchJobs(maxWait=5):
+                    updates[update.jobID] = update.exitStatus
+            self.assertEqual({jobIDs[0]: 0, jobIDs[1]: 1}, updates)
+            self.assertEqual([jobIDs[2]], batchSystem.getIssuedBatchJobIDs())
+            self.assertEqual([jobIDs[2]], list(batchSystem.getRunningBatchJobIDs().keys()))
+
+            batchSystem.killBatchJobs([jobIDs[2]])
+            self.assertEqual([], batchSystem.getIssuedBatchJobIDs())
+
+            # Everything came from the first list of each kind, and the
+            # watches after it, except for asking after a pod whose watch had
+            # not caught up with its job's.
+            lists = [q for _, _, q in self.fake.requests('GET', self.listPath, watch=False)
+                     if 'job-name=' not in q.get('labelSelector', '')]
+            self.assertEqual(2, len(lists))
+
+    def testCleanupInBackground(self):
+        for watch in (True, False):
+            self.fake.logDelay = 0
+            logRequests = len(self.fake.requests('GET', '/log$'))
+            with self._batchSystem(watch=watch) as batchSystem:
+                jobIDs = self._issueJobs(batchSystem, 4)
+                names = [batchSystem.jobPrefix + str(jobID) for jobID in jobIDs]
+                for name in names:
+                    self.fake.runJob(name)
+                    self.fake.finishJob(name, exitCode=1)
+
+                # Failures should be reported without waiting for any logs
+                self.fake.logDelay = 3
+                updates = {}
+                start = time.time()
+                while len(updates) < 4:
+                    for update in batchSystem.getUpdatedBatchJobs(maxWait=1):
+                        self.assertNotIn(update.jobID, updates)
+                        updates[update.jobID] = update.exitStatus
+                self.assertLess(time.time() - start, self.fake.logDelay)
+                self.assertEqual({jobID: 1 for jobID in jobIDs}, updates)
+
+                # The jobs aren't gone yet, but aren't reported again
+                self.assertTrue(all(name in self.fake.objects['jobs'] for name in names))
+                self.assertEqual([], batchSystem.getUpdatedBatchJobs(maxWait=0))
+                self.assertEqual([], batchSystem.getIssuedBatchJobIDs())
+
+                # Then the logs are fetched, at the same time, and the jobs
+                # cleaned up.
+                self._waitFor(lambda: not any(name in self.fake.objects['jobs'] for name in names),
+                              timeout=self.fake.logDelay * 2)
+                self.assertEqual(logRequests + 4, len(self.fake.requests('GET', '/log$')))
+
 @slow
 @needs_mesos
 class MesosBatchSystemTest(hidden.AbstractBatchSystemTest, MesosTestSupport):
@@ -438,6 +701,120 @@ class SingleMachineBatchSystemTest(hidden.AbstractBatchSystemTest):
         return SingleMachineBatchSystem(config=self.config,
                                         maxCores=numCores, maxMemory=1e9, maxDisk=2001)
 
+    def testJobsWaitForResources(self):
+        """
+        Jobs that don't fit wait until running jobs give back what they need.
+        """
+        # Every job needs all the disk, so they have to run one at a time.
+        requirements = dict(defaultRequirements, disk=2001)
+        jobIDs = []
+        for i in range(3):
+            jobDesc = self._mockJobDescription(command='sleep 0.5', jobName='test%d' % i, unitName=None,
+                                               jobStoreID=str(i), requirements=requirements)
+            jobIDs.append(self.batchSystem.issueBatchJob(jobDesc))
+
+        finishedIDs = []
+        deadline = time.time() + 60
+        while len(finishedIDs) < len(jobIDs) and time.time() < deadline:
+            running = self.batchSystem.getRunningBatchJobIDs()
+            self.assertLessEqual(len(running), 1)
+            for jobUpdateInfo in self.batchSystem.getUpdatedBatchJobs(maxWait=0.1):
+                self.assertEqual(jobUpdateInfo.exitStatus, 0)
+                finishedIDs.append(jobUpdateInfo.jobID)
+        # The waiting jobs ran in the order they were issued
+        self.assertEqual(finishedIDs, jobIDs)
+
+    def testSmallJobsBackfill(self):
+        """
+        A small job that fits around the reservation for a waiting big job is
+        started right away.
+        """
+        running, big, small = self._runJobsWithDisk([(1500, 'sleep 2'), (1000, 'true'), (500, 'true')])
+        # The small job did not wait for the first one to finish
+        self.assertLess(self._finishOrder.index(small), self._finishOrder.index(running))
+        self.assertLess(self._finishOrder.index(running), self._finishOrder.index(big))
+
+    def testBigJobsDoNotStarve(self):
+        """
+        A small job that would take resources a waiting big job needs waits
+        behind the big job.
+        """
+        running, big, small = self._runJobsWithDisk([(1000, 'sleep 1'), (2001, 'true'), (500, 'true')])
+        self.assertEqual(self._finishOrder, [running, big, small])
+
+    def testCommandsOnlyTheShellCanParse(self):
+        """
+        A command that can't be split into arguments still goes to the shell,
+        with or without warm workers.
+        """
+        for warm in (False, True):
+            self.config.singleMachineWarmWorkers = warm
+            batchSystem = SingleMachineBatchSystem(config=self.config,
+                                                   maxCores=numCores, maxMemory=1e9, maxDisk=2001)
+            try:
+                jobDesc = self._mockJobDescription(command="true # don't split me", jobName='test',
+                                                   unitName=None, jobStoreID='1',
+                                                   requirements=defaultRequirements)
+                jobID = batchSystem.issueBatchJob(jobDesc)
+                updates = []
+                deadline = time.time() + 60
+                while not updates and time.time() < deadline:
+                    updates = batchSystem.getUpdatedBatchJobs(maxWait=0.1)
+                self.assertEqual([(jobID, 0)], [(update.jobID, update.exitStatus) for update in updates])
+            finally:
+                batchSystem.shutdown()
+
+    def testPriorityWithNothingAvailable(self):
+        """
+        Jobs can still be ordered when there is nothing left of any resource.
+        """
+        needs = (0, 0, 0)
+        self.batchSystem.waitingJobs[needs] = collections.deque([('true', 7, 0, 0, 0, {})])
+        try:
+            self.assertEqual(self.batchSystem._priorityKey(needs, [0, 0, 0]), (0, 7))
+        finally:
+            del self.batchSystem.waitingJobs[needs]
+
+    def testFailedStartReleasesResourcesOnce(self):
+        """
+        A job that can't be started gives back what it took, and no more.
+        """
+        pools = (self.batchSystem.coreFractions, self.batchSystem.memory, self.batchSystem.disk)
+        before = [pool.value for pool in pools]
+        with patch('toil.batchSystems.singleMachine.subprocess.Popen', side_effect=OSError('cannot fork')):
+            self.assertFalse(self.batchSystem._startChild('true', 7, 1, 100, 100, {}))
+        self.assertEqual([pool.value for pool in pools], before)
+        self.assertEqual(self.batchSystem.outputQueue.get_nowait().jobID, 7)
+
+    def _runJobsWithDisk(self, jobs):
+        """
+        Issue jobs with the given disk needs and commands, one after the
+        other, and wait for them all to finish.
+
+        :param list(tuple(int,str)) jobs: The disk need and command of each job.
+        :return: The job IDs, in the order the jobs were issued. The IDs in
+                 the order the jobs finished are left in self._finishOrder.
+        """
+        jobIDs = []
+        for i, (disk, command) in enumerate(jobs):
+            requirements = dict(defaultRequirements, cores=0.1, disk=disk)
+            jobDesc = self._mockJobDescription(command=command, jobName='test%d' % i, unitName=None,
+                                               jobStoreID=str(i), requirements=requirements)
+            jobIDs.append(self.batchSystem.issueBatchJob(jobDesc))
+            if i == 0:
+                # Make sure the first job is running before the others come in
+                while not self.batchSystem.getRunningBatchJobIDs():
+                    time.sleep(0.01)
+
+        self._finishOrder = []
+        deadline = time.time() + 60
+        while len(self._finishOrder) < len(jobIDs) and time.time() < deadline:
+            for jobUpdateInfo in self.batchSystem.getUpdatedBatchJobs(maxWait=0.1):
+                self.assertEqual(jobUpdateInfo.exitStatus, 0)
+                self._finishOrder.append(jobUpdateInfo.jobID)
+        self.assertEqual(sorted(self._finishOrder), sorted(jobIDs))
+        return jobIDs
+
 
 @slow
 class MaxCoresSingleMachineBatchSystemTest(ToilTest):
@@ -764,6 +1141,176 @@ class TorqueBatchSystemTest(hidden.AbstractGridEngineBatchSystemTest):
         for f in glob('toil_job_*.[oe]*'):
             os.unlink(f)
 
+@travis_test
+class GridEngineStatusPollingTest(ToilTest):
+    """
+    Tests that the grid engine batch systems check on all their jobs with one
+    status query per polling interval, and submit jobs that need the same
+    resources as array jobs, against fake scheduler commands.
+    """
+
+    class FakeBoss(object):
+        def __init__(self):
+            self.config = argparse.Namespace(statePollingWait=1, maxLocalJobs=100, manualMemArgs=False)
+            self.environment = {}
+
+        def with_retries(self, operation, *args, **kwargs):
+            return operation(*args, **kwargs)
+
+        def formatStdOutErrPath(self, jobID, batchSystem, batchJobIDfmt, fileDesc):
+            return os.devnull
+
+    def testSlurm(self):
+        from toil.batchSystems.slurm import SlurmBatchSystem
+        self._testCheckOnJobs('slurm', SlurmBatchSystem.Worker, 'sacct')
+
+    def testGridEngine(self):
+        from toil.batchSystems.gridengine import GridEngineBatchSystem
+        self._testCheckOnJobs('gridengine', GridEngineBatchSystem.Worker, 'qstat')
+
+    def testLSF(self):
+        from toil.batchSystems.lsf import LSFBatchSystem
+        self._testCheckOnJobs('lsf', LSFBatchSystem.Worker, 'bjobs')
+
+    def testTorque(self):
+        from toil.batchSystems.torque import TorqueBatchSystem
+        self._testCheckOnJobs('torque', TorqueBatchSystem.Worker, 'qstat', batchIDFormat='%d.fake')
+
+    def _testCheckOnJobs(self, flavor, workerClass, statusCommand, batchIDFormat='%d'):
+        from six.moves.queue import Queue
+        from toil.test.batchSystems.fakeScheduler import FakeScheduler
+
+        scheduler = FakeScheduler(flavor, self._createTempDir())
+        expected = {}
+        with patch.dict(os.environ, scheduler.environment()):
+            updatedJobsQueue = Queue()
+            worker = workerClass(Queue(), updatedJobsQueue, Queue(), Queue(), self.FakeBoss())
+            for jobID in range(30):
+                batchJobID = 1000 + jobID
+                state = ('queued', 'running', 'done')[jobID % 3]
+                scheduler.setJob(batchJobID, state, exitCode=jobID % 2)
+                if state == 'done':
+                    expected[jobID] = jobID % 2
+                worker.batchJobIDs[jobID] = (batchIDFormat % batchJobID, None)
+                worker.runningJobs.add(jobID)
+
+            self.assertTrue(worker.checkOnJobs())
+
+        updates = {}
+        while not updatedJobsQueue.empty():
+            update = updatedJobsQueue.get()
+            updates[update.jobID] = update.exitStatus
+        self.assertEqual(expected, updates)
+        self.assertEqual(set(range(30)) - set(expected), worker.runningJobs)
+        self.assertEqual(1, len([call for call in scheduler.calls() if call[0] == statusCommand]))
+
+    def testSlurmArray(self):
+        from toil.batchSystems.slurm import SlurmBatchSystem
+        self._testArraySubmission('slurm', SlurmBatchSystem.Worker, 'sbatch')
+
+    def testGridEngineArray(self):
+        from toil.batchSystems.gridengine import GridEngineBatchSystem
+        self._testArraySubmission('gridengine', GridEngineBatchSystem.Worker, 'qsub')
+
+    def testLSFArray(self):
+        from toil.batchSystems.lsf import LSFBatchSystem
+        self._testArraySubmission('lsf', LSFBatchSystem.Worker, 'bsub')
+
+    def _testArraySubmission(self, flavor, workerClass, submitCommand):
+        from six.moves.queue import Queue
+        from toil.test.batchSystems.fakeScheduler import FakeScheduler
+
+        scheduler = FakeScheduler(flavor, self._createTempDir())
+        with patch.dict(os.environ, scheduler.environment()):
+            updatedJobsQueue = Queue()
+            worker = workerClass(Queue(), updatedJobsQueue, Queue(), Queue(), self.FakeBoss())
+            # Ten jobs that need the same resources, and two that don't
+            for jobID in range(12):
+                memory = 2 ** 30 if jobID < 10 else 2 ** 31 + jobID
+                worker.waitingJobs.append((jobID, 1, memory, 'echo %d' % jobID, 'job'))
+            self.assertTrue(worker.createJobs(None))
+            self.assertEqual(3, len([call for call in scheduler.calls() if call[0] == submitCommand]))
+            self.assertEqual(set(range(12)), worker.runningJobs)
+
+            arrayID = worker.batchJobIDs[0][0]
+            for jobID in range(10):
+                self.assertEqual((arrayID, jobID + 1), worker.batchJobIDs[jobID])
+                if jobID % 2 == 0:
+                    scheduler.setJob(worker.getBatchSystemID(jobID), 'done', exitCode=jobID % 4)
+                else:
+                    scheduler.setJob(worker.getBatchSystemID(jobID), 'running')
+            for jobID in (10, 11):
+                self.assertIsNone(worker.batchJobIDs[jobID][1])
+
+            self.assertTrue(worker.checkOnJobs())
+
+        updates = {}
+        while not updatedJobsQueue.empty():
+            update = updatedJobsQueue.get()
+            updates[update.jobID] = update.exitStatus
+        self.assertEqual({0: 0, 2: 2, 4: 0, 6: 2, 8: 0}, updates)
+        self.assertEqual({1, 3, 5, 7, 9, 10, 11}, worker.runningJobs)
+
+    def testSlurmArrayTaskLogs(self):
+        from toil.batchSystems.slurm import SlurmBatchSystem
+        self._testArrayTaskLogs('slurm', SlurmBatchSystem.Worker,
+                                ('SLURM_ARRAY_JOB_ID', 'SLURM_ARRAY_TASK_ID'))
+
+    def testGridEngineArrayTaskLogs(self):
+        from toil.batchSystems.gridengine import GridEngineBatchSystem
+        self._testArrayTaskLogs('gridengine', GridEngineBatchSystem.Worker, ('JOB_ID', 'SGE_TASK_ID'))
+
+    def testLSFArrayTaskLogs(self):
+        from toil.batchSystems.lsf import LSFBatchSystem
+        self._testArrayTaskLogs('lsf', LSFBatchSystem.Worker, ('LSB_JOBID', 'LSB_JOBINDEX'))
+
+    def _testArrayTaskLogs(self, flavor, workerClass, idVariables):
+        """
+        Run the tasks of an array job, one of which fails, as the batch system
+        would, and check that the leader would find the failed task's output
+        under its own Toil job ID.
+        """
+        from glob import glob
+        from six.moves.queue import Queue
+        from toil.test.batchSystems.fakeScheduler import FakeScheduler
+
+        workDir = self._createTempDir()
+        boss = self.FakeBoss()
+        boss.config.workflowID = 'wf'
+        boss.config.workDir = workDir
+        boss.config.noStdOutErr = False
+        boss.formatStdOutErrPath = BatchSystemSupport.formatStdOutErrPath.__get__(boss)
+
+        scheduler = FakeScheduler(flavor, self._createTempDir())
+        with patch.dict(os.environ, scheduler.environment()):
+            worker = workerClass(Queue(), Queue(), Queue(), Queue(), boss)
+            jobIDs = [5, 7, 12]
+            commands = ['echo fine', 'echo oops >&2; exit 3', 'echo fine']
+            subLine = worker.prepareArraySubmission(1, 2 ** 30, jobIDs, commands, 'job')
+        arrayCommand = subLine[-1]
+        if arrayCommand.startswith('--wrap='):
+            arrayCommand = arrayCommand[len('--wrap='):]
+
+        for task in range(1, len(commands) + 1):
+            env = dict(os.environ, **dict(zip(idVariables, ('1234', str(task)))))
+            exitCode = subprocess.call(['/bin/sh', '-c', arrayCommand], env=env)
+            self.assertEqual(3 if task == 2 else 0, exitCode)
+
+        for jobID in jobIDs:
+            # This is the glob the leader uses for a failed job
+            logs = glob(os.path.join(workDir, 'toil_workflow_wf_job_{}_batch_*.log'.format(jobID)))
+            self.assertEqual(2, len(logs))
+            contents = {}
+            for log in logs:
+                self.assertIn('1234', os.path.basename(log))
+                with open(log) as f:
+                    contents['error' if log.endswith('_std_error.log') else 'output'] = f.read()
+            if jobID == 7:
+                self.assertEqual({'output': '', 'error': 'oops\n'}, contents)
+            else:
+                self.assertEqual({'output': 'fine\n', 'error': ''}, contents)
+
+
 @slow
 @needs_htcondor
 class HTCondorBatchSystemTest(hidden.AbstractGridEngineBatchSystemTest):
@@ -891,6 +1438,63 @@ class SingleMachineBatchSystemJobTest(hidden.AbstractBatchSystemJobTest):
         assert outString.startswith(possibleStarts)
         assert outString.endswith('sJCsJGCfJC')
 
+    def testWarmWorkers(self):
+        """
+        Jobs run in workers forked from the zygote, and a job that fails there
+        does not take the others down.
+        """
+        tempDir = self._createTempDir('testFiles')
+
+        options = Job.Runner.getDefaultOptions(self._getTestJobStorePath())
+        options.batchSystem = self.batchSystemName
+        options.singleMachineWarmWorkers = True
+        options.retryCount = 0
+
+        root = Job()
+        for i in range(3):
+            root.addChildFn(_writeParentPID, os.path.join(tempDir, str(i)))
+        root.addChildFn(_failJob)
+        with self.assertRaises(FailedJobsException):
+            Job.Runner.startToil(root, options)
+
+        self.assertEqual(['0', '1', '2'], sorted(os.listdir(tempDir)))
+        for name in os.listdir(tempDir):
+            with open(os.path.join(tempDir, name)) as f:
+                # The zygote, not we, started the worker
+                self.assertNotEqual(os.getpid(), int(f.read()))
+
+    def testWarmWorkersUseJobTempDir(self):
+        """
+        Jobs in workers forked from the zygote put temporary files in the
+        TMPDIR they were given, as jobs in workers started fresh do.
+        """
+        tempDir = self._createTempDir('testFiles')
+        jobTempDir = self._createTempDir('jobTemp')
+
+        options = Job.Runner.getDefaultOptions(self._getTestJobStorePath())
+        options.batchSystem = self.batchSystemName
+        options.singleMachineWarmWorkers = True
+        options.environment = ['TMPDIR=' + jobTempDir]
+
+        outFile = os.path.join(tempDir, 'tempdir')
+        Job.Runner.startToil(Job.wrapFn(_writeTempDir, outFile), options)
+        with open(outFile) as f:
+            self.assertEqual(jobTempDir, f.read())
+
+
+def _writeParentPID(path):
+    with open(path, 'w') as f:
+        f.write(str(os.getppid()))
+
+
+def _writeTempDir(path):
+    with open(path, 'w') as f:
+        f.write(tempfile.gettempdir())
+
+
+def _failJob():
+    raise RuntimeError('This job fails on purpose')
+
 
 def _resourceBlockTestAuxFn(outFile, sleepTime, writeVal):
     """
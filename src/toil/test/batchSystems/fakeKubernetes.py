@@ -0,0 +1,343 @@
+# Copyright (C) 2015-2020 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A stand-in for a Kubernetes API server, for testing the Kubernetes batch system
+without a cluster.
+
+FakeKubernetes serves just enough of the API over HTTP for the real Kubernetes
+client to create, read, list, watch and delete jobs, and to list and watch
+their pods. Tests move jobs along with runJob() and finishJob(), can look at
+every request made with requests(), and can slow down fetching pod logs with
+logDelay. Every change gets a resourceVersion, and forgetHistory() makes
+watches from earlier versions fail with 410 Gone, the way a real API server
+does after compacting its history.
+"""
+
+import datetime
+import json
+import re
+import threading
+import time
+import yaml
+
+from six.moves import socketserver as SocketServer
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.urllib.parse import urlparse, parse_qs
+
+# Maps (method, path pattern) to the name of the FakeKubernetes method that
+# answers it. Patterns capture the namespace and then any object name.
+routes = [('POST', r'/apis/batch/v1/namespaces/([^/]+)/jobs', '_createJob'),
+          ('GET', r'/apis/batch/v1/namespaces/([^/]+)/jobs', '_listJobs'),
+          ('GET', r'/apis/batch/v1/namespaces/([^/]+)/jobs/([^/]+)', '_readJob'),
+          ('DELETE', r'/apis/batch/v1/namespaces/([^/]+)/jobs/([^/]+)', '_deleteJob'),
+          ('GET', r'/api/v1/namespaces/([^/]+)/pods', '_listPods'),
+          ('GET', r'/api/v1/namespaces/([^/]+)/pods/([^/]+)/log', '_readPodLog'),
+          ('GET', r'/apis/metrics.k8s.io/v1beta1/namespaces/([^/]+)/pods', '_listPodMetrics')]
+
+
+def _now():
+    return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _status(code, reason, message):
+    return {'kind': 'Status', 'apiVersion': 'v1', 'metadata': {}, 'status': 'Failure',
+            'message': message, 'reason': reason, 'code': code}
+
+
+class _Server(SocketServer.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Watches need chunked responses
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode('utf-8')) if length else None
+        fake = self.server.fake
+        with fake.condition:
+            fake.calls.append((method, url.path, query))
+        for routeMethod, pattern, handler in routes:
+            match = re.match('^' + pattern + '$', url.path)
+            if routeMethod == method and match:
+                getattr(fake, handler)(self, query, body, *match.groups())
+                return
+        self.sendJSON(404, _status(404, 'NotFound', 'No route for ' + url.path))
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def sendJSON(self, code, content):
+        data = json.dumps(content).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def startChunks(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def sendChunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+
+class FakeKubernetes(object):
+    """
+    A fake Kubernetes API server with one namespace, serving on localhost.
+    """
+
+    def __init__(self, namespace='default'):
+        self.namespace = namespace
+        # Maps 'jobs' and 'pods' to dicts from name to object
+        self.objects = {'jobs': {}, 'pods': {}}
+        # Every change, as (resourceVersion, kind, event type, object)
+        self.events = []
+        self.resourceVersion = 0
+        # Watches from versions before this one get 410 Gone
+        self.oldestVersion = 0
+        # Bumped by forgetHistory() to end open watches
+        self.generation = 0
+        self.closed = False
+        # Every request, as (method, path, query)
+        self.calls = []
+        # How long to take to fetch a pod's log, in seconds
+        self.logDelay = 0
+        self.condition = threading.Condition()
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.fake = self
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def writeKubeConfig(self, path):
+        """
+        Write a kubeconfig file for talking to this server.
+        """
+        config = {'apiVersion': 'v1', 'kind': 'Config',
+                  'clusters': [{'name': 'fake', 'cluster': {'server': self.url()}}],
+                  'users': [{'name': 'fake', 'user': {'token': 'fake'}}],
+                  'contexts': [{'name': 'fake', 'context': {'cluster': 'fake', 'user': 'fake',
+                                                            'namespace': self.namespace}}],
+                  'current-context': 'fake'}
+        with open(path, 'w') as f:
+            yaml.safe_dump(config, f)
+
+    def shutdown(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def requests(self, method=None, path=None, watch=None):
+        """
+        Get the requests made so far, as (method, path, query) tuples,
+        optionally only those with the given method, path regex, and whether
+        or not they were watches.
+        """
+        with self.condition:
+            return [(m, p, q) for m, p, q in self.calls
+                    if (method is None or m == method) and
+                    (path is None or re.search(path, p)) and
+                    (watch is None or (q.get('watch', '').lower() == 'true') == watch)]
+
+    def forgetHistory(self):
+        """
+        Forget all changes made so far, ending all watches, so that watches
+        from any version seen so far get 410 Gone.
+        """
+        with self.condition:
+            self.resourceVersion += 1
+            self.oldestVersion = self.resourceVersion
+            self.events = []
+            self.generation += 1
+            self.condition.notify_all()
+
+    def put(self, kind, item, eventType=None):
+        """
+        Store an object of the given kind ('jobs' or 'pods'), giving it a new
+        resourceVersion, and tell watchers.
+        """
+        with self.condition:
+            name = item['metadata']['name']
+            if eventType is None:
+                eventType = 'MODIFIED' if name in self.objects[kind] else 'ADDED'
+            self.resourceVersion += 1
+            item['metadata']['resourceVersion'] = str(self.resourceVersion)
+            item['metadata'].setdefault('namespace', self.namespace)
+            if eventType == 'DELETED':
+                self.objects[kind].pop(name, None)
+            else:
+                self.objects[kind][name] = item
+            self.events.append((self.resourceVersion, kind, eventType, json.loads(json.dumps(item))))
+            self.condition.notify_all()
+
+    def delete(self, kind, name):
+        """
+        Delete an object if it exists. Jobs take their pods with them.
+        """
+        with self.condition:
+            if kind == 'jobs':
+                for podName, pod in list(self.objects['pods'].items()):
+                    if pod['metadata']['labels'].get('job-name') == name:
+                        self.put('pods', pod, 'DELETED')
+            if name in self.objects[kind]:
+                self.put(kind, self.objects[kind][name], 'DELETED')
+
+    def runJob(self, name):
+        """
+        Start a pod running for the job with the given name.
+        """
+        with self.condition:
+            job = self.objects['jobs'][name]
+            labels = dict(job['metadata'].get('labels') or {}, **{'job-name': name})
+            job['status'] = {'active': 1, 'startTime': _now()}
+            self.put('jobs', job)
+            self.put('pods', {'apiVersion': 'v1', 'kind': 'Pod',
+                              'metadata': {'name': name + '-pod', 'labels': labels},
+                              'spec': {'containers': [{'name': 'runner-container', 'image': 'fake',
+                                                       'resources': {'limits': {'memory': '1Gi'}}}]},
+                              'status': {'phase': 'Running', 'startTime': _now(),
+                                         'containerStatuses': [self._containerStatus({'running': {'startedAt': _now()}})]}})
+
+    def finishJob(self, name, exitCode=0):
+        """
+        Finish the running job with the given name, with the given exit code.
+        """
+        with self.condition:
+            pod = self.objects['pods'][name + '-pod']
+            pod['status']['phase'] = 'Succeeded' if exitCode == 0 else 'Failed'
+            pod['status']['containerStatuses'] = [self._containerStatus(
+                {'terminated': {'exitCode': exitCode, 'startedAt': pod['status']['startTime'], 'finishedAt': _now()}})]
+            self.put('pods', pod)
+            job = self.objects['jobs'][name]
+            job['status'] = {'startTime': job['status']['startTime'],
+                             'succeeded' if exitCode == 0 else 'failed': 1}
+            self.put('jobs', job)
+
+    def _containerStatus(self, state):
+        return {'name': 'runner-container', 'image': 'fake', 'imageID': '', 'ready': False,
+                'restartCount': 0, 'state': state}
+
+    def _matches(self, item, query):
+        selector = query.get('labelSelector')
+        if not selector:
+            return True
+        labels = item['metadata'].get('labels') or {}
+        return all(labels.get(k) == v for k, v in (term.split('=', 1) for term in selector.split(',')))
+
+    def _listOrWatch(self, request, query, kind, listKind, apiVersion):
+        if query.get('watch', '').lower() == 'true':
+            self._watch(request, query, kind)
+            return
+        with self.condition:
+            items = [item for item in self.objects[kind].values() if self._matches(item, query)]
+            request.sendJSON(200, {'kind': listKind, 'apiVersion': apiVersion,
+                                   'metadata': {'resourceVersion': str(self.resourceVersion)},
+                                   'items': items})
+
+    def _watch(self, request, query, kind):
+        request.startChunks()
+        since = int(query.get('resourceVersion') or 0)
+        timeout = float(query.get('timeoutSeconds') or 60)
+        with self.condition:
+            generation = self.generation
+            if since < self.oldestVersion:
+                events = [{'type': 'ERROR', 'object': _status(410, 'Expired', 'too old resource version')}]
+                done = True
+            else:
+                events = []
+                done = False
+        try:
+            deadline = datetime.datetime.now() + datetime.timedelta(seconds=timeout)
+            while True:
+                for event in events:
+                    request.sendChunk(json.dumps(event).encode('utf-8') + b'\n')
+                if done:
+                    break
+                with self.condition:
+                    self.condition.wait_for(lambda: any(v > since for v, _, _, _ in self.events) or
+                                            self.generation != generation or self.closed,
+                                            (deadline - datetime.datetime.now()).total_seconds())
+                    if self.generation != generation or self.closed or datetime.datetime.now() >= deadline:
+                        break
+                    events = [{'type': t, 'object': o} for v, k, t, o in self.events
+                              if v > since and k == kind and self._matches(o, query)]
+                    since = self.events[-1][0]
+            request.sendChunk(b'')
+        except (IOError, OSError):
+            # The client went away
+            pass
+
+    def _createJob(self, request, query, body, namespace):
+        body['status'] = {}
+        self.put('jobs', body)
+        request.sendJSON(201, body)
+
+    def _listJobs(self, request, query, body, namespace):
+        self._listOrWatch(request, query, 'jobs', 'JobList', 'batch/v1')
+
+    def _readJob(self, request, query, body, namespace, name):
+        with self.condition:
+            job = self.objects['jobs'].get(name)
+        if job is None:
+            request.sendJSON(404, _status(404, 'NotFound', 'jobs "%s" not found' % name))
+        else:
+            request.sendJSON(200, job)
+
+    def _deleteJob(self, request, query, body, namespace, name):
+        with self.condition:
+            found = name in self.objects['jobs']
+            self.delete('jobs', name)
+        if found:
+            request.sendJSON(200, {'kind': 'Status', 'apiVersion': 'v1', 'metadata': {}, 'status': 'Success'})
+        else:
+            request.sendJSON(404, _status(404, 'NotFound', 'jobs "%s" not found' % name))
+
+    def _listPods(self, request, query, body, namespace):
+        self._listOrWatch(request, query, 'pods', 'PodList', 'v1')
+
+    def _readPodLog(self, request, query, body, namespace, name):
+        time.sleep(self.logDelay)
+        data = b'Log of ' + name.encode('utf-8')
+        request.send_response(200)
+        request.send_header('Content-Type', 'text/plain')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def _listPodMetrics(self, request, query, body, namespace):
+        request.sendJSON(200, {'kind': 'PodMetricsList', 'apiVersion': 'metrics.k8s.io/v1beta1',
+                               'metadata': {}, 'items': []})
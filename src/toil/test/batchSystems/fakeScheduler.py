@@ -0,0 +1,243 @@
+# Copyright (C) 2015-2020 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Stand-ins for the command line tools of grid engine schedulers, for testing the
+grid engine batch systems without a cluster.
+
+FakeScheduler puts scripts named after the scheduler's commands (sacct, qstat,
+bjobs, ...) in a directory, to be put on the PATH. They answer from a JSON file
+of job states, which tests fill in with setJob() and the fake submission
+commands add queued jobs to, and log every call so tests can count them. Array
+job tasks are kept under IDs like 1234.5. Run as a script, this module is what
+those commands execute.
+"""
+
+import json
+import os
+import stat
+import sys
+
+# The commands each scheduler's batch system may call.
+schedulerCommands = {'slurm': ['sbatch', 'sacct', 'squeue', 'scontrol'],
+                     'gridengine': ['qsub', 'qstat', 'qacct'],
+                     'lsf': ['bsub', 'bjobs', 'bacct'],
+                     'torque': ['qstat', 'pbsnodes']}
+
+
+class FakeScheduler(object):
+    """
+    A fake scheduler of the given flavor, one of the keys of schedulerCommands,
+    with its commands in the given directory.
+    """
+
+    def __init__(self, flavor, directory):
+        self.flavor = flavor
+        self.binDir = os.path.join(directory, 'bin')
+        self.stateFile = os.path.join(directory, 'jobs.json')
+        self.logFile = os.path.join(directory, 'calls.log')
+        os.mkdir(self.binDir)
+        for command in schedulerCommands[flavor]:
+            path = os.path.join(self.binDir, command)
+            with open(path, 'w') as f:
+                f.write('#!/bin/sh\nexec "%s" "%s" %s %s "$@"\n' % (sys.executable, os.path.abspath(__file__),
+                                                                   flavor, command))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        _save(self.stateFile, {})
+        open(self.logFile, 'w').close()
+
+    def setJob(self, jobID, state, exitCode=0):
+        """
+        Set the state of a job or array task: 'queued', 'running' or 'done',
+        with the given exit code if it is done.
+        """
+        jobs = self.jobs()
+        jobs[str(jobID)] = {'state': state, 'exit': exitCode}
+        _save(self.stateFile, jobs)
+
+    def jobs(self):
+        """
+        Get the states of all the jobs and array tasks, by ID.
+        """
+        with open(self.stateFile) as f:
+            return json.load(f)
+
+    def calls(self):
+        """
+        Get the argument lists of all the commands run so far.
+        """
+        with open(self.logFile) as f:
+            return [json.loads(line) for line in f]
+
+    def environment(self):
+        """
+        Get the environment variables that put the fake commands on the PATH.
+        """
+        return {'PATH': self.binDir + os.pathsep + os.environ.get('PATH', ''),
+                'TOIL_FAKE_SCHEDULER_STATE': self.stateFile,
+                'TOIL_FAKE_SCHEDULER_LOG': self.logFile}
+
+
+def _save(stateFile, jobs):
+    with open(stateFile, 'w') as f:
+        json.dump(jobs, f)
+
+
+def _submit(jobs, tasks):
+    """
+    Queue a new job, with the given number of array tasks if not None, and
+    return its ID.
+    """
+    jobID = str(max([int(jobID.split('.')[0]) for jobID in jobs] + [4999]) + 1)
+    if tasks is None:
+        jobs[jobID] = {'state': 'queued', 'exit': 0}
+    for task in range(1, (tasks or 0) + 1):
+        jobs['%s.%d' % (jobID, task)] = {'state': 'queued', 'exit': 0}
+    return jobID
+
+
+def _arraySize(spec):
+    # Like 1-10
+    return int(spec.split('-')[1])
+
+
+def _slurm(command, args, jobs):
+    states = {'queued': 'PENDING', 'running': 'RUNNING'}
+    if command == 'sbatch':
+        tasks = None
+        for arg in args:
+            if arg.startswith('--array='):
+                tasks = _arraySize(arg[len('--array='):])
+        print('Submitted batch job %s' % _submit(jobs, tasks))
+        return 0
+    elif command == 'sacct':
+        for jobID in args[args.index('-j') + 1].split(','):
+            if jobID.replace('_', '.') in jobs:
+                job = jobs[jobID.replace('_', '.')]
+                state = states.get(job['state'], 'COMPLETED' if job['exit'] == 0 else 'FAILED')
+                print('%s|%s|%d:0' % (jobID, state, job['exit']))
+                print('%s.batch|%s|%d:0' % (jobID, state, job['exit']))
+        return 0
+    elif command == 'squeue':
+        for jobID, job in jobs.items():
+            if job['state'] in states:
+                print('%s %s 1:00' % (jobID.replace('.', '_'), 'R' if job['state'] == 'running' else 'PD'))
+        return 0
+    return 1
+
+
+def _gridengine(command, args, jobs):
+    if command == 'qsub':
+        tasks = _arraySize(args[args.index('-t') + 1]) if '-t' in args else None
+        jobID = _submit(jobs, tasks)
+        print(jobID if tasks is None else '%s.1-%d:1' % (jobID, tasks))
+        return 0
+    elif command == 'qstat' and '-j' not in args:
+        print('job-ID  prior   name       user         state submit/start at     queue                          slots ja-task-ID')
+        print('-' * 100)
+        for jobID, job in jobs.items():
+            if job['state'] != 'done':
+                jobID, _, task = jobID.partition('.')
+                # Only running jobs are in a queue
+                queue = 'all.q@node1 ' if job['state'] == 'running' else ''
+                print('%s 0.55500 toil_job_1 toil %s 01/01/2020 10:00:00 %s1 %s' %
+                      (jobID, 'r' if job['state'] == 'running' else 'qw', queue, task))
+        return 0
+    jobID = args[args.index('-j') + 1]
+    if '-t' in args:
+        jobID += '.' + args[args.index('-t') + 1]
+    if command == 'qstat':
+        if jobID in jobs and jobs[jobID]['state'] != 'done':
+            print('job_number: %s' % jobID)
+            return 0
+        sys.stderr.write('Following jobs do not exist:\n%s\n' % jobID)
+        return 1
+    elif command == 'qacct':
+        if jobID in jobs and jobs[jobID]['state'] == 'done':
+            print('failed       0\nexit_status  %d' % jobs[jobID]['exit'])
+            return 0
+        sys.stderr.write('error: job id %s not found\n' % jobID)
+        return 1
+    return 1
+
+
+def _lsf(command, args, jobs):
+    if command == 'bsub':
+        name = args[args.index('-J') + 1]
+        tasks = _arraySize(name[name.index('[') + 1:-1]) if '[' in name else None
+        print('Job <%s> is submitted to default queue <normal>.' % _submit(jobs, tasks))
+        return 0
+    elif command == 'bjobs':
+        records = []
+        found = True
+        for lsfJobID in args[3:]:
+            # Array tasks are like 1234[5]
+            jobID, _, task = lsfJobID.rstrip(']').partition('[')
+            if task:
+                jobID += '.' + task
+            if jobID not in jobs:
+                records.append({'JOBID': lsfJobID, 'ERROR': 'Job <%s> is not found' % lsfJobID})
+                found = False
+                continue
+            job = jobs[jobID]
+            if job['state'] == 'done':
+                stat = 'DONE' if job['exit'] == 0 else 'EXIT'
+            else:
+                stat = 'RUN' if job['state'] == 'running' else 'PEND'
+            records.append({'JOBID': jobID.split('.')[0], 'JOBINDEX': task or '0', 'USER': 'toil', 'STAT': stat,
+                            'EXIT_CODE': str(job['exit']) if stat == 'EXIT' else '',
+                            'EXIT_REASON': '', 'PEND_REASON': ''})
+        print(json.dumps({'COMMAND': 'bjobs', 'JOBS': len(records), 'RECORDS': records}, indent=2))
+        return 0 if found else 255
+    elif command == 'bacct':
+        return 0
+    return 1
+
+
+def _torque(command, args, jobs):
+    if command == 'pbsnodes':
+        print('pbs_version = 6.1.2')
+        return 0
+    elif command == 'qstat' and '-f' in args:
+        status = 0
+        for jobID in args[args.index('-f') + 1:]:
+            if jobID not in jobs:
+                sys.stderr.write('qstat: Unknown Job Id %s.fake\n' % jobID)
+                status = 153
+                continue
+            job = jobs[jobID]
+            print('Job Id: %s.fake' % jobID)
+            print('    Job_Name = toil_job_1')
+            print('    job_state = %s' % {'queued': 'Q', 'running': 'R'}.get(job['state'], 'C'))
+            if job['state'] == 'done':
+                print('    exit_status = %d' % job['exit'])
+            print('')
+        return status
+    return 1
+
+
+def main(args):
+    flavor, command, args = args[0], args[1], args[2:]
+    with open(os.environ['TOIL_FAKE_SCHEDULER_LOG'], 'a') as f:
+        f.write(json.dumps([command] + args) + '\n')
+    with open(os.environ['TOIL_FAKE_SCHEDULER_STATE']) as f:
+        jobs = json.load(f)
+    status = {'slurm': _slurm, 'gridengine': _gridengine, 'lsf': _lsf, 'torque': _torque}[flavor](command, args, jobs)
+    if command in ('sbatch', 'qsub', 'bsub'):
+        _save(os.environ['TOIL_FAKE_SCHEDULER_STATE'], jobs)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
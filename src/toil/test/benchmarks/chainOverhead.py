@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Copyright (C) 2015-2020 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure how long a worker takes to chain from one job that does nothing to
+the next, with and without the caching file store.
+
+A linear chain of no-op jobs is run, each the only child of the one before,
+so the whole chain runs in a single worker and the time per job is the
+overhead of running a job and chaining to the next one.
+
+Invoke like:
+
+    python -m toil.test.benchmarks.chainOverhead ./jobstore --numJobs 10000
+"""
+
+import argparse
+import sys
+import time
+
+from toil.common import Toil
+from toil.job import Job
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('--numJobs', type=int, default=10000,
+                        help="Number of no-op jobs to chain together")
+
+    Job.Runner.addToilOptions(parser)
+
+    options = parser.parse_args(sys.argv[1:])
+    options.clean = 'always'
+
+    for caching in (True, False):
+        options.disableCaching = not caching
+        with Toil(options) as toil:
+            start = time.time()
+            toil.start(Job.wrapJobFn(chain, options.numJobs, cores=0.1, memory='100M', disk='10M'))
+            elapsed = time.time() - start
+        print('{}: {:.2f} milliseconds per job'.format('Caching' if caching else 'Not caching',
+                                                       1000 * elapsed / (options.numJobs + 1)))
+
+
+def chain(job, remaining):
+    if remaining > 0:
+        job.addChildJobFn(chain, remaining - 1, cores=0.1, memory='100M', disk='10M')
+
+
+if __name__ == "__main__":
+    main()
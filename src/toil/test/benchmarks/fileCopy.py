@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Copyright (C) 2015-2020 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the throughput of the ways local job stores copy and stream files.
+
+A file of random data is written to the given directory, and then copied and
+read back with each method in turn: copying through Python the way Toil used
+to, copying in the kernel with toil.lib.misc.atomic_copy and atomic_copyobj,
+and reading through a normal file object and through a memory-mapped one.
+Point it at the filesystem your job store lives on, since reflinks and
+server-side copies depend on it.
+
+Invoke like:
+
+    python -m toil.test.benchmarks.fileCopy /scratch/benchmark --size 1G
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from toil.lib.humanize import human2bytes
+from toil.lib.misc import atomic_copy, atomic_copyobj, open_mapped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('directory',
+                        help="Directory to make the test files in")
+    parser.add_argument('--size', type=human2bytes, default='1G',
+                        help="Size of the test file")
+    parser.add_argument('--repeats', type=int, default=3,
+                        help="Number of times to run each method; the best run is reported")
+
+    options = parser.parse_args(sys.argv[1:])
+
+    workDir = tempfile.mkdtemp(dir=options.directory)
+    try:
+        source = os.path.join(workDir, 'source')
+        writeRandomFile(source, options.size)
+
+        methods = [('copy through Python', copyThroughPython),
+                   ('atomic_copy', atomic_copy),
+                   ('atomic_copyobj', copyFromStream),
+                   ('read through file object', readFile),
+                   ('read through mapping', readMapped)]
+        for name, method in methods:
+            dest = os.path.join(workDir, 'dest')
+            best = None
+            for _ in range(options.repeats):
+                startTime = time.time()
+                method(source, dest)
+                seconds = time.time() - startTime
+                best = seconds if best is None else min(best, seconds)
+                if os.path.exists(dest):
+                    os.unlink(dest)
+            print('{:<26} {:8.1f} MiB/s'.format(name, options.size / best / 2 ** 20))
+    finally:
+        shutil.rmtree(workDir)
+
+
+def writeRandomFile(path, size):
+    chunk = os.urandom(1 << 20)
+    with open(path, 'wb') as f:
+        for _ in range(size // len(chunk)):
+            f.write(chunk)
+        f.write(chunk[:size % len(chunk)])
+
+
+def copyThroughPython(source, dest):
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst, length=16384)
+
+
+def copyFromStream(source, dest):
+    with open(source, 'rb') as src:
+        atomic_copyobj(src, dest)
+
+
+def readFile(source, dest):
+    with open(source, 'rb') as f:
+        while f.read(1 << 20):
+            pass
+
+
+def readMapped(source, dest):
+    buf = bytearray(1 << 20)
+    with open_mapped(source) as f:
+        while f.readinto(buf):
+            pass
+
+
+if __name__ == "__main__":
+    main()
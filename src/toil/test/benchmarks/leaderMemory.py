@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# Copyright (C) 2015-2020 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure how much leader memory queued jobs take up.
+
+A root job with a configurable number of children is written to a job store,
+the way a wide scatter leaves it. The job store is then loaded the way the
+leader loads it, and the growth in resident memory is reported per 100,000
+queued jobs.
+
+Invoke like:
+
+    python -m toil.test.benchmarks.leaderMemory ./jobstore --numJobs 100000
+
+Run it against two checkouts to compare leader memory use before and after a
+change.
+"""
+
+import argparse
+import gc
+import sys
+
+import psutil
+
+from toil.common import Config, Toil
+from toil.job import Job, JobDescription
+from toil.lib.bioio import setLoggingFromOptions
+from toil.toilState import ToilState
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('--numJobs', type=int, default=100000,
+                        help="Number of queued child jobs to load")
+
+    Job.Runner.addToilOptions(parser)
+
+    options = parser.parse_args(sys.argv[1:])
+    setLoggingFromOptions(options)
+
+    # The job store is created here and destroyed afterwards.
+    config = Config()
+    config.setOptions(options)
+    jobStore = Toil.getJobStore(options.jobStore)
+    jobStore.initialize(config)
+    try:
+        rootID = writeScatter(jobStore, options.numJobs)
+
+        process = psutil.Process()
+        gc.collect()
+        before = process.memory_info().rss
+
+        # Load everything like the leader does when it starts up
+        jobCache = {jobDesc.jobStoreID: jobDesc for jobDesc in jobStore.jobs()}
+        toilState = ToilState(jobStore, jobCache[rootID], jobCache=jobCache)
+        del jobCache
+        gc.collect()
+        after = process.memory_info().rss
+
+        assert len(toilState.updatedJobs) == options.numJobs
+        perJobs = (after - before) * 100000 / options.numJobs
+        print('Loaded {} queued jobs using {:.1f} MiB: {:.1f} MiB per 100k jobs'.format(
+              options.numJobs, (after - before) / 2 ** 20, perJobs / 2 ** 20))
+    finally:
+        jobStore.destroy()
+
+
+def writeScatter(jobStore, numJobs):
+    """
+    Write a root job that has run, and its queued children, to the job store.
+
+    :return: The ID of the root job.
+    :rtype: str
+    """
+    root = JobDescription(requirements={}, jobName='scatter', unitName='root')
+    jobStore.assignID(root)
+    for i in range(numJobs):
+        child = JobDescription(requirements={'cores': 1, 'memory': 2 ** 30, 'disk': 2 ** 30},
+                               jobName='FunctionWrappingJob', unitName='shard',
+                               displayName='FunctionWrappingJob',
+                               command='_toil files/for-job/body-%d /usr/lib/python3 my.module False' % i)
+        child.addPredecessor()
+        jobStore.assignID(child)
+        jobStore.update(child)
+        root.addChild(child.jobStoreID)
+    jobStore.update(root)
+    return root.jobStoreID
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Copyright (C) 2015-2020 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure how many no-op jobs per second the leader can get through.
+
+The root job fans out to a configurable number of children that do nothing,
+so the run time is dominated by the leader and the batch system rather than
+by the jobs themselves.
+
+Invoke like:
+
+    python -m toil.test.benchmarks.leaderThroughput ./jobstore --numJobs 1000 --batchSystem singleMachine
+
+Run it against two checkouts to compare leader throughput before and after a
+change.
+"""
+
+import argparse
+import sys
+import time
+
+from toil.common import Toil
+from toil.job import Job
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('--numJobs', type=int, default=1000,
+                        help="Number of no-op child jobs to run")
+
+    Job.Runner.addToilOptions(parser)
+
+    options = parser.parse_args(sys.argv[1:])
+
+    root_job = Job.wrapJobFn(fanOut, options.numJobs, cores=0.1, memory='100M', disk='10M')
+
+    with Toil(options) as toil:
+        start = time.time()
+        toil.start(root_job)
+        elapsed = time.time() - start
+
+    # Count the root job too
+    total = options.numJobs + 1
+    print('Ran {} jobs in {:.2f} seconds: {:.2f} jobs/sec'.format(total, elapsed, total / elapsed))
+
+
+def fanOut(job, numJobs):
+    for _ in range(numJobs):
+        job.addChildJobFn(noop, cores=0.1, memory='100M', disk='10M')
+
+
+def noop(job):
+    pass
+
+
+if __name__ == "__main__":
+    main()
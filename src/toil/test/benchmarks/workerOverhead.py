@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Copyright (C) 2015-2020 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure how long the single machine batch system takes to run a job that
+does nothing, with workers started from scratch and with warm workers.
+
+A chain of no-op jobs is run one after the other, so nothing overlaps and
+the time per job is the overhead of getting a worker going, running it, and
+hearing back from it.
+
+Invoke like:
+
+    python -m toil.test.benchmarks.workerOverhead ./jobstore --numJobs 100
+"""
+
+import argparse
+import sys
+import time
+
+from toil.common import Toil
+from toil.job import Job
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('--numJobs', type=int, default=100,
+                        help="Number of no-op jobs to run one after the other")
+
+    Job.Runner.addToilOptions(parser)
+
+    options = parser.parse_args(sys.argv[1:])
+    options.batchSystem = 'single_machine'
+    options.clean = 'always'
+    # Don't let jobs run in the worker of the job before them
+    options.disableChaining = True
+
+    for warm in (False, True):
+        options.singleMachineWarmWorkers = warm
+        with Toil(options) as toil:
+            start = time.time()
+            toil.start(Job.wrapJobFn(chain, options.numJobs, cores=0.1, memory='100M', disk='10M'))
+            elapsed = time.time() - start
+        print('{} workers: {:.3f} seconds per job'.format('Warm' if warm else 'Cold',
+                                                          elapsed / (options.numJobs + 1)))
+
+
+def chain(job, remaining):
+    if remaining > 0:
+        job.addChildJobFn(chain, remaining - 1, cores=0.1, memory='100M', disk='10M')
+
+
+if __name__ == "__main__":
+    main()
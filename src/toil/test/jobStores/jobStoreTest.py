@@ -26,6 +26,7 @@ import socketserver
 import pytest
 import hashlib
 import logging
+import multiprocessing
 import threading
 import os
 import sys
@@ -50,10 +51,12 @@ from toil.lib.exceptions import panic
 
 from toil.common import Config, Toil
 from toil.fileStores import FileID
-from toil.job import Job, JobDescription, TemporaryID
+from toil import pickle
+from toil.job import Job, JobDescription, CheckpointJobDescription, TemporaryID
 from toil.jobStores.abstractJobStore import (NoSuchJobException,
                                              NoSuchFileException)
 from toil.jobStores.fileJobStore import FileJobStore
+from toil.jobStores.utils import JobDescriptionCodec
 from toil.statsAndLogging import StatsAndLogging
 from toil.test import (ToilTest,
                        needs_aws_s3,
@@ -146,6 +149,8 @@ class AbstractJobStoreTest(object):
         def tearDown(self):
             self.jobstore_initialized.destroy()
             self.jobstore_resumed_noconfig.destroy()
+            self.jobstore_initialized.shutdown()
+            self.jobstore_resumed_noconfig.shutdown()
             super(AbstractJobStoreTest.Test, self).tearDown()
 
         @travis_test
@@ -524,6 +529,43 @@ class AbstractJobStoreTest(object):
             self.assertFalse(jobstore1.exists(jobOnJobStore1.jobStoreID))
             # TODO: Who deletes the shared files?
 
+        @travis_test
+        def testStatsAndLoggingBatches(self):
+            """Tests leaving stats unread, and marking batches read without reading them again."""
+            jobstore = self.jobstore_initialized
+            stats = []
+            jobstore.writeStatsAndLogging(b'one')
+            jobstore.writeStatsAndLogging(b'two')
+
+            # Stats can be looked at without marking them read
+            for _ in range(2):
+                stats = []
+                self.assertEqual(2, jobstore.readStatsAndLogging(lambda f: stats.append(f.read()),
+                                                                 markRead=False))
+                self.assertEqual([b'one', b'two'], sorted(stats))
+
+            # If we go away before the batches are marked read, they stay unread
+            class Interrupted(Exception):
+                pass
+
+            batches = []
+
+            def interrupt(batchIDs):
+                batches.extend(batchIDs)
+                raise Interrupted()
+
+            with self.assertRaises(Interrupted):
+                jobstore.readStatsAndLogging(lambda f: None, beforeMarkingRead=interrupt)
+            self.assertTrue(batches)
+
+            # And once we say we have them, they are marked read without being read again
+            stats = []
+            self.assertEqual(0, jobstore.readStatsAndLogging(lambda f: stats.append(f.read()),
+                                                             alreadyRead=batches))
+            self.assertEqual([], stats)
+            self.assertEqual(0, jobstore.readStatsAndLogging(lambda f: None))
+            self.assertEqual(2, jobstore.readStatsAndLogging(lambda f: None, readAll=True))
+
         @travis_test
         def testWriteLogFiles(self):
             """Test writing log files."""
@@ -556,6 +598,56 @@ class AbstractJobStoreTest(object):
             for job in jobs:
                 self.assertTrue(jobstore.exists(job.jobStoreID))
 
+        def testBatchedJobOperations(self):
+            """Test loading, updating, checking on and deleting many jobs at once."""
+            jobstore = self.jobstore_initialized
+            jobRequirements = dict(memory=12, cores=34, disk=35, preemptable=True)
+            jobs = []
+            for i in range(30):
+                job = JobDescription(command='job%d' % i,
+                                     requirements=jobRequirements,
+                                     jobName='test-batched', unitName='onJobStore')
+                jobstore.assignID(job)
+                jobstore.create(job)
+                jobs.append(job)
+            jobIDs = [job.jobStoreID for job in jobs]
+
+            # Assign an ID for a job that is never created
+            missing = JobDescription(command='missing', requirements=jobRequirements,
+                                     jobName='test-batched', unitName='onJobStore')
+            jobstore.assignID(missing)
+
+            self.assertEqual(jobstore.existsMany(jobIDs + [missing.jobStoreID]),
+                             dict({jobID: True for jobID in jobIDs}, **{missing.jobStoreID: False}))
+
+            for job in jobs:
+                job.command = job.command + '-updated'
+            jobstore.updateMany(jobs)
+
+            loaded = jobstore.loadMany(jobIDs + [missing.jobStoreID])
+            self.assertEqual(set(loaded.keys()), set(jobIDs))
+            for job in jobs:
+                self.assertEqual(loaded[job.jobStoreID].command, job.command)
+
+            jobstore.deleteMany(jobIDs[:20])
+            self.assertEqual(jobstore.existsMany(jobIDs),
+                             {jobID: jobID in jobIDs[20:] for jobID in jobIDs})
+            self.assertEqual(set(jobstore.loadMany(jobIDs).keys()), set(jobIDs[20:]))
+
+        @travis_test
+        def testRequestPoolIsReused(self):
+            """Test that concurrent requests share one pool of threads until shutdown."""
+            jobstore = self.jobstore_initialized
+            self.assertEqual(jobstore._mapConcurrently(str, range(5)), ['0', '1', '2', '3', '4'])
+            pool = jobstore._requestPool
+            self.assertIsNotNone(pool)
+            jobstore._mapConcurrently(str, range(5))
+            self.assertIs(jobstore._requestPool, pool)
+            jobstore.shutdown()
+            self.assertIsNone(jobstore._requestPool)
+            # It can still be used after shutting down
+            self.assertEqual(jobstore._mapConcurrently(str, range(2)), ['0', '1'])
+
         @travis_test
         def testGrowingAndShrinkingJob(self):
             """Make sure jobs update correctly if they grow/shrink."""
@@ -1144,6 +1236,67 @@ class FileJobStoreTest(AbstractJobStoreTest.Test):
         finally:
             os.unlink(path)
 
+    @travis_test
+    def testStatsFromManyProcesses(self):
+        "Check that stats appended by many processes at once are each read exactly once."
+        jobstore = self.jobstore_initialized
+
+        def write(worker):
+            for i in range(50):
+                jobstore.writeStatsAndLogging(b'%d-%d' % (worker, i))
+
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=write, args=(worker,)) for worker in range(4)]
+        seen = []
+        for process in processes:
+            process.start()
+        while any(process.is_alive() for process in processes):
+            jobstore.readStatsAndLogging(lambda f: seen.append(f.read()))
+        for process in processes:
+            process.join()
+            self.assertEqual(0, process.exitcode)
+        jobstore.readStatsAndLogging(lambda f: seen.append(f.read()))
+
+        expected = [b'%d-%d' % (worker, i) for worker in range(4) for i in range(50)]
+        self.assertEqual(sorted(expected), sorted(seen))
+        # They are all kept for reading again after the workflow
+        self.assertEqual(len(expected), jobstore.readStatsAndLogging(lambda f: None, readAll=True))
+
+    @travis_test
+    def testJobsListsEveryJob(self):
+        "Check that listing jobs finds every job, across directories and load batches."
+        jobstore = self.jobstore_initialized
+        jobstore.jobsPerLoadBatch = 3
+        jobIDs = set()
+        for i in range(20):
+            job = self.arbitraryJob()
+            jobstore.assignID(job)
+            jobstore.create(job)
+            jobIDs.add(job.jobStoreID)
+        listed = [job.jobStoreID for job in jobstore.jobs()]
+        self.assertEqual(len(listed), len(jobIDs))
+        self.assertEqual(set(listed), jobIDs)
+
+    @travis_test
+    def testLoadPickledJob(self):
+        "Check that jobs pickled by older versions of Toil can still be loaded."
+        jobstore = self.jobstore_initialized
+        job = CheckpointJobDescription(command='command', jobName='pickled',
+                                       requirements=self.arbitraryRequirements)
+        jobstore.assignID(job)
+        job.checkpoint = 'checkpoint'
+        with open(jobstore._getJobFileName(job.jobStoreID), 'wb') as f:
+            pickle.dump(job, f)
+        loaded = jobstore.load(job.jobStoreID)
+        self.assertIsInstance(loaded, CheckpointJobDescription)
+        self.assertEqual(loaded.checkpoint, 'checkpoint')
+
+        # Updating it moves it to the compact format
+        jobstore.update(loaded)
+        with open(jobstore._getJobFileName(job.jobStoreID), 'rb') as f:
+            self.assertTrue(f.read().startswith(JobDescriptionCodec.magic))
+        self.assertEqual(jobstore.load(job.jobStoreID).checkpoint, 'checkpoint')
+
 @needs_google
 class GoogleJobStoreTest(AbstractJobStoreTest.Test):
     projectID = os.getenv('TOIL_GOOGLE_PROJECTID')
@@ -1278,6 +1431,80 @@ class AWSJobStoreTest(AbstractJobStoreTest.Test):
                 with jobstore.readSharedFileStream('foo') as f:
                     self.assertEqual(s, f.read())
 
+    @slow
+    def testPartChecksumsResumeDownloads(self):
+        """
+        A part that is corrupted while downloading a file in parallel is
+        fetched again on its own.
+        """
+        from boto.s3.key import Key
+        from toil.jobStores.aws.jobStore import AWSJobStore
+        jobstore = self.jobstore_initialized
+        jobstore.transferConcurrency = 2
+        partSize = self._partSize()
+        numParts = 3
+        srcPath = os.path.join(self._createTempDir(), 'src')
+        with open(srcPath, 'wb') as f:
+            f.write(os.urandom(partSize * numParts + 1))
+        fileID = jobstore.writeFile(srcPath)
+        info = AWSJobStore.FileInfo.loadOrFail(fileID)
+        self.assertEqual(info._decode_part_checksums()[0], partSize)
+        self.assertEqual(len(info._decode_part_checksums()[1]), numParts + 1)
+
+        # Garble the second part the first time it comes in
+        requests = []
+        getContentsToFile = Key.get_contents_to_file
+
+        def garbleOnce(key, fp, headers=None, *args, **kwargs):
+            getContentsToFile(key, fp, headers, *args, **kwargs)
+            requests.append(headers.get('Range'))
+            if requests.count('bytes=%d-%d' % (partSize, 2 * partSize - 1)) == 1:
+                fp.seek(-1, os.SEEK_CUR)
+                last = fp.read(1)
+                fp.seek(-1, os.SEEK_CUR)
+                fp.write(bytes([last[0] ^ 0xff]))
+
+        Key.get_contents_to_file = garbleOnce
+        try:
+            dstPath = os.path.join(self._createTempDir(), 'dst')
+            jobstore.readFile(fileID, dstPath)
+        finally:
+            Key.get_contents_to_file = getContentsToFile
+        with open(srcPath, 'rb') as src, open(dstPath, 'rb') as dst:
+            self.assertEqual(src.read(), dst.read())
+        # Only the garbled part was fetched twice
+        self.assertEqual(len(requests), numParts + 2)
+
+    def testSinglePartDownloadSkipsHead(self):
+        """
+        A file that went up in one piece is fetched without first asking S3
+        how big it is.
+        """
+        from boto.s3.bucket import Bucket
+        jobstore = self.jobstore_initialized
+        srcPath = os.path.join(self._createTempDir(), 'src')
+        with open(srcPath, 'wb') as f:
+            f.write(os.urandom(self._partSize() // 2))
+        fileID = jobstore.writeFile(srcPath)
+
+        heads = []
+        getKey = Bucket.get_key
+
+        def countHeads(bucket, *args, **kwargs):
+            if kwargs.get('validate', True):
+                heads.append(args)
+            return getKey(bucket, *args, **kwargs)
+
+        Bucket.get_key = countHeads
+        try:
+            dstPath = os.path.join(self._createTempDir(), 'dst')
+            jobstore.readFile(fileID, dstPath)
+        finally:
+            Bucket.get_key = getKey
+        with open(srcPath, 'rb') as src, open(dstPath, 'rb') as dst:
+            self.assertEqual(src.read(), dst.read())
+        self.assertEqual(heads, [])
+
     def testOverlargeJob(self):
         jobstore = self.jobstore_initialized
         jobRequirements = dict(memory=12, cores=34, disk=35, preemptable=True)
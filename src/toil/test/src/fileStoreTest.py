@@ -427,7 +427,8 @@ class hidden(object):
                                     is created.
             :param int fileMB: Size of the created file in MB
             :param bool expectAsyncUpload: Whether we expect the upload to hit
-                                           the job store later(T) or immediately(F) 
+                                           the job store in the background(T) or
+                                           immediately(F)
             """
             cls = hidden.AbstractNonCachingFileStoreTest
             fsID, testFile = cls._writeFileToJobStore(job, isLocalFile, nonLocalDir, fileMB)
@@ -448,7 +449,13 @@ class hidden(object):
                     # We also expect a link in the job store
                     expected += 1
 
-            assert actual == expected, 'Should have %d links. Got %d.' % (expected, actual)
+            if isLocalFile and expectJobStoreLink and expectAsyncUpload:
+                # The background upload may or may not have linked the file
+                # into the job store yet.
+                assert actual in (expected, expected + 1), 'Should have %d or %d links. Got %d.' % (
+                    expected, expected + 1, actual)
+            else:
+                assert actual == expected, 'Should have %d links. Got %d.' % (expected, actual)
 
             logger.info('Uploaded %s with %d links', fsID, actual)
 
@@ -516,6 +523,44 @@ class hidden(object):
                 assert cacheInfoBytes == expectedBytes, 'Testing %s: Expected ' % value + \
                                                   '%s but got %s.' % (expectedBytes, cacheInfoBytes)
 
+        @travis_test
+        def testCacheEvictionPolicies(self):
+            """
+            Ensure each cache eviction policy picks the file we expect to evict. Of three
+            unreferenced cached files, one was read longest ago, one was never hit, and one is
+            huge.
+            """
+            for policy, evicted in [('lru', 'old'), ('lfu', 'rare'), ('greedyDual', 'huge')]:
+                self.options.cacheEvictionPolicy = policy
+                Job.Runner.startToil(Job.wrapJobFn(self._evictOneFile, evicted=evicted), self.options)
+
+        @staticmethod
+        def _evictOneFile(job, evicted):
+            """
+            Fill the cache database with fake files and evict one of them.
+
+            :param str evicted: ID of the fake file the eviction policy should pick.
+            """
+            fileStore = job.fileStore
+            now = time.time()
+            for fileID, size, lastAccess, hits in [('old', 1000, now - 100, 5),
+                                                   ('rare', 1000, now - 10, 0),
+                                                   ('huge', 10 ** 9, now, 5)]:
+                fileStore._write([(fileStore._insertFileSQL.format(''),
+                                   (fileID, os.path.join(fileStore.localCacheDir, fileID), size,
+                                    'cached', None, lastAccess, size)),
+                                  ('UPDATE files SET hits = ? WHERE id = ?', (hits, fileID))])
+
+            fileStore._tryToFreeUpSpace()
+
+            remaining = {row[0] for row in fileStore.cur.execute('SELECT id FROM files')}
+            assert remaining == {'old', 'rare', 'huge'} - {evicted}, remaining
+            assert fileStore.ioStats.cache_evictions == 1
+            for row in fileStore.cur.execute('SELECT value FROM properties WHERE name = ?',
+                                             ('evictionInflation',)):
+                # Later reads must beat the evicted file's priority
+                assert row[0] > 0
+
         @slow
         def testAsyncWriteWithCaching(self):
             """
@@ -601,6 +646,32 @@ class hidden(object):
             A = Job.wrapJobFn(self._writeFileToJobStoreWithAsserts, isLocalFile=True)
             Job.Runner.startToil(A, self.options)
 
+        @travis_test
+        def testUploadsStartBeforeCommit(self):
+            """
+            Write several local files to the job store. They should be
+            uploaded in the background while the job is still running.
+            """
+            A = Job.wrapJobFn(self._writeFilesAndWaitForUploads, numFiles=5)
+            Job.Runner.startToil(A, self.options)
+
+        @staticmethod
+        def _writeFilesAndWaitForUploads(job, numFiles):
+            """
+            Write the given number of local files to the job store, and wait
+            for all of them to be uploaded.
+            """
+            cls = hidden.AbstractNonCachingFileStoreTest
+            fsIDs = [cls._writeFileToJobStore(job, isLocalFile=True)[0] for _ in range(numFiles)]
+            deadline = time.time() + 60
+            while time.time() < deadline:
+                states = [row[0] for fsID in fsIDs
+                          for row in job.fileStore.cur.execute('SELECT state FROM files WHERE id = ?', (fsID,))]
+                if all(state == 'cached' for state in states):
+                    break
+                time.sleep(0.1)
+            assert states == ['cached'] * numFiles, 'Files not uploaded before commit: %s' % states
+
         # readGlobalFile tests
         
         @travis_test
@@ -13,10 +13,13 @@
 # limitations under the License.
 
 from __future__ import absolute_import
+import copy
 import os
+import pickle
 from argparse import ArgumentParser
 from toil.common import Toil
 from toil.job import Job, JobDescription, TemporaryID
+from toil.jobStores.utils import JobDescriptionCodec
 from toil.test import ToilTest, travis_test
 
 class JobDescriptionTest(ToilTest):
@@ -97,3 +100,110 @@ class JobDescriptionTest(ToilTest):
         j.filterSuccessors(lambda jID: jID != 'followOn')
         self.assertEqual(j.nextSuccessors(), None)
         
+
+    @travis_test
+    def testJobDescriptionCopyAndPickle(self):
+        """
+        Tests that JobDescriptions, which keep their attributes in slots, copy
+        and pickle with their successors and any other attributes set on them,
+        and share names and IDs when loaded.
+        """
+        j = JobDescription(command='command', requirements={'memory': 100}, jobName='copied', unitName='unit')
+        j.jobStoreID = 'job'
+        j.addChild('child')
+        j.assignConfig(self.toil.config)
+        j.foo_attribute = 'foo'
+
+        for clone in (copy.copy(j), copy.deepcopy(j), pickle.loads(pickle.dumps(j)),
+                      JobDescriptionCodec.decode(JobDescriptionCodec.encode(j))):
+            self.assertIsNot(clone, j)
+            self.assertEqual(clone.foo_attribute, 'foo')
+            self.assertEqual(clone.childIDs, {'child'})
+            self.assertEqual(clone.followOnIDs, set())
+            self.assertEqual(clone.memory, 100)
+            self.assertIs(clone.jobName, j.jobName)
+
+        # Copies share the config, but pickles leave it out
+        self.assertEqual(copy.copy(j).disk, self.toil.config.defaultDisk)
+        with self.assertRaises(AttributeError):
+            pickle.loads(pickle.dumps(j)).disk
+
+        # Changing a copy's successors leaves ours alone
+        clone = copy.copy(j)
+        clone.filterSuccessors(lambda jID: False)
+        clone.addFollowOn('followOn')
+        self.assertEqual(j.childIDs, {'child'})
+        self.assertEqual(j.followOnIDs, set())
+
+    @travis_test
+    def testJobDescriptionIDSetsAreMutable(self):
+        """
+        Tests that adding to the ID sets of a JobDescription changes it, even
+        while they are empty and shared.
+        """
+        j = JobDescription(command='command', requirements={}, jobName='added')
+        other = JobDescription(command='command', requirements={}, jobName='other')
+        j.childIDs.add('child')
+        j.followOnIDs.update(['followOn'])
+        predecessors = j.predecessorsFinished
+        predecessors.add('first')
+        predecessors.add('second')
+        self.assertEqual(j.childIDs, {'child'})
+        self.assertEqual(j.followOnIDs, {'followOn'})
+        self.assertEqual(j.predecessorsFinished, {'first', 'second'})
+        self.assertEqual(other.childIDs, set())
+        self.assertEqual(other.followOnIDs, set())
+        self.assertEqual(other.predecessorsFinished, set())
+        self.assertEqual(pickle.loads(pickle.dumps(j)).childIDs, {'child'})
+
+    @travis_test
+    def testJobDescriptionSnapshot(self):
+        """
+        Tests that changes to a JobDescription don't show up in its snapshots.
+        """
+        j = JobDescription(command='command', requirements={'memory': 100}, jobName='snapshotted')
+        j.jobStoreID = 'job'
+        j.addChild('child')
+        j.addServiceHostJob('service')
+        j.jobsToDelete.append('chained')
+        j.assignConfig(self.toil.config)
+
+        snapshot = j.snapshot()
+        j.command = None
+        j.addChild('otherChild')
+        j.addFollowOn('followOn')
+        j.addServiceHostJob('otherService', parentServiceID='service')
+        j.jobsToDelete.append('otherChained')
+        j.memory = 200
+
+        self.assertEqual(snapshot.command, 'command')
+        self.assertEqual(snapshot.childIDs, {'child'})
+        self.assertEqual(snapshot.followOnIDs, set())
+        self.assertEqual(snapshot.serviceTree, {'service': []})
+        self.assertEqual(snapshot.jobsToDelete, ['chained'])
+        self.assertEqual(snapshot.memory, 100)
+        self.assertEqual(snapshot.disk, self.toil.config.defaultDisk)
+
+    @travis_test
+    def testSavedBodyLoading(self):
+        """
+        Tests that small job bodies saved by this process are loaded from
+        memory once, and that large ones are always read from the job store.
+        """
+        jobStore = self.toil._jobStore
+        for argument, kept in (('small', True), ('large' * Job.maxSavedBodySize, False)):
+            job = Job.wrapJobFn(jobFn, argument)
+            jobStore.assignID(job.description)
+            job.saveBody(jobStore)
+            fileStoreID = job.description.command.split()[1]
+            self.assertEqual(fileStoreID in Job._savedBodies, kept)
+
+            # Loading works either way, and uses up the kept body
+            self.assertEqual(Job.loadJob(jobStore, job.description)._args, (argument,))
+            self.assertNotIn(fileStoreID, Job._savedBodies)
+            # The job store has the same body
+            self.assertEqual(Job.loadJob(jobStore, job.description)._args, (argument,))
+
+
+def jobFn(job, argument):
+    pass
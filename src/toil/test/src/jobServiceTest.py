@@ -36,6 +36,7 @@ logger = logging.getLogger( __name__ )
 from unittest import skipIf
 from toil.batchSystems.singleMachine import SingleMachineBatchSystem
 from toil.leader import FailedJobsException, DeadlockException
+from toil.serviceSignals import ServiceSignalServer, ServiceSignalClient
 
 class JobServiceTest(ToilTest):
     """
@@ -188,6 +189,49 @@ class JobServiceTest(ToilTest):
                 totalTrys += 1
                 options.restart = True
 
+class ServiceSignalTest(ToilTest):
+    """
+    Tests the channel service host jobs and the leader signal each other on.
+    """
+
+    class FakeBatchSystem(object):
+        def setEnv(self, name, value=None):
+            pass
+
+    def testSignals(self):
+        started = []
+        server = ServiceSignalServer(started.append)
+        server.start(self.FakeBatchSystem())
+        try:
+            client = ServiceSignalClient.fromEnvironment('service1')
+            self.assertTrue(client.reportStarted())
+            self.assertEqual(['service1'], started)
+
+            # Nothing to hear yet
+            self.assertIsNone(client.waitForStop(0.1))
+            self.assertFalse(client.broken)
+            server.stop('service1', error=True)
+            self.assertEqual('error', client.waitForStop(10))
+
+            # Stop signals are remembered for services that watch later
+            server.stop('service2')
+            self.assertEqual('terminate', ServiceSignalClient.fromEnvironment('service2').waitForStop(10))
+
+            # Services that have the wrong token are ignored
+            impostor = ServiceSignalClient(client.address, 'wrong', 'service3')
+            self.assertFalse(impostor.reportStarted())
+            self.assertEqual(['service1'], started)
+
+            watcher = ServiceSignalClient.fromEnvironment('service4')
+            self.assertIsNone(watcher.waitForStop(0.1))
+        finally:
+            server.shutdown()
+
+        # Losing the leader makes services fall back to the job store
+        self.assertIsNone(watcher.waitForStop(10))
+        self.assertTrue(watcher.broken)
+        self.assertIsNone(ServiceSignalClient.fromEnvironment('service5'))
+
 def serviceTest(job, outFile, messageInt):
     """
     Creates one service and one accessing job, which communicate with two files to establish
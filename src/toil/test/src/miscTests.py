@@ -15,6 +15,8 @@ from __future__ import absolute_import, print_function
 from future.utils import raise_
 from builtins import range
 from uuid import uuid4
+import gzip
+import io
 import os
 import random
 import tempfile
@@ -25,6 +27,7 @@ import sys
 from toil.lib.exceptions import panic
 from toil.common import getNodeID
 from toil.lib.misc import atomic_tmp_file, atomic_install, AtomicFileCreate
+from toil.lib.misc import atomic_copy, atomic_copyobj, copy_file_obj, open_mapped, MappedFile
 from toil.lib.misc import CalledProcessErrorStderr, call_command
 from toil.test import ToilTest, slow, travis_test
 
@@ -133,6 +136,110 @@ class MiscTests(ToilTest):
             self.assertEqual(str(ex), "stop!")
         self.assertFalse(os.path.exists(outf))
 
+    def test_atomic_copy(self):
+        data = os.urandom(100000)
+        src = self._get_test_out_file(".src")
+        with open(src, "wb") as fh:
+            fh.write(data)
+        outf = self._get_test_out_file(".copy")
+        atomic_copy(src, outf)
+        with open(outf, "rb") as fh:
+            self.assertEqual(data, fh.read())
+
+    def test_atomic_copyobj_from_position(self):
+        data = os.urandom(100000)
+        src = self._get_test_out_file(".src")
+        with open(src, "wb") as fh:
+            fh.write(data)
+        outf = self._get_test_out_file(".copy")
+        with open(src, "rb") as fh:
+            # Leave some of the file in the read buffer
+            fh.read(1000)
+            atomic_copyobj(fh, outf)
+            self.assertEqual(len(data), fh.tell())
+        with open(outf, "rb") as fh:
+            self.assertEqual(data[1000:], fh.read())
+
+    def test_copy_file_obj_pipes(self):
+        outf = self._get_test_out_file(".copy")
+        readFd, writeFd = os.pipe()
+        os.write(writeFd, b"hello")
+        os.close(writeFd)
+        with os.fdopen(readFd, "rb") as readable, open(outf, "wb") as writable:
+            self.assertEqual(b"h", readable.read(1))
+            self.assertEqual(4, copy_file_obj(readable, writable))
+        with open(outf, "rb") as fh:
+            self.assertEqual(b"ello", fh.read())
+
+        readFd, writeFd = os.pipe()
+        with open(outf, "rb") as readable, os.fdopen(writeFd, "wb") as writable:
+            self.assertEqual(4, copy_file_obj(readable, writable))
+        with os.fdopen(readFd, "rb") as readable:
+            self.assertEqual(b"ello", readable.read())
+
+    def test_copy_file_obj_gzip(self):
+        data = b"hello " * 1000
+        src = self._get_test_out_file(".gz")
+        with gzip.open(src, "wb") as fh:
+            fh.write(data)
+        outf = self._get_test_out_file(".copy")
+        # The uncompressed data has to come out, not the file's bytes.
+        with gzip.open(src, "rb") as readable, open(outf, "wb") as writable:
+            self.assertEqual(len(data), copy_file_obj(readable, writable))
+        with open(outf, "rb") as fh:
+            self.assertEqual(data, fh.read())
+
+    def test_copy_file_obj_mapped(self):
+        data = os.urandom(100000)
+        src = self._get_test_out_file(".src")
+        with open(src, "wb") as fh:
+            fh.write(data)
+        outf = self._get_test_out_file(".copy")
+        with open_mapped(src) as readable, open(outf, "wb") as writable:
+            readable.seek(10)
+            self.assertEqual(len(data) - 10, copy_file_obj(readable, writable))
+            self.assertEqual(len(data), readable.tell())
+        with open(outf, "rb") as fh:
+            self.assertEqual(data[10:], fh.read())
+
+    def test_open_mapped(self):
+        data = b"first\nsecond\nthird"
+        src = self._get_test_out_file(".src")
+        with open(src, "wb") as fh:
+            fh.write(data)
+        with open_mapped(src) as fh:
+            self.assertIsInstance(fh, MappedFile)
+            self.assertEqual(b"fir", fh.read(3))
+            buf = bytearray(4)
+            self.assertEqual(4, fh.readinto(buf))
+            self.assertEqual(b"st\ns", bytes(buf))
+            self.assertEqual(b"econd\n", fh.readline())
+            fh.seek(-5, os.SEEK_END)
+            self.assertEqual(b"third", fh.read())
+            fh.seek(0)
+            self.assertEqual([b"first\n", b"second\n", b"third"], list(fh))
+            self.assertRaises(io.UnsupportedOperation, fh.fileno)
+
+        # Files that can be truncated through another name aren't mapped.
+        hardlink = self._get_test_out_file(".hardlink")
+        os.link(src, hardlink)
+        with open_mapped(src) as fh:
+            self.assertNotIsInstance(fh, MappedFile)
+            self.assertEqual(data, fh.read())
+        os.unlink(hardlink)
+        symlink = self._get_test_out_file(".symlink")
+        os.symlink(src, symlink)
+        with open_mapped(symlink) as fh:
+            self.assertNotIsInstance(fh, MappedFile)
+            self.assertEqual(data, fh.read())
+
+        # Empty files can't be mapped, but can still be read.
+        with open(src, "wb"):
+            pass
+        with open_mapped(src) as fh:
+            self.assertNotIsInstance(fh, MappedFile)
+            self.assertEqual(b"", fh.read())
+
     def test_call_command_ok(self):
         o = call_command(["echo", "Fred"])
         self.assertEqual("Fred\n", o)
@@ -88,3 +88,33 @@ def d(job):
 
 def e():
     return {'a': 'b', 42: 43, 'c': [1, 2, 3]}
+
+
+class SharedPromiseFileTest(ToilTest):
+    """
+    Test that promises sharing a file resolve to the right values, whether the values are small
+    enough to be stored inline or not, and for more than one job using them.
+    """
+
+    @travis_test
+    def test(self):
+        options = Job.Runner.getDefaultOptions(self._getTestJobStorePath())
+        options.logLevel = 'INFO'
+        root = Job.wrapJobFn(f)
+        self.assertEqual(Job.Runner.startToil(root, options),
+                         [(1, 'x' * (Job.maxInlinePromiseSize + 1), (2, 3))] * 2)
+
+
+def f(job):
+    child = job.addChild(job.wrapFn(g))
+    consumers = [job.addFollowOnFn(h, child.rv('small'), child.rv('big'), child.rv('pair'))
+                 for _ in range(2)]
+    return [consumer.rv() for consumer in consumers]
+
+
+def g():
+    return {'small': 1, 'big': 'x' * (Job.maxInlinePromiseSize + 1), 'pair': (2, 3)}
+
+
+def h(small, big, pair):
+    return small, big, pair
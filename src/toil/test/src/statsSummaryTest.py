@@ -0,0 +1,188 @@
+# Copyright (C) 2015-2020 Regents of the University of California
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import random
+from threading import Event
+from unittest.mock import patch
+
+from toil.common import Config
+from toil.jobStores.fileJobStore import FileJobStore
+from toil.lib.expando import Expando
+from toil.statsAndLogging import QuantileSketch, StatsAndLogging, StatsSummary
+from toil.test import ToilTest, travis_test
+from toil.utils.toilStats import getStats, processData
+
+
+def workerStats(*jobs):
+    """
+    Make the stats a worker would write for running jobs with the given class
+    names and times.
+    """
+    return json.dumps(dict(workers=dict(time=sum(t for _, t in jobs) + 1, clock=1, memory=100,
+                                        logsToMaster=[]),
+                           jobs=[dict(class_name=name, time=t, clock=t / 2, memory=50)
+                                 for name, t in jobs]))
+
+
+class QuantileSketchTest(ToilTest):
+    @travis_test
+    def testAccuracy(self):
+        random.seed(1)
+        values = [random.lognormvariate(0, 3) for _ in range(5000)]
+        values += [-v for v in values[:1000]] + [0] * 500
+        sketch = QuantileSketch()
+        for value in values:
+            sketch.add(value)
+        values.sort()
+        for q in (0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1):
+            exact = values[min(int(q * len(values)), len(values) - 1)]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact),
+                                 abs(exact) * QuantileSketch.relativeAccuracy * 1.0001)
+
+    @travis_test
+    def testEmpty(self):
+        self.assertEqual(0, QuantileSketch().quantile(0.5))
+
+    @travis_test
+    def testRoundTrip(self):
+        sketch = QuantileSketch()
+        for value in (-3, 0, 0.5, 7, 7, 1e6):
+            sketch.add(value)
+        copy = QuantileSketch.fromDict(json.loads(json.dumps(sketch.toDict())))
+        for q in (0, 0.2, 0.5, 0.8, 1):
+            self.assertEqual(sketch.quantile(q), copy.quantile(q))
+
+
+class StatsSummaryTest(ToilTest):
+    def setUp(self):
+        super(StatsSummaryTest, self).setUp()
+        path = self._getTestJobStorePath()
+        self.jobStore = FileJobStore(path)
+        self.config = Config()
+        self.config.jobStore = 'file:%s' % path
+        self.config.stats = True
+        self.jobStore.initialize(self.config)
+
+    @travis_test
+    def testEmpty(self):
+        report = processData(self.config, StatsSummary())
+        self.assertEqual(0, report.total_run_time)
+        self.assertEqual(0, report.jobs.total_number)
+        self.assertEqual(0, report.jobs.median_time)
+        self.assertEqual(0, report.worker.max_memory)
+        self.assertEqual({}, dict(report.job_types))
+
+    @travis_test
+    def testRoundTrip(self):
+        summary = StatsSummary()
+        summary.add(json.loads(workerStats(('A', 2), ('B', 3)), object_hook=Expando))
+        summary.add(json.loads(workerStats(('A', 5)), object_hook=Expando))
+        summary.add(Expando(total_time='10', total_clock='4'))
+        summary.save(self.jobStore)
+        loaded = StatsSummary.load(self.jobStore)
+        self.assertEqual(json.loads(json.dumps(processData(self.config, summary))),
+                         json.loads(json.dumps(processData(self.config, loaded))))
+        self.assertEqual(3, loaded.jobs.count)
+        self.assertEqual({'A', 'B'}, set(loaded.jobTypes))
+        self.assertEqual(10, loaded.totalTime)
+
+    @travis_test
+    def testResume(self):
+        """
+        Stats the leader has read are in the saved summary even if it dies
+        right after, and a new leader carries on from there.
+        """
+        self.jobStore.writeStatsAndLogging(workerStats(('A', 2)))
+        self.jobStore.writeStatsAndLogging(workerStats(('B', 3)))
+
+        class LeaderDied(Exception):
+            pass
+
+        # Die as soon as there is nothing left to read
+        with patch('toil.statsAndLogging.time.sleep', side_effect=LeaderDied):
+            with self.assertRaises(LeaderDied):
+                StatsAndLogging.statsAndLoggingAggregator(self.jobStore, Event(), self.config)
+        self.assertEqual(2, getStats(self.jobStore).jobs.count)
+
+        self.jobStore.writeStatsAndLogging(workerStats(('A', 4)))
+        stop = Event()
+        stop.set()
+        StatsAndLogging.statsAndLoggingAggregator(self.jobStore, stop, self.config)
+        summary = getStats(self.jobStore)
+        self.assertEqual(3, summary.jobs.count)
+        self.assertEqual(2, summary.jobTypes['A'].count)
+        self.assertEqual(3, summary.worker.count)
+
+    @travis_test
+    def testSavedOncePerBatch(self):
+        """
+        The leader saves the summary once for each batch of stats it reads, not
+        once for each stats file.
+        """
+        for i in range(5):
+            self.jobStore.writeStatsAndLogging(workerStats(('A', i)))
+        stop = Event()
+        stop.set()
+        with patch.object(StatsSummary, 'save', autospec=True, side_effect=StatsSummary.save) as save:
+            StatsAndLogging.statsAndLoggingAggregator(self.jobStore, stop, self.config)
+        # Once for the workers' stats, and once for the leader's own
+        self.assertEqual(2, save.call_count)
+        self.assertEqual(5, getStats(self.jobStore).jobs.count)
+
+    @travis_test
+    def testDiesBeforeMarkingRead(self):
+        """
+        Stats the leader saved in its summary, but died before marking as read,
+        are not counted again.
+        """
+        self.jobStore.writeStatsAndLogging(workerStats(('A', 2)))
+        self.jobStore.writeStatsAndLogging(workerStats(('B', 3)))
+
+        class LeaderDied(Exception):
+            pass
+
+        save = StatsSummary.save
+
+        def saveAndDie(summary, jobStore):
+            save(summary, jobStore)
+            raise LeaderDied()
+
+        with patch.object(StatsSummary, 'save', autospec=True, side_effect=saveAndDie):
+            with self.assertRaises(LeaderDied):
+                StatsAndLogging.statsAndLoggingAggregator(self.jobStore, Event(), self.config)
+        self.assertEqual(2, getStats(self.jobStore).jobs.count)
+
+        stop = Event()
+        stop.set()
+        StatsAndLogging.statsAndLoggingAggregator(self.jobStore, stop, self.config)
+        self.assertEqual(2, getStats(self.jobStore).jobs.count)
+        self.assertEqual(0, self.jobStore.readStatsAndLogging(lambda f: None))
+
+    @travis_test
+    def testUnreadStats(self):
+        """
+        toil stats counts the stats the leader has not read yet, and leaves
+        them for the leader.
+        """
+        self.jobStore.writeStatsAndLogging(workerStats(('A', 2)))
+        stop = Event()
+        stop.set()
+        StatsAndLogging.statsAndLoggingAggregator(self.jobStore, stop, self.config)
+        self.jobStore.writeStatsAndLogging(workerStats(('B', 3), ('B', 4)))
+        for _ in range(2):
+            summary = getStats(self.jobStore)
+            self.assertEqual(3, summary.jobs.count)
+            self.assertEqual(2, summary.jobTypes['B'].count)
+        self.assertEqual(1, StatsSummary.load(self.jobStore).jobs.count)
+        self.assertEqual(1, self.jobStore.readStatsAndLogging(lambda f: None))
@@ -11,13 +11,16 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import os
 import pickle
 
-from toil.common import Config
-from toil.job import JobDescription, CheckpointJobDescription
+from toil.common import Config, Toil
+from toil.job import Job, JobDescription, CheckpointJobDescription
 from toil.jobStores.fileJobStore import FileJobStore
+from toil.leader import FailedJobsException
 from toil.test import ToilTest, travis_test
-from toil.worker import nextChainable
+from toil.utils.toilStats import getStats
+from toil.worker import nextChainable, nextLocalSuccessor
 
 class WorkerTests(ToilTest):
     """Test miscellaneous units of the worker."""
@@ -93,3 +96,132 @@ class WorkerTests(ToilTest):
             jobDesc2 = createTestJobDesc(1, 2, 3, False, True)
             getattr(jobDesc1, successorType)(jobDesc2.jobStoreID)
             self.assertEqual(None, nextChainable(jobDesc1, self.jobStore, self.config))
+
+    @travis_test
+    def testNextLocalSuccessor(self):
+        """Make sure successors that can run under their own IDs are identified correctly."""
+        def createTestJobDesc(cores=2, checkpoint=False):
+            name = 'job%d' % self.jobNumber
+            self.jobNumber += 1
+            descClass = CheckpointJobDescription if checkpoint else JobDescription
+            jobDesc = descClass(requirements={'memory': 1, 'cores': cores, 'disk': 3, 'preemptable': True}, jobName=name)
+            self.jobStore.assignID(jobDesc)
+            return self.jobStore.create(jobDesc)
+
+        # A child can be run before the follow-ons, though not chained.
+        jobDesc1 = createTestJobDesc()
+        jobDesc2 = createTestJobDesc()
+        jobDesc1.addChild(jobDesc2.jobStoreID)
+        jobDesc1.addFollowOn(createTestJobDesc().jobStoreID)
+        self.assertEqual(None, nextChainable(jobDesc1, self.jobStore, self.config))
+        self.assertEqual(jobDesc2.jobStoreID, nextLocalSuccessor(jobDesc1, self.jobStore, self.config).jobStoreID)
+
+        # Several children can only be run if we are allowed to run that many.
+        jobDesc1 = createTestJobDesc()
+        children = [createTestJobDesc() for _ in range(3)]
+        for child in children:
+            jobDesc1.addChild(child.jobStoreID)
+        self.assertEqual(None, nextLocalSuccessor(jobDesc1, self.jobStore, self.config))
+        self.config.maxChainFanOut = 3
+        self.assertIn(nextLocalSuccessor(jobDesc1, self.jobStore, self.config).jobStoreID,
+                      [child.jobStoreID for child in children])
+
+        # If any of them won't fit, none of them are run.
+        jobDesc1.addChild(createTestJobDesc(cores=3).jobStoreID)
+        self.config.maxChainFanOut = 4
+        self.assertEqual(None, nextLocalSuccessor(jobDesc1, self.jobStore, self.config))
+
+        # Nor are they run if one is a checkpoint.
+        jobDesc1 = createTestJobDesc()
+        jobDesc1.addChild(createTestJobDesc().jobStoreID)
+        jobDesc1.addChild(createTestJobDesc(checkpoint=True).jobStoreID)
+        self.assertEqual(None, nextLocalSuccessor(jobDesc1, self.jobStore, self.config))
+
+    def testRunSuccessorsLocally(self):
+        """Make sure a worker runs a job's children and then its follow-ons itself, when it can."""
+        options = Job.Runner.getDefaultOptions(self._getTestJobStorePath())
+        options.clean = 'always'
+        # The child has to go before the follow-on, so it can't be chained,
+        # but it can still run on the same worker.
+        pids = Job.Runner.startToil(Job.wrapJobFn(branch, 1), options)
+        self.assertEqual(1, len(set(pids)))
+
+        # Several children only run on the same worker if we allow it.
+        # Otherwise the root, each child (with its grandchild chained on) and
+        # the follow-on all get their own worker.
+        pids = Job.Runner.startToil(Job.wrapJobFn(branch, 3), options)
+        self.assertEqual(5, len(set(pids)))
+        options.maxChainFanOut = 3
+        pids = Job.Runner.startToil(Job.wrapJobFn(branch, 3), options)
+        self.assertEqual(1, len(set(pids)))
+
+    def testFailingLocalSuccessor(self):
+        """
+        Make sure a successor that fails while a worker runs it itself is
+        charged for the failure, and not the job it comes after.
+        """
+        options = Job.Runner.getDefaultOptions(self._getTestJobStorePath())
+        options.clean = 'always'
+        options.retryCount = 1
+        triesFile = os.path.join(self._createTempDir(), 'tries')
+        with self.assertRaises(FailedJobsException) as context:
+            Job.Runner.startToil(Job.wrapJobFn(parentOfFailure, triesFile), options)
+        # The child used up its own tries, and is what the leader reports
+        with open(triesFile) as f:
+            self.assertEqual(['child', 'child'], f.read().split())
+        self.assertIn('failingChild', str(context.exception))
+
+    def testFailingLocalSuccessorStats(self):
+        """
+        Make sure the stats of a job are still reported when a successor the
+        worker ran for it afterwards fails.
+        """
+        options = Job.Runner.getDefaultOptions(self._getTestJobStorePath())
+        options.clean = 'never'
+        options.stats = True
+        options.retryCount = 0
+        triesFile = os.path.join(self._createTempDir(), 'tries')
+        with self.assertRaises(FailedJobsException):
+            Job.Runner.startToil(Job.wrapJobFn(parentOfFailure, triesFile), options)
+        stats = getStats(Toil.resumeJobStore(options.jobStore))
+        self.assertEqual(['parentOfFailure'], [name.split('.')[-1] for name in stats.jobTypes])
+
+
+def branch(job, numChildren):
+    """
+    Have the given number of children, each with its own child, and then a
+    follow-on. Return the PIDs of the processes all the jobs ran in.
+    """
+    pids = []
+    for _ in range(numChildren):
+        child = job.addChildJobFn(getPID)
+        pids.append(child.rv())
+        pids.append(child.addChildJobFn(getPID).rv())
+    return job.addFollowOnJobFn(collectPIDs, [os.getpid()] + pids).rv()
+
+
+def getPID(job):
+    return os.getpid()
+
+
+def collectPIDs(job, pids):
+    return pids + [os.getpid()]
+
+
+def parentOfFailure(job, triesFile):
+    """
+    Have a child that always fails, and so can't run in the worker's place,
+    and a follow-on that never gets to run.
+    """
+    job.addChildJobFn(failingChild, triesFile)
+    job.addFollowOnJobFn(recordTry, triesFile, 'follow-on')
+
+
+def failingChild(job, triesFile):
+    recordTry(job, triesFile, 'child')
+    raise RuntimeError('The child failed')
+
+
+def recordTry(job, triesFile, name):
+    with open(triesFile, 'a') as f:
+        f.write(name + '\n')
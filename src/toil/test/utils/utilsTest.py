@@ -332,6 +332,29 @@ class UtilsTest(ToilTest):
         collatedStats = processData(jobStore.config, stats)
         self.assertTrue(len(collatedStats.job_types) == 2, "Some jobs are not represented in the stats.")
 
+    @travis_test
+    def testFileIOStats(self):
+        """
+        Tests that file store reads, writes and cache hits are counted in the stats
+        """
+        options = Job.Runner.getDefaultOptions(self._getTestJobStorePath())
+        options.clean = 'never'
+        options.stats = True
+        root = Job.wrapJobFn(writeCachedFile)
+        root.addChildJobFn(readCachedFile, root.rv())
+        Job.Runner.startToil(root, options)
+        config = Config()
+        config.setOptions(options)
+        jobStore = Toil.resumeJobStore(config.jobStore)
+        collatedStats = processData(jobStore.config, getStats(jobStore))
+        jobTypes = {name.split('.')[-1]: jobType for name, jobType in collatedStats.job_types.items()}
+        self.assertEqual(collatedStats.jobs.total_cache_hits, 1)
+        self.assertEqual(jobTypes['readCachedFile'].total_cache_hits, 1)
+        self.assertEqual(jobTypes['writeCachedFile'].total_cache_hits, 0)
+        # The write is uploaded while the job commits, after its body is done
+        self.assertEqual(jobTypes['writeCachedFile'].total_bytes_written, len('cached'))
+        self.assertEqual(sum(jobTypes['writeCachedFile'].upload_times.values()), 1)
+
     def check_status(self, status, status_fn, seconds=10):
         i = 0.0
         while status_fn(self.toilDir) != status:
@@ -438,6 +461,17 @@ def printUnicodeCharacter():
     subprocess.check_call([sys.executable, '-c', "print('\\xc3\\xbc')"])
 
 
+def writeCachedFile(job):
+    path = job.fileStore.getLocalTempFile()
+    with open(path, 'w') as f:
+        f.write('cached')
+    return job.fileStore.writeGlobalFile(path)
+
+
+def readCachedFile(job, fileID):
+    job.fileStore.readGlobalFile(fileID)
+
+
 class RunTwoJobsPerWorker(Job):
     """
     Runs child job with same resources as self in an attempt to chain the jobs on the same worker
@@ -124,10 +124,15 @@ class ToilState():
         :return:
         """
 
+        # Successors loaded together from the job store, when not in the cache
+        prefetched = {}
+
         def getJob(jobId):
             if jobCache is not None:
                 if jobId in jobCache:
                     return jobCache[jobId]
+            if jobId in prefetched:
+                return prefetched.pop(jobId)
             return jobStore.load(jobId)
         
         # If the job description has a command, is a checkpoint, has services
@@ -153,7 +158,7 @@ class ToilState():
                 if jobDesc.jobStoreID not in successor.predecessorsFinished:
 
                     # Update the successor's status to mark the predecessor complete
-                    successor.predecessorsFinished.add(jobDesc.jobStoreID)
+                    successor.addFinishedPredecessor(jobDesc.jobStoreID)
 
                 # If the successor has no predecessors to finish
                 assert len(successor.predecessorsFinished) <= successor.predecessorNumber
@@ -165,6 +170,12 @@ class ToilState():
                     # Recursively consider the successor
                     self._buildToilState(successor, jobStore, jobCache=jobCache)
             
+            # Fetch all the successors we haven't considered yet in one go,
+            # rather than one at a time as we recurse.
+            prefetched.update(jobStore.loadMany([successorJobStoreID for successorJobStoreID in jobDesc.nextSuccessors()
+                                                 if successorJobStoreID not in self.successorJobStoreIDToPredecessorJobs and
+                                                 (jobCache is None or successorJobStoreID not in jobCache)]))
+
             # For each successor
             for successorJobStoreID in jobDesc.nextSuccessors():
                 
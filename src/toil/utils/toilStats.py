@@ -19,10 +19,8 @@ Reports statistical data about a given Toil workflow.
 from __future__ import absolute_import, print_function
 from __future__ import division
 from builtins import str
-from builtins import range
 from past.utils import old_div
 from builtins import object
-from functools import partial
 import logging
 import json
 from toil.lib.bioio import getBasicOptionParser
@@ -30,6 +28,7 @@ from toil.lib.bioio import parseBasicOptions
 from toil.common import Toil, jobStoreLocatorHelp, Config
 from toil.version import version
 from toil.lib.expando import Expando
+from toil.statsAndLogging import StatsSummary
 
 logger = logging.getLogger( __name__ )
 
@@ -306,6 +305,29 @@ def sprintTag(key, tag, options, columnWidths=None):
     out_str += header + "\n"
     out_str += sub_header + "\n"
     out_str += tag_str + "\n"
+    out_str += sprintFileIO(tag, options)
+    return out_str
+
+def sprintFileIO(tag, options):
+    """ Generate a pretty-print ready string of the file I/O done by a JTTag(),
+    if it did any.
+    """
+    out_str = ""
+    if tag.get("total_cache_hits", 0) or tag.get("total_cache_misses", 0) or tag.get("total_cache_evictions", 0):
+        out_str += "  Cache Hits: %s  Misses: %s  Evictions: %s\n" % (
+            reportNumber(tag.total_cache_hits, options),
+            reportNumber(tag.total_cache_misses, options),
+            reportNumber(tag.total_cache_evictions, options))
+    if tag.get("total_bytes_read", 0) or tag.get("total_bytes_written", 0) or tag.get("total_commit_wait", 0):
+        out_str += "  Read: %s  Written: %s  Commit Wait: %s\n" % (
+            reportMemory(tag.total_bytes_read, options, isBytes=True),
+            reportMemory(tag.total_bytes_written, options, isBytes=True),
+            reportTime(tag.total_commit_wait, options))
+    for title, histogram in [("Download Times", "download_times"), ("Upload Times", "upload_times")]:
+        buckets = ["%s: %s" % (bucket, reportNumber(count, options))
+                   for bucket, count in tag.get(histogram, {}).items() if count]
+        if buckets:
+            out_str += "  %s: %s\n" % (title, "  ".join(buckets))
     return out_str
 
 def decorateTitle(title, options):
@@ -439,114 +461,39 @@ def updateColumnWidths(tag, cw, options):
                     # this string is larger than max, width must be increased
                     cw.setWidth(category, field, len(s) + 1)
 
-def buildElement(element, items, itemName):
-    """ Create an element for output.
-    """
-    def assertNonnegative(i,name):
-        if i < 0:
-            raise RuntimeError("Negative value %s reported for %s" %(i,name) )
-        else:
-            return float(i)
-
-    itemTimes = []
-    itemClocks = []
-    itemMemory = []
-    for item in items:
-        # If something lacks an entry, assume it used none of that thing.
-        # This avoids crashing when jobs e.g. aren't done.
-        itemTimes.append(assertNonnegative(float(item.get("time", 0)), "time"))
-        itemClocks.append(assertNonnegative(float(item.get("clock", 0)), "clock"))
-        itemMemory.append(assertNonnegative(float(item.get("memory", 0)), "memory"))
-    assert len(itemClocks) == len(itemTimes) == len(itemMemory)
-
-    itemWaits=[]
-    for index in range(0,len(itemTimes)):
-        itemWaits.append(itemTimes[index] - itemClocks[index])
-
-    itemWaits.sort()
-    itemTimes.sort()
-    itemClocks.sort()
-    itemMemory.sort()
-
-    if len(itemTimes) == 0:
-        itemTimes.append(0)
-        itemClocks.append(0)
-        itemWaits.append(0)
-        itemMemory.append(0)
-
-    element[itemName]=Expando(
-        total_number=float(len(items)),
-        total_time=float(sum(itemTimes)),
-        median_time=float(itemTimes[old_div(len(itemTimes),2)]),
-        average_time=float(old_div(sum(itemTimes),len(itemTimes))),
-        min_time=float(min(itemTimes)),
-        max_time=float(max(itemTimes)),
-        total_clock=float(sum(itemClocks)),
-        median_clock=float(itemClocks[old_div(len(itemClocks),2)]),
-        average_clock=float(old_div(sum(itemClocks),len(itemClocks))),
-        min_clock=float(min(itemClocks)),
-        max_clock=float(max(itemClocks)),
-        total_wait=float(sum(itemWaits)),
-        median_wait=float(itemWaits[old_div(len(itemWaits),2)]),
-        average_wait=float(old_div(sum(itemWaits),len(itemWaits))),
-        min_wait=float(min(itemWaits)),
-        max_wait=float(max(itemWaits)),
-        total_memory=float(sum(itemMemory)),
-        median_memory=float(itemMemory[old_div(len(itemMemory),2)]),
-        average_memory=float(old_div(sum(itemMemory),len(itemMemory))),
-        min_memory=float(min(itemMemory)),
-        max_memory=float(max(itemMemory)),
-        name=itemName
-    )
-    return element[itemName]
-
-def createSummary(element, containingItems, containingItemName, getFn):
-    itemCounts = [len(getFn(containingItem)) for
-                  containingItem in containingItems]
-    itemCounts.sort()
-    if len(itemCounts) == 0:
-        itemCounts.append(0)
-    element["median_number_per_%s" % containingItemName] = itemCounts[old_div(len(itemCounts), 2)]
-    element["average_number_per_%s" % containingItemName] = old_div(float(sum(itemCounts)), len(itemCounts))
-    element["min_number_per_%s" % containingItemName] = min(itemCounts)
-    element["max_number_per_%s" % containingItemName] = max(itemCounts)
-
-
 def getStats(jobStore):
-    """ Collect and return the stats and config data.
+    """ Collect and return a StatsSummary of the stats data.
+
+    Uses the summary the leader saves as it goes, if there is one, adding any
+    stats files the leader has not read yet without marking them as read, so
+    that nothing already summarized needs to be read again. Otherwise,
+    summarizes the stats files one at a time.
     """
-    def aggregateStats(fileHandle,aggregateObject):
+    summary = StatsSummary.load(jobStore)
+
+    def aggregateStats(fileHandle):
         try:
             stats = json.load(fileHandle, object_hook=Expando)
-            for key in list(stats.keys()):
-                if key in aggregateObject:
-                    aggregateObject[key].append(stats[key])
-                else:
-                    aggregateObject[key]=[stats[key]]
         except ValueError:
             logger.critical("File %s contains corrupted json. Skipping file." % fileHandle)
-            pass  # The file is corrupted.
+            return  # The file is corrupted.
+        summary.add(stats)
 
-    aggregateObject = Expando()
-    callBack = partial(aggregateStats, aggregateObject=aggregateObject)
-    jobStore.readStatsAndLogging(callBack, readAll=True)
-    return aggregateObject
+    if summary is not None:
+        jobStore.readStatsAndLogging(aggregateStats, markRead=False, alreadyRead=summary.batchIDs)
+    else:
+        summary = StatsSummary()
+        jobStore.readStatsAndLogging(aggregateStats, readAll=True)
+    return summary
 
 
 def processData(config, stats):
     """
     Collate the stats and report
     """
-    if 'total_time' not in stats or 'total_clock' not in stats:
-        # toil job not finished yet
-        stats.total_time = [0.0]
-        stats.total_clock = [0.0]
-
-    stats.total_time = sum([float(number) for number in stats.total_time])
-    stats.total_clock = sum([float(number) for number in stats.total_clock])
-
-    collatedStatsTag = Expando(total_run_time=stats.total_time,
-                               total_clock=stats.total_clock,
+    # If the workflow isn't finished yet, its total times are 0.
+    collatedStatsTag = Expando(total_run_time=stats.totalTime,
+                               total_clock=stats.totalClock,
                                batch_system=config.batchSystem,
                                default_memory=str(config.defaultMemory),
                                default_cores=str(config.defaultCores),
@@ -554,28 +501,28 @@ def processData(config, stats):
                                )
 
     # Add worker info
-    worker = [_f for _f in getattr(stats, 'workers', []) if _f]
-    jobs = [_f for _f in getattr(stats, 'jobs', []) if _f]
-    jobs = [item for sublist in jobs for item in sublist]
-
-    def fn4(job):
-        try:
-            return list(jobs)
-        except TypeError:
-            return []
+    collatedStatsTag.worker = stats.worker.report("worker")
+    collatedStatsTag.jobs = stats.jobs.report("jobs")
+
+    # Add how many jobs each worker ran
+    jobsPerWorker = stats.jobsPerWorker or {0: 1}
+    workers = sum(jobsPerWorker.values())
+    seen = 0
+    for number in sorted(jobsPerWorker):
+        seen += jobsPerWorker[number]
+        if seen > workers // 2:
+            collatedStatsTag.jobs.median_number_per_worker = number
+            break
+    collatedStatsTag.jobs.average_number_per_worker = round(float(sum(number * count for number, count in
+                                                                      jobsPerWorker.items())) / workers, 2)
+    collatedStatsTag.jobs.min_number_per_worker = min(jobsPerWorker)
+    collatedStatsTag.jobs.max_number_per_worker = max(jobsPerWorker)
 
-    buildElement(collatedStatsTag, worker, "worker")
-    createSummary(buildElement(collatedStatsTag, jobs, "jobs"),
-                  getattr(stats, 'workers', []), "worker", fn4)
     # Get info for each job
-    jobNames = set()
-    for job in jobs:
-        jobNames.add(job.class_name)
     jobTypesTag = Expando()
     collatedStatsTag.job_types = jobTypesTag
-    for jobName in jobNames:
-        jobTypes = [ job for job in jobs if job.class_name == jobName ]
-        buildElement(jobTypesTag, jobTypes, jobName)
+    for jobName, jobType in stats.jobTypes.items():
+        jobTypesTag[jobName] = jobType.report(jobName)
     collatedStatsTag.name = "collatedStatsTag"
     return collatedStatsTag
 
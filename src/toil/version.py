@@ -0,0 +1,11 @@
+baseVersion = '4.3.0a1'
+cgcloudVersion = '1.6.0a1.dev393'
+version = '4.3.0a1-5b96cd52d4103b4bde66f7db6a4050fc67be778f-dirty'
+distVersion = '4.3.0a1'
+exactPython = 'python3.11'
+python = 'python3.11'
+dockerTag = '4.3.0a1-5b96cd52d4103b4bde66f7db6a4050fc67be778f-dirty-py3.11'
+currentCommit = '5b96cd52d4103b4bde66f7db6a4050fc67be778f'
+dockerRegistry = 'quay.io/ucsc_cgl'
+dockerName = 'toil'
+dirty = True
@@ -23,7 +23,6 @@ from contextlib import contextmanager
 import os
 import pickle
 import sys
-import copy
 import random
 import json
 import tempfile
@@ -70,11 +69,9 @@ def nextChainable(predecessor, jobStore, config):
         return None
 
     if len(predecessor.stack) > 1 and len(predecessor.stack[-1]) > 0 and len(predecessor.stack[-2]) > 0:
-        # TODO: Without a real stack list we can freely mutate, we can't chain
-        # to a child, which may branch, and then go back and do the follow-ons
-        # of the original job.
-        # TODO: Go back to a free-form stack list and require some kind of
-        # stack build phase?
+        # The child can't take over this job's ID while the follow-ons still
+        # need to run after it. nextLocalSuccessor() can run it under its own
+        # ID instead.
         logger.debug("Stopping running chain of jobs because job has both children and follow-ons")
         return None
 
@@ -97,35 +94,89 @@ def nextChainable(predecessor, jobStore, config):
     # Load the successor JobDescription
     successor = jobStore.load(successorID)
 
+    if not canRunAfter(successor, predecessor):
+        return None
+    
+    # Made it through! This job is chainable.
+    return successor
+
+def canRunAfter(successor, predecessor):
+    """
+    Returns True if the given successor can be run by the worker that ran the
+    given predecessor, in the predecessor's resource allocation.
+    
+    :param toil.job.JobDescription successor: The job to run next
+    :param toil.job.JobDescription predecessor: The job that has just run
+    :rtype: bool
+    """
     #We check the requirements of the successor to see if we can run it
     #within the current worker
     if successor.memory > predecessor.memory:
         logger.debug("We need more memory for the next job, so finishing")
-        return None
+        return False
     if successor.cores > predecessor.cores:
         logger.debug("We need more cores for the next job, so finishing")
-        return None
+        return False
     if successor.disk > predecessor.disk:
         logger.debug("We need more disk for the next job, so finishing")
-        return None
+        return False
     if successor.preemptable != predecessor.preemptable:
         logger.debug("Preemptability is different for the next job, returning to the leader")
-        return None
+        return False
     if successor.predecessorNumber > 1:
         logger.debug("The next job has multiple predecessors; we must return to the leader.")
-        return None
+        return False
 
     if len(successor.services) > 0:
         logger.debug("The next job requires services that will not yet be started; we must return to the leader.")
-        return None
+        return False
 
     if isinstance(successor, CheckpointJobDescription):
         # Check if job is a checkpoint job and quit if so
         logger.debug("Next job is checkpoint, so finishing")
-        return None
+        return False
     
-    # Made it through! This job is chainable.
-    return successor
+    return True
+
+def nextLocalSuccessor(predecessor, jobStore, config):
+    """
+    Returns the JobDescription of a successor of the given predecessor that
+    this worker can run itself, under the successor's own ID, or None if the
+    successors must be left to the leader.
+    
+    Used where chaining is impossible because the predecessor has more to do
+    after the successor: follow-ons waiting on a child, or other successors
+    in the same phase. Successors are only run here if all of the
+    successors in the phase can be, so that none of them are held up waiting
+    for the others; the phase can be at most config.maxChainFanOut wide.
+    
+    :param toil.job.JobDescription predecessor: The job that has just run, or
+           whose last locally-run successor has just finished.
+    :param toil.jobStores.abstractJobStore.AbstractJobStore jobStore: The JobStore to fetch JobDescriptions from.
+    :param toil.common.Config config: The configuration for the current run.
+    :rtype: toil.job.JobDescription or None
+    """
+    if len(predecessor.services) > 0 or isinstance(predecessor, CheckpointJobDescription):
+        # The leader has to keep track of services and checkpointed subtrees
+        return None
+
+    jobs = predecessor.nextSuccessors()
+    if not jobs:
+        return None
+    if len(jobs) > config.maxChainFanOut:
+        logger.debug("Job has %i successors to run at once, which is too many to run here", len(jobs))
+        return None
+
+    successors = jobStore.loadMany(list(jobs))
+    if len(successors) != len(jobs):
+        # Some successor is already done and gone, which only the leader can
+        # sort out.
+        return None
+    for successor in successors.values():
+        if not canRunAfter(successor, predecessor):
+            return None
+    # Run them in a consistent order
+    return successors[min(successors)]
 
 def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=True):
     """
@@ -289,6 +340,20 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
     blockFn = lambda : True
     listOfJobs = [jobName]
     job = None
+    # Jobs whose successors we are running here under the successors' own
+    # IDs, rather than chaining, outermost first. The job we were started
+    # for is at the bottom, if there are any. Each is kept with where its
+    # chain of jobs starts in listOfJobs, how many job stats and log messages
+    # there were when that chain started, and a function to wait for its
+    # commit.
+    parentJobs = []
+    # Where the chain of jobs we are working on starts in listOfJobs
+    chainStart = 0
+    # How many job stats and messages for the leader there were when it started
+    chainReports = (0, 0)
+    # Set if a successor we were running here failed, rather than the job we
+    # were started for
+    successorFailed = False
     try:
 
         #Put a message at the top of the log, just to make sure it's working.
@@ -361,6 +426,9 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
             startClock = getTotalCpuTime()
 
         startTime = time.time()
+        # Set when we come back to a job from a successor we were running for
+        # it, and need to work out what to do next for it
+        resumed = False
         while True:
             ##########################################
             #Run the job body, if there is one
@@ -405,12 +473,13 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
                 
                 logger.info("Completed body for %s", jobDesc)
 
-            else:
+            elif not resumed:
                 #The command may be none, in which case
                 #the JobDescription is either a shell ready to be deleted or has
                 #been scheduled after a failure to cleanup
                 logger.debug("No user job to run, so finishing")
                 break
+            resumed = False
             
             if AbstractFileStore._terminateEvent.isSet():
                 raise RuntimeError("The termination flag is set")
@@ -418,15 +487,60 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
             ##########################################
             #Establish if we can run another job within the worker
             ##########################################
-            successor = nextChainable(jobDesc, jobStore, config)
-            if successor is None or config.disableChaining:
-                # Can't chain any more jobs. We are going to stop.
+            successor = None if config.disableChaining else nextChainable(jobDesc, jobStore, config)
+            if successor is None:
+                if parentJobs and jobDesc.command is None and next(jobDesc.successorsAndServiceHosts(), None) is None:
+                    ##########################################
+                    # The job we were running for the job it comes after is
+                    # done, successors and all. Delete it, as the leader
+                    # would have, and carry on with the job it came after.
+                    ##########################################
+                    
+                    # Make sure everything it did is committed first
+                    blockFn()
+                    if AbstractFileStore._terminateEvent.isSet():
+                        raise RuntimeError("The termination flag is set")
+                    
+                    parent, chainStart, chainReports, _ = parentJobs.pop()
+                    logger.info("Finished %s, going back to %s", jobDesc, parent)
+                    # Forget the finished job before it is gone, so the
+                    # parent never points at a job that doesn't exist.
+                    finishedID = jobDesc.jobStoreID
+                    parent.filterSuccessors(lambda jID: jID != finishedID)
+                    jobStore.update(parent)
+                    for otherID in jobDesc.jobsToDelete:
+                        jobStore.delete(otherID)
+                    jobStore.delete(finishedID)
+                    
+                    jobDesc = parent
+                    resumed = True
+                    continue
                 
-                logger.info("Not chaining from job %s", jobDesc)
+                localSuccessor = None if config.disableChaining else nextLocalSuccessor(jobDesc, jobStore, config)
+                if localSuccessor is None:
+                    # Can't chain any more jobs. We are going to stop.
+                    
+                    logger.info("Not chaining from job %s", jobDesc)
+                    
+                    # TODO: Somehow the commit happens even if we don't start it here. 
+                    
+                    break
                 
-                # TODO: Somehow the commit happens even if we don't start it here. 
+                ##########################################
+                # The successor can't take over the current job's ID, because
+                # the current job has more to do after it. Run it here under
+                # its own ID, like the leader would have, and come back to the
+                # current job when the successor and everything after it is
+                # done.
+                ##########################################
                 
-                break
+                logger.info("Running %s after %s in this worker", localSuccessor, jobDesc)
+                parentJobs.append((jobDesc, chainStart, chainReports, blockFn))
+                chainStart = len(listOfJobs)
+                chainReports = (len(statsDict.jobs), len(statsDict.workers.logsToMaster))
+                listOfJobs.append(str(localSuccessor))
+                jobDesc = localSuccessor
+                continue
                 
             logger.info("Chaining from %s to %s", jobDesc, successor)
 
@@ -459,37 +573,25 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
             # the deletion of the job ID we're currently working on.
             jobDesc.jobsToDelete.append(successorID)
 
-            # Clone the now-current JobDescription (which used to be the successor).
-            # TODO: Why??? Can we not?
-            jobDesc = copy.deepcopy(jobDesc)
-            
-            # Build a fileStore to update the job and commit the replacement.
-            # TODO: can we have a commit operation without an entire FileStore???
-            fileStore = AbstractFileStore.createFileStore(jobStore, jobDesc, localWorkerTempDir, blockFn,
-                                                          caching=not config.disableCaching)
-                                                          
-            # Update blockFn to wait for that commit operation.
-            blockFn = fileStore.waitForCommit
-
-            # This will update the job once the previous job is done updating
-            fileStore.startCommit(jobState=True)            
+            # The files the job we replaced deleted are gone once its own
+            # commit is done, which this one waits for.
+            jobDesc.filesToDelete = []
             
-            # Clone the current job description again, so that further updates
-            # to it (such as new successors being added when it runs) occur
-            # after the commit process we just kicked off, and aren't committed
-            # early or partially.
-            jobDesc = copy.deepcopy(jobDesc)
+            # Save the replacement once the previous job is done updating. It
+            # has nothing else to commit yet, so it doesn't need a file store
+            # for that. Commit a snapshot, so that further updates to the job
+            # description (such as new successors being added when it runs)
+            # aren't committed early or partially.
+            blockFn = AbstractFileStore.startJobDescriptionCommit(jobStore, jobDesc.snapshot(), blockFn)
             
             logger.debug("Starting the next job")
         
-        ##########################################
-        #Finish up the stats
-        ##########################################
-        if config.stats:
-            totalCPUTime, totalMemoryUsage = getTotalCpuTimeAndMemoryUsage()
-            statsDict.workers.time = str(time.time() - startTime)
-            statsDict.workers.clock = str(totalCPUTime - startClock)
-            statsDict.workers.memory = str(totalMemoryUsage)
+        if parentJobs:
+            # We stopped partway through the successors of the job we were
+            # started for. They are all committed as far as they got, and the
+            # leader can take it from here.
+            jobDesc, chainStart, chainReports, _ = parentJobs[0]
+            parentJobs = []
 
         # log the worker log path here so that if the file is truncated the path can still be found
         if redirectOutputToLogFile:
@@ -505,6 +607,17 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
         logger.error("Exiting the worker because of a failed job on host %s", socket.gethostname())
         AbstractFileStore._terminateEvent.set()
     
+    ##########################################
+    #Finish up the stats
+    ##########################################
+    # There are stats to report unless we failed, or only a successor we were
+    # running here failed.
+    if config.stats and (parentJobs or not AbstractFileStore._terminateEvent.isSet()):
+        totalCPUTime, totalMemoryUsage = getTotalCpuTimeAndMemoryUsage()
+        statsDict.workers.time = str(time.time() - startTime)
+        statsDict.workers.clock = str(totalCPUTime - startClock)
+        statsDict.workers.memory = str(totalMemoryUsage)
+    
     ##########################################
     #Wait for the asynchronous chain of writes/updates to finish
     ########################################## 
@@ -519,9 +632,25 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
     if AbstractFileStore._terminateEvent.isSet():
         # Something has gone wrong.
         
-        # Clobber any garbage state we have for this job from failing with
-        # whatever good state is still stored in the JobStore
-        jobDesc = jobStore.load(jobStoreID)
+        if parentJobs:
+            # It was a successor we were running here under its own ID that
+            # failed. Charge it for the failure, as the leader would have, and
+            # leave the jobs it comes after as they were last committed, for
+            # the leader to carry on from.
+            for _, _, _, waitForParentCommit in parentJobs:
+                waitForParentCommit()
+            jobDesc = jobStore.load(jobDesc.jobStoreID)
+            listOfJobs = listOfJobs[chainStart:]
+            # Only report on the jobs that finished before it started
+            del statsDict.jobs[chainReports[0]:]
+            del statsDict.workers.logsToMaster[chainReports[1]:]
+            jobDesc.setupJobAfterFailure()
+            jobStore.update(jobDesc)
+            successorFailed = True
+        else:
+            # Clobber any garbage state we have for this job from failing with
+            # whatever good state is still stored in the JobStore
+            jobDesc = jobStore.load(jobStoreID)
         # Remember that we failed
         jobAttemptFailed = True
 
@@ -589,7 +718,7 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
         statsDict.logs.names = listOfJobs
         statsDict.logs.messages = logMessages
 
-    if (debugging or config.stats or statsDict.workers.logsToMaster) and not jobAttemptFailed:  # We have stats/logging to report back
+    if (debugging or config.stats or statsDict.workers.logsToMaster) and (not jobAttemptFailed or successorFailed):  # We have stats/logging to report back
         jobStore.writeStatsAndLogging(json.dumps(statsDict, ensure_ascii=True).encode())
 
     #Remove the temp dir
@@ -604,9 +733,11 @@ def workerScript(jobStore, config, jobName, jobStoreID, redirectOutputToLogFile=
             jobStore.delete(otherID)
         jobStore.delete(jobDesc.jobStoreID)
         
-    if jobAttemptFailed:
+    if jobAttemptFailed and not successorFailed:
         return 1
     else:
+        # If only a successor failed, the job we were started for is fine, and
+        # the leader finds the successor's failure when it goes to run it.
         return 0
         
 def parse_args(args):
@@ -689,7 +820,10 @@ def main(argv=None):
     
     with in_contexts(options.context):
         # Call the worker
-        exit_code = workerScript(jobStore, config, options.jobName, options.jobStoreID)
+        try:
+            exit_code = workerScript(jobStore, config, options.jobName, options.jobStoreID)
+        finally:
+            jobStore.shutdown()
     
     # Exit with its return value
     sys.exit(exit_code)